@@ -1,16 +1,778 @@
 # app_rpg_search.py - API Corrigida
-from flask import Flask, request, jsonify
-from elasticsearch import Elasticsearch
+import atexit
+import json
+import os
+import time
+from datetime import datetime
+
+from flask import Flask, request, jsonify, Response, g, stream_with_context
+from werkzeug.exceptions import HTTPException
+from elasticsearch import ApiError, BadRequestError, Elasticsearch, NotFoundError, UnsupportedProductError
+
+from cache_rpg import CacheTTL
+from contadores_rpg import RepositorioContadores
+from ranking_rpg import ATRIBUTOS_RANKING, RankingPersonagens
+from elegibilidade_rpg import METRICAS, IndiceMissoesPorNivel
+from recomendacao_rpg import MatrizItens
+from similares_rpg import TabelaSimilares
+from embeddings_rpg import CAMPO_EMBEDDING, MatrizEmbeddings, com_embedding, embedding_do_item
+from eventos_rpg import BarramentoEventos, fluxo_sse
+from buscas_salvas_rpg import INDICE_BUSCAS, Percolador
+from indices_rpg import indice_atual
+from escrita_rpg import POLITICAS_REFRESH, FilaCheia, FilaEscritas, OrcamentoRefresh
+from captura_rpg import CapturaTrafego, eh_escrita
+from metricas_rpg import ClienteMedido, RegistroMetricas, coletor_caches, coletor_pool_es
+from perfil_rpg import condensar_perfil, explicar_consulta
+from protecao_rpg import CircuitoAberto, ClienteProtegido, Compartimento, Disjuntor, TimeoutsAdaptativos, sobrecarga
+from tempos_rpg import ClienteCronometrado, Cronometro, JSONCronometrado, LogConsultasLentas, em_fase, marcar_fase
+from colunar_rpg import (
+    MIME_ARROW, MIME_COLUNAR, CAMPOS_ITENS, CAMPOS_PERSONAGENS, CAMPOS_MISSOES,
+    colunas_de_hits, corpo_colunar, serializar_arrow
+)
 
 app = Flask(__name__)
-es = Elasticsearch("http://localhost:9200")
+
+# RPG_ES_BACKEND=local troca o cluster pelo ElasticsearchLocal (es_local_rpg.py),
+# populado na subida pelo gerador (RPG_ES_LOCAL_ESCALA, RPG_ES_LOCAL_SEED) ou
+# por um dataset de ingestao_rpg.py (RPG_ES_LOCAL_DATASET)
+BACKEND_ES = os.environ.get('RPG_ES_BACKEND', 'elasticsearch')
+if BACKEND_ES == 'local':
+    from es_local_rpg import ElasticsearchLocal, popular
+    es = ElasticsearchLocal()
+    popular(
+        es,
+        escala=float(os.environ.get('RPG_ES_LOCAL_ESCALA', 1.0)),
+        seed=int(os.environ.get('RPG_ES_LOCAL_SEED', 42)),
+        dataset=os.environ.get('RPG_ES_LOCAL_DATASET')
+    )
+else:
+    es = Elasticsearch("http://localhost:9200")
 
 # Verificar conexão
 if not es.ping():
     print("❌ Erro: Elasticsearch não está rodando!")
     exit()
 
-print("✅ Conectado ao Elasticsearch")
+print("✅ Conectado ao Elasticsearch" if BACKEND_ES != 'local' else "✅ Usando o Elasticsearch local (em processo)")
+
+# A API lê e escreve pelos aliases; índices de antes das versões ainda funcionam
+for _alias in ('rpg_itens', 'rpg_personagens', 'rpg_missoes'):
+    try:
+        if indice_atual(es, _alias) == _alias:
+            print(f"⚠️  '{_alias}' é um índice sem versão; migre com: python migrar_indices.py {_alias}")
+    except Exception as e:
+        print(f"⚠️  Não foi possível verificar o alias '{_alias}': {e}")
+
+# ============================================================
+# CAPTURA DE TRÁFEGO
+# ============================================================
+# Com RPG_CAPTURA=<fração> (ex.: 0.01), essa fração das requisições vai
+# para RPG_CAPTURA_ARQUIVO (JSONL, roda a cada RPG_CAPTURA_MAX_MB) para
+# ser reproduzida depois com `python captura_rpg.py`. Registrado antes
+# dos outros before_request para medir também as respostas de validação.
+captura = CapturaTrafego(
+    arquivo=os.environ.get('RPG_CAPTURA_ARQUIVO', 'trafego_capturado.jsonl'),
+    amostragem=float(os.environ.get('RPG_CAPTURA', 0)),
+    tamanho_max=int(float(os.environ.get('RPG_CAPTURA_MAX_MB', 64)) * 1024 * 1024),
+    arquivos=int(os.environ.get('RPG_CAPTURA_ARQUIVOS', 5))
+)
+captura.iniciar()
+atexit.register(captura.fechar)
+
+
+@app.before_request
+def sortear_captura():
+    if captura.sortear():
+        g.captura = (time.time(), time.perf_counter())
+
+
+@app.after_request
+def registrar_captura(response):
+    inicio = g.pop('captura', None)
+    # Streams SSE não têm duração que faça sentido reproduzir
+    if inicio is None or response.is_streamed:
+        return response
+    chegada, relogio = inicio
+    registro = {
+        'ts': round(chegada, 6),
+        'metodo': request.method,
+        'rota': request.url_rule.rule if request.url_rule else '(sem rota)',
+        'caminho': request.path,
+        'query': request.query_string.decode('utf-8', 'replace'),
+        'status': response.status_code,
+        'duracao_ms': round((time.perf_counter() - relogio) * 1000, 3),
+        'bytes_resposta': response.calculate_content_length()
+    }
+    if request.content_length:
+        if request.content_length > captura.max_corpo:
+            registro['corpo_omitido'] = request.content_length
+        else:
+            registro['corpo'] = request.get_json(silent=True)
+    captura.registrar(registro)
+    return response
+
+# ============================================================
+# MÉTRICAS (PROMETHEUS)
+# ============================================================
+# GET /metrics expõe contagem e latência por rota, requisições em
+# andamento, exceções, chamadas/took do ES por índice e rota, caches e
+# pool de conexões. O cliente ES é trocado por um proxy que mede cada
+# chamada, então os componentes criados abaixo já saem instrumentados.
+metricas = RegistroMetricas()
+es = ClienteMedido(es, metricas)
+
+requisicoes_http = metricas.contador(
+    'rpg_http_requisicoes_total', 'Requisições respondidas por rota, método e status', ('rota', 'metodo', 'status'))
+duracao_http = metricas.histograma(
+    'rpg_http_duracao_segundos', 'Tempo até a resposta (cabeçalhos, no caso de streams) por rota', ('rota', 'metodo'))
+em_andamento_http = metricas.medidor(
+    'rpg_http_em_andamento', 'Requisições em processamento por rota', ('rota',))
+excecoes_http = metricas.contador(
+    'rpg_http_excecoes_total', 'Exceções não tratadas pelas rotas, por tipo', ('rota', 'excecao'))
+
+
+@app.before_request
+def iniciar_metricas():
+    g.metricas = (request.url_rule.rule if request.url_rule else '(sem rota)', time.perf_counter())
+    em_andamento_http.inc(g.metricas[0])
+
+
+@app.after_request
+def registrar_metricas(response):
+    if 'metricas' in g:
+        rota, inicio = g.metricas
+        duracao_http.observar(time.perf_counter() - inicio, rota, request.method)
+        requisicoes_http.inc(rota, request.method, str(response.status_code))
+    return response
+
+
+@app.teardown_request
+def encerrar_metricas(exc):
+    medicao = g.pop('metricas', None)
+    if medicao is None:
+        return
+    em_andamento_http.dec(medicao[0])
+    if exc is not None:
+        excecoes_http.inc(medicao[0], type(exc).__name__)
+
+
+# Coletores lidos a cada exportação; os nomes abaixo são definidos mais adiante
+metricas.coletor(coletor_pool_es(es))
+metricas.coletor(coletor_caches(lambda: [cache_contagem]))
+
+
+@metricas.coletor
+def coletar_filas():
+    """Profundidade das filas em segundo plano (write-behind, percolador, SSE, captura)"""
+    escritas = fila_escritas.estatisticas()
+    return [
+        ('rpg_fila_profundidade', 'gauge', 'Itens aguardando nas filas em segundo plano', [
+            ({'fila': 'write_behind'}, escritas['profundidade']),
+            ({'fila': 'percolador'}, percolador.fila.qsize()),
+            ({'fila': 'captura'}, captura.fila.qsize()),
+            ({'fila': 'sse_mudancas'}, barramento_mudancas.estatisticas()['pendentes']),
+            ({'fila': 'sse_buscas_salvas'}, barramento_buscas.estatisticas()['pendentes'])
+        ]),
+        ('rpg_fila_capacidade', 'gauge', 'Capacidade da fila de write-behind',
+         [({'fila': 'write_behind'}, escritas['capacidade'])]),
+        ('rpg_fila_descartes_total', 'counter', 'Itens recusados ou descartados por fila cheia', [
+            ({'fila': 'write_behind'}, escritas['recusadas']),
+            ({'fila': 'percolador'}, percolador.descartados),
+            ({'fila': 'captura'}, captura.metricas['descartadas'])
+        ])
+    ]
+
+# ============================================================
+# TEMPO POR FASE (SERVER-TIMING) E CONSULTAS LENTAS
+# ============================================================
+# Cada requisição é dividida em parse -> build -> es -> format ->
+# serialize: as rotas marcam 'build' ao montar a consulta, o proxy do
+# cliente ES conta as chamadas e o provedor JSON conta o jsonify. As
+# fases saem no cabeçalho Server-Timing (RPG_SERVER_TIMING=0 desliga) e
+# em /metrics. Requisições acima de RPG_LENTAS_MS vão para
+# RPG_LENTAS_ARQUIVO com o DSL e o took de cada chamada; com
+# RPG_LENTAS_PERFIL=1 as buscas são refeitas com "profile": true.
+SERVER_TIMING = os.environ.get('RPG_SERVER_TIMING', '1') != '0'
+
+app.json = JSONCronometrado(app)
+es = ClienteCronometrado(es)
+
+consultas_lentas = LogConsultasLentas(
+    arquivo=os.environ.get('RPG_LENTAS_ARQUIVO', 'consultas_lentas.jsonl'),
+    limite_ms=float(os.environ.get('RPG_LENTAS_MS', 500)),
+    es=es,
+    perfil=os.environ.get('RPG_LENTAS_PERFIL', '0') == '1'
+)
+consultas_lentas.iniciar()
+atexit.register(consultas_lentas.fechar)
+
+duracao_fases = metricas.histograma(
+    'rpg_http_fase_segundos', 'Tempo por fase da requisição (parse, build, es, format, serialize)', ('rota', 'fase'))
+
+
+@app.before_request
+def iniciar_cronometro():
+    g.cronometro = Cronometro()
+
+
+@app.after_request
+def registrar_fases(response):
+    cronometro = g.pop('cronometro', None)
+    if cronometro is None:
+        return response
+    total = cronometro.encerrar()
+    rota = request.url_rule.rule if request.url_rule else '(sem rota)'
+    for fase, duracao in cronometro.fases.items():
+        duracao_fases.observar(duracao, rota, fase)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = cronometro.server_timing(total)
+    
+    if consultas_lentas.lenta(total * 1000) and not response.is_streamed:
+        consultas_lentas.registrar({
+            'ts': round(time.time() - total, 6),
+            'metodo': request.method,
+            'rota': rota,
+            'caminho': request.path,
+            'query': request.query_string.decode('utf-8', 'replace'),
+            'status': response.status_code,
+            'duracao_ms': round(total * 1000, 3),
+            'fases_ms': {fase: round(duracao * 1000, 3) for fase, duracao in cronometro.fases.items()},
+            'took_ms': cronometro.took_ms(),
+            'chamadas_es': cronometro.chamadas
+        })
+    return response
+
+# ============================================================
+# PROTEÇÃO CONTRA SOBRECARGA
+# ============================================================
+# Cada classe de rota tem um compartimento com RPG_LIMITE_<CLASSE>
+# requisições simultâneas e uma fila do mesmo tamanho com espera de até
+# RPG_ESPERA_COMPARTIMENTO segundos; passando disso a resposta é 503
+# com Retry-After, sem ocupar o worker. Rotas de observação e streams
+# ficam de fora. As chamadas das rotas ao ES passam por um disjuntor
+# (RPG_DISJUNTOR_FALHAS falhas seguidas de 429/timeout abrem o circuito
+# por RPG_DISJUNTOR_ESPERA segundos) e usam timeout = p99 recente x
+# RPG_TIMEOUT_FATOR de cada leitura (escritas ficam com o padrão).
+CLASSES_ROTA = {
+    'pesadas': {
+        '/dashboard', '/dashboard_personagens', '/dashboard_missoes', '/similares/<item_id>', '/busca-avancada',
+        '/count', '/missoes/elegiveis', '/personagens/elegiveis', '/personagens/<pessoa_id>/recomendacoes',
+        '/personagens/recomendacoes', '/itens/bulk', '/escritas/<ack>', '/debug/profile/<path:rota>'
+    },
+    'buscas': {
+        '/buscar', '/filtrar', '/autocomplete', '/buscar_personagens', '/filtrar_personagens', '/buscar_missoes',
+        '/filtrar_missoes', '/missoes_dificuldade', '/top_personagens', '/top_personagens/<pessoa_id>/posicao',
+        '/top_personagens/<pessoa_id>/vizinhos', '/itens', '/personagens', '/missoes', '/buscas_salvas'
+    }
+}
+# Nunca limitadas: observação (precisa responder justamente sob carga) e streams de longa duração
+ROTAS_LIVRES = {
+    '/', '/metrics', '/stream/estatisticas', '/escritas/estatisticas', '/captura/estatisticas',
+    '/lentas/estatisticas', '/protecao/estatisticas', '/stream/changes', '/buscas_salvas/stream'
+}
+LIMITES_PADRAO = {'pesadas': 4, 'buscas': 16, 'documentos': 32}
+
+compartimentos = {
+    classe: Compartimento(
+        classe,
+        limite=int(os.environ.get(f'RPG_LIMITE_{classe.upper()}', padrao)),
+        espera=float(os.environ.get('RPG_ESPERA_COMPARTIMENTO', 1.0))
+    )
+    for classe, padrao in LIMITES_PADRAO.items()
+}
+CLASSE_DA_ROTA = {rota: classe for classe, rotas in CLASSES_ROTA.items() for rota in rotas}
+
+disjuntor_es = Disjuntor(
+    limite=int(os.environ.get('RPG_DISJUNTOR_FALHAS', 5)),
+    espera=float(os.environ.get('RPG_DISJUNTOR_ESPERA', 10))
+)
+timeouts_es = TimeoutsAdaptativos(
+    padrao=float(os.environ.get('RPG_TIMEOUT_ES', 10)),
+    fator=float(os.environ.get('RPG_TIMEOUT_FATOR', 3))
+)
+es = ClienteProtegido(es, disjuntor_es, timeouts_es)
+
+
+@app.before_request
+def admitir_requisicao():
+    if request.url_rule is None or request.url_rule.rule in ROTAS_LIVRES:
+        return None
+    compartimento = compartimentos[CLASSE_DA_ROTA.get(request.url_rule.rule, 'documentos')]
+    if not compartimento.entrar():
+        return jsonify({
+            'error': f'Servidor ocupado: limite de requisições "{compartimento.nome}" atingido'
+        }), 503, {'Retry-After': str(compartimento.retry_after())}
+    g.compartimento = (compartimento, time.perf_counter())
+
+
+@app.teardown_request
+def liberar_compartimento(exc):
+    ocupado = g.pop('compartimento', None)
+    if ocupado is not None:
+        compartimento, inicio = ocupado
+        compartimento.sair(time.perf_counter() - inicio)
+
+
+def resposta_erro(e):
+    """Resposta de uma rota que falhou: 503 se o ES está sobrecarregado (ou o circuito aberto), senão 500"""
+    if isinstance(e, CircuitoAberto):
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+    if sobrecarga(e):
+        return jsonify({'error': f'Elasticsearch sobrecarregado: {e}'}), 503, {'Retry-After': '1'}
+    return jsonify({'error': str(e)}), 500
+
+
+@metricas.coletor
+def coletar_protecao():
+    """Ocupação e descartes dos compartimentos e estado do disjuntor"""
+    estatisticas = {classe: c.estatisticas() for classe, c in compartimentos.items()}
+    serie = lambda campo: [({'classe': classe}, e[campo]) for classe, e in estatisticas.items()]
+    return [
+        ('rpg_compartimento_em_uso', 'gauge', 'Requisições em andamento por classe de rota', serie('em_uso')),
+        ('rpg_compartimento_esperando', 'gauge', 'Requisições na fila do compartimento', serie('esperando')),
+        ('rpg_compartimento_recusadas_total', 'counter', 'Recusadas com a fila cheia (503)', serie('recusadas')),
+        ('rpg_compartimento_expiradas_total', 'counter', 'Desistiram de esperar uma vaga (503)', serie('expiradas')),
+        ('rpg_disjuntor_aberto', 'gauge', 'Disjuntor do ES aberto (1) ou meio-aberto (0.5)',
+         [({}, {'fechado': 0, 'meio_aberto': 0.5, 'aberto': 1}[disjuntor_es.estado])]),
+        ('rpg_disjuntor_recusadas_total', 'counter', 'Chamadas ao ES recusadas com o circuito aberto',
+         [({}, disjuntor_es.metricas['recusadas'])])
+    ]
+
+# ============================================================
+# NOTIFICAÇÃO DE ESCRITAS
+# ============================================================
+# Estruturas mantidas em memória (contadores, caches...) registram um
+# ouvinte aqui e são avisadas de cada escrita feita pelas rotas CRUD,
+# com o documento antigo e o novo (None na criação/remoção).
+OUVINTES_ESCRITA = []
+
+
+def ao_escrever(ouvinte):
+    """Registrar ouvinte(indice, doc_id, antigo, novo)"""
+    OUVINTES_ESCRITA.append(ouvinte)
+    return ouvinte
+
+
+def notificar_escrita(indice, doc_id, antigo, novo):
+    """Avisar todos os ouvintes; falha de um ouvinte não derruba a escrita"""
+    for ouvinte in OUVINTES_ESCRITA:
+        try:
+            ouvinte(indice, doc_id, antigo, novo)
+        except Exception as e:
+            print(f"⚠️  Ouvinte de escrita {ouvinte.__name__} falhou: {e}")
+
+# Orçamento de refresh forçado por índice: escritas com refresh=true
+# (ver POLÍTICA DE REFRESH DAS ESCRITAS) e semeaduras das estruturas em memória
+orcamento_refresh = OrcamentoRefresh(por_minuto=int(os.environ.get('RPG_REFRESH_ORCAMENTO', 60)))
+
+# ============================================================
+# CONTADORES DOS DASHBOARDS
+# ============================================================
+# Semeados uma vez a partir das agregações do ES, atualizados a cada
+# escrita e reconciliados periodicamente (RPG_INTERVALO_RECONCILIACAO).
+contadores = RepositorioContadores(
+    es,
+    arquivo=os.environ.get('RPG_CONTADORES_ARQUIVO'),
+    intervalo_reconciliacao=int(os.environ.get('RPG_INTERVALO_RECONCILIACAO', 300)),
+    orcamento=orcamento_refresh
+)
+ao_escrever(contadores.registrar_escrita)
+contadores.iniciar_reconciliacao_periodica()
+
+if contadores.arquivo:
+    atexit.register(contadores.salvar_arquivo)
+
+# ============================================================
+# RANKINGS DE PERSONAGENS
+# ============================================================
+# Semeados com um scan na primeira consulta, mantidos pelas escritas e
+# reconciliados com um novo scan a cada RPG_INTERVALO_RECONCILIACAO.
+ranking = RankingPersonagens(
+    es,
+    intervalo_reconciliacao=int(os.environ.get('RPG_INTERVALO_RECONCILIACAO', 300)),
+    orcamento=orcamento_refresh
+)
+ao_escrever(ranking.registrar_escrita)
+ranking.iniciar_reconciliacao_periodica()
+
+# Missões ativas indexadas por faixa de nível (elegibilidade), semeadas e
+# reconciliadas como os rankings
+missoes_por_nivel = IndiceMissoesPorNivel(
+    es,
+    intervalo_reconciliacao=int(os.environ.get('RPG_INTERVALO_RECONCILIACAO', 300)),
+    orcamento=orcamento_refresh
+)
+ao_escrever(missoes_por_nivel.registrar_escrita)
+missoes_por_nivel.iniciar_reconciliacao_periodica()
+
+# Matriz compacta de itens (recomendação de equipamentos), semeada e
+# reconciliada como os rankings
+matriz_itens = MatrizItens(
+    es,
+    intervalo_reconciliacao=int(os.environ.get('RPG_INTERVALO_RECONCILIACAO', 300)),
+    orcamento=orcamento_refresh
+)
+ao_escrever(matriz_itens.registrar_escrita)
+matriz_itens.iniciar_reconciliacao_periodica()
+
+# Tabela pré-calculada de itens similares: gerada offline (similares_rpg.py) e
+# recarregada quando o arquivo muda; RPG_SIMILARES_NO_PROCESSO=1 constrói aqui
+# (padrão no backend local, que o job offline não alcança)
+tabela_similares = TabelaSimilares(
+    es,
+    arquivo=os.environ.get('RPG_ARQUIVO_SIMILARES', 'similares_itens.npz'),
+    intervalo=int(os.environ.get('RPG_INTERVALO_SIMILARES', 3600)),
+    construir_no_processo=os.environ.get('RPG_SIMILARES_NO_PROCESSO', '1' if BACKEND_ES == 'local' else '0') == '1'
+)
+ao_escrever(tabela_similares.registrar_escrita)
+tabela_similares.iniciar_job()
+if tabela_similares.construir_no_processo:
+    atexit.register(tabela_similares.salvar_arquivo)
+
+# kNN exato em NumPy (quando o backend não tem HNSW)
+matriz_embeddings = MatrizEmbeddings(
+    es,
+    intervalo_reconciliacao=int(os.environ.get('RPG_INTERVALO_RECONCILIACAO', 300)),
+    orcamento=orcamento_refresh
+)
+ao_escrever(matriz_embeddings.registrar_escrita)
+matriz_embeddings.iniciar_reconciliacao_periodica()
+
+# ============================================================
+# FEED DE MUDANÇAS (SSE)
+# ============================================================
+# Toda escrita feita pela API (CRUD e bulk) vira um evento no
+# barramento, transmitido em /stream/changes.
+barramento_mudancas = BarramentoEventos('mudancas')
+
+
+@ao_escrever
+def publicar_mudanca(indice, doc_id, antigo, novo):
+    if antigo is None:
+        operacao = 'criado'
+    elif novo is None:
+        operacao = 'removido'
+    else:
+        operacao = 'atualizado'
+    barramento_mudancas.publicar('mudanca', {
+        'indice': indice,
+        'doc_id': doc_id,
+        'operacao': operacao,
+        'antigo': antigo,
+        'novo': novo
+    })
+
+# ============================================================
+# BUSCAS SALVAS (PERCOLATOR) E NOTIFICAÇÕES
+# ============================================================
+# Itens escritos pela API são percolados em lote contra as buscas
+# salvas; cada busca que bate vira um evento para os assinantes SSE.
+barramento_buscas = BarramentoEventos('buscas_salvas')
+percolador = Percolador(es, barramento_buscas)
+try:
+    percolador.garantir_indice()
+except Exception as e:
+    print(f"⚠️  Índice de buscas salvas indisponível: {e}")
+ao_escrever(percolador.registrar_escrita)
+percolador.iniciar()
+
+# ============================================================
+# POLÍTICA DE REFRESH DAS ESCRITAS
+# ============================================================
+# Toda rota de escrita aceita ?refresh=false|wait_for|true (padrão em
+# RPG_REFRESH_PADRAO). false não espera nada; wait_for responde quando
+# a escrita já aparece nas buscas (próximo refresh periódico); true
+# força um refresh, limitado a RPG_REFRESH_ORCAMENTO por minuto e por
+# índice. Acima do orçamento, true vira wait_for.
+REFRESH_PADRAO = os.environ.get('RPG_REFRESH_PADRAO', 'false')
+
+
+@app.before_request
+def validar_refresh():
+    valor = request.args.get('refresh')
+    if valor is not None and valor not in POLITICAS_REFRESH:
+        return jsonify({'error': f'refresh inválido: {valor}', 'valores': list(POLITICAS_REFRESH)}), 400
+
+
+def politica_refresh(indice, padrao=None):
+    """Refresh efetivo da escrita atual (já descontado do orçamento do índice)"""
+    pedido = request.args.get('refresh', padrao or REFRESH_PADRAO)
+    g.refresh = orcamento_refresh.aplicar(indice, pedido)
+    return g.refresh
+
+# ============================================================
+# WRITE-BEHIND (ESCRITAS AGRUPADAS EM _BULK)
+# ============================================================
+# Com RPG_WRITE_BEHIND=1 (ou ?write_behind=1), as rotas CRUD gravam a
+# escrita num journal local, enfileiram e respondem 202 com um ack; uma
+# thread envia a fila ao ES em lotes _bulk. Os ouvintes de escrita só
+# são avisados depois que o lote é gravado. ?wait_for=1 espera o flush.
+# PUT/DELETE partem da última escrita ainda na fila (documento_atual),
+# não da versão do ES, para o antigo avisado aos ouvintes bater.
+WRITE_BEHIND_PADRAO = os.environ.get('RPG_WRITE_BEHIND', '0').lower() in ('1', 'true', 'sim')
+TIMEOUT_WAIT_FOR = float(os.environ.get('RPG_WRITE_BEHIND_TIMEOUT', 30))
+
+fila_escritas = FilaEscritas(
+    es,
+    journal=os.environ.get('RPG_WRITE_BEHIND_JOURNAL', 'write_behind.jsonl'),
+    ao_gravar=notificar_escrita,
+    capacidade=int(os.environ.get('RPG_WRITE_BEHIND_CAPACIDADE', 10000)),
+    tamanho_lote=int(os.environ.get('RPG_WRITE_BEHIND_LOTE', 500)),
+    intervalo_flush=float(os.environ.get('RPG_WRITE_BEHIND_INTERVALO', 0.2)),
+    max_tentativas=int(os.environ.get('RPG_WRITE_BEHIND_TENTATIVAS', 5))
+)
+fila_escritas.iniciar()
+
+
+def parametro_booleano(nome, padrao=False):
+    valor = request.args.get(nome)
+    if valor is None:
+        return padrao
+    return valor.lower() in ('1', 'true', 'sim')
+
+
+def parametro_limite(valor, padrao, maximo):
+    """`limite` da query string ou do corpo JSON, entre 1 e `maximo`; ValueError se não é inteiro"""
+    if valor is None:
+        return padrao
+    if isinstance(valor, bool):
+        raise ValueError(valor)
+    try:
+        limite = int(valor)
+    except TypeError:
+        raise ValueError(valor)
+    return max(1, min(limite, maximo))
+
+
+def erro_limite(maximo, nome='limite'):
+    return jsonify({'error': f'"{nome}" deve ser um inteiro de 1 a {maximo}'}), 400
+
+
+def documento_atual(indice, doc_id):
+    """Versão mais nova do documento: a da última escrita na fila write-behind ou a do ES (None se não existe)"""
+    na_fila, documento = fila_escritas.pendente(indice, doc_id)
+    if na_fila:
+        return documento
+    try:
+        return es.get(index=indice, id=doc_id)['_source']
+    except NotFoundError:
+        return None
+
+
+def gravar(indice, doc_id, novo, antigo=None, corpo=None):
+    """Index (novo) ou delete (novo=None) direto ou pela fila; devolve (doc_id, ack)
+
+    `corpo` é o que vai para o ES quando difere do documento avisado aos
+    ouvintes (itens levam o embedding). ack é None se a escrita já foi
+    gravada quando a função retorna.
+    """
+    refresh = politica_refresh(indice)
+    if not parametro_booleano('write_behind', WRITE_BEHIND_PADRAO):
+        if novo is None:
+            es.delete(index=indice, id=doc_id, refresh=refresh)
+        else:
+            resultado = es.index(index=indice, id=doc_id, body=corpo if corpo is not None else novo,
+                                 refresh=refresh)
+            doc_id = resultado['_id']
+        notificar_escrita(indice, doc_id, antigo, novo)
+        return doc_id, None
+    
+    ack, doc_id = fila_escritas.enfileirar(indice, doc_id, novo, antigo, corpo, refresh)
+    if parametro_booleano('wait_for'):
+        resultado = fila_escritas.esperar(ack, TIMEOUT_WAIT_FOR)
+        if resultado['status'] == 'falhou':
+            raise RuntimeError(f"Escrita {ack} falhou: {resultado['error']}")
+        if resultado['status'] == 'gravado':
+            return doc_id, None
+    return doc_id, ack
+
+
+def resposta_escrita(corpo, ack, status=200):
+    """Resposta da rota CRUD; escrita ainda na fila vira 202 com o ack"""
+    corpo = {**corpo, 'refresh': g.get('refresh')}
+    if ack is None:
+        return jsonify(corpo), status
+    return jsonify({
+        **corpo,
+        'ack': ack,
+        'status_url': f'/escritas/{ack}'
+    }), 202
+
+# ============================================================
+# POLÍTICA DE CONTAGEM DE HITS (track_total_hits)
+# ============================================================
+# Por padrão o total é aproximado: o Elasticsearch conta até
+# LIMITE_TOTAL_HITS e depois só informa "pelo menos N". Isso evita
+# visitar todos os documentos só para contar e, nos índices ordenados
+# pelo sort padrão de cada rota (ver indices_rpg.ORDENACAO_INDICE),
+# permite encerrar cada segmento assim que o top-N estiver pronto.
+# Quem precisa do número exato pede ?exact_total=1 ou usa /count.
+LIMITE_TOTAL_HITS = int(os.environ.get('RPG_LIMITE_TOTAL_HITS', 1000))
+TTL_CACHE_CONTAGEM = int(os.environ.get('RPG_TTL_CACHE_CONTAGEM', 30))
+
+cache_contagem = CacheTTL('contagem', ttl_segundos=TTL_CACHE_CONTAGEM)
+
+
+@ao_escrever
+def invalidar_contagens(indice, doc_id, antigo, novo):
+    cache_contagem.invalidar(indice)
+
+
+def politica_total_hits():
+    """Valor de track_total_hits para a requisição atual"""
+    exato = request.args.get('exact_total', '')
+    if not exato and request.is_json:
+        exato = str((request.get_json(silent=True) or {}).get('exact_total', ''))
+    if exato.lower() in ('1', 'true', 'sim'):
+        return True
+    return LIMITE_TOTAL_HITS
+
+
+def info_total(resp):
+    """Total de hits e se ele é exato (relation == 'eq')"""
+    total = resp['hits']['total']
+    return {
+        'total': total['value'],
+        'total_exato': total['relation'] == 'eq'
+    }
+
+# ============================================================
+# CONSTRUÇÃO DE FILTROS
+# ============================================================
+
+def filtro_range(campo, minimo, maximo):
+    """Filtro range com os limites informados (ou None)"""
+    range_query = {}
+    if minimo is not None:
+        range_query['gte'] = minimo
+    if maximo is not None:
+        range_query['lte'] = maximo
+    return {"range": {campo: range_query}}
+
+
+def construir_filtros_itens(filtros):
+    """Filtros de /filtrar: tipo, raridade, valor e nível requerido"""
+    filters = []
+    
+    if 'tipo' in filtros:
+        filters.append({"term": {"tipo": filtros['tipo']}})
+    
+    if 'raridade' in filtros:
+        filters.append({"term": {"raridade": filtros['raridade']}})
+    
+    # Range de valor
+    if 'valor_min' in filtros or 'valor_max' in filtros:
+        filters.append(filtro_range("valor", filtros.get('valor_min'), filtros.get('valor_max')))
+    
+    # Range de nível
+    if 'nivel_min' in filtros or 'nivel_max' in filtros:
+        filters.append(filtro_range("nivel_requerido", filtros.get('nivel_min'), filtros.get('nivel_max')))
+    
+    return filters
+
+
+def query_busca_itens(criterios):
+    """Query de /busca-avancada: texto livre + filtros de /filtrar (também usada nas buscas salvas)"""
+    must = []
+    
+    # Texto livre
+    if 'texto' in criterios:
+        must.append({
+            "multi_match": {
+                "query": criterios['texto'],
+                "fields": ["nome^3", "descricao"],
+                "fuzziness": "AUTO"
+            }
+        })
+    
+    return {
+        "bool": {
+            "must": must,
+            "filter": construir_filtros_itens(criterios)
+        }
+    }
+
+
+def construir_filtros_personagens(data):
+    """Filtros de /filtrar_personagens: classe, raça, status e nível"""
+    filters = []
+    
+    if 'classe' in data:
+        filters.append({"term": {"classe": data['classe']}})
+    
+    if 'raca' in data:
+        filters.append({"term": {"raca": data['raca']}})
+    
+    if 'status' in data:
+        filters.append({"term": {"status": data['status']}})
+    
+    if 'nivel_min' in data or 'nivel_max' in data:
+        filters.append(filtro_range("nivel", data.get('nivel_min'), data.get('nivel_max')))
+    
+    return filters
+
+
+def construir_filtros_missoes(data):
+    """Filtros de /filtrar_missoes: dificuldade, tipo, nível e ouro"""
+    filters = []
+    
+    if 'dificuldade' in data:
+        filters.append({"term": {"dificuldade": data['dificuldade']}})
+    
+    if 'tipo' in data:
+        filters.append({"term": {"tipo": data['tipo']}})
+    
+    if 'nivel_min' in data or 'nivel_max' in data:
+        filters.append(filtro_range("nivel_minimo", data.get('nivel_min'), data.get('nivel_max')))
+    
+    if 'ouro_min' in data or 'ouro_max' in data:
+        filters.append(filtro_range("recompensa_ouro", data.get('ouro_min'), data.get('ouro_max')))
+    
+    return filters
+
+# ============================================================
+# FORMATOS DE RESPOSTA (JSON por linha, JSON colunar e Arrow)
+# ============================================================
+# Campos devolvidos pelas rotas de filtro (mesmos do JSON por linha)
+CAMPOS_FILTRO_ITENS = ['nome', 'tipo', 'raridade', 'valor', 'nivel_requerido', 'peso']
+CAMPOS_FILTRO_PERSONAGENS = ['nome', 'classe', 'raca', 'nivel', 'status', 'experiencia']
+CAMPOS_FILTRO_MISSOES = ['titulo', 'dificuldade', 'tipo', 'recompensa_ouro', 'nivel_minimo', 'nivel_maximo']
+
+
+def formato_solicitado():
+    """Formato pedido pelo cliente: 'arrow', 'colunar' ou 'json'
+
+    Aceita o header Accept (application/vnd.apache.arrow.stream ou
+    application/vnd.rpg.colunar+json) ou o parâmetro ?formato=.
+    """
+    formato = request.args.get('formato', '').lower()
+    if formato in ('arrow', 'colunar', 'json'):
+        return formato
+    
+    aceitos = [mime for mime, _ in request.accept_mimetypes]
+    if MIME_ARROW in aceitos:
+        return 'arrow'
+    if MIME_COLUNAR in aceitos:
+        return 'colunar'
+    return 'json'
+
+
+def responder_colunar(formato, hits, campos, extras, padroes=None):
+    """Responder com colunas montadas direto dos hits (sem dicts por linha)
+
+    `padroes`: os mesmos valores que a resposta JSON da rota usa para
+    campos ausentes, para as duas trazerem as mesmas linhas.
+    """
+    colunas = colunas_de_hits(hits, campos, padroes=padroes)
+    
+    if formato == 'arrow':
+        with em_fase('serialize'):
+            corpo = serializar_arrow(colunas, extras)
+        return Response(corpo, mimetype=MIME_ARROW)
+    
+    resposta = jsonify(corpo_colunar(colunas, extras))
+    resposta.mimetype = MIME_COLUNAR
+    return resposta
 
 # ============================================================
 # ROTA RAIZ
@@ -24,7 +786,8 @@ def home():
             '/filtrar?tipo=Arma&raridade=Lendário',
             '/autocomplete?q=esp',
             '/similares/<item_id>',
-            '/dashboard'
+            '/dashboard',
+            '/count?entidade=itens&tipo=Arma'
         ],
         'exemplos': {
             'buscar': 'curl "http://localhost:5000/buscar?q=espada"',
@@ -32,7 +795,8 @@ def home():
             'filtrar_post': 'curl -X POST http://localhost:5000/filtrar -H "Content-Type: application/json" -d \'{"tipo":"Arma"}\'',
             'autocomplete': 'curl "http://localhost:5000/autocomplete?q=esp"',
             'similares': 'curl "http://localhost:5000/similares/1"',
-            'dashboard': 'curl "http://localhost:5000/dashboard"'
+            'dashboard': 'curl "http://localhost:5000/dashboard"',
+            'count': 'curl "http://localhost:5000/count?entidade=itens&tipo=Arma"'
         },
         'status': 'ok'
     })
@@ -53,6 +817,7 @@ def buscar_itens():
         }), 400
     
     try:
+        marcar_fase('build')
         query = {
             "query": {
                 "multi_match": {
@@ -68,7 +833,8 @@ def buscar_itens():
                     "descricao": {}
                 }
             },
-            "size": 20
+            "size": 20,
+            "track_total_hits": politica_total_hits()
         }
         
         resp = es.search(index="rpg_itens", body=query)
@@ -93,13 +859,13 @@ def buscar_itens():
             resultados.append(item)
         
         return jsonify({
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'query': termo,
             'resultados': resultados
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 2. FILTROS COMBINADOS (GET e POST)
@@ -134,31 +900,8 @@ def filtrar_itens():
     
     try:
         # Construir query
-        filters = []
-        
-        if 'tipo' in filtros:
-            filters.append({"term": {"tipo": filtros['tipo']}})
-        
-        if 'raridade' in filtros:
-            filters.append({"term": {"raridade": filtros['raridade']}})
-        
-        # Range de valor
-        if 'valor_min' in filtros or 'valor_max' in filtros:
-            range_query = {}
-            if 'valor_min' in filtros:
-                range_query['gte'] = filtros['valor_min']
-            if 'valor_max' in filtros:
-                range_query['lte'] = filtros['valor_max']
-            filters.append({"range": {"valor": range_query}})
-        
-        # Range de nível
-        if 'nivel_min' in filtros or 'nivel_max' in filtros:
-            range_query = {}
-            if 'nivel_min' in filtros:
-                range_query['gte'] = filtros['nivel_min']
-            if 'nivel_max' in filtros:
-                range_query['lte'] = filtros['nivel_max']
-            filters.append({"range": {"nivel_requerido": range_query}})
+        marcar_fase('build')
+        filters = construir_filtros_itens(filtros)
         
         query = {
             "query": {
@@ -167,11 +910,22 @@ def filtrar_itens():
                 }
             },
             "sort": [{"valor": "desc"}],
-            "size": 50
+            "size": 50,
+            "track_total_hits": politica_total_hits()
         }
         
+        formato = formato_solicitado()
+        if formato != 'json':
+            query['_source'] = CAMPOS_FILTRO_ITENS
+        
         resp = es.search(index="rpg_itens", body=query)
         
+        if formato != 'json':
+            return responder_colunar(formato, resp['hits']['hits'], CAMPOS_FILTRO_ITENS, {
+                **info_total(resp),
+                'filtros_aplicados': filtros
+            }, padroes={'nivel_requerido': 0, 'peso': 0})
+        
         # Formatar resposta
         resultados = []
         for hit in resp['hits']['hits']:
@@ -186,13 +940,13 @@ def filtrar_itens():
             })
         
         return jsonify({
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'filtros_aplicados': filtros,
             'resultados': resultados
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 3. AUTOCOMPLETE
@@ -210,6 +964,7 @@ def autocomplete():
     
     try:
         # Busca com prefix
+        marcar_fase('build')
         query = {
             "query": {
                 "bool": {
@@ -260,14 +1015,108 @@ def autocomplete():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 4. ITENS SIMILARES
 # ============================================================
 @app.route('/similares/<item_id>', methods=['GET'])
 def itens_similares(item_id):
-    """Encontrar itens similares usando More Like This"""
+    """Itens similares: tabela pré-calculada (More Like This se o item não está nela, ou com modo=mlt) ou kNN"""
+    modo = request.args.get('modo', 'tabela')
+    if modo in ('knn', 'knn_local'):
+        return similares_knn(item_id, forcar_local=(modo == 'knn_local'))
+    if modo == 'mlt':
+        return similares_more_like_this(item_id)
+    
+    encontrado = tabela_similares.obter(item_id)
+    if encontrado is not None:
+        item, similares = encontrado
+        return jsonify({
+            'item_original': {
+                'id': item_id,
+                'nome': item['nome'],
+                'tipo': item['tipo']
+            },
+            'total_similares': len(similares),
+            'similares': similares,
+            'fonte': 'tabela'
+        })
+    
+    return similares_more_like_this(item_id)
+
+
+def knn_indisponivel(e):
+    """Erro de um backend que não roda kNN (sem o campo vetorial, versão antiga), não de sobrecarga"""
+    if isinstance(e, (BadRequestError, UnsupportedProductError)):
+        return True
+    return isinstance(e, ApiError) and 'unsupported' in str(e).lower()
+
+
+def similares_knn(item_id, forcar_local=False):
+    """Itens similares por vetor: kNN HNSW do ES, ou força bruta em NumPy se o backend não tem kNN"""
+    try:
+        try:
+            item = es.get(index="rpg_itens", id=item_id)
+        except NotFoundError:
+            return jsonify({'error': f'Item {item_id} não encontrado'}), 404
+        
+        # O vetor não volta no _source: é recalculado (o embedder é determinístico)
+        vetor = embedding_do_item(item['_source'])
+        tamanho = request.args.get('size', 10, type=int)
+        
+        resultados = None
+        fonte = 'knn_local'
+        if not forcar_local:
+            try:
+                marcar_fase('build')
+                query = {
+                    "knn": {
+                        "field": CAMPO_EMBEDDING,
+                        "query_vector": [float(x) for x in vetor],
+                        "k": tamanho,
+                        "num_candidates": max(100, tamanho * 10),
+                        "filter": {"bool": {"must_not": {"ids": {"values": [item_id]}}}}
+                    },
+                    "size": tamanho,
+                    "_source": ["nome", "tipo", "raridade", "valor"]
+                }
+                resp = es.search(index="rpg_itens", body=query)
+                resultados = [
+                    {'id': hit['_id'], 'score': hit['_score'], **hit['_source']}
+                    for hit in resp['hits']['hits']
+                ]
+                fonte = 'knn'
+            except Exception as e:
+                # Sobrecarga, timeouts e circuito aberto seguem para resposta_erro: a força
+                # bruta monta a matriz de todos os itens na primeira vez e só piora a carga
+                if not knn_indisponivel(e):
+                    raise
+                app.logger.warning("kNN no Elasticsearch indisponível, usando força bruta: %s", e)
+        
+        if resultados is None:
+            resultados = [
+                {'id': doc_id, 'score': score, **(resumo or {})}
+                for doc_id, score, resumo in matriz_embeddings.vizinhos(vetor, tamanho, excluir=item_id)
+            ]
+        
+        return jsonify({
+            'item_original': {
+                'id': item_id,
+                'nome': item['_source']['nome'],
+                'tipo': item['_source']['tipo']
+            },
+            'total_similares': len(resultados),
+            'similares': resultados,
+            'fonte': fonte
+        })
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+
+def similares_more_like_this(item_id):
+    """Itens similares calculados na hora com More Like This"""
     try:
         # Primeiro verificar se item existe
         try:
@@ -276,6 +1125,7 @@ def itens_similares(item_id):
             return jsonify({'error': f'Item {item_id} não encontrado'}), 404
         
         # More Like This query
+        marcar_fase('build')
         query = {
             "query": {
                 "more_like_this": {
@@ -286,7 +1136,8 @@ def itens_similares(item_id):
                     "min_doc_freq": 1
                 }
             },
-            "size": 10
+            "size": 10,
+            "track_total_hits": politica_total_hits()
         }
         
         resp = es.search(index="rpg_itens", body=query)
@@ -310,119 +1161,70 @@ def itens_similares(item_id):
                 'tipo': item['_source']['tipo']
             },
             'total_similares': resp['hits']['total']['value'],
-            'similares': resultados
+            'similares': resultados,
+            'fonte': 'more_like_this'
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 5. DASHBOARD ANALÍTICO (MELHORADO)
 # ============================================================
 @app.route('/dashboard', methods=['GET'])
 def dashboard():
-    """Dashboard com estatísticas e agregações"""
+    """Dashboard com estatísticas e agregações (contadores em memória)"""
     try:
-        query = {
-            "size": 0,
-            "aggs": {
-                "por_tipo": {
-                    "terms": {
-                        "field": "tipo",
-                        "size": 10
-                    }
-                },
-                "por_raridade": {
-                    "terms": {
-                        "field": "raridade",
-                        "size": 10
-                    }
-                },
-                "distribuicao_valor": {
-                    "histogram": {
-                        "field": "valor",
-                        "interval": 10000,  # Intervalos de 10k
-                        "min_doc_count": 1  # Só mostrar buckets com dados
-                    }
-                },
-                "ranges_valor": {
-                    "range": {
-                        "field": "valor",
-                        "ranges": [
-                            {"to": 100, "key": "0-100 (Muito Barato)"},
-                            {"from": 100, "to": 1000, "key": "100-1000 (Barato)"},
-                            {"from": 1000, "to": 10000, "key": "1k-10k (Médio)"},
-                            {"from": 10000, "to": 100000, "key": "10k-100k (Caro)"},
-                            {"from": 100000, "key": "100k+ (Muito Caro)"}
-                        ]
-                    }
-                },
-                "estatisticas_valor": {
-                    "stats": {"field": "valor"}
-                },
-                "estatisticas_nivel": {
-                    "stats": {"field": "nivel_requerido"}
-                },
-                "top_itens_caros": {
-                    "top_hits": {
-                        "size": 5,
-                        "sort": [{"valor": "desc"}],
-                        "_source": ["nome", "tipo", "raridade", "valor"]
-                    }
-                }
-            }
-        }
-        
-        resp = es.search(index="rpg_itens", body=query)
-        aggs = resp['aggregations']
+        dados = contadores.snapshot('rpg_itens')
+        termos = dados['termos']
+        valor = dados['estatisticas']['valor']
+        nivel = dados['estatisticas']['nivel_requerido']
         
         # Formatar resposta de forma mais legível
         dashboard_data = {
-            'total_itens': resp['hits']['total']['value'],
+            'total_itens': dados['total'],
             
             'por_tipo': [
-                {'tipo': b['key'], 'quantidade': b['doc_count']}
-                for b in aggs['por_tipo']['buckets']
+                {'tipo': termo, 'quantidade': quantidade}
+                for termo, quantidade in termos['tipo'][:10]
             ],
             
             'por_raridade': [
-                {'raridade': b['key'], 'quantidade': b['doc_count']}
-                for b in aggs['por_raridade']['buckets']
+                {'raridade': termo, 'quantidade': quantidade}
+                for termo, quantidade in termos['raridade'][:10]
             ],
             
             'ranges_valor': [
-                {'faixa': b['key'], 'quantidade': b['doc_count']}
-                for b in aggs['ranges_valor']['buckets']
+                {'faixa': faixa, 'quantidade': quantidade}
+                for faixa, quantidade in dados['faixas']['valor']
             ],
             
             'estatisticas_valor': {
-                'minimo': aggs['estatisticas_valor']['min'],
-                'maximo': aggs['estatisticas_valor']['max'],
-                'media': round(aggs['estatisticas_valor']['avg'], 2),
-                'soma_total': aggs['estatisticas_valor']['sum']
+                'minimo': valor['min'],
+                'maximo': valor['max'],
+                'media': round(valor['avg'], 2) if valor['avg'] is not None else None,
+                'soma_total': valor['sum']
             },
             
             'estatisticas_nivel': {
-                'minimo': aggs['estatisticas_nivel']['min'],
-                'maximo': aggs['estatisticas_nivel']['max'],
-                'media': round(aggs['estatisticas_nivel']['avg'], 2)
+                'minimo': nivel['min'],
+                'maximo': nivel['max'],
+                'media': round(nivel['avg'], 2) if nivel['avg'] is not None else None
             },
             
-            'top_5_mais_caros': [
-                hit['_source'] for hit in aggs['top_itens_caros']['hits']['hits']
-            ],
+            'top_5_mais_caros': dados['top'][:5],
             
-            # Só primeiros 20 buckets do histograma
+            # Só primeiros 20 buckets do histograma (intervalos de 10k)
             'distribuicao_valor_histograma': [
-                {'valor_min': b['key'], 'quantidade': b['doc_count']}
-                for b in aggs['distribuicao_valor']['buckets'][:20]
+                {'valor_min': inicio, 'quantidade': quantidade}
+                for inicio, quantidade in dados['histogramas']['valor'][:20]
             ]
         }
         
         return jsonify(dashboard_data)
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 6. BUSCA AVANÇADA (BÔNUS)
@@ -432,51 +1234,17 @@ def busca_avancada():
     """Busca com múltiplos critérios"""
     data = request.json or {}
     
-    must = []
-    filters = []
-    should = []
-    
-    # Texto livre
-    if 'texto' in data:
-        must.append({
-            "multi_match": {
-                "query": data['texto'],
-                "fields": ["nome^3", "descricao"],
-                "fuzziness": "AUTO"
-            }
-        })
-    
-    # Filtros exatos
-    if 'tipo' in data:
-        filters.append({"term": {"tipo": data['tipo']}})
-    
-    if 'raridade' in data:
-        filters.append({"term": {"raridade": data['raridade']}})
-    
-    # Ranges
-    if 'valor_min' in data or 'valor_max' in data:
-        range_q = {}
-        if 'valor_min' in data:
-            range_q['gte'] = data['valor_min']
-        if 'valor_max' in data:
-            range_q['lte'] = data['valor_max']
-        filters.append({"range": {"valor": range_q}})
-    
+    marcar_fase('build')
     query = {
-        "query": {
-            "bool": {
-                "must": must,
-                "filter": filters,
-                "should": should
-            }
-        },
-        "size": data.get('size', 20)
+        "query": query_busca_itens(data),
+        "size": data.get('size', 20),
+        "track_total_hits": politica_total_hits()
     }
     
     resp = es.search(index="rpg_itens", body=query)
     
     return jsonify({
-        'total': resp['hits']['total']['value'],
+        **info_total(resp),
         'resultados': [
             {
                 'id': hit['_id'],
@@ -499,6 +1267,7 @@ def buscar_personagens():
         return jsonify({'error': 'Parâmetro "q" é obrigatório'}), 400
     
     try:
+        marcar_fase('build')
         query = {
             "query": {
                 "multi_match": {
@@ -507,7 +1276,8 @@ def buscar_personagens():
                     "fuzziness": "AUTO"
                 }
             },
-            "size": 20
+            "size": 20,
+            "track_total_hits": politica_total_hits()
         }
         
         resp = es.search(index="rpg_personagens", body=query)
@@ -529,12 +1299,12 @@ def buscar_personagens():
             })
         
         return jsonify({
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'resultados': resultados
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 8. FILTRAR PERSONAGENS
@@ -544,34 +1314,28 @@ def filtrar_personagens():
     """Filtrar personagens"""
     data = request.json or {}
     
-    filters = []
-    
-    if 'classe' in data:
-        filters.append({"term": {"classe": data['classe']}})
-    
-    if 'raca' in data:
-        filters.append({"term": {"raca": data['raca']}})
-    
-    if 'status' in data:
-        filters.append({"term": {"status": data['status']}})
-    
-    if 'nivel_min' in data or 'nivel_max' in data:
-        range_query = {}
-        if 'nivel_min' in data:
-            range_query['gte'] = data['nivel_min']
-        if 'nivel_max' in data:
-            range_query['lte'] = data['nivel_max']
-        filters.append({"range": {"nivel": range_query}})
+    marcar_fase('build')
+    filters = construir_filtros_personagens(data)
     
     query = {
         "query": {"bool": {"filter": filters} if filters else {"match_all": {}}},
         "sort": [{"nivel": "desc"}],
-        "size": 100
+        "size": 100,
+        "track_total_hits": politica_total_hits()
     }
     
+    formato = formato_solicitado()
+    if formato != 'json':
+        query['_source'] = CAMPOS_FILTRO_PERSONAGENS
+    
     try:
         resp = es.search(index="rpg_personagens", body=query)
         
+        if formato != 'json':
+            return responder_colunar(formato, resp['hits']['hits'], CAMPOS_FILTRO_PERSONAGENS, {
+                **info_total(resp)
+            }, padroes={'experiencia': 0})
+        
         resultados = []
         for hit in resp['hits']['hits']:
             resultados.append({
@@ -584,85 +1348,110 @@ def filtrar_personagens():
             })
         
         return jsonify({
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'resultados': resultados
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 9. DASHBOARD PERSONAGENS
 # ============================================================
 @app.route('/dashboard_personagens', methods=['GET'])
 def dashboard_personagens():
-    """Dashboard de personagens"""
+    """Dashboard de personagens (contadores em memória)"""
     try:
-        query = {
-            "size": 0,
-            "aggs": {
-                "por_classe": {"terms": {"field": "classe", "size": 20}},
-                "por_raca": {"terms": {"field": "raca", "size": 20}},
-                "por_status": {"terms": {"field": "status", "size": 10}},
-                "nivel_stats": {"stats": {"field": "nivel"}},
-                "exp_stats": {"stats": {"field": "experiencia"}},
-                "total_ativos": {
-                    "filter": {"term": {"status": "Ativo"}}
-                }
-            }
-        }
-        
-        resp = es.search(index="rpg_personagens", body=query)
-        aggs = resp['aggregations']
+        dados = contadores.snapshot('rpg_personagens')
+        termos = dados['termos']
+        stats = dados['estatisticas']
         
         return jsonify({
-            'total_personagens': resp['hits']['total']['value'],
-            'nivel_medio': aggs['nivel_stats']['avg'],
-            'exp_media': aggs['exp_stats']['avg'],
-            'total_ativos': aggs['total_ativos']['doc_count'],
-            'por_classe': [{'classe': b['key'], 'quantidade': b['doc_count']} for b in aggs['por_classe']['buckets']],
-            'por_raca': [{'raca': b['key'], 'quantidade': b['doc_count']} for b in aggs['por_raca']['buckets']]
+            'total_personagens': dados['total'],
+            'nivel_medio': stats['nivel']['avg'],
+            'exp_media': stats['experiencia']['avg'],
+            'total_ativos': dict(termos['status']).get('Ativo', 0),
+            'por_classe': [{'classe': t, 'quantidade': n} for t, n in termos['classe'][:20]],
+            'por_raca': [{'raca': t, 'quantidade': n} for t, n in termos['raca'][:20]]
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 10. TOP PERSONAGENS
 # ============================================================
-@app.route('/top_personagens', methods=['GET'])
-def top_personagens():
-    """Top personagens"""
+def parametros_ranking():
+    """Atributo e filtros (classe/raça) de uma consulta de ranking"""
     ordenar_por = request.args.get('ordenar_por', 'nivel').lower()
     
     # Campos válidos para ordenação
-    campos_validos = ['nivel', 'experiencia', 'vida', 'forca']
-    if ordenar_por not in campos_validos:
+    if ordenar_por not in ATRIBUTOS_RANKING:
         ordenar_por = 'nivel'
     
+    return {
+        'atributo': ordenar_por,
+        'classe': request.args.get('classe') or None,
+        'raca': request.args.get('raca') or None
+    }
+
+
+@app.route('/top_personagens', methods=['GET'])
+def top_personagens():
+    """Top personagens (ranking em memória)"""
+    parametros = parametros_ranking()
+    try:
+        limite = parametro_limite(request.args.get('limite'), 10, 1000)
+    except ValueError:
+        return erro_limite(1000)
+    
+    try:
+        personagens, total = ranking.top(limite=limite, **parametros)
+        
+        return jsonify({
+            'ordenar_por': parametros['atributo'],
+            'total': total,
+            'personagens': personagens
+        })
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+
+@app.route('/top_personagens/<pessoa_id>/posicao', methods=['GET'])
+def posicao_personagem(pessoa_id):
+    """Posição de um personagem no ranking"""
+    parametros = parametros_ranking()
+    
     try:
-        query = {
-            "query": {"match_all": {}},
-            "sort": [{ordenar_por: "desc"}],
-            "size": 10
-        }
+        posicao = ranking.posicao(pessoa_id, **parametros)
+        if posicao is None:
+            return jsonify({'error': 'Personagem não está neste ranking'}), 404
         
-        resp = es.search(index="rpg_personagens", body=query)
+        return jsonify({'ordenar_por': parametros['atributo'], **posicao})
         
-        personagens = []
-        for hit in resp['hits']['hits']:
-            personagens.append({
-                'nome': hit['_source']['nome'],
-                'classe': hit['_source']['classe'],
-                'nivel': hit['_source']['nivel'],
-                'experiencia': hit['_source'].get('experiencia', 0),
-                'vida': hit['_source'].get('vida', 0)
-            })
+    except Exception as e:
+        return resposta_erro(e)
+
+
+@app.route('/top_personagens/<pessoa_id>/vizinhos', methods=['GET'])
+def vizinhos_personagem(pessoa_id):
+    """Personagens logo acima e logo abaixo no ranking"""
+    parametros = parametros_ranking()
+    try:
+        raio = parametro_limite(request.args.get('raio'), 5, 100)
+    except ValueError:
+        return erro_limite(100, 'raio')
+    
+    try:
+        vizinhos = ranking.vizinhos(pessoa_id, raio=raio, **parametros)
+        if vizinhos is None:
+            return jsonify({'error': 'Personagem não está neste ranking'}), 404
         
-        return jsonify({'personagens': personagens})
+        return jsonify({'ordenar_por': parametros['atributo'], 'id': pessoa_id, **vizinhos})
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 11. BUSCA MISSÕES
@@ -676,6 +1465,7 @@ def buscar_missoes():
         return jsonify({'error': 'Parâmetro "q" é obrigatório'}), 400
     
     try:
+        marcar_fase('build')
         query = {
             "query": {
                 "multi_match": {
@@ -684,7 +1474,8 @@ def buscar_missoes():
                     "fuzziness": "AUTO"
                 }
             },
-            "size": 20
+            "size": 20,
+            "track_total_hits": politica_total_hits()
         }
         
         resp = es.search(index="rpg_missoes", body=query)
@@ -706,12 +1497,12 @@ def buscar_missoes():
             })
         
         return jsonify({
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'resultados': resultados
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 12. FILTRAR MISSÕES
@@ -721,39 +1512,28 @@ def filtrar_missoes():
     """Filtrar missões"""
     data = request.json or {}
     
-    filters = []
-    
-    if 'dificuldade' in data:
-        filters.append({"term": {"dificuldade": data['dificuldade']}})
-    
-    if 'tipo' in data:
-        filters.append({"term": {"tipo": data['tipo']}})
-    
-    if 'nivel_min' in data or 'nivel_max' in data:
-        range_query = {}
-        if 'nivel_min' in data:
-            range_query['gte'] = data['nivel_min']
-        if 'nivel_max' in data:
-            range_query['lte'] = data['nivel_max']
-        filters.append({"range": {"nivel_minimo": range_query}})
-    
-    if 'ouro_min' in data or 'ouro_max' in data:
-        range_query = {}
-        if 'ouro_min' in data:
-            range_query['gte'] = data['ouro_min']
-        if 'ouro_max' in data:
-            range_query['lte'] = data['ouro_max']
-        filters.append({"range": {"recompensa_ouro": range_query}})
+    marcar_fase('build')
+    filters = construir_filtros_missoes(data)
     
     query = {
         "query": {"bool": {"filter": filters} if filters else {"match_all": {}}},
         "sort": [{"recompensa_ouro": "desc"}],
-        "size": 100
+        "size": 100,
+        "track_total_hits": politica_total_hits()
     }
     
+    formato = formato_solicitado()
+    if formato != 'json':
+        query['_source'] = CAMPOS_FILTRO_MISSOES
+    
     try:
         resp = es.search(index="rpg_missoes", body=query)
         
+        if formato != 'json':
+            return responder_colunar(formato, resp['hits']['hits'], CAMPOS_FILTRO_MISSOES, {
+                **info_total(resp)
+            })
+        
         resultados = []
         for hit in resp['hits']['hits']:
             resultados.append({
@@ -766,45 +1546,35 @@ def filtrar_missoes():
             })
         
         return jsonify({
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'resultados': resultados
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 13. DASHBOARD MISSÕES
 # ============================================================
 @app.route('/dashboard_missoes', methods=['GET'])
 def dashboard_missoes():
-    """Dashboard de missões"""
+    """Dashboard de missões (contadores em memória)"""
     try:
-        query = {
-            "size": 0,
-            "aggs": {
-                "por_dificuldade": {"terms": {"field": "dificuldade", "size": 10}},
-                "por_tipo": {"terms": {"field": "tipo", "size": 20}},
-                "ouro_stats": {"stats": {"field": "recompensa_ouro"}},
-                "xp_stats": {"stats": {"field": "recompensa_experiencia"}},
-                "taxa_media": {"avg": {"field": "taxa_conclusao_pct"}}
-            }
-        }
-        
-        resp = es.search(index="rpg_missoes", body=query)
-        aggs = resp['aggregations']
+        dados = contadores.snapshot('rpg_missoes')
+        termos = dados['termos']
+        stats = dados['estatisticas']
         
         return jsonify({
-            'total_missoes': resp['hits']['total']['value'],
-            'ouro_medio': aggs['ouro_stats']['avg'],
-            'xp_medio': aggs['xp_stats']['avg'],
-            'taxa_media': aggs['taxa_media']['value'],
-            'por_dificuldade': [{'dificuldade': b['key'], 'quantidade': b['doc_count']} for b in aggs['por_dificuldade']['buckets']],
-            'por_tipo': [{'tipo': b['key'], 'quantidade': b['doc_count']} for b in aggs['por_tipo']['buckets']]
+            'total_missoes': dados['total'],
+            'ouro_medio': stats['recompensa_ouro']['avg'],
+            'xp_medio': stats['recompensa_experiencia']['avg'],
+            'taxa_media': stats['taxa_conclusao_pct']['avg'],
+            'por_dificuldade': [{'dificuldade': t, 'quantidade': n} for t, n in termos['dificuldade'][:10]],
+            'por_tipo': [{'tipo': t, 'quantidade': n} for t, n in termos['tipo'][:20]]
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # 14. MISSÕES POR DIFICULDADE
@@ -815,6 +1585,7 @@ def missoes_dificuldade():
     dificuldade = request.args.get('dificuldade', '')
     
     try:
+        marcar_fase('build')
         query = {
             "query": {"term": {"dificuldade": dificuldade}},
             "sort": [{"recompensa_ouro": "desc"}],
@@ -841,7 +1612,504 @@ def missoes_dificuldade():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
+
+# ============================================================
+# 15. CONTAGEM EXATA (COM CACHE)
+# ============================================================
+ENTIDADES_CONTAGEM = {
+    'itens': ('rpg_itens', construir_filtros_itens),
+    'personagens': ('rpg_personagens', construir_filtros_personagens),
+    'missoes': ('rpg_missoes', construir_filtros_missoes)
+}
+FILTROS_INTEIROS = {'valor_min', 'valor_max', 'nivel_min', 'nivel_max', 'ouro_min', 'ouro_max'}
+
+
+@app.route('/count', methods=['GET', 'POST'])
+def contar():
+    """Contagem exata via es.count, com cache por índice + filtros"""
+    entidade = request.args.get('entidade', 'itens')
+    
+    if entidade not in ENTIDADES_CONTAGEM:
+        return jsonify({
+            'error': f'Entidade inválida: {entidade}',
+            'entidades_disponiveis': list(ENTIDADES_CONTAGEM)
+        }), 400
+    
+    indice, construir_filtros = ENTIDADES_CONTAGEM[entidade]
+    
+    # Mesmos filtros das rotas /filtrar*
+    if request.method == 'POST':
+        filtros = request.json or {}
+    else:
+        filtros = {k: v for k, v in request.args.items() if k != 'entidade'}
+        try:
+            for campo in FILTROS_INTEIROS & filtros.keys():
+                filtros[campo] = int(filtros[campo])
+        except ValueError:
+            return jsonify({'error': 'Filtros de faixa devem ser inteiros'}), 400
+    
+    try:
+        chave = (indice, json.dumps(filtros, sort_keys=True))
+        total = cache_contagem.obter(chave)
+        em_cache = total is not None
+        
+        if not em_cache:
+            filters = construir_filtros(filtros)
+            query = {"query": {"bool": {"filter": filters}} if filters else {"match_all": {}}}
+            total = es.count(index=indice, body=query)['count']
+            cache_contagem.guardar(chave, total)
+        
+        return jsonify({
+            'entidade': entidade,
+            'total': total,
+            'total_exato': True,
+            'filtros_aplicados': filtros,
+            'cache': em_cache
+        })
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+# ============================================================
+# 16. ELEGIBILIDADE PERSONAGEM <-> MISSÃO (EM LOTE)
+# ============================================================
+MAX_IDS_ELEGIBILIDADE = 5000
+
+
+def ids_do_corpo(data, campo):
+    """Lista de ids do corpo JSON (ou None se inválida)"""
+    ids = data.get(campo)
+    if not isinstance(ids, list) or not ids or len(ids) > MAX_IDS_ELEGIBILIDADE:
+        return None
+    return [str(i) for i in ids]
+
+
+@app.route('/missoes/elegiveis', methods=['POST'])
+def missoes_elegiveis():
+    """Missões ativas que cada personagem pode aceitar (ordenadas por recompensa/dia)"""
+    data = request.get_json(silent=True) or {}
+    ids = ids_do_corpo(data, 'personagens')
+    if ids is None:
+        return jsonify({
+            'error': f'Envie "personagens": lista de 1 a {MAX_IDS_ELEGIBILIDADE} ids',
+            'exemplo': {'personagens': ['1', '2'], 'ordenar_por': 'ouro_por_dia', 'limite': 10}
+        }), 400
+    
+    metrica = data.get('ordenar_por', 'ouro_por_dia')
+    if metrica not in METRICAS:
+        metrica = 'ouro_por_dia'
+    try:
+        limite = parametro_limite(data.get('limite'), 10, 100)
+    except ValueError:
+        return erro_limite(100)
+    
+    try:
+        resultados = {}
+        nao_encontrados = []
+        for pessoa_id in ids:
+            pessoa = ranking.obter(pessoa_id)
+            if pessoa is None:
+                nao_encontrados.append(pessoa_id)
+                continue
+            nivel = pessoa.get('nivel') or 0
+            missoes, total = missoes_por_nivel.missoes_do_nivel(nivel, metrica, limite)
+            resultados[pessoa_id] = {
+                'nome': pessoa.get('nome'),
+                'nivel': nivel,
+                'total': total,
+                'missoes': missoes
+            }
+        
+        return jsonify({
+            'ordenar_por': metrica,
+            'resultados': resultados,
+            'nao_encontrados': nao_encontrados
+        })
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+
+@app.route('/personagens/elegiveis', methods=['POST'])
+def personagens_elegiveis():
+    """Personagens cujo nível está na faixa de cada missão"""
+    data = request.get_json(silent=True) or {}
+    ids = ids_do_corpo(data, 'missoes')
+    if ids is None:
+        return jsonify({
+            'error': f'Envie "missoes": lista de 1 a {MAX_IDS_ELEGIBILIDADE} ids',
+            'exemplo': {'missoes': ['1', '2'], 'classe': 'Mago', 'limite': 50}
+        }), 400
+    
+    try:
+        limite = parametro_limite(data.get('limite'), 50, 1000)
+    except ValueError:
+        return erro_limite(1000)
+    classe = data.get('classe') or None
+    raca = data.get('raca') or None
+    
+    try:
+        resultados = {}
+        nao_encontradas = []
+        inativas = {}
+        for missao_id in ids:
+            missao = missoes_por_nivel.obter(missao_id)
+            if missao is None:
+                status = missoes_por_nivel.status_inativa(missao_id)
+                if status is None:
+                    nao_encontradas.append(missao_id)
+                else:
+                    inativas[missao_id] = status
+                continue
+            personagens, total = ranking.faixa(
+                'nivel', missao['nivel_minimo'], missao['nivel_maximo'],
+                limite=limite, classe=classe, raca=raca
+            )
+            resultados[missao_id] = {
+                'titulo': missao['titulo'],
+                'nivel_minimo': missao['nivel_minimo'],
+                'nivel_maximo': missao['nivel_maximo'],
+                'total': total,
+                'personagens': personagens
+            }
+        
+        return jsonify({
+            'resultados': resultados,
+            'nao_encontradas': nao_encontradas,
+            'inativas': inativas
+        })
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+# ============================================================
+# 17. RECOMENDAÇÃO DE EQUIPAMENTOS
+# ============================================================
+MAX_GRUPO_RECOMENDACAO = 100
+
+
+def recomendacoes_do_grupo(ids, limite):
+    """Recomendações de vários personagens numa única pontuação matricial"""
+    encontrados = [(pessoa_id, ranking.obter(pessoa_id)) for pessoa_id in ids]
+    personagens = [(pessoa_id, p) for pessoa_id, p in encontrados if p is not None]
+    recomendacoes = matriz_itens.recomendar([p for _, p in personagens], limite)
+    
+    resultados = {}
+    for (pessoa_id, pessoa), itens in zip(personagens, recomendacoes):
+        resultados[pessoa_id] = {
+            'nome': pessoa.get('nome'),
+            'classe': pessoa.get('classe'),
+            'nivel': pessoa.get('nivel'),
+            'itens': [
+                {'id': item_id, 'pontuacao': pontuacao, **item}
+                for item_id, pontuacao, item in itens if item is not None
+            ]
+        }
+    nao_encontrados = [pessoa_id for pessoa_id, p in encontrados if p is None]
+    return resultados, nao_encontrados
+
+
+@app.route('/personagens/<pessoa_id>/recomendacoes', methods=['GET'])
+def recomendacoes_personagem(pessoa_id):
+    """Itens usáveis que melhor combinam com o personagem"""
+    try:
+        limite = parametro_limite(request.args.get('limite'), 10, 100)
+    except ValueError:
+        return erro_limite(100)
+    
+    try:
+        resultados, _ = recomendacoes_do_grupo([pessoa_id], limite)
+        if pessoa_id not in resultados:
+            return jsonify({'error': 'Personagem não encontrado'}), 404
+        
+        return jsonify({'id': pessoa_id, **resultados[pessoa_id]})
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+
+@app.route('/personagens/recomendacoes', methods=['POST'])
+def recomendacoes_grupo():
+    """Recomendações para um grupo inteiro de personagens"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('personagens')
+    if not isinstance(ids, list) or not ids or len(ids) > MAX_GRUPO_RECOMENDACAO:
+        return jsonify({
+            'error': f'Envie "personagens": lista de 1 a {MAX_GRUPO_RECOMENDACAO} ids',
+            'exemplo': {'personagens': ['1', '2', '3'], 'limite': 5}
+        }), 400
+    
+    try:
+        limite = parametro_limite(data.get('limite'), 10, 100)
+    except ValueError:
+        return erro_limite(100)
+    
+    try:
+        resultados, nao_encontrados = recomendacoes_do_grupo([str(i) for i in ids], limite)
+        
+        return jsonify({
+            'resultados': resultados,
+            'nao_encontrados': nao_encontrados
+        })
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+# ============================================================
+# 18. BUSCAS SALVAS (PERCOLATOR + SSE)
+# ============================================================
+CRITERIOS_BUSCA = ['texto', 'tipo', 'raridade', 'valor_min', 'valor_max', 'nivel_min', 'nivel_max']
+
+
+@app.route('/buscas_salvas', methods=['POST'])
+def salvar_busca():
+    """Salvar uma busca de itens como query percolator"""
+    data = request.get_json(silent=True) or {}
+    criterios = {k: v for k, v in (data.get('criterios') or {}).items() if k in CRITERIOS_BUSCA}
+    
+    if not data.get('nome') or not criterios:
+        return jsonify({
+            'error': 'Informe "nome" e ao menos um critério',
+            'criterios_disponiveis': CRITERIOS_BUSCA,
+            'exemplo': {'nome': 'Lendárias baratas', 'usuario': 'ana',
+                        'criterios': {'tipo': 'Arma', 'raridade': 'Lendário', 'valor_max': 20000}}
+        }), 400
+    
+    try:
+        documento = {
+            'query': query_busca_itens(criterios),
+            'nome_busca': data['nome'],
+            'usuario': data.get('usuario'),
+            'criterios': criterios,
+            'data_busca': datetime.now().isoformat()
+        }
+        # wait_for por padrão: a busca já vale para a próxima escrita de item
+        resultado = es.index(index=INDICE_BUSCAS, body=documento,
+                             refresh=politica_refresh(INDICE_BUSCAS, 'wait_for'))
+        
+        return jsonify({
+            'mensagem': 'Busca salva com sucesso',
+            'id': resultado['_id'],
+            'stream': f"/buscas_salvas/stream?busca={resultado['_id']}"
+        }), 201
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+
+@app.route('/buscas_salvas', methods=['GET'])
+def listar_buscas_salvas():
+    """Listar buscas salvas (opcionalmente de um usuário)"""
+    usuario = request.args.get('usuario')
+    
+    try:
+        marcar_fase('build')
+        query = {
+            "query": {"term": {"usuario": usuario}} if usuario else {"match_all": {}},
+            "_source": ["nome_busca", "usuario", "criterios", "data_busca"],
+            "size": 100
+        }
+        resp = es.search(index=INDICE_BUSCAS, body=query)
+        
+        return jsonify({
+            'buscas': [{'id': hit['_id'], **hit['_source']} for hit in resp['hits']['hits']],
+            'percolador': percolador.estatisticas()
+        })
+        
+    except Exception as e:
+        return resposta_erro(e)
+
+
+@app.route('/buscas_salvas/<busca_id>', methods=['DELETE'])
+def deletar_busca_salva(busca_id):
+    """Remover uma busca salva"""
+    try:
+        es.delete(index=INDICE_BUSCAS, id=busca_id, refresh=politica_refresh(INDICE_BUSCAS, 'wait_for'))
+        return jsonify({'mensagem': f'Busca {busca_id} deletada com sucesso'})
+    except NotFoundError:
+        return jsonify({'error': 'Busca não encontrada'}), 404
+    except Exception as e:
+        return resposta_erro(e)
+
+
+@app.route('/buscas_salvas/stream', methods=['GET'])
+def stream_buscas_salvas():
+    """SSE: novos itens que batem com as buscas salvas (?usuario= e/ou ?busca=)"""
+    usuario = request.args.get('usuario')
+    buscas = set(request.args.getlist('busca'))
+    
+    def filtro(evento):
+        if usuario and evento.get('usuario') != usuario:
+            return False
+        return not buscas or evento.get('busca_id') in buscas
+    
+    assinatura = barramento_buscas.assinar(filtro)
+    return Response(
+        stream_with_context(fluxo_sse(assinatura)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ============================================================
+# 19. FEED DE MUDANÇAS (SSE)
+# ============================================================
+INDICES_FEED = ['rpg_itens', 'rpg_personagens', 'rpg_missoes']
+MAX_CAPACIDADE_FEED = 10000
+
+
+@app.route('/stream/changes', methods=['GET'])
+def stream_mudancas():
+    """SSE: criações, atualizações e remoções (?indices=rpg_itens,rpg_missoes)"""
+    indices = [i for i in request.args.get('indices', '').split(',') if i] or INDICES_FEED
+    invalidos = [i for i in indices if i not in INDICES_FEED]
+    if invalidos:
+        return jsonify({'error': f'Índices inválidos: {invalidos}', 'indices_disponiveis': INDICES_FEED}), 400
+    
+    capacidade = min(request.args.get('capacidade', 1000, type=int), MAX_CAPACIDADE_FEED)
+    
+    # Reconexão: o navegador manda Last-Event-ID; outros clientes podem usar ?desde=
+    desde = request.headers.get('Last-Event-ID', request.args.get('desde'))
+    desde = int(desde) if desde and desde.isdigit() else None
+    
+    indices = set(indices)
+    assinatura = barramento_mudancas.assinar(
+        lambda evento: evento['indice'] in indices,
+        capacidade=capacidade,
+        desde=desde
+    )
+    return Response(
+        stream_with_context(fluxo_sse(assinatura)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/stream/estatisticas', methods=['GET'])
+def estatisticas_streams():
+    """Assinantes, eventos publicados e pendentes de cada barramento"""
+    return jsonify({
+        'mudancas': barramento_mudancas.estatisticas(),
+        'buscas_salvas': barramento_buscas.estatisticas(),
+        'percolador': percolador.estatisticas()
+    })
+
+# ============================================================
+# 20. ESCRITAS ENFILEIRADAS (WRITE-BEHIND)
+# ============================================================
+
+@app.route('/escritas/estatisticas', methods=['GET'])
+def estatisticas_escritas():
+    """Profundidade da fila, latência do flush e orçamento de refresh"""
+    return jsonify({
+        'write_behind_padrao': WRITE_BEHIND_PADRAO,
+        **fila_escritas.estatisticas(),
+        'refresh_padrao': REFRESH_PADRAO,
+        'orcamento_refresh': orcamento_refresh.estatisticas()
+    })
+
+
+@app.route('/captura/estatisticas', methods=['GET'])
+def estatisticas_captura():
+    """Amostragem, registros gravados/descartados e rotações da captura de tráfego"""
+    return jsonify(captura.estatisticas())
+
+
+@app.route('/lentas/estatisticas', methods=['GET'])
+def estatisticas_lentas():
+    """Limite, requisições lentas gravadas/descartadas e perfis do log de consultas lentas"""
+    return jsonify(consultas_lentas.estatisticas())
+
+
+@app.route('/protecao/estatisticas', methods=['GET'])
+def estatisticas_protecao():
+    """Compartimentos por classe de rota, disjuntor e timeouts adaptativos do ES"""
+    return jsonify({
+        'compartimentos': {classe: c.estatisticas() for classe, c in compartimentos.items()},
+        'disjuntor': disjuntor_es.estatisticas(),
+        'timeouts_es': timeouts_es.estatisticas()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    """Métricas no formato texto do Prometheus"""
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/escritas/<ack>', methods=['GET'])
+def status_escrita(ack):
+    """Situação de uma escrita enfileirada (?wait_for=1 espera o flush)"""
+    if parametro_booleano('wait_for'):
+        resultado = fila_escritas.esperar(ack, TIMEOUT_WAIT_FOR)
+    else:
+        resultado = fila_escritas.resultado(ack)
+    
+    if resultado is None:
+        return jsonify({'error': f'Escrita {ack} desconhecida'}), 404
+    return jsonify(resultado)
+
+# ============================================================
+# 21. PERFIL DE CONSULTAS (DEBUG)
+# ============================================================
+# /debug/profile/<rota> recebe os mesmos parâmetros (query string e
+# corpo JSON) da rota de leitura, executa a rota para capturar o DSL
+# exato de cada busca e refaz as buscas com "profile": true.
+# RPG_DEBUG_PROFILE=0 desliga.
+DEBUG_PROFILE = os.environ.get('RPG_DEBUG_PROFILE', '1') != '0'
+
+
+@app.route('/debug/profile/<path:rota>', methods=['GET', 'POST'])
+def perfilar_rota(rota):
+    """Árvore de tempos por cláusula, coletor e agregação das buscas que a rota faria (?explain=1 traz a query reescrita)"""
+    if not DEBUG_PROFILE:
+        return jsonify({'error': 'Perfil de consultas desligado (RPG_DEBUG_PROFILE=0)'}), 404
+    
+    caminho = '/' + rota
+    try:
+        regra, _ = app.url_map.bind('localhost').match(caminho, method=request.method, return_rule=True)
+    except HTTPException as e:
+        return jsonify({'error': f'{request.method} {caminho}: {e.name}'}), e.code or 404
+    
+    # Só rotas de leitura: a rota roda de verdade para montar o DSL
+    if (eh_escrita({'metodo': request.method, 'caminho': caminho}) or regra.rule.startswith('/debug/')
+            or 'stream' in regra.rule.split('/')):
+        return jsonify({'error': f'{regra.rule} não é uma rota de leitura que possa ser perfilada'}), 400
+    
+    # Contexto de app próprio: o g da rota perfilada não se mistura com o desta requisição
+    with app.app_context(), app.test_request_context(
+            caminho, method=request.method, query_string=request.query_string.decode('utf-8', 'replace'),
+            data=request.get_data(), content_type=request.content_type,
+            headers={'Accept': request.headers.get('Accept', '')}):
+        cronometro = g.cronometro = Cronometro()
+        resposta_rota = app.make_response(app.dispatch_request())
+        total_rota = cronometro.encerrar()
+    
+    buscas, outras = [], []
+    for chamada in cronometro.chamadas:
+        if chamada['operacao'] != 'search' or not isinstance(chamada.get('corpo'), dict):
+            outras.append({k: chamada.get(k) for k in ('operacao', 'indice', 'took', 'duracao_ms')})
+            continue
+        busca = {'indice': chamada['indice'], 'dsl': chamada['corpo'], 'took_rota_ms': chamada.get('took')}
+        try:
+            resp = es.search(index=chamada['indice'], body={**chamada['corpo'], 'profile': True})
+            busca['took_ms'] = resp['took']
+            busca.update(condensar_perfil(resp.get('profile')))
+            if parametro_booleano('explain') and 'query' in chamada['corpo']:
+                busca['reescrita'] = explicar_consulta(es, chamada['indice'], chamada['corpo']['query'])
+        except Exception as e:
+            busca['error'] = str(e)
+        buscas.append(busca)
+    
+    return jsonify({
+        'rota': regra.rule,
+        'metodo': request.method,
+        'status_rota': resposta_rota.status_code,
+        'fases_rota_ms': {fase: round(d * 1000, 3) for fase, d in cronometro.fases.items()},
+        'total_rota_ms': round(total_rota * 1000, 3),
+        'buscas': buscas,
+        'outras_chamadas': outras
+    })
 
 # ============================================================
 # CRUD - ITENS
@@ -860,16 +2128,18 @@ def criar_item():
                 return jsonify({'error': f'Campo obrigatório faltando: {campo}'}), 400
         
         # Criar documento
-        resultado = es.index(index='rpg_itens', body=data)
+        item_id, ack = gravar('rpg_itens', None, data, corpo=com_embedding(data))
         
-        return jsonify({
+        return resposta_escrita({
             'mensagem': 'Item criado com sucesso',
-            'id': resultado['_id'],
+            'id': item_id,
             'item': data
-        }), 201
+        }, ack, 201)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 
 @app.route('/itens/<item_id>', methods=['GET'])
@@ -878,8 +2148,10 @@ def obter_item(item_id):
     try:
         resultado = es.get(index='rpg_itens', id=item_id)
         return jsonify({'item': resultado['_source'], 'id': resultado['_id']})
-    except Exception as e:
+    except NotFoundError:
         return jsonify({'error': 'Item não encontrado'}), 404
+    except Exception as e:
+        return resposta_erro(e)
 
 
 @app.route('/itens/<item_id>', methods=['PUT'])
@@ -889,19 +2161,23 @@ def atualizar_item(item_id):
         data = request.get_json()
         
         # Validar que item existe
-        es.get(index='rpg_itens', id=item_id)
+        atual = documento_atual('rpg_itens', item_id)
+        if atual is None:
+            return jsonify({'error': 'Item não encontrado'}), 404
         
         # Atualizar
-        resultado = es.index(index='rpg_itens', id=item_id, body=data)
+        _, ack = gravar('rpg_itens', item_id, data, atual, corpo=com_embedding(data))
         
-        return jsonify({
+        return resposta_escrita({
             'mensagem': 'Item atualizado com sucesso',
             'id': item_id,
             'item': data
-        })
+        }, ack)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 
 @app.route('/itens/<item_id>', methods=['DELETE'])
@@ -909,15 +2185,77 @@ def deletar_item(item_id):
     """Deletar item"""
     try:
         # Verificar que existe
-        es.get(index='rpg_itens', id=item_id)
+        atual = documento_atual('rpg_itens', item_id)
+        if atual is None:
+            return jsonify({'error': 'Item não encontrado'}), 404
         
         # Deletar
-        es.delete(index='rpg_itens', id=item_id)
+        _, ack = gravar('rpg_itens', item_id, None, atual)
         
-        return jsonify({'mensagem': f'Item {item_id} deletado com sucesso'})
+        return resposta_escrita({'mensagem': f'Item {item_id} deletado com sucesso'}, ack)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': 'Item não encontrado'}), 404
+        return resposta_erro(e)
+
+
+@app.route('/itens/bulk', methods=['POST'])
+def criar_itens_bulk():
+    """Criar ou substituir vários itens com uma única requisição _bulk"""
+    data = request.get_json(silent=True)
+    itens = data.get('itens') if isinstance(data, dict) else data
+    
+    if not isinstance(itens, list) or not itens:
+        return jsonify({
+            'error': 'Envie uma lista de itens (ou {"itens": [...]})',
+            'exemplo': [{'id': 'opcional', 'nome': 'Espada', 'tipo': 'Arma', 'raridade': 'Raro', 'valor': 900}]
+        }), 400
+    
+    campos_obrigatorios = ['nome', 'tipo', 'raridade', 'valor']
+    for posicao, item in enumerate(itens):
+        faltando = [campo for campo in campos_obrigatorios if campo not in item]
+        if faltando:
+            return jsonify({'error': f'Item {posicao}: campos obrigatórios faltando: {faltando}'}), 400
+    
+    try:
+        documentos = [{k: v for k, v in item.items() if k != 'id'} for item in itens]
+        ids = [str(item['id']) if 'id' in item else None for item in itens]
+        
+        # Versões atuais dos itens substituídos (para os ouvintes de escrita)
+        existentes = [i for i in ids if i is not None]
+        antigos = {}
+        if existentes:
+            for doc in es.mget(index='rpg_itens', body={'ids': existentes})['docs']:
+                if doc.get('found'):
+                    antigos[doc['_id']] = doc['_source']
+        
+        operacoes = []
+        for doc_id, documento in zip(ids, documentos):
+            operacoes.append({'index': {'_index': 'rpg_itens', '_id': doc_id} if doc_id else {'_index': 'rpg_itens'}})
+            operacoes.append(com_embedding(documento))
+        
+        resp = es.bulk(body=operacoes, refresh=politica_refresh('rpg_itens'))
+        
+        # A resposta do _bulk traz, na ordem, o id (gerado ou não) de cada item
+        gravados, erros = [], []
+        for posicao, (resultado, documento) in enumerate(zip(resp['items'], documentos)):
+            resultado = resultado['index']
+            if resultado.get('error'):
+                erros.append({'posicao': posicao, 'error': resultado['error']})
+                continue
+            notificar_escrita('rpg_itens', resultado['_id'], antigos.get(resultado['_id']), documento)
+            gravados.append(resultado['_id'])
+        
+        return jsonify({
+            'mensagem': f'{len(gravados)} itens gravados',
+            'ids': gravados,
+            'erros': erros,
+            'refresh': g.refresh
+        }), 201 if not erros else 207
+        
+    except Exception as e:
+        return resposta_erro(e)
 
 
 @app.route('/itens', methods=['GET'])
@@ -934,14 +2272,24 @@ def listar_itens():
         
         inicio = (pagina - 1) * tamanho
         
+        marcar_fase('build')
         query = {
             "query": {"match_all": {}},
             "size": tamanho,
-            "from": inicio
+            "from": inicio,
+            "track_total_hits": politica_total_hits()
         }
         
         resp = es.search(index='rpg_itens', body=query)
         
+        formato = formato_solicitado()
+        if formato != 'json':
+            return responder_colunar(formato, resp['hits']['hits'], CAMPOS_ITENS, {
+                **info_total(resp),
+                'pagina': pagina,
+                'tamanho': tamanho
+            })
+        
         itens = []
         for hit in resp['hits']['hits']:
             item = hit['_source']
@@ -950,13 +2298,13 @@ def listar_itens():
         
         return jsonify({
             'itens': itens,
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'pagina': pagina,
             'tamanho': tamanho
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # CRUD - PERSONAGENS
@@ -974,16 +2322,18 @@ def criar_personagem():
             if campo not in data:
                 return jsonify({'error': f'Campo obrigatório faltando: {campo}'}), 400
         
-        resultado = es.index(index='rpg_personagens', body=data)
+        pessoa_id, ack = gravar('rpg_personagens', None, data)
         
-        return jsonify({
+        return resposta_escrita({
             'mensagem': 'Personagem criado com sucesso',
-            'id': resultado['_id'],
+            'id': pessoa_id,
             'personagem': data
-        }), 201
+        }, ack, 201)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 
 @app.route('/personagens/<pessoa_id>', methods=['GET'])
@@ -992,8 +2342,10 @@ def obter_personagem(pessoa_id):
     try:
         resultado = es.get(index='rpg_personagens', id=pessoa_id)
         return jsonify({'personagem': resultado['_source'], 'id': resultado['_id']})
-    except Exception as e:
+    except NotFoundError:
         return jsonify({'error': 'Personagem não encontrado'}), 404
+    except Exception as e:
+        return resposta_erro(e)
 
 
 @app.route('/personagens/<pessoa_id>', methods=['PUT'])
@@ -1003,31 +2355,39 @@ def atualizar_personagem(pessoa_id):
         data = request.get_json()
         
         # Validar que existe
-        es.get(index='rpg_personagens', id=pessoa_id)
+        atual = documento_atual('rpg_personagens', pessoa_id)
+        if atual is None:
+            return jsonify({'error': 'Personagem não encontrado'}), 404
         
-        resultado = es.index(index='rpg_personagens', id=pessoa_id, body=data)
+        _, ack = gravar('rpg_personagens', pessoa_id, data, atual)
         
-        return jsonify({
+        return resposta_escrita({
             'mensagem': 'Personagem atualizado com sucesso',
             'id': pessoa_id,
             'personagem': data
-        })
+        }, ack)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 
 @app.route('/personagens/<pessoa_id>', methods=['DELETE'])
 def deletar_personagem(pessoa_id):
     """Deletar personagem"""
     try:
-        es.get(index='rpg_personagens', id=pessoa_id)
-        es.delete(index='rpg_personagens', id=pessoa_id)
+        atual = documento_atual('rpg_personagens', pessoa_id)
+        if atual is None:
+            return jsonify({'error': 'Personagem não encontrado'}), 404
+        _, ack = gravar('rpg_personagens', pessoa_id, None, atual)
         
-        return jsonify({'mensagem': f'Personagem {pessoa_id} deletado com sucesso'})
+        return resposta_escrita({'mensagem': f'Personagem {pessoa_id} deletado com sucesso'}, ack)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': 'Personagem não encontrado'}), 404
+        return resposta_erro(e)
 
 
 @app.route('/personagens', methods=['GET'])
@@ -1044,14 +2404,24 @@ def listar_personagens():
         
         inicio = (pagina - 1) * tamanho
         
+        marcar_fase('build')
         query = {
             "query": {"match_all": {}},
             "size": tamanho,
-            "from": inicio
+            "from": inicio,
+            "track_total_hits": politica_total_hits()
         }
         
         resp = es.search(index='rpg_personagens', body=query)
         
+        formato = formato_solicitado()
+        if formato != 'json':
+            return responder_colunar(formato, resp['hits']['hits'], CAMPOS_PERSONAGENS, {
+                **info_total(resp),
+                'pagina': pagina,
+                'tamanho': tamanho
+            })
+        
         personagens = []
         for hit in resp['hits']['hits']:
             pessoa = hit['_source']
@@ -1060,13 +2430,13 @@ def listar_personagens():
         
         return jsonify({
             'personagens': personagens,
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'pagina': pagina,
             'tamanho': tamanho
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # CRUD - MISSÕES
@@ -1084,16 +2454,18 @@ def criar_missao():
             if campo not in data:
                 return jsonify({'error': f'Campo obrigatório faltando: {campo}'}), 400
         
-        resultado = es.index(index='rpg_missoes', body=data)
+        missao_id, ack = gravar('rpg_missoes', None, data)
         
-        return jsonify({
+        return resposta_escrita({
             'mensagem': 'Missão criada com sucesso',
-            'id': resultado['_id'],
+            'id': missao_id,
             'missao': data
-        }), 201
+        }, ack, 201)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 
 @app.route('/missoes/<missao_id>', methods=['GET'])
@@ -1102,8 +2474,10 @@ def obter_missao(missao_id):
     try:
         resultado = es.get(index='rpg_missoes', id=missao_id)
         return jsonify({'missao': resultado['_source'], 'id': resultado['_id']})
-    except Exception as e:
+    except NotFoundError:
         return jsonify({'error': 'Missão não encontrada'}), 404
+    except Exception as e:
+        return resposta_erro(e)
 
 
 @app.route('/missoes/<missao_id>', methods=['PUT'])
@@ -1113,31 +2487,39 @@ def atualizar_missao(missao_id):
         data = request.get_json()
         
         # Validar que existe
-        es.get(index='rpg_missoes', id=missao_id)
+        atual = documento_atual('rpg_missoes', missao_id)
+        if atual is None:
+            return jsonify({'error': 'Missão não encontrada'}), 404
         
-        resultado = es.index(index='rpg_missoes', id=missao_id, body=data)
+        _, ack = gravar('rpg_missoes', missao_id, data, atual)
         
-        return jsonify({
+        return resposta_escrita({
             'mensagem': 'Missão atualizada com sucesso',
             'id': missao_id,
             'missao': data
-        })
+        }, ack)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 
 @app.route('/missoes/<missao_id>', methods=['DELETE'])
 def deletar_missao(missao_id):
     """Deletar missão"""
     try:
-        es.get(index='rpg_missoes', id=missao_id)
-        es.delete(index='rpg_missoes', id=missao_id)
+        atual = documento_atual('rpg_missoes', missao_id)
+        if atual is None:
+            return jsonify({'error': 'Missão não encontrada'}), 404
+        _, ack = gravar('rpg_missoes', missao_id, None, atual)
         
-        return jsonify({'mensagem': f'Missão {missao_id} deletada com sucesso'})
+        return resposta_escrita({'mensagem': f'Missão {missao_id} deletada com sucesso'}, ack)
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': 'Missão não encontrada'}), 404
+        return resposta_erro(e)
 
 
 @app.route('/missoes', methods=['GET'])
@@ -1154,14 +2536,24 @@ def listar_missoes():
         
         inicio = (pagina - 1) * tamanho
         
+        marcar_fase('build')
         query = {
             "query": {"match_all": {}},
             "size": tamanho,
-            "from": inicio
+            "from": inicio,
+            "track_total_hits": politica_total_hits()
         }
         
         resp = es.search(index='rpg_missoes', body=query)
         
+        formato = formato_solicitado()
+        if formato != 'json':
+            return responder_colunar(formato, resp['hits']['hits'], CAMPOS_MISSOES, {
+                **info_total(resp),
+                'pagina': pagina,
+                'tamanho': tamanho
+            })
+        
         missoes = []
         for hit in resp['hits']['hits']:
             missao = hit['_source']
@@ -1170,13 +2562,13 @@ def listar_missoes():
         
         return jsonify({
             'missoes': missoes,
-            'total': resp['hits']['total']['value'],
+            **info_total(resp),
             'pagina': pagina,
             'tamanho': tamanho
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return resposta_erro(e)
 
 # ============================================================
 # EXECUTAR APP
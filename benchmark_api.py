@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+# benchmark_api.py - Carga ponta a ponta nas rotas da API: mixes, concorrência, histogramas e took do ES x overhead
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from urllib.parse import urlencode
+
+import numpy as np
+
+from embeddings_rpg import CAMPO_EMBEDDING
+from gerador_rpg import (
+    ADJETIVOS, BASE_ENTIDADES, CLASSES, DIFICULDADES, GERADORES, NOMES_ARMAS, NOMES_BASE, RARIDADES, TIPOS_ITEM,
+    documentos
+)
+
+# ============================================================
+# HISTOGRAMA (estilo HDR)
+# ============================================================
+
+class Histograma:
+    """Histograma log-linear de latências em microssegundos, no esquema do HdrHistogram
+
+    Até 2 * METADE os valores são exatos; acima disso cada potência de 2
+    tem METADE baldes lineares, então o erro relativo fica abaixo de
+    1/METADE (~0,8% com 128) do menor ao maior valor. Registrar é O(1),
+    e histogramas de threads ou execuções diferentes se somam.
+    """
+
+    METADE = 128
+
+    def __init__(self, maximo_us=3_600_000_000):
+        self.maximo_us = maximo_us
+        self.contagens = np.zeros(self._indice(maximo_us) + 1, dtype=np.int64)
+        self.total = 0
+        self.soma = 0
+        self.maior = 0
+
+    @classmethod
+    def _indice(cls, valor):
+        if valor < 2 * cls.METADE:
+            return valor
+        deslocamento = valor.bit_length() - cls.METADE.bit_length()
+        return 2 * cls.METADE + (deslocamento - 1) * cls.METADE + (valor >> deslocamento) - cls.METADE
+
+    @classmethod
+    def _valor(cls, indice):
+        """Maior valor que cai no balde (percentis pelo limite de cima, como o HdrHistogram)"""
+        if indice < 2 * cls.METADE:
+            return indice
+        deslocamento, resto = divmod(indice - 2 * cls.METADE, cls.METADE)
+        deslocamento += 1
+        return ((cls.METADE + resto + 1) << deslocamento) - 1
+
+    def registrar(self, valor_us, vezes=1):
+        valor = min(max(int(valor_us), 0), self.maximo_us)
+        self.contagens[self._indice(valor)] += vezes
+        self.total += vezes
+        self.soma += valor * vezes
+        self.maior = max(self.maior, valor)
+
+    def somar(self, outro):
+        self.contagens += outro.contagens
+        self.total += outro.total
+        self.soma += outro.soma
+        self.maior = max(self.maior, outro.maior)
+        return self
+
+    def percentil(self, q):
+        """Valor (µs) abaixo do qual fica a fração q das amostras"""
+        if not self.total:
+            return None
+        alvo = max(1, int(np.ceil(q * self.total)))
+        indice = int(np.searchsorted(np.cumsum(self.contagens), alvo))
+        return min(self._valor(indice), self.maior)
+
+    def media(self):
+        return self.soma / self.total if self.total else None
+
+    def resumo(self, percentis=(0.5, 0.95, 0.99, 0.999)):
+        """Percentis, média e máximo em ms"""
+        ms = lambda us: None if us is None else round(us / 1000, 3)
+        resumo = {f"p{q * 100:g}": ms(self.percentil(q)) for q in percentis}
+        resumo.update({"media": ms(self.media()), "max": ms(self.maior if self.total else None),
+                       "amostras": self.total})
+        return resumo
+
+    def para_dict(self):
+        """Forma compacta (só baldes ocupados), para guardar no JSON e somar depois"""
+        ocupados = np.flatnonzero(self.contagens)
+        return {"metade": self.METADE, "indices": ocupados.tolist(),
+                "contagens": self.contagens[ocupados].tolist(), "soma_us": self.soma, "max_us": self.maior}
+
+    @classmethod
+    def de_dict(cls, dados):
+        if dados.get("metade", cls.METADE) != cls.METADE:
+            raise ValueError("histograma gravado com outra precisão")
+        histograma = cls()
+        histograma.contagens[dados["indices"]] = dados["contagens"]
+        histograma.total = int(sum(dados["contagens"]))
+        histograma.soma = dados["soma_us"]
+        histograma.maior = dados["max_us"]
+        return histograma
+
+# ============================================================
+# OPERAÇÕES E MIXES
+# ============================================================
+# Cada operação monta (método, caminho, corpo) a partir do gerador
+# aleatório do worker e do contexto (totais por entidade e ids criados
+# pelo próprio worker: PUT/DELETE nunca tocam os dados do dataset).
+TERMOS_BUSCA = [n.lower() for n in NOMES_ARMAS + ADJETIVOS] + ['pocao', 'armadura', 'anel', 'livro']
+TERMOS_PERSONAGENS = [n.lower() for n in NOMES_BASE] + [c.lower() for c in CLASSES]
+TERMOS_MISSOES = ['dragoes', 'goblins', 'resgate', 'caverna', 'floresta', 'torre', 'ruinas', 'orcs']
+
+
+def _com_erro(rng, termo):
+    """Um erro de digitação em ~15% das buscas (exercita a fuzziness)"""
+    if len(termo) > 4 and rng.random() < 0.15:
+        i = rng.randrange(1, len(termo) - 1)
+        return termo[:i] + termo[i + 1:]
+    return termo
+
+
+def _id(rng, ctx, entidade):
+    """Id do dataset com acesso enviesado (poucos itens concentram as leituras)"""
+    total = max(ctx['totais'].get(entidade, 1), 1)
+    return str(min(int(rng.paretovariate(1.2)), total) if rng.random() < 0.5 else rng.randint(1, total))
+
+
+def _faixa(rng, minimo, maximo):
+    a, b = sorted(rng.randint(minimo, maximo) for _ in range(2))
+    return a, b
+
+
+def _novo(entidade):
+    """Documento novo com a mesma distribuição do dataset (gerador_rpg), marcado como do benchmark"""
+    def novo(rng):
+        colunas = GERADORES[entidade](np.random.default_rng(rng.getrandbits(32)), 1)
+        doc = documentos(colunas, 1)[0]
+        doc.pop(CAMPO_EMBEDDING, None)
+        campo_nome = 'titulo' if entidade == 'missoes' else 'nome'
+        doc[campo_nome] = f"{doc[campo_nome]} Bench"
+        return doc
+    return novo
+
+
+def _escrever(entidade, novo):
+    """Operações de criar/atualizar/remover de uma entidade (caminho base /<entidade>)"""
+    def criar(rng, ctx):
+        return 'POST', f'/{entidade}/criar', novo(rng)
+
+    def atualizar(rng, ctx):
+        criados = ctx['criados'][entidade]
+        if not criados:
+            return criar(rng, ctx)
+        return 'PUT', f'/{entidade}/{rng.choice(criados)}', novo(rng)
+
+    def remover(rng, ctx):
+        criados = ctx['criados'][entidade]
+        if not criados:
+            return criar(rng, ctx)
+        return 'DELETE', f'/{entidade}/{criados.popleft()}', None
+
+    return criar, atualizar, remover
+
+
+_criar_item, _atualizar_item, _remover_item = _escrever('itens', _novo('itens'))
+_criar_personagem, _atualizar_personagem, _remover_personagem = _escrever('personagens', _novo('personagens'))
+_criar_missao, _atualizar_missao, _remover_missao = _escrever('missoes', _novo('missoes'))
+
+
+def _filtros_itens(rng):
+    filtros = {}
+    if rng.random() < 0.6:
+        filtros['tipo'] = rng.choice(TIPOS_ITEM)
+    if rng.random() < 0.5:
+        filtros['raridade'] = rng.choice(RARIDADES)
+    if rng.random() < 0.5 or not filtros:
+        filtros['valor_min'], filtros['valor_max'] = _faixa(rng, 0, 60000)
+    return filtros
+
+
+OPERACOES = {
+    # Itens
+    'buscar': lambda rng, ctx: ('GET', f"/buscar?q={_com_erro(rng, rng.choice(TERMOS_BUSCA))}", None),
+    'filtrar_get': lambda rng, ctx: ('GET', f"/filtrar?{urlencode(_filtros_itens(rng))}", None),
+    'filtrar_post': lambda rng, ctx: ('POST', '/filtrar', _filtros_itens(rng)),
+    'autocomplete': lambda rng, ctx: ('GET', f"/autocomplete?q={rng.choice(TERMOS_BUSCA)[:rng.randint(2, 4)]}",
+                                      None),
+    'similares': lambda rng, ctx: ('GET', f"/similares/{_id(rng, ctx, 'itens')}", None),
+    'similares_knn': lambda rng, ctx: ('GET', f"/similares/{_id(rng, ctx, 'itens')}?modo=knn", None),
+    'busca_avancada': lambda rng, ctx: ('POST', '/busca-avancada',
+                                        {'texto': rng.choice(TERMOS_BUSCA), **_filtros_itens(rng)}),
+    'dashboard': lambda rng, ctx: ('GET', '/dashboard', None),
+    'count': lambda rng, ctx: ('GET', f"/count?{urlencode(_filtros_itens(rng))}", None),
+    'obter_item': lambda rng, ctx: ('GET', f"/itens/{_id(rng, ctx, 'itens')}", None),
+    'listar_itens': lambda rng, ctx: ('GET', f"/itens?pagina={rng.randint(1, 20)}&tamanho={rng.choice([10, 50])}",
+                                      None),
+    'criar_item': _criar_item,
+    'atualizar_item': _atualizar_item,
+    'deletar_item': _remover_item,
+    # Personagens
+    'buscar_personagens': lambda rng, ctx: ('GET', f"/buscar_personagens?q={rng.choice(TERMOS_PERSONAGENS)}", None),
+    'filtrar_personagens': lambda rng, ctx: ('POST', '/filtrar_personagens',
+                                             {'classe': rng.choice(CLASSES), 'nivel_min': rng.randint(1, 15)}),
+    'dashboard_personagens': lambda rng, ctx: ('GET', '/dashboard_personagens', None),
+    'top_personagens': lambda rng, ctx: ('GET', f"/top_personagens?limite={rng.choice([10, 50])}", None),
+    'obter_personagem': lambda rng, ctx: ('GET', f"/personagens/{_id(rng, ctx, 'personagens')}", None),
+    'listar_personagens': lambda rng, ctx: ('GET', f"/personagens?pagina={rng.randint(1, 10)}", None),
+    'criar_personagem': _criar_personagem,
+    'atualizar_personagem': _atualizar_personagem,
+    'deletar_personagem': _remover_personagem,
+    # Missões
+    'buscar_missoes': lambda rng, ctx: ('GET', f"/buscar_missoes?q={rng.choice(TERMOS_MISSOES)}", None),
+    'filtrar_missoes': lambda rng, ctx: ('POST', '/filtrar_missoes', {'dificuldade': rng.choice(DIFICULDADES)}),
+    'dashboard_missoes': lambda rng, ctx: ('GET', '/dashboard_missoes', None),
+    'missoes_dificuldade': lambda rng, ctx: ('GET', f"/missoes_dificuldade?dificuldade={rng.choice(DIFICULDADES)}",
+                                             None),
+    'obter_missao': lambda rng, ctx: ('GET', f"/missoes/{_id(rng, ctx, 'missoes')}", None),
+    'listar_missoes': lambda rng, ctx: ('GET', f"/missoes?pagina={rng.randint(1, 10)}", None),
+    'criar_missao': _criar_missao,
+    'atualizar_missao': _atualizar_missao,
+    'deletar_missao': _remover_missao,
+}
+
+# Pesos relativos por mix; `todas` cobre cada rota igualmente
+MIXES = {
+    'navegacao': {
+        'buscar': 20, 'autocomplete': 20, 'filtrar_get': 8, 'filtrar_post': 4, 'obter_item': 10, 'similares': 6,
+        'similares_knn': 2, 'busca_avancada': 4, 'listar_itens': 4, 'buscar_personagens': 4,
+        'filtrar_personagens': 2, 'obter_personagem': 3, 'top_personagens': 2, 'buscar_missoes': 3,
+        'filtrar_missoes': 2, 'missoes_dificuldade': 1, 'dashboard': 1, 'count': 1,
+        'criar_item': 1, 'atualizar_item': 1, 'deletar_item': 1
+    },
+    'busca': {'buscar': 40, 'autocomplete': 30, 'busca_avancada': 10, 'filtrar_get': 10, 'filtrar_post': 10},
+    'dashboards': {'dashboard': 3, 'dashboard_personagens': 2, 'dashboard_missoes': 2, 'count': 2,
+                   'top_personagens': 1},
+    'escrita': {
+        'criar_item': 4, 'atualizar_item': 3, 'deletar_item': 2, 'criar_personagem': 2,
+        'atualizar_personagem': 1, 'deletar_personagem': 1, 'criar_missao': 2, 'atualizar_missao': 1,
+        'deletar_missao': 1, 'obter_item': 3
+    },
+    'todas': {nome: 1 for nome in OPERACOES},
+}
+
+
+def ler_mix(texto):
+    """Nome de um mix ou pesos explícitos: 'buscar=5,dashboard=1'"""
+    if texto in MIXES:
+        return dict(MIXES[texto])
+    pesos = {}
+    for parte in texto.split(','):
+        nome, _, peso = parte.partition('=')
+        if nome.strip() not in OPERACOES:
+            raise SystemExit(f"❌ Operação desconhecida: {nome.strip()} (disponíveis: {', '.join(OPERACOES)})")
+        pesos[nome.strip()] = float(peso or 1)
+    return pesos
+
+# ============================================================
+# CLIENTES (HTTP ou em processo)
+# ============================================================
+
+def medicao_server_timing(cabecalho):
+    """took/tempo no cliente ES a partir do Server-Timing da API (None se ausente)"""
+    if not cabecalho:
+        return None
+    metricas = {}
+    for parte in cabecalho.split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        for parametro in parametros.split(';'):
+            chave, _, valor = parametro.partition('=')
+            if chave.strip() == 'dur':
+                metricas[nome] = float(valor)
+            elif chave.strip() == 'desc':
+                metricas[nome + '_desc'] = valor.strip('"')
+    if 'total' not in metricas:
+        return None
+    chamadas = metricas.get('es_took_desc', '0').split()[0]
+    return {'took_ms': metricas.get('es_took', 0.0), 'cliente_ms': metricas.get('es', 0.0),
+            'chamadas': int(chamadas) if chamadas.isdigit() else 0}
+
+
+class ClienteHttp:
+    """API rodando em outro processo: latência ponta a ponta, com took e tempo no ES lidos do Server-Timing"""
+
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip('/')
+        self._sessoes = threading.local()
+        self._requests = requests
+
+    def requisitar(self, metodo, caminho, corpo):
+        sessao = getattr(self._sessoes, 'sessao', None)
+        if sessao is None:
+            sessao = self._sessoes.sessao = self._requests.Session()
+        resp = sessao.request(metodo, self.url + caminho, json=corpo, timeout=60)
+        return resp.status_code, resp.content, medicao_server_timing(resp.headers.get('Server-Timing'))
+
+
+class EsInstrumentado:
+    """Proxy do cliente ES que soma, por thread, o tempo das chamadas e o `took` que o ES devolve"""
+
+    METODOS = {'search', 'count', 'get', 'mget', 'index', 'update', 'delete', 'bulk', 'scroll', 'msearch'}
+
+    def __init__(self, es):
+        self._es = es
+        self._local = threading.local()
+
+    def zerar(self):
+        self._local.medicao = {'took_ms': 0.0, 'cliente_ms': 0.0, 'chamadas': 0}
+
+    def medicao(self):
+        return getattr(self._local, 'medicao', None)
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._es, nome)
+        if nome not in self.METODOS:
+            return atributo
+
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                resp = atributo(*args, **kwargs)
+            finally:
+                medicao = self.medicao()
+                if medicao is not None:
+                    medicao['cliente_ms'] += (time.perf_counter() - inicio) * 1000
+                    medicao['chamadas'] += 1
+            medicao = self.medicao()
+            if medicao is not None:
+                took = resp.get('took') if hasattr(resp, 'get') else None
+                medicao['took_ms'] += took or 0
+            return resp
+
+        return medido
+
+
+class ClienteLocal:
+    """API importada no próprio processo (Flask test client), com o cliente ES instrumentado
+
+    O backend segue RPG_ES_BACKEND: o cluster em localhost:9200 ou o
+    ElasticsearchLocal de es_local_rpg.py (RPG_ES_LOCAL_ESCALA).
+    """
+
+    def __init__(self):
+        import app_rpg_search
+        self.es = EsInstrumentado(app_rpg_search.es)
+        app_rpg_search.es = self.es
+        self.app = app_rpg_search.app
+        self._clientes = threading.local()
+
+    def requisitar(self, metodo, caminho, corpo):
+        cliente = getattr(self._clientes, 'cliente', None)
+        if cliente is None:
+            cliente = self._clientes.cliente = self.app.test_client()
+        self.es.zerar()
+        resp = cliente.open(caminho, method=metodo, json=corpo)
+        return resp.status_code, resp.get_data(), self.es.medicao()
+
+# ============================================================
+# EXECUÇÃO DA CARGA
+# ============================================================
+
+class Rota:
+    """Medições de uma operação: latência total, took do ES, tempo no cliente ES e overhead da API"""
+
+    def __init__(self):
+        self.latencia = Histograma()
+        self.took = Histograma()
+        self.cliente_es = Histograma()
+        self.overhead = Histograma()
+        self.status = Counter()
+        self.erros = 0
+        self.chamadas_es = 0
+
+    def somar(self, outra):
+        for campo in ('latencia', 'took', 'cliente_es', 'overhead'):
+            getattr(self, campo).somar(getattr(outra, campo))
+        self.status.update(outra.status)
+        self.erros += outra.erros
+        self.chamadas_es += outra.chamadas_es
+        return self
+
+
+class Worker(threading.Thread):
+    def __init__(self, numero, cliente, pesos, ctx, seed, fim, intervalo, limite, aquecimento_ate):
+        super().__init__(daemon=True)
+        self.cliente = cliente
+        self.nomes = list(pesos)
+        self.pesos = [pesos[n] for n in self.nomes]
+        self.ctx = {**ctx, 'criados': {e: deque() for e in ('itens', 'personagens', 'missoes')}}
+        self.rng = random.Random(seed * 1000 + numero)
+        self.fim = fim
+        self.intervalo = intervalo
+        self.limite = limite
+        self.aquecimento_ate = aquecimento_ate
+        self.rotas = {}
+        self.excecoes = Counter()
+
+    def _registrar(self, nome, status, latencia_us, medicao):
+        rota = self.rotas.setdefault(nome, Rota())
+        rota.latencia.registrar(latencia_us)
+        rota.status[status] += 1
+        if status >= 500 or status == 0:
+            rota.erros += 1
+        if medicao is not None:
+            rota.took.registrar(medicao['took_ms'] * 1000)
+            rota.cliente_es.registrar(medicao['cliente_ms'] * 1000)
+            rota.overhead.registrar(max(latencia_us - medicao['cliente_ms'] * 1000, 0))
+            rota.chamadas_es += medicao['chamadas']
+
+    def run(self):
+        proxima = time.perf_counter()
+        feitas = 0
+        while time.perf_counter() < self.fim and (self.limite is None or feitas < self.limite):
+            if self.intervalo:
+                # Taxa fixa: a latência conta a partir do horário previsto, então
+                # atrasos do servidor não somem das medidas (omissão coordenada)
+                espera = proxima - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                inicio = proxima
+                proxima += self.intervalo
+            else:
+                inicio = time.perf_counter()
+            nome = self.rng.choices(self.nomes, self.pesos)[0]
+            metodo, caminho, corpo = OPERACOES[nome](self.rng, self.ctx)
+            medicao = None
+            try:
+                status, conteudo, medicao = self.cliente.requisitar(metodo, caminho, corpo)
+            except Exception as e:
+                status, conteudo = 0, b''
+                self.excecoes[type(e).__name__] += 1
+            latencia_us = (time.perf_counter() - inicio) * 1_000_000
+
+            if status in (200, 201, 202) and metodo == 'POST' and caminho.endswith('/criar'):
+                entidade = caminho.split('/')[1]
+                self.ctx['criados'][entidade].append(json.loads(conteudo)['id'])
+
+            if time.perf_counter() >= self.aquecimento_ate:
+                self._registrar(nome, status, latencia_us, medicao)
+                feitas += 1
+
+
+def executar(cliente, pesos, ctx, concorrencia, duracao, requisicoes, taxa, aquecimento, seed):
+    agora = time.perf_counter()
+    aquecimento_ate = agora + aquecimento
+    fim = aquecimento_ate + (duracao if duracao else 10 ** 9)
+    por_worker = None if requisicoes is None else -(-requisicoes // concorrencia)
+    intervalo = concorrencia / taxa if taxa else None
+    workers = [Worker(i, cliente, pesos, ctx, seed, fim, intervalo, por_worker, aquecimento_ate)
+               for i in range(concorrencia)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    decorrido = time.perf_counter() - max(aquecimento_ate, agora)
+
+    rotas = {}
+    excecoes = Counter()
+    for worker in workers:
+        for nome, rota in worker.rotas.items():
+            rotas.setdefault(nome, Rota()).somar(rota)
+        excecoes.update(worker.excecoes)
+    return rotas, decorrido, excecoes
+
+# ============================================================
+# RELATÓRIO
+# ============================================================
+
+def commit_atual():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        sujo = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        return f"{commit}-dirty" if commit and sujo else commit or None
+    except OSError:
+        return None
+
+
+def resumo_rota(rota, decorrido):
+    resumo = {
+        "requisicoes": rota.latencia.total,
+        "throughput_rps": round(rota.latencia.total / decorrido, 2) if decorrido else None,
+        "erros": rota.erros,
+        "status": {str(s): n for s, n in sorted(rota.status.items())},
+        "latencia_ms": rota.latencia.resumo(),
+        "histograma_latencia": rota.latencia.para_dict()
+    }
+    if rota.cliente_es.total:
+        resumo.update({
+            "chamadas_es_por_requisicao": round(rota.chamadas_es / rota.latencia.total, 2),
+            "took_es_ms": rota.took.resumo(),
+            "cliente_es_ms": rota.cliente_es.resumo(),
+            "overhead_api_ms": rota.overhead.resumo()
+        })
+    return resumo
+
+
+def imprimir(resultado):
+    print(f"\n   {'rota':<22} {'n':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'p99.9':>8} "
+          f"{'max':>8} {'took':>7} {'overh.':>7}")
+    linhas = sorted(resultado['rotas'].items(), key=lambda r: -r[1]['requisicoes']) + \
+        [('TOTAL', resultado['total'])]
+    for nome, rota in linhas:
+        lat = rota['latencia_ms']
+        took = rota.get('took_es_ms', {}).get('p50')
+        overhead = rota.get('overhead_api_ms', {}).get('p50')
+        fmt = lambda v, largura=8: f"{v:>{largura}.2f}" if v is not None else f"{'-':>{largura}}"
+        print(f"   {nome:<22} {rota['requisicoes']:>7} {fmt(rota['throughput_rps'])} {fmt(lat['p50'])} "
+              f"{fmt(lat['p95'])} {fmt(lat['p99'])} {fmt(lat['p99.9'])} {fmt(lat['max'])} "
+              f"{fmt(took, 7)} {fmt(overhead, 7)}" + (f"  ⚠️ {rota['erros']} erros" if rota['erros'] else ""))
+    print("   (ms; took/overh. = mediana do took do ES e do tempo fora do cliente ES)")
+
+
+def comparar(atual, anterior):
+    """Variação de throughput, p50 e p99 por rota frente a uma execução gravada"""
+    print(f"\n📊 Comparação com {anterior.get('commit')} ({anterior.get('data')})")
+    print(f"   {'rota':<22} {'req/s':>16} {'p50':>18} {'p99':>18}")
+    variacao = lambda novo, velho: f"{(novo - velho) / velho * 100:+.1f}%" if novo and velho else "-"
+    rotas = dict(atual['rotas'], TOTAL=atual['total'])
+    antigas = dict(anterior['rotas'], TOTAL=anterior['total'])
+    for nome, rota in rotas.items():
+        velha = antigas.get(nome)
+        if velha is None:
+            continue
+        rps, velho_rps = rota['throughput_rps'], velha['throughput_rps']
+        p50, velho_p50 = rota['latencia_ms']['p50'], velha['latencia_ms']['p50']
+        p99, velho_p99 = rota['latencia_ms']['p99'], velha['latencia_ms']['p99']
+        print(f"   {nome:<22} {rps or 0:>8.1f} {variacao(rps, velho_rps):>7} {p50 or 0:>9.2f} "
+              f"{variacao(p50, velho_p50):>8} {p99 or 0:>9.2f} {variacao(p99, velho_p99):>8}")
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta das rotas da API")
+    parser.add_argument("--url", default=None,
+                        help="API já rodando (ex.: http://localhost:5000); sem isso, importa a API no processo")
+    parser.add_argument("--backend", choices=["elasticsearch", "local"], default=None,
+                        help="Backend da API em processo (padrão: RPG_ES_BACKEND)")
+    parser.add_argument("--scale", type=float, default=None,
+                        help="Escala do backend local (RPG_ES_LOCAL_ESCALA); os ids seguem o gerador")
+    parser.add_argument("--mix", default="navegacao",
+                        help=f"Mix de operações ({', '.join(MIXES)}) ou pesos 'buscar=5,dashboard=1'")
+    parser.add_argument("-c", "--concorrencia", type=int, default=8, help="Clientes simultâneos")
+    parser.add_argument("--duracao", type=float, default=30, help="Segundos medidos (0 = usar --requisicoes)")
+    parser.add_argument("-n", "--requisicoes", type=int, default=None, help="Total de requisições medidas")
+    parser.add_argument("--taxa", type=float, default=None,
+                        help="Requisições/s no total (carga aberta); sem isso, cada cliente dispara em sequência")
+    parser.add_argument("--aquecimento", type=float, default=5, help="Segundos descartados no início")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", default=None, help="Arquivo JSON (padrão: bench_api_<commit>_<data>.json)")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    print("⏱️  Benchmark: API ponta a ponta")
+    print("=" * 60)
+
+    if args.url:
+        cliente = ClienteHttp(args.url)
+        backend = f"http ({args.url})"
+    else:
+        if args.backend:
+            os.environ['RPG_ES_BACKEND'] = args.backend
+        if args.scale is not None:
+            os.environ['RPG_ES_LOCAL_ESCALA'] = str(args.scale)
+        cliente = ClienteLocal()
+        backend = os.environ.get('RPG_ES_BACKEND', 'elasticsearch')
+
+    # Totais por entidade (os ids do dataset vão de 1 ao total)
+    totais = {}
+    for entidade in BASE_ENTIDADES:
+        status, conteudo, _ = cliente.requisitar('GET', f'/count?entidade={entidade}', None)
+        if status != 200:
+            print(f"❌ /count?entidade={entidade} respondeu {status}: {conteudo[:200]!r}")
+            sys.exit(1)
+        totais[entidade] = json.loads(conteudo)['total']
+
+    pesos = ler_mix(args.mix)
+    print(f"📦 Backend: {backend} | dados: {totais}")
+    print(f"🔀 Mix '{args.mix}': {len(pesos)} operações | {args.concorrencia} clientes | "
+          + (f"{args.taxa:g} req/s" if args.taxa else "carga fechada")
+          + (f" | {args.requisicoes} requisições" if args.requisicoes else f" | {args.duracao:g}s"))
+
+    rotas, decorrido, excecoes = executar(
+        cliente, pesos, {'totais': totais}, args.concorrencia,
+        args.duracao if not args.requisicoes else None, args.requisicoes, args.taxa, args.aquecimento, args.seed
+    )
+    total = Rota()
+    for rota in rotas.values():
+        total.somar(rota)
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec='seconds'),
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(), "backend": backend},
+        "configuracao": {"mix": args.mix, "pesos": pesos, "concorrencia": args.concorrencia,
+                         "duracao": args.duracao, "requisicoes": args.requisicoes, "taxa": args.taxa,
+                         "aquecimento": args.aquecimento, "seed": args.seed, "scale": args.scale},
+        "dados": totais,
+        "decorrido_s": round(decorrido, 3),
+        "excecoes": dict(excecoes),
+        "total": resumo_rota(total, decorrido),
+        "rotas": {nome: resumo_rota(rota, decorrido) for nome, rota in sorted(rotas.items())}
+    }
+    imprimir(resultado)
+    if excecoes:
+        print(f"\n⚠️  Exceções no cliente: {dict(excecoes)}")
+
+    saida = args.saida or f"bench_api_{resultado['commit'] or 'sem-git'}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultado em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(resultado, json.load(f))
+
+    print("\n" + "=" * 60)
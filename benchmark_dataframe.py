@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# benchmark_dataframe.py - Comparar montagem de tabelas por linha vs colunar
+import random
+import sys
+import time
+
+import pandas as pd
+
+from colunar_rpg import dataframe_de_registros
+
+print("⏱️  Benchmark: resultados da API -> DataFrame")
+print("=" * 60)
+
+N_LINHAS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+REPETICOES = 20
+
+tipos = ["Arma", "Armadura", "Acessório", "Consumível", "Livro", "Componente Arcano"]
+raridades = ["Comum", "Incomum", "Raro", "Muito Raro", "Lendário", "Artefato"]
+
+# Simular a resposta de /filtrar com N_LINHAS itens
+random.seed(42)
+itens = [
+    {
+        'id': str(i),
+        'nome': f"Item {i}",
+        'tipo': random.choice(tipos),
+        'raridade': random.choice(raridades),
+        'valor': random.randint(10, 999999),
+        'nivel_requerido': random.randint(1, 20),
+        'peso': random.randint(1, 50)
+    }
+    for i in range(N_LINHAS)
+]
+
+colunas = [
+    ('id', 'ID'), ('nome', 'Nome'), ('tipo', 'Tipo'), ('raridade', 'Raridade'),
+    ('valor', 'Valor (PO)'), ('nivel_requerido', 'Nível'), ('peso', 'Peso')
+]
+
+
+def por_linha():
+    """Montagem original: lista de dicts por linha + pd.DataFrame"""
+    df_data = []
+    for item in itens:
+        df_data.append({
+            'ID': item['id'],
+            'Nome': item['nome'],
+            'Tipo': item['tipo'],
+            'Raridade': item['raridade'],
+            'Valor (PO)': item['valor'],
+            'Nível': item.get('nivel_requerido', 0),
+            'Peso': item.get('peso', 0)
+        })
+    return pd.DataFrame(df_data)
+
+
+def colunar():
+    """Montagem colunar com dtypes declarados"""
+    return dataframe_de_registros(itens, colunas)
+
+
+def medir(funcao):
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        df = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return tempos[len(tempos) // 2] * 1000, df
+
+
+print(f"📦 {N_LINHAS:,} linhas, mediana de {REPETICOES} execuções\n")
+
+for nome, funcao in [("Por linha (dicts)", por_linha), ("Colunar (dtypes)", colunar)]:
+    mediana_ms, df = medir(funcao)
+    memoria_kb = df.memory_usage(deep=True).sum() / 1024
+    print(f"   {nome:<20} {mediana_ms:8.2f} ms   {memoria_kb:10,.0f} KB")
+
+print("\n" + "=" * 60)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# benchmark_index_sort.py - Latência do top-10 com e sem index.sort
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+from indices_rpg import corpo_do_indice
+
+parser = argparse.ArgumentParser(description="Top-10 por valor com e sem ordenação de índice")
+parser.add_argument("--docs", type=int, default=5_000_000, help="Documentos por índice")
+parser.add_argument("--repeticoes", type=int, default=50, help="Consultas por cenário")
+parser.add_argument("--manter", action="store_true", help="Não apagar os índices de benchmark no final")
+args = parser.parse_args()
+
+print("⏱️  Benchmark: index.sort + track_total_hits")
+print("=" * 60)
+
+es = Elasticsearch("http://localhost:9200", request_timeout=600)
+
+if not es.ping():
+    print("❌ Elasticsearch não está rodando!")
+    print("Execute: docker-compose up -d")
+    sys.exit(1)
+
+INDICES = {
+    "bench_itens_ordenado": True,
+    "bench_itens_sem_ordem": False
+}
+
+tipos = ["Arma", "Armadura", "Acessório", "Consumível", "Livro", "Componente Arcano"]
+raridades = ["Comum", "Incomum", "Raro", "Muito Raro", "Lendário", "Artefato"]
+
+# ============================================================
+# CRIAR E POPULAR OS ÍNDICES
+# ============================================================
+
+def gerar_acoes(indice, total):
+    """Documentos mínimos de item (mesma distribuição para os dois índices)"""
+    rng = random.Random(42)
+    for i in range(total):
+        yield {
+            "_index": indice,
+            "_id": str(i),
+            "_source": {
+                "nome": f"Item {i}",
+                "tipo": rng.choice(tipos),
+                "raridade": rng.choice(raridades),
+                "valor": rng.randint(10, 999999),
+                "nivel_requerido": rng.randint(1, 20)
+            }
+        }
+
+
+for indice, ordenar in INDICES.items():
+    if es.indices.exists(index=indice):
+        es.indices.delete(index=indice)
+
+    corpo = corpo_do_indice("rpg_itens", ordenar=ordenar)
+    corpo["settings"]["refresh_interval"] = "-1"
+    es.indices.create(index=indice, body=corpo)
+
+    print(f"\n📤 Populando '{indice}' com {args.docs:,} documentos...")
+    inicio = time.perf_counter()
+    for ok, info in helpers.parallel_bulk(es, gerar_acoes(indice, args.docs), chunk_size=5000, thread_count=4):
+        if not ok:
+            print(f"⚠️  Falha: {info}")
+    es.indices.put_settings(index=indice, body={"index": {"refresh_interval": "1s"}})
+    es.indices.refresh(index=indice)
+    es.indices.forcemerge(index=indice, max_num_segments=5)
+    print(f"✅ Populado em {time.perf_counter() - inicio:.1f}s")
+
+# ============================================================
+# MEDIR
+# ============================================================
+CENARIOS = [
+    ("total exato", True),
+    ("total limitado (1000)", 1000),
+    ("sem total", False)
+]
+
+
+def medir(indice, track_total_hits, filtro):
+    """Mediana e p95 (ms) do top-10 ordenado por valor"""
+    query = {
+        "query": {"bool": {"filter": filtro}} if filtro else {"match_all": {}},
+        "sort": [{"valor": "desc"}],
+        "size": 10,
+        "track_total_hits": track_total_hits
+    }
+    # Aquecer
+    for _ in range(5):
+        es.search(index=indice, body=query, request_cache=False)
+
+    tooks, latencias = [], []
+    for _ in range(args.repeticoes):
+        inicio = time.perf_counter()
+        resp = es.search(index=indice, body=query, request_cache=False)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        tooks.append(resp["took"])
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95) - 1]
+    return statistics.median(tooks), statistics.median(latencias), p95
+
+
+for nome_filtro, filtro in [("match_all", None), ("tipo=Arma", [{"term": {"tipo": "Arma"}}])]:
+    print(f"\n🔍 Top-10 por valor desc ({nome_filtro}), {args.repeticoes} consultas")
+    print(f"   {'índice':<24} {'cenário':<24} {'took':>8} {'p50':>9} {'p95':>9}")
+    for indice in INDICES:
+        for nome_cenario, track in CENARIOS:
+            took, p50, p95 = medir(indice, track, filtro)
+            print(f"   {indice:<24} {nome_cenario:<24} {took:6.1f}ms {p50:7.1f}ms {p95:7.1f}ms")
+
+if not args.manter:
+    for indice in INDICES:
+        es.indices.delete(index=indice)
+    print("\n🗑️  Índices de benchmark removidos")
+
+print("\n" + "=" * 60)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# benchmark_similares.py - Recall e latência: more_like_this x kNN (HNSW) x força bruta
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+from embeddings_rpg import CAMPO_EMBEDDING, MatrizEmbeddings, com_embedding, embedding_do_item
+
+parser = argparse.ArgumentParser(description="Comparar os modos de /similares")
+parser.add_argument("--amostra", type=int, default=50, help="Itens consultados")
+parser.add_argument("-k", type=int, default=10, help="Vizinhos por consulta")
+parser.add_argument("--num-candidates", type=int, default=100, help="num_candidates do kNN")
+parser.add_argument("--preencher", action="store_true",
+                    help="Gravar o embedding nos itens que ainda não têm (índices antigos)")
+args = parser.parse_args()
+
+print("⏱️  Benchmark: itens similares")
+print("=" * 60)
+
+es = Elasticsearch("http://localhost:9200", request_timeout=120)
+
+if not es.ping():
+    print("❌ Elasticsearch não está rodando!")
+    print("Execute: docker-compose up -d")
+    sys.exit(1)
+
+# ============================================================
+# PREPARAR
+# ============================================================
+if args.preencher:
+    print("\n📤 Preenchendo embeddings...")
+    acoes = (
+        {"_op_type": "index", "_index": "rpg_itens", "_id": hit["_id"], "_source": com_embedding(hit["_source"])}
+        for hit in helpers.scan(es, index="rpg_itens", query={"query": {"match_all": {}}})
+    )
+    sucesso, _ = helpers.bulk(es, acoes, stats_only=True)
+    es.indices.refresh(index="rpg_itens")
+    print(f"✅ {sucesso} itens atualizados")
+
+matriz = MatrizEmbeddings(es)
+matriz.semear()
+ids = list(matriz.posicoes)
+random.Random(42).shuffle(ids)
+amostra = ids[:args.amostra]
+print(f"\n📦 {len(ids)} itens, {len(amostra)} consultas, k={args.k}")
+
+# ============================================================
+# MEDIR
+# ============================================================
+
+def mlt(item_id):
+    query = {
+        "query": {
+            "more_like_this": {
+                "fields": ["nome", "descricao", "tags", "tipo"],
+                "like": [{"_index": "rpg_itens", "_id": item_id}],
+                "min_term_freq": 1,
+                "max_query_terms": 12,
+                "min_doc_freq": 1
+            }
+        },
+        "size": args.k,
+        "_source": False
+    }
+    return [hit["_id"] for hit in es.search(index="rpg_itens", body=query)["hits"]["hits"]]
+
+
+def knn(item_id):
+    fonte = es.get(index="rpg_itens", id=item_id)["_source"]
+    query = {
+        "knn": {
+            "field": CAMPO_EMBEDDING,
+            "query_vector": [float(x) for x in embedding_do_item(fonte)],
+            "k": args.k,
+            "num_candidates": args.num_candidates,
+            "filter": {"bool": {"must_not": {"ids": {"values": [item_id]}}}}
+        },
+        "size": args.k,
+        "_source": False
+    }
+    return [hit["_id"] for hit in es.search(index="rpg_itens", body=query)["hits"]["hits"]]
+
+
+def forca_bruta(item_id):
+    return [doc_id for doc_id, _, _ in matriz.vizinhos(matriz.vetor(item_id), args.k, excluir=item_id)]
+
+
+def medir(funcao):
+    """Resultados por item e latências (ms)"""
+    for item_id in amostra[:5]:
+        funcao(item_id)
+    resultados, latencias = {}, []
+    for item_id in amostra:
+        inicio = time.perf_counter()
+        resultados[item_id] = funcao(item_id)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    latencias.sort()
+    return resultados, latencias
+
+
+def sobreposicao(a, b):
+    """Fração média de b recuperada por a (recall@k quando b é a referência)"""
+    fracoes = [len(set(a[i]) & set(b[i])) / len(b[i]) for i in a if b.get(i)]
+    return statistics.mean(fracoes) if fracoes else 0.0
+
+
+modos = {"more_like_this": mlt, "knn (HNSW)": knn, "força bruta (NumPy)": forca_bruta}
+medidos = {}
+print(f"\n   {'modo':<22} {'p50':>9} {'p95':>9} {'p99':>9}")
+for nome, funcao in modos.items():
+    resultados, latencias = medir(funcao)
+    medidos[nome] = resultados
+    p = lambda q: latencias[min(int(len(latencias) * q), len(latencias) - 1)]
+    print(f"   {nome:<22} {statistics.median(latencias):7.2f}ms {p(0.95):7.2f}ms {p(0.99):7.2f}ms")
+
+print(f"\n🎯 Recall@{args.k} do HNSW frente à força bruta (exata): "
+      f"{sobreposicao(medidos['knn (HNSW)'], medidos['força bruta (NumPy)']):.3f}")
+print(f"🔁 Concordância kNN x more_like_this: "
+      f"{sobreposicao(medidos['knn (HNSW)'], medidos['more_like_this']):.3f}")
+
+print("\n" + "=" * 60)
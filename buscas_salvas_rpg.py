@@ -0,0 +1,97 @@
+# buscas_salvas_rpg.py - Percolação dos itens escritos contra as buscas salvas
+import queue
+import threading
+
+from indices_rpg import garantir_indice
+
+INDICE_BUSCAS = 'rpg_buscas_salvas'
+
+# Documentos percolados por requisição ao ES
+TAMANHO_LOTE = 100
+
+# Itens aguardando percolação antes de começar a descartar
+CAPACIDADE_FILA = 10000
+
+
+class Percolador:
+    """Percola itens criados/atualizados e publica as buscas que batem
+
+    As escritas só enfileiram o documento; uma thread esvazia a fila em
+    lotes e manda todos num único `percolate` com `documents`, então a
+    rota de escrita não espera pelo ES nem por quem está assinando.
+    """
+
+    def __init__(self, es, barramento, indice_itens='rpg_itens'):
+        self.es = es
+        self.barramento = barramento
+        self.indice_itens = indice_itens
+        self.fila = queue.Queue(maxsize=CAPACIDADE_FILA)
+        self.descartados = 0
+        self.percolados = 0
+        self._thread = None
+
+    def garantir_indice(self):
+        garantir_indice(self.es, INDICE_BUSCAS)
+
+    def registrar_escrita(self, indice, doc_id, antigo, novo):
+        """Ouvinte das escritas da API: enfileira itens criados ou atualizados"""
+        if indice != self.indice_itens or novo is None:
+            return
+        try:
+            self.fila.put_nowait((doc_id, novo, 'criado' if antigo is None else 'atualizado'))
+        except queue.Full:
+            self.descartados += 1
+
+    def iniciar(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._laco, name="percolador", daemon=True)
+        self._thread.start()
+
+    def _laco(self):
+        while True:
+            lote = [self.fila.get()]
+            while len(lote) < TAMANHO_LOTE:
+                try:
+                    lote.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.percolar(lote)
+            except Exception as e:
+                print(f"⚠️  Falha ao percolar {len(lote)} itens: {e}")
+
+    def percolar(self, lote):
+        """Um percolate para o lote inteiro; publica um evento por (busca, item)"""
+        query = {
+            "query": {
+                "percolate": {
+                    "field": "query",
+                    "documents": [doc for _, doc, _ in lote]
+                }
+            },
+            "_source": ["nome_busca", "usuario"],
+            "size": 10000
+        }
+        resp = self.es.search(index=INDICE_BUSCAS, body=query)
+        self.percolados += len(lote)
+
+        for hit in resp['hits']['hits']:
+            slots = hit.get('fields', {}).get('_percolator_document_slot', [0])
+            for slot in slots:
+                doc_id, doc, operacao = lote[slot]
+                self.barramento.publicar('busca_salva', {
+                    'busca_id': hit['_id'],
+                    'nome_busca': hit['_source'].get('nome_busca'),
+                    'usuario': hit['_source'].get('usuario'),
+                    'operacao': operacao,
+                    'item_id': doc_id,
+                    'item': doc
+                })
+
+    def estatisticas(self):
+        return {
+            'pendentes': self.fila.qsize(),
+            'percolados': self.percolados,
+            'descartados': self.descartados
+        }
@@ -0,0 +1,64 @@
+# cache_rpg.py - Cache em memória com expiração (TTL) para respostas da API
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheTTL:
+    """Cache LRU com expiração por entrada e contadores de acerto/erro
+
+    As chaves são tuplas cujo primeiro elemento é o índice consultado,
+    o que permite invalidar tudo de um índice após uma escrita.
+    """
+
+    def __init__(self, nome, ttl_segundos=30, max_entradas=1024):
+        self.nome = nome
+        self.ttl = ttl_segundos
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.erros = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        """Valor em cache ou None se ausente/expirado"""
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None or entrada[0] < agora:
+                if entrada is not None:
+                    del self._dados[chave]
+                self.erros += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.acertos += 1
+            return entrada[1]
+
+    def guardar(self, chave, valor):
+        """Guardar valor com o TTL padrão do cache"""
+        with self._lock:
+            self._dados[chave] = (time.monotonic() + self.ttl, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+
+    def invalidar(self, indice=None):
+        """Remover as entradas de um índice (ou todas)"""
+        with self._lock:
+            if indice is None:
+                self._dados.clear()
+                return
+            for chave in [c for c in self._dados if c[0] == indice]:
+                del self._dados[chave]
+
+    def estatisticas(self):
+        """Acertos, erros e tamanho atual"""
+        with self._lock:
+            total = self.acertos + self.erros
+            return {
+                'cache': self.nome,
+                'entradas': len(self._dados),
+                'acertos': self.acertos,
+                'erros': self.erros,
+                'taxa_acerto': round(self.acertos / total, 4) if total else 0.0
+            }
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# captura_rpg.py - Captura amostrada das requisições da API (JSONL com rotação) e replay com diff de latência
+import argparse
+import glob
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Requisições capturadas esperando a thread de escrita; cheia, a captura descarta
+CAPACIDADE_PADRAO = 10000
+
+# O arquivo roda ao passar deste tamanho, mantendo ARQUIVOS_PADRAO anteriores
+TAMANHO_MAX_PADRAO = 64 * 1024 * 1024
+ARQUIVOS_PADRAO = 5
+
+# Corpos maiores que isto não são guardados (o registro marca corpo_omitido)
+MAX_CORPO_PADRAO = 64 * 1024
+
+# Métodos/rotas que alteram dados (o replay pode pular com --sem-escritas)
+METODOS_ESCRITA = {'PUT', 'DELETE', 'PATCH'}
+SUFIXOS_ESCRITA = ('/criar', '/bulk')
+ROTAS_ESCRITA = {'/buscas_salvas'}
+
+
+def eh_escrita(registro):
+    if registro['metodo'] in METODOS_ESCRITA:
+        return True
+    return registro['metodo'] == 'POST' and (registro['caminho'].endswith(SUFIXOS_ESCRITA)
+                                             or registro['caminho'] in ROTAS_ESCRITA)
+
+
+def arquivos_da_captura(caminho):
+    """Arquivos de uma captura em ordem cronológica (rotacionados .N ... .1, depois o atual)"""
+    rotacionados = []
+    for nome in glob.glob(f"{glob.escape(caminho)}.*"):
+        sufixo = nome[len(caminho) + 1:]
+        if sufixo.isdigit():
+            rotacionados.append((int(sufixo), nome))
+    arquivos = [nome for _, nome in sorted(rotacionados, reverse=True)]
+    return arquivos + ([caminho] if os.path.exists(caminho) else [])
+
+
+class CapturaTrafego:
+    """Amostra de requisições gravada em JSONL só-acréscimo, com rotação por tamanho
+
+    Na requisição só se sorteia a amostra e se monta o registro; a
+    gravação fica com uma thread, atrás de uma fila limitada. Com a fila
+    cheia (disco lento) o registro é descartado e contado, então a
+    captura nunca segura a resposta. Cada linha guarda o instante de
+    chegada, método, rota, caminho, query string, corpo JSON, status,
+    duração e tamanho da resposta.
+    """
+
+    NOME_THREAD = 'captura-trafego'
+
+    def __init__(self, arquivo, amostragem=0.0, tamanho_max=TAMANHO_MAX_PADRAO, arquivos=ARQUIVOS_PADRAO,
+                 capacidade=CAPACIDADE_PADRAO, max_corpo=MAX_CORPO_PADRAO):
+        self.arquivo = arquivo
+        self.amostragem = amostragem
+        self.tamanho_max = tamanho_max
+        self.arquivos = arquivos
+        self.max_corpo = max_corpo
+        self.fila = queue.Queue(maxsize=capacidade)
+        self._aleatorio = random.Random()
+        self._thread = None
+        self._saida = None
+        self._tamanho = 0
+        self.metricas = {'amostradas': 0, 'gravadas': 0, 'descartadas': 0, 'rotacoes': 0, 'bytes': 0}
+
+    @property
+    def ativa(self):
+        return self.amostragem > 0
+
+    def sortear(self):
+        """True se a requisição atual entra na amostra"""
+        return self.ativa and (self.amostragem >= 1 or self._aleatorio.random() < self.amostragem)
+
+    def registrar(self, registro):
+        """Enfileirar um registro pronto; descarta sem bloquear se a fila está cheia"""
+        self.metricas['amostradas'] += 1
+        try:
+            self.fila.put_nowait(registro)
+        except queue.Full:
+            self.metricas['descartadas'] += 1
+
+    # --------------------------------------------------------
+    # Gravação e rotação
+    # --------------------------------------------------------
+    def iniciar(self):
+        if self._thread is not None or not self.ativa:
+            return
+        self._abrir()
+        self._thread = threading.Thread(target=self._laco, name=self.NOME_THREAD, daemon=True)
+        self._thread.start()
+
+    def _abrir(self):
+        self._saida = open(self.arquivo, 'a', encoding='utf-8')
+        self._tamanho = self._saida.tell()
+
+    def _rotacionar(self):
+        self._saida.close()
+        for n in range(self.arquivos - 1, 0, -1):
+            if os.path.exists(f"{self.arquivo}.{n}"):
+                os.replace(f"{self.arquivo}.{n}", f"{self.arquivo}.{n + 1}")
+        if self.arquivos > 0:
+            os.replace(self.arquivo, f"{self.arquivo}.1")
+        else:
+            os.remove(self.arquivo)
+        self.metricas['rotacoes'] += 1
+        self._abrir()
+
+    def _preparar(self, registro):
+        """Último ajuste do registro antes de gravar, já na thread de escrita"""
+        return registro
+
+    def _laco(self):
+        while True:
+            registros = [self.fila.get()]
+            # Esvazia o que já chegou numa única escrita
+            while len(registros) < 1000:
+                try:
+                    registros.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            for registro in registros:
+                linha = json.dumps(self._preparar(registro), ensure_ascii=False, default=str) + "\n"
+                tamanho = len(linha.encode('utf-8'))
+                if self._tamanho and self._tamanho + tamanho > self.tamanho_max:
+                    self._rotacionar()
+                self._saida.write(linha)
+                self._tamanho += tamanho
+                self.metricas['bytes'] += tamanho
+            self._saida.flush()
+            self.metricas['gravadas'] += len(registros)
+
+    def fechar(self, timeout=2.0):
+        """Gravar o que resta na fila (atexit)"""
+        limite = time.monotonic() + timeout
+        while not self.fila.empty() and time.monotonic() < limite:
+            time.sleep(0.01)
+        if self._saida is not None:
+            self._saida.flush()
+
+    def estatisticas(self):
+        return {
+            'arquivo': self.arquivo,
+            'amostragem': self.amostragem,
+            'pendentes': self.fila.qsize(),
+            **self.metricas
+        }
+
+# ============================================================
+# REPLAY
+# ============================================================
+
+def ler_captura(caminhos, sem_escritas=False, rotas=None, limite=None):
+    """Registros das capturas em ordem de chegada"""
+    registros = []
+    for caminho in caminhos:
+        for arquivo in arquivos_da_captura(caminho) or [caminho]:
+            with open(arquivo, encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        # Última linha truncada por uma queda no meio da escrita
+                        continue
+                    if registro.get('corpo_omitido') or (sem_escritas and eh_escrita(registro)):
+                        continue
+                    if rotas and registro['rota'] not in rotas:
+                        continue
+                    registros.append(registro)
+    registros.sort(key=lambda r: r['ts'])
+    return registros[:limite] if limite else registros
+
+
+def reproduzir(cliente, registros, velocidade, concorrencia):
+    """Reenviar os registros mantendo os intervalos entre chegadas (divididos pela velocidade)
+
+    velocidade 0 = o mais rápido possível, com `concorrencia` requisições
+    em voo. Devolve, por registro, (status, latência em µs, atraso do envio
+    em µs) na ordem de entrada.
+    """
+    resultados = [None] * len(registros)
+
+    def enviar(i, previsto):
+        registro = registros[i]
+        caminho = registro['caminho'] + (f"?{registro['query']}" if registro.get('query') else '')
+        inicio = time.perf_counter()
+        try:
+            status, _, _ = cliente.requisitar(registro['metodo'], caminho, registro.get('corpo'))
+        except Exception:
+            status = 0
+        fim = time.perf_counter()
+        resultados[i] = (status, (fim - inicio) * 1_000_000,
+                         max(inicio - previsto, 0) * 1_000_000 if previsto is not None else 0)
+
+    # Com intervalos preservados, o pool precisa comportar os picos da captura
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        inicio = time.perf_counter()
+        primeiro = registros[0]['ts'] if registros else 0
+        for i, registro in enumerate(registros):
+            previsto = None
+            if velocidade:
+                previsto = inicio + (registro['ts'] - primeiro) / velocidade
+                espera = previsto - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+            pool.submit(enviar, i, previsto)
+    return resultados, time.perf_counter() - inicio
+
+
+def resumir(registros, resultados, decorrido):
+    """Histogramas por rota: latência capturada x reproduzida, atraso do envio e status divergentes"""
+    from benchmark_api import Histograma
+
+    rotas = {}
+    for registro, (status, latencia_us, atraso_us) in zip(registros, resultados):
+        for nome in (registro['rota'], 'TOTAL'):
+            rota = rotas.setdefault(nome, {'capturada': Histograma(), 'reproduzida': Histograma(),
+                                           'atraso': Histograma(), 'divergentes': 0, 'erros': 0})
+            rota['capturada'].registrar(registro['duracao_ms'] * 1000)
+            rota['reproduzida'].registrar(latencia_us)
+            rota['atraso'].registrar(atraso_us)
+            rota['divergentes'] += status != registro['status']
+            rota['erros'] += status == 0 or status >= 500
+    return {
+        nome: {
+            'requisicoes': rota['reproduzida'].total,
+            'throughput_rps': round(rota['reproduzida'].total / decorrido, 2) if decorrido else None,
+            'status_divergentes': rota['divergentes'],
+            'erros': rota['erros'],
+            'capturada_ms': rota['capturada'].resumo(),
+            'reproduzida_ms': rota['reproduzida'].resumo(),
+            'atraso_envio_ms': rota['atraso'].resumo(),
+            'histograma_reproduzida': rota['reproduzida'].para_dict()
+        }
+        for nome, rota in rotas.items()
+    }
+
+
+def variacao(novo, velho):
+    return f"{(novo - velho) / velho * 100:+.1f}%" if novo is not None and velho else "-"
+
+
+def imprimir(rotas, referencia, rotulo):
+    """p50/p99 reproduzidos frente à referência (a captura ou um replay anterior)"""
+    print(f"\n   {'rota':<34} {'n':>6} {'p50':>8} {f'Δ {rotulo}':>12} {'p99':>8} {f'Δ {rotulo}':>12} "
+          f"{'status≠':>8}")
+    ordem = sorted((n for n in rotas if n != 'TOTAL'), key=lambda n: -rotas[n]['requisicoes']) + ['TOTAL']
+    for nome in ordem:
+        rota = rotas[nome]
+        base = referencia(nome)
+        p50, p99 = rota['reproduzida_ms']['p50'], rota['reproduzida_ms']['p99']
+        print(f"   {nome:<34} {rota['requisicoes']:>6} {p50:>8.2f} "
+              f"{variacao(p50, base and base['p50']):>12} {p99:>8.2f} {variacao(p99, base and base['p99']):>12} "
+              f"{rota['status_divergentes']:>8}")
+    total = rotas['TOTAL']
+    print(f"   (ms; atraso de envio p99 {total['atraso_envio_ms']['p99']:.2f}ms — se alto, aumente -c)")
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+if __name__ == "__main__":
+    from benchmark_api import ClienteHttp, ClienteLocal, commit_atual
+
+    parser = argparse.ArgumentParser(description="Reproduzir tráfego capturado pela API e comparar latências")
+    parser.add_argument("capturas", nargs="+",
+                        help="Arquivos de captura (RPG_CAPTURA_ARQUIVO; os rotacionados .N entram juntos)")
+    parser.add_argument("--url", default=None, help="API alvo (sem isso, importa a API no processo)")
+    parser.add_argument("--backend", choices=["elasticsearch", "local"], default=None,
+                        help="Backend da API em processo (padrão: RPG_ES_BACKEND)")
+    parser.add_argument("--velocidade", type=float, default=1.0,
+                        help="1 = tempo real, N = N vezes mais rápido, 0 = o mais rápido possível")
+    parser.add_argument("-c", "--concorrencia", type=int, default=32, help="Requisições simultâneas no máximo")
+    parser.add_argument("--sem-escritas", action="store_true", help="Pular criações, atualizações e remoções")
+    parser.add_argument("--rotas", nargs="*", default=None, help="Só estas rotas (ex.: /buscar /itens/<item_id>)")
+    parser.add_argument("-n", "--limite", type=int, default=None, help="Só as primeiras N requisições")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON (padrão: replay_<commit>_<data>.json)")
+    parser.add_argument("--base", default=None, help="JSON de um replay anterior para comparar (em vez da captura)")
+    args = parser.parse_args()
+
+    print("🔁 Replay de tráfego capturado")
+    print("=" * 60)
+
+    registros = ler_captura(args.capturas, args.sem_escritas, set(args.rotas or []), args.limite)
+    if not registros:
+        print("❌ Nenhuma requisição nas capturas")
+        sys.exit(1)
+    duracao = registros[-1]['ts'] - registros[0]['ts']
+    print(f"📦 {len(registros)} requisições em {duracao:.1f}s de captura "
+          f"({len({r['rota'] for r in registros})} rotas)")
+
+    if args.url:
+        cliente = ClienteHttp(args.url)
+    else:
+        if args.backend:
+            os.environ['RPG_ES_BACKEND'] = args.backend
+        cliente = ClienteLocal()
+
+    modo = f"{args.velocidade:g}×" if args.velocidade else "o mais rápido possível"
+    print(f"▶️  Reproduzindo a {modo} com até {args.concorrencia} em voo...")
+    resultados, decorrido = reproduzir(cliente, registros, args.velocidade, args.concorrencia)
+    rotas = resumir(registros, resultados, decorrido)
+    print(f"✅ {len(registros)} requisições em {decorrido:.1f}s ({len(registros) / decorrido:.1f} req/s)")
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        print(f"\n📊 Frente ao replay {base.get('commit')} ({base.get('data')})")
+        imprimir(rotas, lambda nome: base['rotas'].get(nome, {}).get('reproduzida_ms'), 'base')
+    else:
+        print("\n📊 Frente às latências capturadas")
+        imprimir(rotas, lambda nome: rotas[nome]['capturada_ms'], 'captura')
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec='seconds'),
+        "capturas": args.capturas,
+        "alvo": args.url or os.environ.get('RPG_ES_BACKEND', 'elasticsearch'),
+        "configuracao": {"velocidade": args.velocidade, "concorrencia": args.concorrencia,
+                         "sem_escritas": args.sem_escritas, "rotas": args.rotas, "limite": args.limite},
+        "decorrido_s": round(decorrido, 3),
+        "rotas": rotas
+    }
+    saida = args.saida or f"replay_{resultado['commit'] or 'sem-git'}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultado em {saida}")
+    print("\n" + "=" * 60)
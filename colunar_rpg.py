@@ -0,0 +1,191 @@
+# colunar_rpg.py - Montagem colunar de tabelas (resultados da API -> DataFrame)
+import json
+
+import pandas as pd
+import pyarrow as pa
+
+# ============================================================
+# TIPOS DECLARADOS POR CAMPO
+# ============================================================
+# Campos categóricos (poucos valores distintos, muitas repetições)
+CAMPOS_CATEGORICOS = {
+    'tipo', 'raridade', 'classe', 'raca', 'status', 'dificuldade', 'localizacao'
+}
+
+# Campos inteiros (cabem com folga em 32 bits)
+CAMPOS_INTEIROS = {
+    'valor', 'nivel', 'nivel_requerido', 'experiencia', 'vida', 'mana',
+    'forca', 'destreza', 'constituicao', 'inteligencia', 'sabedoria', 'carisma',
+    'recompensa_ouro', 'recompensa_experiencia', 'nivel_minimo', 'nivel_maximo',
+    'tempo_limite_dias', 'posicao'
+}
+
+# Campos decimais (peso aceita frações em /itens/criar)
+CAMPOS_DECIMAIS = {'score', 'taxa_conclusao_pct', 'peso'}
+
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def dtype_do_campo(campo):
+    """Dtype declarado para um campo da API (Int32 é o inteiro anulável do pandas)"""
+    if campo in CAMPOS_CATEGORICOS:
+        return 'category'
+    if campo in CAMPOS_INTEIROS:
+        return 'Int32'
+    if campo in CAMPOS_DECIMAIS:
+        return 'float64'
+    return None
+
+
+def coluna_numerica(valores, dtype):
+    """Series Int32 (anulável) ou float64 com os valores; o que não cabe no tipo vira nulo
+
+    Ausentes e não numéricos viram nulos; em Int32 também os fracionários
+    e os fora da faixa, em vez de truncar ou derrubar a tabela toda.
+    Usada pelo DataFrame e pelo Arrow, para os dois darem o mesmo resultado.
+    """
+    serie = pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce')
+    if dtype == 'Int32':
+        serie = serie.where((serie % 1 == 0) & serie.between(INT32_MIN, INT32_MAX))
+    return serie.astype(dtype)
+
+# ============================================================
+# ADAPTADOR RESULTADOS -> DATAFRAME
+# ============================================================
+
+def montar_coluna(valores, campo, padrao_texto='-'):
+    """Converter uma lista de valores em Series com o dtype declarado"""
+    dtype = dtype_do_campo(campo)
+    if dtype in ('Int32', 'float64'):
+        return coluna_numerica(valores, dtype)
+    valores = [padrao_texto if v is None else v for v in valores]
+    return pd.Series(valores, dtype=dtype)
+
+
+def dataframe_de_registros(registros, colunas, padrao_texto='-'):
+    """Montar DataFrame coluna a coluna a partir de registros da API
+
+    `colunas` é uma lista de pares (campo_da_api, titulo_exibido). Cada
+    coluna é extraída uma única vez e já nasce com o dtype final
+    (category para tipo/raridade/classe, Int32 para valor/nivel...),
+    evitando a lista intermediária de dicts por linha.
+    """
+    dados = {}
+    for campo, titulo in colunas:
+        valores = [r.get(campo) for r in registros]
+        dados[titulo] = montar_coluna(valores, campo, padrao_texto)
+    return pd.DataFrame(dados)
+
+
+def dataframe_de_colunas(colunas, especificacao, padrao_texto='-'):
+    """Montar DataFrame a partir de uma resposta colunar da API
+
+    `colunas` é o dict campo -> lista devolvido com formato colunar;
+    `especificacao` segue o mesmo formato de `dataframe_de_registros`.
+    """
+    dados = {}
+    for campo, titulo in especificacao:
+        valores = colunas.get(campo)
+        if valores is None:
+            valores = [None] * len(next(iter(colunas.values()), []))
+        dados[titulo] = montar_coluna(valores, campo, padrao_texto)
+    return pd.DataFrame(dados)
+
+# ============================================================
+# RESPOSTAS COLUNARES DA API (JSON colunar e Arrow)
+# ============================================================
+MIME_ARROW = 'application/vnd.apache.arrow.stream'
+MIME_COLUNAR = 'application/vnd.rpg.colunar+json'
+
+# Campos completos de cada índice (usados pelas listagens)
+CAMPOS_ITENS = [
+    'nome', 'descricao', 'tipo', 'raridade', 'valor', 'peso', 'nivel_requerido',
+    'atributos_bonus.forca', 'atributos_bonus.destreza', 'tags', 'data_criacao'
+]
+CAMPOS_PERSONAGENS = [
+    'nome', 'descricao', 'classe', 'raca', 'nivel', 'experiencia', 'vida', 'mana',
+    'forca', 'destreza', 'constituicao', 'inteligencia', 'sabedoria', 'carisma',
+    'status', 'data_criacao', 'ultima_atualizacao'
+]
+CAMPOS_MISSOES = [
+    'titulo', 'descricao', 'objetivo', 'recompensa_ouro', 'recompensa_experiencia',
+    'nivel_minimo', 'nivel_maximo', 'dificuldade', 'tipo', 'localizacao', 'status',
+    'npc_ofertante', 'tempo_limite_dias', 'numero_aceitacoes', 'numero_conclusoes',
+    'taxa_conclusao_pct', 'data_criacao', 'repeticao_permitida'
+]
+
+
+def valor_do_campo(source, campo):
+    """Ler um campo do _source, aceitando caminhos com ponto (atributos_bonus.forca)"""
+    if '.' not in campo:
+        return source.get(campo)
+    valor = source
+    for parte in campo.split('.'):
+        if not isinstance(valor, dict):
+            return None
+        valor = valor.get(parte)
+    return valor
+
+
+def colunas_de_hits(hits, campos, com_score=False, padroes=None):
+    """Extrair colunas diretamente dos hits do Elasticsearch
+
+    `padroes` dá o valor de um campo ausente do _source, o mesmo
+    `.get(campo, padrao)` da resposta JSON da rota (null continua nulo).
+    """
+    padroes = padroes or {}
+    colunas = {'id': [hit['_id'] for hit in hits]}
+    if com_score:
+        colunas['score'] = [hit['_score'] for hit in hits]
+    for campo in campos:
+        if campo in padroes:
+            colunas[campo] = [hit['_source'].get(campo, padroes[campo]) for hit in hits]
+        else:
+            colunas[campo] = [valor_do_campo(hit['_source'], campo) for hit in hits]
+    return colunas
+
+
+def corpo_colunar(colunas, extras):
+    """Corpo JSON colunar: metadados da resposta + dict campo -> lista"""
+    return {
+        **extras,
+        'n_linhas': len(colunas['id']),
+        'colunas': colunas
+    }
+
+
+def tabela_arrow(colunas):
+    """Montar uma tabela Arrow com os tipos declarados de cada campo"""
+    arrays = {}
+    for campo, valores in colunas.items():
+        dtype = dtype_do_campo(campo.split('.')[-1])
+        if dtype == 'category':
+            arrays[campo] = pa.array(valores, type=pa.string()).dictionary_encode()
+        elif dtype in ('Int32', 'float64'):
+            arrays[campo] = pa.Array.from_pandas(coluna_numerica(valores, dtype))
+        else:
+            arrays[campo] = pa.array(valores)
+    return pa.table(arrays)
+
+
+def serializar_arrow(colunas, extras):
+    """Serializar colunas no formato Arrow IPC (stream)
+
+    Os metadados da resposta (total, filtros...) vão como JSON na chave
+    `rpg` dos metadados do schema.
+    """
+    tabela = tabela_arrow(colunas)
+    tabela = tabela.replace_schema_metadata({'rpg': json.dumps(extras, default=str)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabela.schema) as writer:
+        writer.write_table(tabela)
+    return sink.getvalue().to_pybytes()
+
+
+def dataframe_de_arrow(conteudo):
+    """Ler uma resposta Arrow da API: devolve (DataFrame, metadados)"""
+    tabela = pa.ipc.open_stream(conteudo).read_all()
+    metadados = json.loads((tabela.schema.metadata or {}).get(b'rpg', b'{}'))
+    # int32 com nulos volta como Int32 (sem isso o pandas converte para float64)
+    return tabela.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get), metadados
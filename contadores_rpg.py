@@ -0,0 +1,440 @@
+# contadores_rpg.py - Contadores incrementais dos dashboards
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# ============================================================
+# DEFINIÇÃO DOS CONTADORES POR ÍNDICE
+# ============================================================
+FAIXAS_VALOR = [
+    {"to": 100, "key": "0-100 (Muito Barato)"},
+    {"from": 100, "to": 1000, "key": "100-1000 (Barato)"},
+    {"from": 1000, "to": 10000, "key": "1k-10k (Médio)"},
+    {"from": 10000, "to": 100000, "key": "10k-100k (Caro)"},
+    {"from": 100000, "key": "100k+ (Muito Caro)"}
+]
+
+DEFINICOES = {
+    'rpg_itens': {
+        'termos': ['tipo', 'raridade'],
+        'estatisticas': ['valor', 'nivel_requerido'],
+        'faixas': {'valor': FAIXAS_VALOR},
+        'histogramas': {'valor': 10000},
+        'top': {'campo': 'valor', 'tamanho': 20, 'exibir': 5, 'campos': ['nome', 'tipo', 'raridade', 'valor']}
+    },
+    'rpg_personagens': {
+        'termos': ['classe', 'raca', 'status'],
+        'estatisticas': ['nivel', 'experiencia']
+    },
+    'rpg_missoes': {
+        'termos': ['dificuldade', 'tipo'],
+        'estatisticas': ['recompensa_ouro', 'recompensa_experiencia', 'taxa_conclusao_pct']
+    }
+}
+
+# Tamanho máximo dos terms na semeadura (bem acima das categorias reais)
+MAX_TERMOS = 1000
+
+
+def numero(valor):
+    """Valor numérico do documento (ou None se ausente/inválido)"""
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return None
+    return valor
+
+
+def chave_faixa(faixas, valor):
+    """Chave da faixa (range agg) que contém o valor"""
+    for faixa in faixas:
+        if 'from' in faixa and valor < faixa['from']:
+            continue
+        if 'to' in faixa and valor >= faixa['to']:
+            continue
+        return faixa['key']
+    return None
+
+# ============================================================
+# CONTADORES DE UM ÍNDICE
+# ============================================================
+
+class ContadoresIndice:
+    """Estado agregado de um índice, mantido escrita a escrita
+
+    Termos e faixas são contagens exatas. Nas estatísticas, soma e
+    contagem também são exatas; mínimo e máximo só mudam para pior
+    quando o próprio extremo é removido, e nesse caso o campo fica
+    marcado como "sujo" até a próxima reconciliação com o ES.
+    """
+
+    def __init__(self, indice, definicao):
+        self.indice = indice
+        self.definicao = definicao
+        self.semeado_em = None
+        self.total = 0
+        self.termos = {campo: Counter() for campo in definicao.get('termos', [])}
+        self.estatisticas = {campo: self._stats_vazia() for campo in definicao.get('estatisticas', [])}
+        self.faixas = {campo: Counter() for campo in definicao.get('faixas', {})}
+        self.histogramas = {campo: Counter() for campo in definicao.get('histogramas', {})}
+        self.top = []
+        self.sujos = set()
+
+    @staticmethod
+    def _stats_vazia():
+        return {'count': 0, 'sum': 0, 'min': None, 'max': None}
+
+    # --------------------------------------------------------
+    # Semeadura a partir das agregações do ES
+    # --------------------------------------------------------
+    def campos(self):
+        """Campos dos documentos que entram em algum contador"""
+        definicao = self.definicao
+        campos = list(self.termos) + list(self.estatisticas) + list(self.faixas) + list(self.histogramas)
+        if definicao.get('top'):
+            campos += [definicao['top']['campo']] + definicao['top']['campos']
+        return sorted(set(campos))
+
+    def resumo(self, doc):
+        """Só os campos contados de um documento (None para documento ausente)"""
+        if doc is None:
+            return None
+        return {campo: doc.get(campo) for campo in self.campos()}
+
+    def query_semeadura(self, conferir=()):
+        """Agregações que reconstroem todo o estado do índice
+
+        Os ids em `conferir` voltam como hits (post_filter não muda as
+        agregações): mostram o estado de cada um no mesmo retrato.
+        """
+        aggs = {"total": {"filter": {"match_all": {}}}}
+        for campo in self.termos:
+            aggs[f"termos_{campo}"] = {"terms": {"field": campo, "size": MAX_TERMOS}}
+        for campo in self.estatisticas:
+            aggs[f"stats_{campo}"] = {"stats": {"field": campo}}
+        for campo, faixas in self.definicao.get('faixas', {}).items():
+            aggs[f"faixas_{campo}"] = {"range": {"field": campo, "ranges": faixas}}
+        for campo, intervalo in self.definicao.get('histogramas', {}).items():
+            aggs[f"hist_{campo}"] = {"histogram": {"field": campo, "interval": intervalo, "min_doc_count": 1}}
+        top = self.definicao.get('top')
+        if top:
+            aggs["top"] = {
+                "top_hits": {
+                    "size": top['tamanho'],
+                    "sort": [{top['campo']: "desc"}],
+                    "_source": top['campos']
+                }
+            }
+        if not conferir:
+            return {"size": 0, "track_total_hits": False, "aggs": aggs}
+        return {
+            "size": len(conferir),
+            "track_total_hits": False,
+            "_source": self.campos(),
+            "post_filter": {"ids": {"values": sorted(conferir)}},
+            "aggs": aggs
+        }
+
+    def carregar_agregacoes(self, resp):
+        """Substituir o estado pelo resultado de query_semeadura()"""
+        aggs = resp['aggregations']
+        self.total = aggs['total']['doc_count']
+        for campo in self.termos:
+            self.termos[campo] = Counter({b['key']: b['doc_count'] for b in aggs[f"termos_{campo}"]['buckets']})
+        for campo in self.estatisticas:
+            stats = aggs[f"stats_{campo}"]
+            self.estatisticas[campo] = {
+                'count': stats['count'],
+                'sum': stats['sum'] or 0,
+                'min': stats['min'],
+                'max': stats['max']
+            }
+        for campo in self.faixas:
+            self.faixas[campo] = Counter({b['key']: b['doc_count'] for b in aggs[f"faixas_{campo}"]['buckets']})
+        for campo in self.histogramas:
+            self.histogramas[campo] = Counter({b['key']: b['doc_count'] for b in aggs[f"hist_{campo}"]['buckets']})
+        if 'top' in aggs:
+            self.top = [(hit['_id'], hit['_source']) for hit in aggs['top']['hits']['hits']]
+        self.sujos = set()
+        self.semeado_em = time.time()
+
+    # --------------------------------------------------------
+    # Atualização incremental
+    # --------------------------------------------------------
+    def aplicar(self, doc_id, antigo, novo):
+        """Aplicar uma escrita: criação (antigo=None), remoção (novo=None) ou atualização"""
+        # O top guardado é sempre um prefixo correto do ranking; se ele
+        # contém todos os documentos, qualquer novo valor entra nele
+        top_completo = len(self.top) >= self.total
+
+        if antigo is not None:
+            self._somar(antigo, -1)
+            self.top = [par for par in self.top if par[0] != doc_id]
+        if novo is not None:
+            self._somar(novo, +1)
+            self._inserir_top(doc_id, novo, top_completo)
+        if antigo is None and novo is not None:
+            self.total += 1
+        elif antigo is not None and novo is None:
+            self.total -= 1
+
+        top = self.definicao.get('top')
+        if top and len(self.top) < min(top['exibir'], self.total):
+            # Saíram documentos do top e os próximos da fila são desconhecidos
+            self.sujos.add('top')
+
+    def _somar(self, doc, sinal):
+        for campo, contagem in self.termos.items():
+            valor = doc.get(campo)
+            if valor is None:
+                continue
+            for termo in (valor if isinstance(valor, list) else [valor]):
+                contagem[termo] += sinal
+                if contagem[termo] <= 0:
+                    del contagem[termo]
+
+        for campo, stats in self.estatisticas.items():
+            valor = numero(doc.get(campo))
+            if valor is None:
+                continue
+            stats['count'] += sinal
+            stats['sum'] += sinal * valor
+            if sinal > 0:
+                stats['min'] = valor if stats['min'] is None else min(stats['min'], valor)
+                stats['max'] = valor if stats['max'] is None else max(stats['max'], valor)
+            elif stats['count'] == 0:
+                stats['min'] = stats['max'] = None
+            elif valor in (stats['min'], stats['max']):
+                self.sujos.add(campo)
+
+        for campo, contagem in self.faixas.items():
+            valor = numero(doc.get(campo))
+            if valor is None:
+                continue
+            chave = chave_faixa(self.definicao['faixas'][campo], valor)
+            contagem[chave] += sinal
+
+        for campo, contagem in self.histogramas.items():
+            valor = numero(doc.get(campo))
+            if valor is None:
+                continue
+            intervalo = self.definicao['histogramas'][campo]
+            chave = float((valor // intervalo) * intervalo)
+            contagem[chave] += sinal
+            if contagem[chave] <= 0:
+                del contagem[chave]
+
+    def _inserir_top(self, doc_id, doc, top_completo):
+        top = self.definicao.get('top')
+        if not top:
+            return
+        valor = numero(doc.get(top['campo']))
+        if valor is None:
+            return
+        if not top_completo and self.top and valor < (self.top[-1][1].get(top['campo']) or 0):
+            # Abaixo do último conhecido: a posição real é desconhecida
+            return
+        resumo = {campo: doc.get(campo) for campo in top['campos']}
+        self.top.append((doc_id, resumo))
+        self.top.sort(key=lambda par: par[1].get(top['campo']) or 0, reverse=True)
+        del self.top[top['tamanho']:]
+
+    # --------------------------------------------------------
+    # Leitura
+    # --------------------------------------------------------
+    def snapshot(self):
+        """Cópia do estado atual (termos ordenados por contagem, como no ES)"""
+        estatisticas = {}
+        for campo, stats in self.estatisticas.items():
+            estatisticas[campo] = {
+                **stats,
+                'avg': stats['sum'] / stats['count'] if stats['count'] else None
+            }
+        return {
+            'indice': self.indice,
+            'total': self.total,
+            'termos': {campo: contagem.most_common() for campo, contagem in self.termos.items()},
+            'estatisticas': estatisticas,
+            'faixas': {
+                campo: [(f['key'], self.faixas[campo][f['key']]) for f in self.definicao['faixas'][campo]]
+                for campo in self.faixas
+            },
+            'histogramas': {campo: sorted(contagem.items()) for campo, contagem in self.histogramas.items()},
+            'top': [src for _, src in self.top],
+            'semeado_em': self.semeado_em
+        }
+
+    def para_dict(self):
+        """Estado serializável (persistência em disco)"""
+        return {
+            'total': self.total,
+            'termos': {c: dict(v) for c, v in self.termos.items()},
+            'estatisticas': self.estatisticas,
+            'faixas': {c: dict(v) for c, v in self.faixas.items()},
+            'histogramas': {c: list(v.items()) for c, v in self.histogramas.items()},
+            'top': self.top,
+            'sujos': sorted(self.sujos),
+            'semeado_em': self.semeado_em
+        }
+
+    def de_dict(self, dados):
+        """Restaurar o estado salvo por para_dict()"""
+        self.total = dados['total']
+        self.termos = {c: Counter(v) for c, v in dados['termos'].items()}
+        self.estatisticas = dados['estatisticas']
+        self.faixas = {c: Counter(v) for c, v in dados['faixas'].items()}
+        self.histogramas = {c: Counter(dict((float(k), n) for k, n in v)) for c, v in dados['histogramas'].items()}
+        self.top = [tuple(par) for par in dados['top']]
+        self.sujos = set(dados['sujos'])
+        self.semeado_em = dados['semeado_em']
+
+# ============================================================
+# REPOSITÓRIO DE CONTADORES (todos os índices)
+# ============================================================
+
+def escritas_fora_do_retrato(escritas, retrato, resumo):
+    """Escritas que as agregações ainda não contam, na ordem em que foram avisadas
+
+    `retrato` tem o estado (resumido) de cada documento no mesmo retrato
+    das agregações. Para cada id, a última escrita cujo documento novo é
+    esse estado já está contada, junto com as anteriores; sem nenhuma
+    assim, o retrato é anterior a todas e todas são reaplicadas.
+    """
+    contadas = {}
+    for i, (doc_id, _, novo) in enumerate(escritas):
+        if resumo(novo) == retrato.get(doc_id):
+            contadas[doc_id] = i
+    return [escrita for i, escrita in enumerate(escritas) if i > contadas.get(escrita[0], -1)]
+
+
+class RepositorioContadores:
+    """Contadores de todos os índices, com semeadura, reconciliação e persistência
+
+    A semeadura de um índice é única (quem chega durante ela espera e
+    reaproveita o resultado). Ela pede um refresh antes das agregações
+    (pelo orçamento de refresh, se houver), para que as escritas já
+    avisadas (inclusive a remoção que sujou um extremo) estejam
+    visíveis, e guarda as escritas avisadas durante a semeadura. As
+    avisadas antes de a consulta sair voltam como hits no mesmo retrato
+    das agregações e só são reaplicadas se ainda não estão contadas; as
+    avisadas depois são reaplicadas todas (só estariam no retrato se um
+    refresh acontecesse entre a escrita e a consulta, já em andamento).
+    """
+
+    def __init__(self, es, arquivo=None, intervalo_reconciliacao=300, orcamento=None):
+        self.es = es
+        self.arquivo = arquivo
+        self.intervalo_reconciliacao = intervalo_reconciliacao
+        self.orcamento = orcamento
+        self.indices = {indice: ContadoresIndice(indice, definicao) for indice, definicao in DEFINICOES.items()}
+        self._lock = threading.Lock()
+        self._semeaduras = {indice: threading.Lock() for indice in self.indices}
+        self._durante_semeadura = {}
+        self._thread = None
+
+        if arquivo and os.path.exists(arquivo):
+            self.carregar_arquivo()
+
+    @staticmethod
+    def _precisa_semear(contadores):
+        return contadores.semeado_em is None or bool(contadores.sujos)
+
+    def semear(self, indice, forcar=True):
+        """Reconstruir os contadores de um índice a partir do ES
+
+        Com forcar=False não faz nada se, depois de esperar uma semeadura
+        em andamento, o índice já está semeado e limpo.
+        """
+        contadores = self.indices[indice]
+        with self._semeaduras[indice]:
+            if not forcar and not self._precisa_semear(contadores):
+                return
+            with self._lock:
+                self._durante_semeadura[indice] = []
+            try:
+                self._refresh(indice)
+                with self._lock:
+                    conferidas = len(self._durante_semeadura[indice])
+                    conferir = {doc_id for doc_id, _, _ in self._durante_semeadura[indice]}
+                resp = self.es.search(index=indice, body=contadores.query_semeadura(conferir))
+            except Exception:
+                with self._lock:
+                    del self._durante_semeadura[indice]
+                raise
+            with self._lock:
+                contadores.carregar_agregacoes(resp)
+                retrato = {hit['_id']: contadores.resumo(hit['_source']) for hit in resp['hits']['hits']}
+                escritas = self._durante_semeadura.pop(indice)
+                pendentes = escritas_fora_do_retrato(escritas[:conferidas], retrato, contadores.resumo)
+                for doc_id, antigo, novo in pendentes + escritas[conferidas:]:
+                    contadores.aplicar(doc_id, antigo, novo)
+
+    def _refresh(self, indice):
+        if self.orcamento is None:
+            self.es.indices.refresh(index=indice)
+        else:
+            self.orcamento.refrescar(self.es, indice)
+
+    def registrar_escrita(self, indice, doc_id, antigo, novo):
+        """Ouvinte das escritas da API (criação, atualização e remoção)"""
+        contadores = self.indices.get(indice)
+        if contadores is None:
+            return
+        with self._lock:
+            durante = self._durante_semeadura.get(indice)
+            if durante is not None:
+                # Pode não estar nas agregações em andamento: reaplicada no fim da semeadura
+                durante.append((doc_id, antigo, novo))
+            elif contadores.semeado_em is not None:
+                contadores.aplicar(doc_id, antigo, novo)
+
+    def snapshot(self, indice):
+        """Estado atual do índice; semeia na primeira leitura ou se algo ficou sujo"""
+        contadores = self.indices[indice]
+        if self._precisa_semear(contadores):
+            self.semear(indice, forcar=False)
+        with self._lock:
+            return contadores.snapshot()
+
+    def reconciliar(self):
+        """Re-semear todos os índices (corrige desvios acumulados)"""
+        for indice in self.indices:
+            try:
+                self.semear(indice)
+            except Exception as e:
+                print(f"⚠️  Falha ao reconciliar contadores de '{indice}': {e}")
+        if self.arquivo:
+            self.salvar_arquivo()
+
+    def iniciar_reconciliacao_periodica(self):
+        """Thread daemon que reconcilia a cada `intervalo_reconciliacao` segundos"""
+        if self._thread is not None or not self.intervalo_reconciliacao:
+            return
+
+        def laco():
+            while True:
+                time.sleep(self.intervalo_reconciliacao)
+                self.reconciliar()
+
+        self._thread = threading.Thread(target=laco, name="reconciliacao-contadores", daemon=True)
+        self._thread.start()
+
+    def salvar_arquivo(self):
+        """Persistir os contadores em JSON (escrita atômica)"""
+        with self._lock:
+            dados = {indice: c.para_dict() for indice, c in self.indices.items() if c.semeado_em is not None}
+        temporario = f"{self.arquivo}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(temporario, self.arquivo)
+
+    def carregar_arquivo(self):
+        """Carregar contadores persistidos (serão reconciliados depois)"""
+        try:
+            with open(self.arquivo, encoding='utf-8') as f:
+                dados = json.load(f)
+            for indice, estado in dados.items():
+                if indice in self.indices:
+                    self.indices[indice].de_dict(estado)
+        except Exception as e:
+            print(f"⚠️  Contadores salvos ignorados ({self.arquivo}): {e}")
@@ -0,0 +1,271 @@
+# elegibilidade_rpg.py - Índice de intervalos de nível das missões (personagem <-> missão)
+import bisect
+import threading
+import time
+from collections import Counter
+
+from elasticsearch import helpers
+
+# ============================================================
+# MÉTRICAS DE ORDENAÇÃO
+# ============================================================
+CAMPOS_MISSAO = [
+    'titulo', 'dificuldade', 'tipo', 'localizacao', 'status', 'nivel_minimo', 'nivel_maximo',
+    'recompensa_ouro', 'recompensa_experiencia', 'tempo_limite_dias'
+]
+
+METRICAS = ['ouro_por_dia', 'xp_por_dia']
+
+STATUS_ATIVA = 'Ativa'
+
+
+def resumo_missao(doc):
+    """Campos da missão usados nas respostas, com as recompensas por dia"""
+    resumo = {campo: doc.get(campo) for campo in CAMPOS_MISSAO}
+    dias = doc.get('tempo_limite_dias') or 1
+    resumo['ouro_por_dia'] = round((doc.get('recompensa_ouro') or 0) / dias, 2)
+    resumo['xp_por_dia'] = round((doc.get('recompensa_experiencia') or 0) / dias, 2)
+    return resumo
+
+# ============================================================
+# ÍNDICE DE INTERVALOS
+# ============================================================
+
+class IndiceMissoesPorNivel:
+    """Missões ativas indexadas pela faixa [nivel_minimo, nivel_maximo]
+
+    As extremidades de todas as faixas dividem a reta de níveis em
+    segmentos elementares; cada segmento guarda as missões que o cobrem,
+    já ordenadas por cada métrica. Uma consulta é um bisect para achar o
+    segmento do nível e uma fatia da lista pronta. Cada escrita tira e
+    põe só a faixa da missão (divide um segmento quando surge uma
+    extremidade nova e junta dois quando uma extremidade deixa de ser
+    usada). Os ids das missões fora do status ativo ficam à parte, com o
+    status, para as respostas distinguirem missão inativa de missão
+    inexistente. Semeado e reconciliado como os rankings de personagens.
+    """
+
+    def __init__(self, es, indice='rpg_missoes', intervalo_reconciliacao=300, orcamento=None):
+        self.es = es
+        self.indice = indice
+        self.intervalo_reconciliacao = intervalo_reconciliacao
+        self.orcamento = orcamento
+        self.missoes = {}
+        self.inativas = {}
+        # Quantas faixas usam cada extremidade, extremidades ordenadas e,
+        # por segmento, {métrica: [(-valor, id), ...]} ordenado
+        self.pontos = Counter()
+        self.limites = []
+        self.segmentos = []
+        self.semeado = False
+        self.semeado_em = None
+        self._lock = threading.RLock()
+        self._lock_semeadura = threading.Lock()
+        self._durante_semeadura = None
+        self._thread = None
+
+    # --------------------------------------------------------
+    # Manutenção
+    # --------------------------------------------------------
+    def semear(self, forcar=True):
+        """Remontar o índice a partir de um scan (ativas completas, demais só o status)
+
+        Uma semeadura por vez (forcar=False desiste se outra já semeou).
+        O refresh antes do scan torna visíveis as escritas já avisadas; as
+        avisadas durante o scan são guardadas e reaplicadas no fim.
+        """
+        with self._lock_semeadura:
+            if not forcar and self.semeado:
+                return
+            with self._lock:
+                self._durante_semeadura = []
+            try:
+                self._refresh()
+                missoes, inativas = {}, {}
+                query = {"_source": CAMPOS_MISSAO}
+                for hit in helpers.scan(self.es, index=self.indice, query=query, size=5000):
+                    status = hit['_source'].get('status')
+                    if status == STATUS_ATIVA:
+                        missoes[hit['_id']] = resumo_missao(hit['_source'])
+                    else:
+                        inativas[hit['_id']] = status
+                estrutura = self._montar(missoes)
+            except Exception:
+                with self._lock:
+                    self._durante_semeadura = None
+                raise
+
+            with self._lock:
+                self.missoes, self.inativas = missoes, inativas
+                self.pontos, self.limites, self.segmentos = estrutura
+                escritas, self._durante_semeadura = self._durante_semeadura, None
+                for doc_id, novo in escritas:
+                    self._aplicar(doc_id, novo)
+                self.semeado = True
+                self.semeado_em = time.time()
+
+    def _refresh(self):
+        if self.orcamento is None:
+            self.es.indices.refresh(index=self.indice)
+        else:
+            self.orcamento.refrescar(self.es, self.indice)
+
+    def garantir_semeado(self):
+        if not self.semeado:
+            self.semear(forcar=False)
+
+    def registrar_escrita(self, indice, doc_id, antigo, novo):
+        """Ouvinte das escritas da API: mantém o conjunto de missões ativas"""
+        if indice != self.indice:
+            return
+        with self._lock:
+            if self._durante_semeadura is not None:
+                self._durante_semeadura.append((doc_id, novo))
+            if self.semeado:
+                self._aplicar(doc_id, novo)
+
+    def reconciliar(self):
+        """Novo scan (corrige escritas que não passaram pela API); só depois da primeira consulta"""
+        if not self.semeado:
+            return
+        try:
+            self.semear()
+        except Exception as e:
+            print(f"⚠️  Falha ao reconciliar as faixas de '{self.indice}': {e}")
+
+    def iniciar_reconciliacao_periodica(self):
+        """Thread daemon que reconcilia a cada `intervalo_reconciliacao` segundos"""
+        if self._thread is not None or not self.intervalo_reconciliacao:
+            return
+
+        def laco():
+            while True:
+                time.sleep(self.intervalo_reconciliacao)
+                self.reconciliar()
+
+        self._thread = threading.Thread(target=laco, name="reconciliacao-missoes", daemon=True)
+        self._thread.start()
+
+    def _aplicar(self, doc_id, novo):
+        """Estado final de uma missão (idempotente: reaplicar a mesma escrita não muda nada)"""
+        antiga = self.missoes.pop(doc_id, None)
+        if antiga is not None:
+            self._remover_faixa(doc_id, antiga)
+        self.inativas.pop(doc_id, None)
+        if novo is None:
+            return
+        if novo.get('status') == STATUS_ATIVA:
+            self.missoes[doc_id] = resumo_missao(novo)
+            self._inserir_faixa(doc_id, self.missoes[doc_id])
+        else:
+            self.inativas[doc_id] = novo.get('status')
+
+    @staticmethod
+    def _faixa(missao):
+        """Faixa semiaberta [inicio, fim) de níveis da missão (ou None se inválida)"""
+        minimo, maximo = missao['nivel_minimo'], missao['nivel_maximo']
+        if minimo is None or maximo is None or minimo > maximo:
+            return None
+        return minimo, maximo + 1
+
+    @classmethod
+    def _montar(cls, missoes):
+        """Extremidades e segmentos inteiros a partir das missões (só na semeadura)"""
+        faixas = []
+        for doc_id, missao in missoes.items():
+            faixa = cls._faixa(missao)
+            if faixa is not None:
+                faixas.append(faixa + (doc_id,))
+
+        pontos = Counter(ponto for inicio, fim, _ in faixas for ponto in (inicio, fim))
+        limites = sorted(pontos)
+        cobertura = [[] for _ in range(max(len(limites) - 1, 0))]
+        for inicio, fim, doc_id in faixas:
+            primeiro = bisect.bisect_left(limites, inicio)
+            ultimo = bisect.bisect_left(limites, fim)
+            for segmento in range(primeiro, ultimo):
+                cobertura[segmento].append(doc_id)
+
+        segmentos = [
+            {metrica: sorted((-missoes[i][metrica], i) for i in ids) for metrica in METRICAS}
+            for ids in cobertura
+        ]
+        return pontos, limites, segmentos
+
+    def _abrir_limite(self, ponto):
+        """Contar uma faixa na extremidade; extremidade nova divide o segmento que a contém"""
+        self.pontos[ponto] += 1
+        if self.pontos[ponto] > 1:
+            return
+        j = bisect.bisect_left(self.limites, ponto)
+        if self.limites:
+            if j == 0:
+                # Abaixo da menor extremidade nenhuma faixa cobre nada
+                self.segmentos.insert(0, {metrica: [] for metrica in METRICAS})
+            elif j == len(self.limites):
+                self.segmentos.append({metrica: [] for metrica in METRICAS})
+            else:
+                dividido = self.segmentos[j - 1]
+                self.segmentos.insert(j, {metrica: list(lista) for metrica, lista in dividido.items()})
+        self.limites.insert(j, ponto)
+
+    def _fechar_limite(self, ponto):
+        """Descontar uma faixa; extremidade sem faixas junta os dois segmentos vizinhos (iguais)"""
+        self.pontos[ponto] -= 1
+        if self.pontos[ponto] > 0:
+            return
+        del self.pontos[ponto]
+        j = bisect.bisect_left(self.limites, ponto)
+        if len(self.limites) > 1:
+            del self.segmentos[min(j, len(self.segmentos) - 1)]
+        del self.limites[j]
+
+    def _inserir_faixa(self, doc_id, missao):
+        faixa = self._faixa(missao)
+        if faixa is None:
+            return
+        for ponto in faixa:
+            self._abrir_limite(ponto)
+        primeiro = bisect.bisect_left(self.limites, faixa[0])
+        ultimo = bisect.bisect_left(self.limites, faixa[1])
+        for segmento in self.segmentos[primeiro:ultimo]:
+            for metrica in METRICAS:
+                bisect.insort(segmento[metrica], (-missao[metrica], doc_id))
+
+    def _remover_faixa(self, doc_id, missao):
+        faixa = self._faixa(missao)
+        if faixa is None:
+            return
+        primeiro = bisect.bisect_left(self.limites, faixa[0])
+        ultimo = bisect.bisect_left(self.limites, faixa[1])
+        for segmento in self.segmentos[primeiro:ultimo]:
+            for metrica in METRICAS:
+                lista = segmento[metrica]
+                del lista[bisect.bisect_left(lista, (-missao[metrica], doc_id))]
+        for ponto in faixa:
+            self._fechar_limite(ponto)
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+    def missoes_do_nivel(self, nivel, metrica='ouro_por_dia', limite=10):
+        """Missões ativas cuja faixa contém o nível, melhores primeiro: (lista, total)"""
+        self.garantir_semeado()
+        with self._lock:
+            segmento = bisect.bisect_right(self.limites, nivel) - 1
+            if segmento < 0 or segmento >= len(self.segmentos):
+                return [], 0
+            chaves = self.segmentos[segmento][metrica]
+            return [{'id': i, **self.missoes[i]} for _, i in chaves[:max(limite, 1)]], len(chaves)
+
+    def obter(self, doc_id):
+        """Resumo de uma missão ativa (ou None)"""
+        self.garantir_semeado()
+        with self._lock:
+            return self.missoes.get(doc_id)
+
+    def status_inativa(self, doc_id):
+        """Status de uma missão existente mas não ativa (ou None)"""
+        self.garantir_semeado()
+        with self._lock:
+            return self.inativas.get(doc_id)
@@ -0,0 +1,282 @@
+# embeddings_rpg.py - Embeddings locais de itens (feature hashing) e kNN por força bruta
+import hashlib
+import math
+import threading
+import time
+
+import numpy as np
+from elasticsearch import helpers
+
+from similares_rpg import termos_do_item
+
+# ============================================================
+# EMBEDDER OFFLINE (sem rede, determinístico)
+# ============================================================
+DIM_TEXTO = 128
+
+# Atributos numéricos normalizados para [0, 1] (aceitam escalares ou arrays NumPy)
+ESCALAS_NUMERICAS = [
+    ('valor', lambda v: np.log1p(v) / np.log1p(999999)),
+    ('peso', lambda v: v / 50),
+    ('nivel_requerido', lambda v: v / 20),
+    ('atributos_bonus.forca', lambda v: v / 5),
+    ('atributos_bonus.destreza', lambda v: v / 5)
+]
+
+DIM_EMBEDDING = DIM_TEXTO + len(ESCALAS_NUMERICAS)
+
+# Peso da parte numérica frente ao texto (que tem norma 1)
+PESO_NUMERICO = 0.5
+
+CAMPO_EMBEDDING = 'embedding'
+
+
+def _hash(termo):
+    """Posição e sinal do termo (estável entre processos, ao contrário de hash())"""
+    digest = hashlib.blake2b(termo.encode('utf-8'), digest_size=8).digest()
+    numero = int.from_bytes(digest, 'little')
+    return numero % DIM_TEXTO, 1.0 if (numero >> 63) & 1 else -1.0
+
+
+def _numero(item, campo):
+    valor = item
+    for parte in campo.split('.'):
+        valor = valor.get(parte) if isinstance(valor, dict) else None
+    return valor if isinstance(valor, (int, float)) and not isinstance(valor, bool) else 0
+
+
+def vetor_texto(item):
+    """Parte textual do embedding (DIM_TEXTO floats, norma 1 ou vetor nulo)"""
+    vetor = np.zeros(DIM_TEXTO, dtype=np.float32)
+    for termo, tf in termos_do_item(item).items():
+        posicao, sinal = _hash(termo)
+        vetor[posicao] += sinal * (1 + math.log(tf))
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma > 0 else vetor
+
+
+def parte_numerica(colunas, n=None):
+    """Parte numérica de um lote: `colunas` mapeia campo -> array (campos ausentes valem 0)"""
+    n = n if n is not None else len(next(iter(colunas.values())))
+    partes = np.zeros((n, len(ESCALAS_NUMERICAS)), dtype=np.float32)
+    for i, (campo, escala) in enumerate(ESCALAS_NUMERICAS):
+        if campo in colunas:
+            valores = np.asarray(colunas[campo], dtype=np.float64)
+            partes[:, i] = PESO_NUMERICO * np.clip(escala(valores), 0.0, 1.0)
+    return partes
+
+
+def embeddings_em_lote(textos, numericos):
+    """Juntar partes textual (n x DIM_TEXTO) e numérica e normalizar cada linha"""
+    vetores = np.hstack([textos, numericos]).astype(np.float32)
+    normas = np.linalg.norm(vetores, axis=1)
+    # O ES não aceita vetor nulo com similarity=cosine
+    nulos = normas == 0
+    vetores[nulos, -1] = 1.0
+    normas[nulos] = 1.0
+    return vetores / normas[:, None]
+
+
+def embedding_do_item(item):
+    """Vetor de DIM_EMBEDDING floats com norma 1 (similaridade de cosseno)"""
+    numericos = parte_numerica({campo: [_numero(item, campo)] for campo, _ in ESCALAS_NUMERICAS}, 1)
+    return embeddings_em_lote(vetor_texto(item)[None, :], numericos)[0]
+
+
+def lista_embedding(item):
+    """Embedding como lista de floats (para gravar no ES)"""
+    return [round(float(x), 6) for x in embedding_do_item(item)]
+
+
+def com_embedding(item):
+    """Cópia do documento com o campo de embedding preenchido"""
+    return {**item, CAMPO_EMBEDDING: lista_embedding(item)}
+
+# ============================================================
+# kNN POR FORÇA BRUTA (fallback local)
+# ============================================================
+CAMPOS_RESUMO = ['nome', 'tipo', 'raridade', 'valor']
+CAMPOS_EMBEDDER = ['nome', 'descricao', 'tags', 'tipo', 'raridade', 'valor', 'peso',
+                   'nivel_requerido', 'atributos_bonus']
+
+
+class MatrizEmbeddings:
+    """Matriz (itens x DIM_EMBEDDING) para kNN exato com um produto matricial
+
+    Usada quando o backend não tem HNSW (stand-in local) e como
+    referência de recall nos benchmarks. Semeada e reconciliada como os
+    rankings de personagens; cada escrita troca, acrescenta ou remove só
+    a linha do item, com cópia na escrita depois de uma consulta (como a
+    matriz de itens da recomendação).
+    """
+
+    def __init__(self, es, indice='rpg_itens', intervalo_reconciliacao=300, orcamento=None):
+        self.es = es
+        self.indice = indice
+        self.intervalo_reconciliacao = intervalo_reconciliacao
+        self.orcamento = orcamento
+        self.itens = {}
+        self.semeado = False
+        self.semeado_em = None
+        self._lock = threading.RLock()
+        self._lock_semeadura = threading.Lock()
+        self._durante_semeadura = None
+        self._thread = None
+        # Alguma consulta guardou as linhas atuais: a próxima escrita copia antes
+        self._em_uso = False
+        self.n = 0
+        self.posicoes = {}
+        self.ids = np.empty(0, dtype=object)
+        self.matriz = np.zeros((0, DIM_EMBEDDING), dtype=np.float32)
+
+    # --------------------------------------------------------
+    # Manutenção
+    # --------------------------------------------------------
+    def semear(self, forcar=True):
+        """Remontar a matriz a partir de um scan do índice, sem bloquear as consultas
+
+        Uma semeadura por vez (forcar=False desiste se outra já semeou).
+        O refresh antes do scan torna visíveis as escritas já avisadas; as
+        avisadas durante o scan são guardadas e reaplicadas no fim.
+        """
+        with self._lock_semeadura:
+            if not forcar and self.semeado:
+                return
+            with self._lock:
+                self._durante_semeadura = []
+            try:
+                self._refresh()
+                vetores, itens = [], {}
+                for hit in helpers.scan(self.es, index=self.indice, query={"_source": CAMPOS_EMBEDDER}, size=5000):
+                    vetores.append(embedding_do_item(hit['_source']))
+                    itens[hit['_id']] = {campo: hit['_source'].get(campo) for campo in CAMPOS_RESUMO}
+                ids = np.empty(len(itens), dtype=object)
+                ids[:] = list(itens)
+                matriz = np.stack(vetores) if vetores else np.zeros((0, DIM_EMBEDDING), dtype=np.float32)
+            except Exception:
+                with self._lock:
+                    self._durante_semeadura = None
+                raise
+
+            with self._lock:
+                self.itens, self.ids, self.matriz = itens, ids, matriz
+                self.n = len(ids)
+                self.posicoes = {doc_id: i for i, doc_id in enumerate(itens)}
+                self._em_uso = False
+                escritas, self._durante_semeadura = self._durante_semeadura, None
+                for doc_id, novo in escritas:
+                    self._aplicar(doc_id, novo)
+                self.semeado = True
+                self.semeado_em = time.time()
+
+    def _refresh(self):
+        if self.orcamento is None:
+            self.es.indices.refresh(index=self.indice)
+        else:
+            self.orcamento.refrescar(self.es, self.indice)
+
+    def garantir_semeado(self):
+        if not self.semeado:
+            self.semear(forcar=False)
+
+    def registrar_escrita(self, indice, doc_id, antigo, novo):
+        """Ouvinte das escritas da API"""
+        if indice != self.indice:
+            return
+        with self._lock:
+            if self._durante_semeadura is not None:
+                self._durante_semeadura.append((doc_id, novo))
+            if self.semeado:
+                self._aplicar(doc_id, novo)
+
+    def reconciliar(self):
+        """Novo scan (corrige escritas que não passaram pela API); só depois da primeira consulta"""
+        if not self.semeado:
+            return
+        try:
+            self.semear()
+        except Exception as e:
+            print(f"⚠️  Falha ao reconciliar os embeddings de '{self.indice}': {e}")
+
+    def iniciar_reconciliacao_periodica(self):
+        """Thread daemon que reconcilia a cada `intervalo_reconciliacao` segundos"""
+        if self._thread is not None or not self.intervalo_reconciliacao:
+            return
+
+        def laco():
+            while True:
+                time.sleep(self.intervalo_reconciliacao)
+                self.reconciliar()
+
+        self._thread = threading.Thread(target=laco, name="reconciliacao-embeddings", daemon=True)
+        self._thread.start()
+
+    def _aplicar(self, doc_id, novo):
+        """Trocar, acrescentar ou remover (novo=None) a linha do item; idempotente"""
+        if self._em_uso:
+            # Cópia na escrita: não mexer nas linhas que uma consulta ainda está lendo
+            self.itens, self.ids, self.matriz = dict(self.itens), self.ids.copy(), self.matriz.copy()
+            self._em_uso = False
+        i = self.posicoes.get(doc_id)
+        if novo is None:
+            if i is None:
+                return
+            ultimo = self.n - 1
+            if i != ultimo:
+                self.ids[i] = self.ids[ultimo]
+                self.matriz[i] = self.matriz[ultimo]
+                self.posicoes[self.ids[i]] = i
+            del self.posicoes[doc_id]
+            del self.itens[doc_id]
+            self.ids[ultimo] = None
+            self.n = ultimo
+            return
+        if i is None:
+            if self.n == len(self.ids):
+                self._crescer()
+            i = self.posicoes[doc_id] = self.n
+            self.n += 1
+        self.ids[i] = doc_id
+        self.matriz[i] = embedding_do_item(novo)
+        self.itens[doc_id] = {campo: novo.get(campo) for campo in CAMPOS_RESUMO}
+
+    def _crescer(self):
+        """Dobrar a capacidade (acréscimos custam O(1) amortizado)"""
+        capacidade = max(16, 2 * len(self.ids))
+        ids = np.empty(capacidade, dtype=object)
+        ids[:self.n] = self.ids[:self.n]
+        matriz = np.zeros((capacidade, DIM_EMBEDDING), dtype=np.float32)
+        matriz[:self.n] = self.matriz[:self.n]
+        self.ids, self.matriz = ids, matriz
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+    def vetor(self, doc_id):
+        """Embedding de um item da matriz (ou None)"""
+        self.garantir_semeado()
+        with self._lock:
+            i = self.posicoes.get(doc_id)
+            return None if i is None else self.matriz[i].copy()
+
+    def vizinhos(self, vetor, k=10, excluir=None):
+        """Os k itens de maior cosseno com o vetor: lista de (id, score, resumo)"""
+        self.garantir_semeado()
+        with self._lock:
+            # Sem cópia: as escritas copiam as linhas antes de alterá-las
+            self._em_uso = True
+            n, itens = self.n, self.itens
+            ids, matriz = self.ids[:n], self.matriz[:n]
+            posicao_excluida = self.posicoes.get(excluir)
+
+        if not n:
+            return []
+        scores = matriz @ np.asarray(vetor, dtype=np.float32)
+        if posicao_excluida is not None:
+            scores[posicao_excluida] = -np.inf
+        k = min(k, n)
+        melhores = np.argpartition(-scores, k - 1)[:k]
+        melhores = melhores[np.argsort(-scores[melhores], kind='stable')]
+        # Mesma escala do ES para cosine: (1 + cos) / 2
+        return [(ids[i], round(float((1 + scores[i]) / 2), 4), itens.get(ids[i]))
+                for i in melhores if np.isfinite(scores[i])]
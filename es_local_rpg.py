@@ -0,0 +1,1909 @@
+# es_local_rpg.py - Elasticsearch em processo: o subconjunto do DSL que a API usa, para rodar sem cluster
+import json
+import math
+import os
+import re
+import secrets
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase, translate
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+from elastic_transport import ApiResponseMeta, HeadApiResponse, HttpHeaders, NodeConfig, ObjectApiResponse
+from elasticsearch import AuthorizationException, BadRequestError, ConflictError, NotFoundError
+from elasticsearch.serializer import JSONSerializer
+
+# ============================================================
+# CONSTANTES
+# ============================================================
+# BM25 com os parâmetros padrão do Lucene
+K1 = 1.2
+B = 0.75
+
+# Limites padrão do ES
+TRACK_TOTAL_HITS_PADRAO = 10000
+MAX_EXPANSOES_FUZZY = 50
+
+TIPOS_NUMERICOS = {'long', 'integer', 'short', 'byte', 'double', 'float', 'half_float', 'scaled_float',
+                   'unsigned_long'}
+TIPOS_INTEIROS = {'long', 'integer', 'short', 'byte', 'unsigned_long'}
+TIPOS_KEYWORD = {'keyword', 'constant_keyword', 'wildcard'}
+
+# Chaves aceitas no corpo de uma busca (o resto é erro, como no ES)
+CHAVES_BUSCA = {'query', 'size', 'from', 'sort', '_source', 'aggs', 'aggregations', 'track_total_hits',
+                'highlight', 'knn', 'min_score', 'version', 'track_scores', 'timeout', 'seq_no_primary_term',
+                'profile', 'post_filter'}
+
+_NO = NodeConfig("http", "localhost", 9200)
+_PALAVRA = re.compile(r"\w+")
+_DATA_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+
+# ============================================================
+# RESPOSTAS E ERROS (mesmas classes do cliente oficial)
+# ============================================================
+
+def _meta(status):
+    return ApiResponseMeta(status=status, http_version="1.1", headers=HttpHeaders(), duration=0.0, node=_NO)
+
+
+def _resposta(corpo, status=200):
+    return ObjectApiResponse(body=corpo, meta=_meta(status))
+
+
+def _erro(classe, status, tipo, motivo):
+    causa = {"type": tipo, "reason": motivo}
+    return classe(message=tipo, meta=_meta(status), body={"error": {**causa, "root_cause": [causa]}, "status": status})
+
+
+def _requisicao_invalida(motivo, tipo='parsing_exception'):
+    return _erro(BadRequestError, 400, tipo, motivo)
+
+
+def _indice_inexistente(nome):
+    return _erro(NotFoundError, 404, 'index_not_found_exception', f"no such index [{nome}]")
+
+# ============================================================
+# ANÁLISE DE TEXTO
+# ============================================================
+# Todos os analyzers dos índices RPG são tokenizer standard + lowercase
+# (+ asciifolding); aqui o tokenizer é \w+ e o asciifolding é NFKD.
+
+@lru_cache(maxsize=65536)
+def analisar(texto, dobrar=True):
+    """Tokens de um texto (tupla), em minúsculas e opcionalmente sem acentos"""
+    texto = texto.lower()
+    if dobrar:
+        texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return tuple(_PALAVRA.findall(texto))
+
+
+def _dobra(analisador, definidos):
+    """True se o analyzer do campo tem asciifolding"""
+    if not analisador or analisador == 'standard':
+        return False
+    return 'asciifolding' in definidos.get(analisador, {}).get('filter', [])
+
+
+def distancia(a, b, maximo):
+    """Distância de edição com transposições (OSA); maximo + 1 se passar do limite"""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        atual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            custo = a[i - 1] != b[j - 1]
+            atual[j] = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + custo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                atual[j] = min(atual[j], anterior2[j - 2] + 1)
+        if min(atual) > maximo:
+            return maximo + 1
+        anterior2, anterior = anterior, atual
+    return anterior[-1]
+
+
+def edicoes_permitidas(fuzziness, termo):
+    """Edições aceitas para o termo (fuzziness AUTO = AUTO:3,6)"""
+    if fuzziness is None:
+        return 0
+    texto = str(fuzziness).upper()
+    if texto.startswith('AUTO'):
+        baixo, alto = 3, 6
+        if ':' in texto:
+            baixo, alto = (int(x) for x in texto.split(':')[1].split(','))
+        return 0 if len(termo) < baixo else 1 if len(termo) < alto else 2
+    return min(int(float(texto)), 2)
+
+# ============================================================
+# VALORES DOS DOCUMENTOS
+# ============================================================
+
+def _copiar(valor):
+    if isinstance(valor, dict):
+        return {k: _copiar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        if not valor or not isinstance(valor[0], (dict, list)):
+            return list(valor)
+        return [_copiar(v) for v in valor]
+    return valor
+
+
+def _valores(fonte, caminho):
+    """Valores folha de um caminho com pontos (listas achatadas, sem None)"""
+    atuais = [fonte]
+    for parte in caminho.split('.'):
+        proximos = []
+        for atual in atuais:
+            if isinstance(atual, dict) and parte in atual:
+                valor = atual[parte]
+                proximos.extend(valor if isinstance(valor, list) else [valor])
+        atuais = proximos
+    return [v for v in atuais if v is not None]
+
+
+def _texto_keyword(valor):
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    return str(valor)
+
+
+def _para_ms(valor):
+    """Data (ISO, epoch ms ou 'now') em epoch millis"""
+    if isinstance(valor, bool):
+        raise ValueError(valor)
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor)
+    if texto == 'now':
+        return time.time() * 1000
+    if texto.isdigit():
+        return float(texto)
+    data = datetime.fromisoformat(texto.replace('Z', '+00:00'))
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return data.timestamp() * 1000
+
+
+def _converter(tipo, valor):
+    """Valor da coluna (float) para campos numéricos, datas e booleanos"""
+    if tipo == 'data':
+        return _para_ms(valor)
+    if tipo == 'booleano':
+        if valor in (True, 'true'):
+            return 1.0
+        if valor in (False, 'false'):
+            return 0.0
+        raise ValueError(valor)
+    if isinstance(valor, bool):
+        raise ValueError(valor)
+    return float(valor)
+
+
+def _filtrar_fonte(fonte, incluir, excluir, prefixo=''):
+    resultado = {}
+    for chave, valor in fonte.items():
+        caminho = prefixo + chave
+        if excluir and any(fnmatchcase(caminho, padrao) for padrao in excluir):
+            continue
+        if incluir and not any(fnmatchcase(caminho, padrao) for padrao in incluir):
+            if isinstance(valor, dict):
+                parcial = _filtrar_fonte(valor, incluir, excluir, caminho + '.')
+                if parcial:
+                    resultado[chave] = parcial
+            continue
+        if isinstance(valor, dict) and excluir:
+            resultado[chave] = _filtrar_fonte(valor, None, excluir, caminho + '.')
+        else:
+            resultado[chave] = _copiar(valor)
+    return resultado
+
+
+def filtrar_fonte(fonte, especificacao):
+    """Aplicar o parâmetro _source (bool, campo, lista ou includes/excludes); None = omitir"""
+    if especificacao is False or fonte is None:
+        return None
+    if especificacao is None or especificacao is True:
+        return _copiar(fonte)
+    if isinstance(especificacao, str):
+        especificacao = [especificacao]
+    if isinstance(especificacao, list):
+        return _filtrar_fonte(fonte, especificacao, None)
+    incluir = especificacao.get('includes', especificacao.get('include'))
+    excluir = especificacao.get('excludes', especificacao.get('exclude'))
+    return _filtrar_fonte(fonte, [incluir] if isinstance(incluir, str) else incluir,
+                          [excluir] if isinstance(excluir, str) else excluir)
+
+
+def _mesclar(base, parcial):
+    """Update parcial: objetos são mesclados recursivamente, o resto substituído"""
+    resultado = _copiar(base)
+    for chave, valor in parcial.items():
+        if isinstance(valor, dict) and isinstance(resultado.get(chave), dict):
+            resultado[chave] = _mesclar(resultado[chave], valor)
+        else:
+            resultado[chave] = _copiar(valor)
+    return resultado
+
+# ============================================================
+# ÍNDICE (invertido + colunar)
+# ============================================================
+
+class Campo:
+    """Campo do mapping: caminho, caminho no _source (subcampos leem o pai) e tipo interno"""
+    __slots__ = ('caminho', 'origem', 'tipo', 'tipo_es', 'dobrar', 'dims')
+
+    def __init__(self, caminho, origem, tipo_es, dobrar=False, dims=None):
+        self.caminho = caminho
+        self.origem = origem
+        self.tipo_es = tipo_es
+        self.dobrar = dobrar
+        self.dims = dims
+        if tipo_es == 'text':
+            self.tipo = 'text'
+        elif tipo_es in TIPOS_KEYWORD:
+            self.tipo = 'keyword'
+        elif tipo_es in TIPOS_NUMERICOS:
+            self.tipo = 'numero'
+        elif tipo_es == 'date':
+            self.tipo = 'data'
+        elif tipo_es == 'boolean':
+            self.tipo = 'booleano'
+        elif tipo_es == 'dense_vector':
+            self.tipo = 'vetor'
+        else:
+            # object desabilitado, percolator, completion...: só no _source
+            self.tipo = 'ignorar'
+
+
+class Indice:
+    """Um índice concreto em memória
+
+    Texto e keyword vão para um índice invertido (termo -> {posição: tf},
+    com arrays NumPy em cache por termo); números, datas e booleanos para
+    colunas float64 (NaN = ausente); vetores para uma matriz float32.
+    Cada documento ocupa uma posição fixa, e todas as consultas devolvem
+    máscaras/pontuações do tamanho do índice.
+    """
+
+    def __init__(self, nome, corpo=None):
+        corpo = _copiar(corpo or {})
+        self.nome = nome
+        self.settings = corpo.get('settings', {})
+        self.mappings = corpo.get('mappings', {})
+        self.mappings.setdefault('properties', {})
+        self.excluir_fonte = self.mappings.get('_source', {}).get('excludes', [])
+        self.campos = {}
+        self._mapear(self.mappings['properties'])
+
+        self.ids = []
+        self.posicao = {}
+        self.fontes = []
+        self.versoes = []
+        self.n = 0
+        self.capacidade = 0
+        self.seq_no = -1
+        self.vivos = np.zeros(0, dtype=bool)
+        self.presenca = {}
+        self.colunas = {}
+        self.comprimentos = {}
+        self.vetores = {}
+        self.postings = {}
+        self.docs_campo = Counter()
+        self.soma_comprimentos = Counter()
+        self._arrays = {}
+        self._versao_dicionario = Counter()
+        self._expansoes = {}
+
+    # --------------------------------------------------------
+    # Mapping
+    # --------------------------------------------------------
+    def _analisadores(self):
+        analysis = self.settings.get('analysis') or self.settings.get('index', {}).get('analysis', {})
+        return analysis.get('analyzer', {})
+
+    def _mapear(self, propriedades, prefixo=''):
+        definidos = self._analisadores()
+        for nome, spec in propriedades.items():
+            caminho = prefixo + nome
+            if 'properties' in spec and spec.get('enabled', True):
+                self._mapear(spec['properties'], caminho + '.')
+                continue
+            tipo = spec.get('type', 'object')
+            if spec.get('enabled') is False:
+                tipo = 'object'
+            self.campos[caminho] = Campo(caminho, caminho, tipo, _dobra(spec.get('analyzer'), definidos),
+                                         spec.get('dims'))
+            for sub, subspec in spec.get('fields', {}).items():
+                self.campos[f"{caminho}.{sub}"] = Campo(f"{caminho}.{sub}", caminho, subspec.get('type'),
+                                                        _dobra(subspec.get('analyzer'), definidos))
+
+    def _coberto(self, caminho):
+        """True se o caminho (ou um objeto acima dele) já está no mapping"""
+        if caminho in self.campos:
+            return True
+        partes = caminho.split('.')
+        return any('.'.join(partes[:i]) in self.campos for i in range(1, len(partes)))
+
+    def _mapear_dinamico(self, fonte, propriedades=None, prefixo=''):
+        """Mapping dinâmico do ES para campos novos (texto + .keyword, números, datas, booleanos)"""
+        propriedades = self.mappings['properties'] if propriedades is None else propriedades
+        for chave, valor in fonte.items():
+            caminho = prefixo + chave
+            if isinstance(valor, list):
+                valor = next((v for v in valor if v is not None), None)
+            if valor is None or self._coberto(caminho) and not isinstance(valor, dict):
+                continue
+            if isinstance(valor, dict):
+                if caminho in self.campos:
+                    continue
+                filho = propriedades.setdefault(chave, {}).setdefault('properties', {})
+                self._mapear_dinamico(valor, filho, caminho + '.')
+                continue
+            if isinstance(valor, bool):
+                spec = {"type": "boolean"}
+            elif isinstance(valor, int):
+                spec = {"type": "long"}
+            elif isinstance(valor, float):
+                spec = {"type": "float"}
+            elif _DATA_ISO.match(str(valor)):
+                spec = {"type": "date"}
+            else:
+                spec = {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+            propriedades[chave] = spec
+            self._mapear({chave: spec}, prefixo)
+
+    # --------------------------------------------------------
+    # Armazenamento
+    # --------------------------------------------------------
+    def _crescer(self, minimo):
+        if minimo <= self.capacidade:
+            return
+        nova = max(16, self.capacidade * 2, minimo)
+
+        def ampliar(array, preenchimento):
+            novo = np.full((nova,) + array.shape[1:], preenchimento, dtype=array.dtype)
+            novo[:len(array)] = array
+            return novo
+
+        self.vivos = ampliar(self.vivos, False)
+        for tabela, preenchimento in ((self.presenca, False), (self.colunas, np.nan),
+                                      (self.comprimentos, 0), (self.vetores, 0)):
+            for campo, array in tabela.items():
+                tabela[campo] = ampliar(array, preenchimento)
+        self.capacidade = nova
+
+    def _array(self, tabela, campo, dtype, preenchimento, dims=None):
+        if campo not in tabela:
+            forma = (self.capacidade,) if dims is None else (self.capacidade, dims)
+            tabela[campo] = np.full(forma, preenchimento, dtype=dtype)
+        return tabela[campo]
+
+    def _extrair(self, fonte):
+        """Valores indexáveis por campo; valida os tipos antes de qualquer mudança"""
+        extraido = {}
+        for campo in list(self.campos.values()):
+            if campo.tipo == 'ignorar':
+                continue
+            valores = _valores(fonte, campo.origem)
+            if not valores:
+                continue
+            try:
+                if campo.tipo == 'text':
+                    tokens = [t for v in valores if not isinstance(v, dict) for t in analisar(str(v), campo.dobrar)]
+                    extraido[campo.caminho] = (Counter(tokens), len(tokens))
+                elif campo.tipo == 'keyword':
+                    extraido[campo.caminho] = (Counter({_texto_keyword(v) for v in valores
+                                                        if not isinstance(v, dict)}), 1)
+                elif campo.tipo == 'vetor':
+                    vetor = np.asarray(valores, dtype=np.float32)
+                    if campo.dims and len(vetor) != campo.dims:
+                        raise ValueError(f"{len(vetor)} dimensões, esperado {campo.dims}")
+                    extraido[campo.caminho] = vetor
+                else:
+                    extraido[campo.caminho] = _converter(campo.tipo, valores[0])
+            except (TypeError, ValueError) as e:
+                raise _requisicao_invalida(f"failed to parse field [{campo.caminho}]: {e}",
+                                           'document_parsing_exception')
+        return extraido
+
+    def _mudou_termo(self, campo, termo, dicionario_mudou):
+        self._arrays.pop((campo, termo), None)
+        if dicionario_mudou:
+            self._versao_dicionario[campo] += 1
+
+    def _aplicar(self, pos, extraido, sinal):
+        """Somar (sinal=+1) ou retirar (-1) os valores de um documento das estruturas"""
+        for caminho, dado in extraido.items():
+            campo = self.campos[caminho]
+            self._array(self.presenca, caminho, bool, False)[pos] = sinal > 0
+            if campo.tipo in ('text', 'keyword'):
+                contagem, comprimento = dado
+                postings = self.postings.setdefault(caminho, {})
+                for termo, tf in contagem.items():
+                    if sinal > 0:
+                        novo = termo not in postings
+                        postings.setdefault(termo, {})[pos] = tf
+                        self._mudou_termo(caminho, termo, novo)
+                    else:
+                        posting = postings.get(termo, {})
+                        posting.pop(pos, None)
+                        if not posting:
+                            postings.pop(termo, None)
+                        self._mudou_termo(caminho, termo, not posting)
+                self.docs_campo[caminho] += sinal
+                self.soma_comprimentos[caminho] += sinal * comprimento
+                if campo.tipo == 'text':
+                    self._array(self.comprimentos, caminho, np.float32, 0)[pos] = comprimento if sinal > 0 else 0
+            elif campo.tipo == 'vetor':
+                matriz = self._array(self.vetores, caminho, np.float32, 0, len(dado))
+                matriz[pos] = dado if sinal > 0 else 0
+            else:
+                self._array(self.colunas, caminho, np.float64, np.nan)[pos] = dado if sinal > 0 else np.nan
+
+    def _fonte_armazenada(self, fonte):
+        fonte = _copiar(fonte)
+        if self.excluir_fonte:
+            fonte = _filtrar_fonte(fonte, None, self.excluir_fonte)
+        return fonte
+
+    def gravar(self, doc_id, fonte, op='index', versao=None, tipo_versao=None):
+        """Indexar (criar ou substituir) um documento; devolve (resultado, versão, seq_no)"""
+        self._mapear_dinamico(fonte)
+        extraido = self._extrair(fonte)
+        externo = tipo_versao in ('external', 'external_gt', 'external_gte')
+        pos = self.posicao.get(doc_id)
+
+        if pos is not None:
+            atual = self.versoes[pos]
+            if op == 'create':
+                raise _erro(ConflictError, 409, 'version_conflict_engine_exception',
+                            f"[{doc_id}]: version conflict, document already exists (current version [{atual}])")
+            if externo and (versao < atual or versao == atual and tipo_versao != 'external_gte'):
+                raise _erro(ConflictError, 409, 'version_conflict_engine_exception',
+                            f"[{doc_id}]: version conflict, current version [{atual}] is higher or equal "
+                            f"to the one provided [{versao}]")
+            self._desindexar(pos)
+            resultado, nova_versao = 'updated', versao if externo else atual + 1
+        else:
+            pos = self.n
+            self._crescer(pos + 1)
+            self.n += 1
+            self.ids.append(doc_id)
+            self.fontes.append(None)
+            self.versoes.append(0)
+            self.posicao[doc_id] = pos
+            resultado, nova_versao = 'created', versao if externo else 1
+
+        self._aplicar(pos, extraido, +1)
+        self.fontes[pos] = self._fonte_armazenada(fonte)
+        self.versoes[pos] = nova_versao
+        self.vivos[pos] = True
+        self.seq_no += 1
+        return resultado, nova_versao, self.seq_no
+
+    def _desindexar(self, pos):
+        self._aplicar(pos, self._extrair(self.fontes[pos]), -1)
+        for caminho in self.vetores:
+            self.presenca[caminho][pos] = False
+            self.vetores[caminho][pos] = 0
+
+    def remover(self, doc_id):
+        """Remover um documento; devolve (versão, seq_no) ou None se não existe"""
+        pos = self.posicao.pop(doc_id, None)
+        if pos is None:
+            return None
+        self._desindexar(pos)
+        self.fontes[pos] = None
+        self.vivos[pos] = False
+        self.versoes[pos] += 1
+        self.seq_no += 1
+        return self.versoes[pos], self.seq_no
+
+    def documento(self, doc_id):
+        pos = self.posicao.get(doc_id)
+        return None if pos is None else (pos, self.fontes[pos], self.versoes[pos])
+
+    # --------------------------------------------------------
+    # Primitivas de consulta
+    # --------------------------------------------------------
+    def posting(self, campo, termo):
+        """(posições, tfs) do termo no campo, como arrays (em cache até o termo mudar)"""
+        chave = (campo, termo)
+        arrays = self._arrays.get(chave)
+        if arrays is None:
+            posting = self.postings.get(campo, {}).get(termo, {})
+            arrays = (np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                      np.fromiter(posting.values(), dtype=np.float64, count=len(posting)))
+            self._arrays[chave] = arrays
+        return arrays
+
+    def bm25(self, campo, termo):
+        """(posições, pontuações BM25) do termo no campo"""
+        posicoes, tf = self.posting(campo, termo)
+        if not len(posicoes):
+            return posicoes, tf
+        total = max(self.docs_campo[campo], 1)
+        idf = math.log(1 + (total - len(posicoes) + 0.5) / (len(posicoes) + 0.5))
+        if campo in self.comprimentos:
+            media = self.soma_comprimentos[campo] / total or 1.0
+            normalizacao = K1 * (1 - B + B * self.comprimentos[campo][posicoes] / media)
+        else:
+            # keyword: sem norms, o comprimento não conta
+            normalizacao = K1
+        return posicoes, idf * tf / (tf + normalizacao)
+
+    def expandir(self, campo, termo, edicoes):
+        """Termos do dicionário do campo a até `edicoes` edições, com o peso do fuzzy do Lucene"""
+        postings = self.postings.get(campo, {})
+        if edicoes == 0:
+            return [(termo, 1.0)] if termo in postings else []
+        chave = (campo, termo, edicoes)
+        versao = self._versao_dicionario[campo]
+        guardado = self._expansoes.get(chave)
+        if guardado is not None and guardado[0] == versao:
+            return guardado[1]
+
+        candidatos = []
+        for outro in postings:
+            d = distancia(termo, outro, edicoes)
+            if d <= edicoes:
+                candidatos.append((d, -len(postings[outro]), outro))
+        candidatos.sort()
+        expansoes = [(outro, 1.0 - d / max(min(len(outro), len(termo)), 1))
+                     for d, _, outro in candidatos[:MAX_EXPANSOES_FUZZY]]
+        self._expansoes[chave] = (versao, expansoes)
+        return expansoes
+
+    def valores_ordenacao(self, campo, posicoes):
+        """Valores float (NaN = ausente) para ordenar pelas posições dadas"""
+        spec = self.campos.get(campo)
+        if spec is None:
+            return np.full(len(posicoes), np.nan)
+        if spec.tipo in ('numero', 'data', 'booleano'):
+            return self._array(self.colunas, campo, np.float64, np.nan)[posicoes]
+        if spec.tipo == 'keyword':
+            valores = []
+            for pos in posicoes.tolist():
+                encontrados = _valores(self.fontes[pos], spec.origem)
+                valores.append(min(_texto_keyword(v) for v in encontrados) if encontrados else None)
+            distintos = sorted({v for v in valores if v is not None})
+            rank = {v: i for i, v in enumerate(distintos)}
+            return np.array([np.nan if v is None else rank[v] for v in valores], dtype=np.float64)
+        raise _requisicao_invalida(f"Text fields are not optimised for sorting: [{campo}]",
+                                   'illegal_argument_exception')
+
+    def valor_de_ordenacao(self, campo, pos):
+        """Valor devolvido em hit['sort']"""
+        spec = self.campos.get(campo)
+        if spec is None:
+            return None
+        if spec.tipo == 'keyword':
+            encontrados = _valores(self.fontes[pos], spec.origem)
+            return min(_texto_keyword(v) for v in encontrados) if encontrados else None
+        valor = self.colunas.get(campo, np.full(pos + 1, np.nan))[pos]
+        if np.isnan(valor):
+            return None
+        if spec.tipo_es in TIPOS_INTEIROS or spec.tipo in ('data', 'booleano'):
+            return int(valor)
+        return float(valor)
+
+    def ordenar(self, posicoes, pontos, ordenacao, limite=None):
+        """Posições na ordem pedida (empate: ordem de inserção); só as `limite` primeiras se dado"""
+        chaves = []
+        for campo, ordem, ausente in ordenacao or [('_score', 'desc', None)]:
+            if campo == '_score':
+                chave = pontos[posicoes]
+            elif campo == '_doc':
+                chave = posicoes.astype(np.float64)
+            else:
+                chave = self.valores_ordenacao(campo, posicoes)
+            if ordem == 'desc':
+                chave = -chave
+            chaves.append(np.where(np.isnan(chave), -np.inf if ausente == '_first' else np.inf, chave))
+
+        if limite is not None and limite < len(posicoes):
+            if limite <= 0:
+                return posicoes[:0]
+            # Só o que pode entrar no top: tudo até o valor do limite-ésimo (inclusive empates)
+            corte = np.partition(chaves[0], limite - 1)[limite - 1]
+            selecao = chaves[0] <= corte
+            posicoes = posicoes[selecao]
+            chaves = [chave[selecao] for chave in chaves]
+
+        ordem = np.lexsort([posicoes] + chaves[::-1])
+        resultado = posicoes[ordem]
+        return resultado if limite is None else resultado[:limite]
+
+    def descricao(self, aliases):
+        settings = {k: v for k, v in self.settings.items() if k != 'index'}
+        settings.update(self.settings.get('index', {}))
+        return {"aliases": aliases, "mappings": _copiar(self.mappings), "settings": {"index": _copiar(settings)}}
+
+    def configuracao(self, chave):
+        """Setting do índice (aceita 'blocks.write' ou {'blocks': {'write': ...}})"""
+        index = self.settings.get('index', {})
+        if chave in index:
+            return index[chave]
+        atual = index
+        for parte in chave.split('.'):
+            if not isinstance(atual, dict) or parte not in atual:
+                return None
+            atual = atual[parte]
+        return atual
+
+# ============================================================
+# CONSULTA (avaliação do DSL sobre um índice)
+# ============================================================
+
+def _lista(valor):
+    if valor is None:
+        return []
+    return valor if isinstance(valor, list) else [valor]
+
+
+def _campo_e_argumentos(corpo, chave_valor='query'):
+    """{campo: valor} ou {campo: {chave_valor: ..., opções}} -> (campo, valor, opções)"""
+    opcoes = {k: v for k, v in corpo.items() if k in ('boost', '_name')}
+    campos = [k for k in corpo if k not in opcoes]
+    if len(campos) != 1:
+        raise _requisicao_invalida(f"query espera um único campo, recebeu {campos}")
+    campo = campos[0]
+    valor = corpo[campo]
+    if isinstance(valor, dict):
+        opcoes.update(valor)
+        return campo, valor.get(chave_valor), opcoes
+    return campo, valor, opcoes
+
+
+def _minimo_deve(especificacao, total):
+    """minimum_should_match: inteiro, negativo ou porcentagem"""
+    texto = str(especificacao)
+    if texto.endswith('%'):
+        porcentagem = int(texto[:-1])
+        valor = int(total * abs(porcentagem) / 100)
+        return total - valor if porcentagem < 0 else valor
+    valor = int(texto)
+    return total + valor if valor < 0 else valor
+
+
+class Consulta:
+    """Avaliação de uma query: cada cláusula devolve (máscara, pontuações) do tamanho do índice"""
+
+    def __init__(self, motor, indice):
+        self.motor = motor
+        self.indice = indice
+        self.n = indice.n
+        self.vivos = indice.vivos[:self.n]
+        self.realce = {}
+        self.slots = {}
+        # Com "profile": true, lista onde avaliar() pendura o nó de cada cláusula
+        self.perfil = None
+
+    def _vazio(self):
+        return np.zeros(self.n, dtype=bool), np.zeros(self.n)
+
+    def _mascara(self, posicoes):
+        mascara = np.zeros(self.n, dtype=bool)
+        mascara[posicoes] = True
+        return mascara
+
+    def _constante(self, mascara, boost=1.0):
+        return mascara, np.where(mascara, float(boost), 0.0)
+
+    def avaliar(self, query):
+        if not isinstance(query, dict) or len(query) != 1:
+            raise _requisicao_invalida(f"query malformada: {query!r}")
+        tipo, argumentos = next(iter(query.items()))
+        metodo = getattr(self, f"_q_{tipo}", None)
+        if metodo is None:
+            raise _requisicao_invalida(f"[{tipo}] não é suportada pelo backend local")
+        if self.perfil is None:
+            return metodo(argumentos)
+        no = {"type": tipo, "description": json.dumps(query, ensure_ascii=False, default=str),
+              "time_in_nanos": 0, "breakdown": {}, "children": []}
+        pai = self.perfil
+        pai.append(no)
+        self.perfil = no['children']
+        inicio = time.perf_counter_ns()
+        try:
+            return metodo(argumentos)
+        finally:
+            no['time_in_nanos'] = time.perf_counter_ns() - inicio
+            self.perfil = pai
+
+    # --------------------------------------------------------
+    # Texto
+    # --------------------------------------------------------
+    def match_campo(self, campo, texto, fuzziness=None, operador='or', boost=1.0, minimo=None):
+        """match de um texto em um campo: soma do BM25 dos termos (melhor expansão fuzzy de cada)"""
+        mascara, pontos = self._vazio()
+        spec = self.indice.campos.get(campo)
+        if spec is None or texto is None or spec.tipo in ('ignorar', 'vetor'):
+            return mascara, pontos
+        if spec.tipo in ('numero', 'data', 'booleano'):
+            try:
+                valor = _converter(spec.tipo, texto)
+            except (TypeError, ValueError):
+                return mascara, pontos
+            return self._constante(self.indice.colunas.get(campo, np.full(self.n, np.nan))[:self.n] == valor, boost)
+
+        termos = analisar(str(texto), spec.dobrar) if spec.tipo == 'text' else (_texto_keyword(texto),)
+        if not termos:
+            return mascara, pontos
+        acertos = np.zeros(self.n, dtype=np.int32)
+        for termo in termos:
+            melhor = np.zeros(self.n)
+            achou = np.zeros(self.n, dtype=bool)
+            for expansao, peso in self.indice.expandir(campo, termo, edicoes_permitidas(fuzziness, termo)):
+                posicoes, notas = self.indice.bm25(campo, expansao)
+                melhor[posicoes] = np.maximum(melhor[posicoes], notas * peso)
+                achou[posicoes] = True
+                self.realce.setdefault(campo, set()).add(expansao)
+            pontos += melhor
+            acertos += achou
+
+        if str(operador).lower() == 'and':
+            mascara = acertos == len(termos)
+        elif minimo is not None:
+            mascara = acertos >= max(1, _minimo_deve(minimo, len(termos)))
+        else:
+            mascara = acertos > 0
+        return mascara, np.where(mascara, pontos * float(boost), 0.0)
+
+    def _q_match(self, corpo):
+        campo, texto, opcoes = _campo_e_argumentos(corpo)
+        return self.match_campo(campo, texto, opcoes.get('fuzziness'), opcoes.get('operator', 'or'),
+                                opcoes.get('boost', 1.0), opcoes.get('minimum_should_match'))
+
+    def _q_multi_match(self, corpo):
+        """multi_match best_fields (padrão) ou most_fields, com boosts campo^N"""
+        tipo = corpo.get('type', 'best_fields')
+        if tipo not in ('best_fields', 'most_fields'):
+            raise _requisicao_invalida(f"multi_match type [{tipo}] não é suportado pelo backend local")
+        desempate = float(corpo.get('tie_breaker', 0.0))
+        mascara, melhor = self._vazio()
+        soma = np.zeros(self.n)
+        for especificacao in corpo.get('fields') or ['*']:
+            campo, _, peso = especificacao.partition('^')
+            campos = [c for c in self.indice.campos if fnmatchcase(c, campo)] if '*' in campo else [campo]
+            for nome in campos:
+                m, p = self.match_campo(nome, corpo.get('query'), corpo.get('fuzziness'),
+                                        corpo.get('operator', 'or'), float(peso or 1.0),
+                                        corpo.get('minimum_should_match'))
+                mascara |= m
+                melhor = np.maximum(melhor, p)
+                soma += p
+        pontos = soma if tipo == 'most_fields' else melhor + desempate * (soma - melhor)
+        return mascara, pontos * float(corpo.get('boost', 1.0))
+
+    def _q_match_phrase_prefix(self, corpo):
+        campo, texto, opcoes = _campo_e_argumentos(corpo)
+        spec = self.indice.campos.get(campo)
+        if spec is None or spec.tipo != 'text' or not texto:
+            return self._vazio()
+        tokens = analisar(str(texto), spec.dobrar)
+        if not tokens:
+            return self._vazio()
+        *frase, prefixo = tokens
+        expansoes = sorted(t for t in self.indice.postings.get(campo, {}) if t.startswith(prefixo))
+        expansoes = set(expansoes[:int(opcoes.get('max_expansions', 50))])
+        if not expansoes:
+            return self._vazio()
+
+        candidatos = self._mascara(np.concatenate([self.indice.posting(campo, t)[0] for t in expansoes]))
+        for token in frase:
+            candidatos &= self._mascara(self.indice.posting(campo, token)[0])
+        if frase:
+            # Confirmar a sequência relendo o texto dos candidatos
+            for pos in np.flatnonzero(candidatos).tolist():
+                sequencias = [analisar(str(v), spec.dobrar) for v in _valores(self.indice.fontes[pos], spec.origem)]
+                candidatos[pos] = any(
+                    tuple(seq[i:i + len(frase)]) == tuple(frase) and seq[i + len(frase)] in expansoes
+                    for seq in sequencias for i in range(len(seq) - len(frase))
+                )
+
+        pontos = np.zeros(self.n)
+        for termo in list(frase) + sorted(expansoes):
+            posicoes, notas = self.indice.bm25(campo, termo)
+            pontos[posicoes] += notas
+        self.realce.setdefault(campo, set()).update(frase, expansoes)
+        return candidatos, np.where(candidatos, pontos * float(opcoes.get('boost', 1.0)), 0.0)
+
+    def _q_more_like_this(self, corpo):
+        """more_like_this como no Lucene: top termos por tf-idf dos documentos de referência"""
+        campos = [c for c in corpo.get('fields', []) if c in self.indice.campos] or \
+            [c for c, s in self.indice.campos.items() if s.tipo in ('text', 'keyword')]
+        min_tf = int(corpo.get('min_term_freq', 2))
+        min_df = int(corpo.get('min_doc_freq', 5))
+        max_df = int(corpo.get('max_doc_freq', 2**31 - 1))
+        min_tamanho = int(corpo.get('min_word_length', 0))
+        max_termos = int(corpo.get('max_query_terms', 25))
+
+        frequencias = Counter()
+        excluir = []
+        for referencia in _lista(corpo.get('like')):
+            if isinstance(referencia, str):
+                fonte = {self.indice.campos[c].origem: referencia for c in campos}
+            elif '_id' in referencia:
+                indice = self.motor.indice_de_leitura(referencia.get('_index', self.indice.nome))
+                encontrado = indice.documento(str(referencia['_id']))
+                if encontrado is None:
+                    continue
+                fonte = encontrado[1]
+                if indice is self.indice:
+                    excluir.append(encontrado[0])
+            else:
+                fonte = referencia.get('doc', {})
+            for campo in campos:
+                spec = self.indice.campos[campo]
+                for valor in _valores(fonte, spec.origem):
+                    termos = analisar(str(valor), spec.dobrar) if spec.tipo == 'text' else [_texto_keyword(valor)]
+                    frequencias.update((campo, t) for t in termos)
+
+        total = max(int(self.vivos.sum()), 1)
+        candidatos = []
+        for (campo, termo), tf in frequencias.items():
+            df = len(self.indice.postings.get(campo, {}).get(termo, ()))
+            if tf < min_tf or df < min_df or df > max_df or len(termo) < min_tamanho or df == 0:
+                continue
+            idf = math.log(total / (df + 1)) + 1
+            candidatos.append((-tf * idf, campo, termo))
+        candidatos.sort()
+        escolhidos = candidatos[:max_termos]
+        if not escolhidos:
+            return self._vazio()
+
+        acertos = np.zeros(self.n, dtype=np.int32)
+        pontos = np.zeros(self.n)
+        for _, campo, termo in escolhidos:
+            posicoes, notas = self.indice.bm25(campo, termo)
+            acertos[posicoes] += 1
+            pontos[posicoes] += notas
+        minimo = max(1, _minimo_deve(corpo.get('minimum_should_match', '30%'), len(escolhidos)))
+        mascara = acertos >= minimo
+        if not corpo.get('include', False):
+            mascara[excluir] = False
+        return mascara, np.where(mascara, pontos * float(corpo.get('boost', 1.0)), 0.0)
+
+    # --------------------------------------------------------
+    # Termos, faixas e estrutura
+    # --------------------------------------------------------
+    def _q_match_all(self, corpo):
+        return self._constante(self.vivos.copy(), (corpo or {}).get('boost', 1.0))
+
+    def _q_match_none(self, corpo):
+        return self._vazio()
+
+    def _termo(self, campo, valor, case_insensitive=False):
+        """Máscara e pontuação de um valor exato no campo"""
+        if campo == '_id':
+            encontrado = self.indice.posicao.get(str(valor))
+            return self._constante(self._mascara([] if encontrado is None else [encontrado]))
+        spec = self.indice.campos.get(campo)
+        if spec is None or spec.tipo in ('ignorar', 'vetor'):
+            return self._vazio()
+        if spec.tipo in ('numero', 'data', 'booleano'):
+            try:
+                valor = _converter(spec.tipo, valor)
+            except (TypeError, ValueError):
+                raise _requisicao_invalida(f"failed to create query: valor inválido [{valor}] para [{campo}]",
+                                           'query_shard_exception')
+            return self._constante(self.indice.colunas.get(campo, np.full(self.n, np.nan))[:self.n] == valor)
+
+        valor = _texto_keyword(valor)
+        termos = [valor]
+        if case_insensitive:
+            termos = [t for t in self.indice.postings.get(campo, {}) if t.lower() == valor.lower()]
+        mascara, pontos = self._vazio()
+        for termo in termos:
+            posicoes, notas = self.indice.bm25(campo, termo)
+            mascara[posicoes] = True
+            pontos[posicoes] = np.maximum(pontos[posicoes], notas)
+        return mascara, pontos
+
+    def _q_term(self, corpo):
+        campo, valor, opcoes = _campo_e_argumentos(corpo, 'value')
+        mascara, pontos = self._termo(campo, valor, opcoes.get('case_insensitive', False))
+        return mascara, pontos * float(opcoes.get('boost', 1.0))
+
+    def _q_terms(self, corpo):
+        boost = corpo.get('boost', 1.0)
+        campo, valores, _ = _campo_e_argumentos(corpo)
+        mascara = np.zeros(self.n, dtype=bool)
+        for valor in _lista(valores):
+            mascara |= self._termo(campo, valor)[0]
+        return self._constante(mascara, boost)
+
+    def _q_ids(self, corpo):
+        posicoes = [self.indice.posicao[str(v)] for v in _lista(corpo.get('values')) if str(v) in self.indice.posicao]
+        return self._constante(self._mascara(posicoes), corpo.get('boost', 1.0))
+
+    def _q_exists(self, corpo):
+        campo = corpo.get('field')
+        presenca = self.indice.presenca.get(campo)
+        if presenca is None:
+            # Objeto: existe se algum subcampo existe
+            mascara = np.zeros(self.n, dtype=bool)
+            for caminho, array in self.indice.presenca.items():
+                if caminho.startswith(campo + '.'):
+                    mascara |= array[:self.n]
+            return self._constante(mascara, corpo.get('boost', 1.0))
+        return self._constante(presenca[:self.n].copy(), corpo.get('boost', 1.0))
+
+    def _q_range(self, corpo):
+        campo, _, opcoes = _campo_e_argumentos(corpo, 'gte')
+        spec = self.indice.campos.get(campo)
+        if spec is None:
+            return self._vazio()
+        limites = {k: opcoes[k] for k in ('gte', 'gt', 'lte', 'lt', 'from', 'to') if opcoes.get(k) is not None}
+        if 'from' in limites:
+            limites['gte' if opcoes.get('include_lower', True) else 'gt'] = limites.pop('from')
+        if 'to' in limites:
+            limites['lte' if opcoes.get('include_upper', True) else 'lt'] = limites.pop('to')
+        comparar = {'gte': np.greater_equal, 'gt': np.greater, 'lte': np.less_equal, 'lt': np.less}
+
+        if spec.tipo == 'keyword':
+            termos = [t for t in self.indice.postings.get(campo, {})
+                      if all(comparar[k](t, str(v)) for k, v in limites.items())]
+            posicoes = [self.indice.posting(campo, t)[0] for t in termos]
+            mascara = self._mascara(np.concatenate(posicoes) if posicoes else [])
+            return self._constante(mascara, opcoes.get('boost', 1.0))
+        if spec.tipo not in ('numero', 'data', 'booleano'):
+            raise _requisicao_invalida(f"range não suportado no campo [{campo}] ({spec.tipo_es})",
+                                       'query_shard_exception')
+
+        coluna = self.indice.colunas.get(campo, np.full(self.n, np.nan))[:self.n]
+        mascara = ~np.isnan(coluna)
+        try:
+            for chave, valor in limites.items():
+                mascara &= comparar[chave](coluna, _converter(spec.tipo, valor))
+        except (TypeError, ValueError):
+            raise _requisicao_invalida(f"limite inválido em range de [{campo}]", 'query_shard_exception')
+        return self._constante(mascara, opcoes.get('boost', 1.0))
+
+    def _padrao(self, campo, aceita, boost):
+        mascara = np.zeros(self.n, dtype=bool)
+        termos = [t for t in self.indice.postings.get(campo, {}) if aceita(t)]
+        for termo in termos:
+            mascara[self.indice.posting(campo, termo)[0]] = True
+        self.realce.setdefault(campo, set()).update(termos)
+        return self._constante(mascara, boost)
+
+    def _q_wildcard(self, corpo):
+        campo, padrao, opcoes = _campo_e_argumentos(corpo, 'value')
+        padrao = str(padrao if padrao is not None else opcoes.get('wildcard', ''))
+        flags = re.IGNORECASE if opcoes.get('case_insensitive') else 0
+        regex = re.compile(translate(padrao.replace('[', '[[]')), flags)
+        return self._padrao(campo, regex.match, opcoes.get('boost', 1.0))
+
+    def _q_prefix(self, corpo):
+        campo, prefixo, opcoes = _campo_e_argumentos(corpo, 'value')
+        if opcoes.get('case_insensitive'):
+            prefixo = str(prefixo).lower()
+            return self._padrao(campo, lambda t: t.lower().startswith(prefixo), opcoes.get('boost', 1.0))
+        return self._padrao(campo, lambda t: t.startswith(str(prefixo)), opcoes.get('boost', 1.0))
+
+    def _q_bool(self, corpo):
+        must, filtros = _lista(corpo.get('must')), _lista(corpo.get('filter'))
+        should, must_not = _lista(corpo.get('should')), _lista(corpo.get('must_not'))
+        mascara = self.vivos.copy()
+        pontos = np.zeros(self.n)
+        for query in must:
+            m, p = self.avaliar(query)
+            mascara &= m
+            pontos += p
+        for query in filtros:
+            mascara &= self.avaliar(query)[0]
+        if should:
+            acertos = np.zeros(self.n, dtype=np.int32)
+            for query in should:
+                m, p = self.avaliar(query)
+                acertos += m
+                pontos += np.where(m, p, 0.0)
+            padrao = 0 if must or filtros else 1
+            mascara &= acertos >= _minimo_deve(corpo.get('minimum_should_match', padrao), len(should))
+        for query in must_not:
+            mascara &= ~self.avaliar(query)[0]
+        return mascara, np.where(mascara, pontos * float(corpo.get('boost', 1.0)), 0.0)
+
+    def _q_constant_score(self, corpo):
+        return self._constante(self.avaliar(corpo['filter'])[0], corpo.get('boost', 1.0))
+
+    def _q_percolate(self, corpo):
+        """Percolação: indexa os documentos num índice temporário com o mesmo mapping e roda cada query salva"""
+        campo = corpo.get('field')
+        spec = self.indice.campos.get(campo)
+        if spec is None or spec.tipo_es != 'percolator':
+            raise _requisicao_invalida(f"[{campo}] não é um campo percolator", 'query_shard_exception')
+        documentos = corpo.get('documents') or _lista(corpo.get('document'))
+        temporario = Indice('_percolacao', {'settings': self.indice.settings, 'mappings': self.indice.mappings})
+        for slot, documento in enumerate(documentos):
+            temporario.gravar(str(slot), documento)
+
+        mascara, pontos = self._vazio()
+        for pos in np.flatnonzero(self.vivos).tolist():
+            query = self.indice.fontes[pos].get(campo)
+            if not query:
+                continue
+            m, _ = Consulta(self.motor, temporario).avaliar(query)
+            slots = np.flatnonzero(m).tolist()
+            if slots:
+                mascara[pos] = True
+                pontos[pos] = 1.0
+                self.slots[pos] = slots
+        return mascara, pontos
+
+    def knn(self, corpo):
+        """kNN exato por cosseno (score = (1 + cos) / 2, como o ES)"""
+        campo = corpo.get('field')
+        matriz = self.indice.vetores.get(campo)
+        if matriz is None:
+            raise _requisicao_invalida(f"[knn] campo [{campo}] sem vetores", 'illegal_argument_exception')
+        consulta = np.asarray(corpo['query_vector'], dtype=np.float32)
+        mascara = self.indice.presenca[campo][:self.n].copy()
+        for filtro in _lista(corpo.get('filter')):
+            mascara &= self.avaliar(filtro)[0]
+
+        vetores = matriz[:self.n]
+        normas = np.linalg.norm(vetores, axis=1) * (np.linalg.norm(consulta) or 1.0)
+        cosseno = np.divide(vetores @ consulta, normas, out=np.zeros(self.n, dtype=np.float32), where=normas > 0)
+        notas = np.where(mascara, (1 + cosseno.astype(np.float64)) / 2, 0.0)
+        k = int(corpo.get('k', 10))
+        melhores = self.indice.ordenar(np.flatnonzero(mascara), notas, None, limite=k)
+        selecionados = self._mascara(melhores)
+        return selecionados, np.where(selecionados, notas * float(corpo.get('boost', 1.0)), 0.0)
+
+    # --------------------------------------------------------
+    # Agregações
+    # --------------------------------------------------------
+    def agregar(self, aggs, mascara, pontos):
+        resultado = {}
+        for nome, definicao in aggs.items():
+            subaggs = definicao.get('aggs', definicao.get('aggregations'))
+            tipos = [k for k in definicao if k not in ('aggs', 'aggregations', 'meta')]
+            if len(tipos) != 1:
+                raise _requisicao_invalida(f"agregação [{nome}] malformada")
+            metodo = getattr(self, f"_a_{tipos[0]}", None)
+            if metodo is None:
+                raise _requisicao_invalida(f"agregação [{tipos[0]}] não é suportada pelo backend local")
+            resultado[nome] = metodo(definicao[tipos[0]], mascara, pontos, subaggs)
+        return resultado
+
+    def _balde(self, corpo, mascara, pontos, subaggs):
+        if subaggs:
+            corpo.update(self.agregar(subaggs, mascara, pontos))
+        return corpo
+
+    def _coluna(self, campo):
+        spec = self.indice.campos.get(campo)
+        if spec is not None and spec.tipo not in ('numero', 'data', 'booleano'):
+            raise _requisicao_invalida(f"Field [{campo}] of type [{spec.tipo_es}] is not supported for aggregation",
+                                       'illegal_argument_exception')
+        return self.indice.colunas.get(campo, np.full(self.n, np.nan))[:self.n]
+
+    def _chave_numerica(self, campo, valor):
+        spec = self.indice.campos.get(campo)
+        if spec is not None and (spec.tipo_es in TIPOS_INTEIROS or spec.tipo in ('data', 'booleano')):
+            return int(valor)
+        return float(valor)
+
+    def _a_terms(self, corpo, mascara, pontos, subaggs):
+        campo = corpo['field']
+        spec = self.indice.campos.get(campo)
+        if spec is not None and spec.tipo == 'text':
+            raise _requisicao_invalida(f"Text fields are not optimised for operations that require per-document "
+                                       f"field data [{campo}]", 'illegal_argument_exception')
+        contagens = []
+        if spec is not None and spec.tipo == 'keyword':
+            for termo in self.indice.postings.get(campo, {}):
+                balde = self._mascara(self.indice.posting(campo, termo)[0]) & mascara
+                contagens.append((termo, int(balde.sum()), balde))
+        elif spec is not None:
+            coluna = self._coluna(campo)
+            valores, quantidades = np.unique(coluna[mascara & ~np.isnan(coluna)], return_counts=True)
+            for valor, quantidade in zip(valores.tolist(), quantidades.tolist()):
+                contagens.append((self._chave_numerica(campo, valor), quantidade, mascara & (coluna == valor)))
+
+        contagens = [c for c in contagens if c[1] >= int(corpo.get('min_doc_count', 1))]
+        ordem = corpo.get('order', {'_count': 'desc'})
+        criterios = list(ordem.items()) if isinstance(ordem, dict) else [next(iter(o.items())) for o in ordem]
+        for chave, direcao in reversed(criterios + [('_key', 'asc')]):
+            indice = 1 if chave == '_count' else 0
+            contagens.sort(key=lambda c: c[indice], reverse=direcao == 'desc')
+        tamanho = int(corpo.get('size', 10))
+        baldes = []
+        for chave, quantidade, balde in contagens[:tamanho]:
+            item = {"key": chave, "doc_count": quantidade}
+            if spec is not None and spec.tipo == 'booleano':
+                item["key_as_string"] = 'true' if chave else 'false'
+            baldes.append(self._balde(item, balde, pontos, subaggs))
+        return {
+            "doc_count_error_upper_bound": 0,
+            "sum_other_doc_count": sum(c[1] for c in contagens[tamanho:]),
+            "buckets": baldes
+        }
+
+    def _a_histogram(self, corpo, mascara, pontos, subaggs):
+        campo = corpo['field']
+        intervalo = float(corpo['interval'])
+        deslocamento = float(corpo.get('offset', 0))
+        minimo = int(corpo.get('min_doc_count', 0))
+        coluna = self._coluna(campo)
+        presentes = mascara & ~np.isnan(coluna)
+        chaves_docs = np.floor((coluna[presentes] - deslocamento) / intervalo) * intervalo + deslocamento
+        chaves, quantidades = np.unique(chaves_docs, return_counts=True)
+        contagem = dict(zip(chaves.tolist(), quantidades.tolist()))
+        if minimo == 0 and len(chaves):
+            passos = int(round((chaves[-1] - chaves[0]) / intervalo))
+            todas = [chaves[0] + i * intervalo for i in range(passos + 1)]
+        else:
+            todas = [c for c in chaves.tolist() if contagem[c] >= minimo]
+        baldes = []
+        for chave in todas:
+            balde = presentes & (coluna >= chave) & (coluna < chave + intervalo) if subaggs else None
+            baldes.append(self._balde({"key": float(chave), "doc_count": contagem.get(chave, 0)},
+                                      balde, pontos, subaggs))
+        return {"buckets": baldes}
+
+    def _a_range(self, corpo, mascara, pontos, subaggs):
+        campo = corpo['field']
+        coluna = self._coluna(campo)
+        presentes = mascara & ~np.isnan(coluna)
+        baldes = []
+        for faixa in corpo.get('ranges', []):
+            inicio, fim = faixa.get('from'), faixa.get('to')
+            balde = presentes.copy()
+            if inicio is not None:
+                balde &= coluna >= float(inicio)
+            if fim is not None:
+                balde &= coluna < float(fim)
+            chave = faixa.get('key') or \
+                f"{'*' if inicio is None else float(inicio)}-{'*' if fim is None else float(fim)}"
+            item = {"key": chave}
+            if inicio is not None:
+                item["from"] = float(inicio)
+            if fim is not None:
+                item["to"] = float(fim)
+            item["doc_count"] = int(balde.sum())
+            baldes.append(self._balde(item, balde, pontos, subaggs))
+        if corpo.get('keyed'):
+            return {"buckets": {b.pop('key'): b for b in baldes}}
+        return {"buckets": baldes}
+
+    def _valores_metricos(self, corpo, mascara):
+        coluna = self._coluna(corpo['field'])
+        valores = coluna[mascara & ~np.isnan(coluna)]
+        if 'missing' in corpo:
+            ausentes = int((mascara & np.isnan(coluna)).sum())
+            valores = np.concatenate([valores, np.full(ausentes, float(corpo['missing']))])
+        return valores
+
+    def _a_stats(self, corpo, mascara, pontos, subaggs):
+        valores = self._valores_metricos(corpo, mascara)
+        if not len(valores):
+            return {"count": 0, "min": None, "max": None, "avg": None, "sum": 0.0}
+        return {"count": int(len(valores)), "min": float(valores.min()), "max": float(valores.max()),
+                "avg": float(valores.mean()), "sum": float(valores.sum())}
+
+    def _a_avg(self, corpo, mascara, pontos, subaggs):
+        return {"value": self._a_stats(corpo, mascara, pontos, subaggs)['avg']}
+
+    def _a_min(self, corpo, mascara, pontos, subaggs):
+        return {"value": self._a_stats(corpo, mascara, pontos, subaggs)['min']}
+
+    def _a_max(self, corpo, mascara, pontos, subaggs):
+        return {"value": self._a_stats(corpo, mascara, pontos, subaggs)['max']}
+
+    def _a_sum(self, corpo, mascara, pontos, subaggs):
+        return {"value": self._a_stats(corpo, mascara, pontos, subaggs)['sum']}
+
+    def _a_value_count(self, corpo, mascara, pontos, subaggs):
+        presenca = self.indice.presenca.get(corpo['field'])
+        return {"value": 0 if presenca is None else int((presenca[:self.n] & mascara).sum())}
+
+    def _a_cardinality(self, corpo, mascara, pontos, subaggs):
+        campo = corpo['field']
+        spec = self.indice.campos.get(campo)
+        if spec is not None and spec.tipo == 'keyword':
+            return {"value": sum(1 for termo in self.indice.postings.get(campo, {})
+                                 if mascara[self.indice.posting(campo, termo)[0]].any())}
+        return {"value": int(len(np.unique(self._valores_metricos(corpo, mascara))))}
+
+    def _a_filter(self, corpo, mascara, pontos, subaggs):
+        balde = mascara & self.avaliar(corpo)[0]
+        return self._balde({"doc_count": int(balde.sum())}, balde, pontos, subaggs)
+
+    def _a_filters(self, corpo, mascara, pontos, subaggs):
+        baldes = {}
+        for nome, query in corpo.get('filters', {}).items():
+            balde = mascara & self.avaliar(query)[0]
+            baldes[nome] = self._balde({"doc_count": int(balde.sum())}, balde, pontos, subaggs)
+        return {"buckets": baldes}
+
+    def _a_top_hits(self, corpo, mascara, pontos, subaggs):
+        ordenacao = ler_ordenacao(corpo.get('sort'))
+        inicio, tamanho = int(corpo.get('from', 0)), int(corpo.get('size', 3))
+        posicoes = self.indice.ordenar(np.flatnonzero(mascara), pontos, ordenacao, limite=inicio + tamanho)[inicio:]
+        pontuar = not ordenacao or any(c == '_score' for c, _, _ in ordenacao)
+        return {"hits": {
+            "total": {"value": int(mascara.sum()), "relation": "eq"},
+            "max_score": float(pontos[posicoes].max()) if pontuar and len(posicoes) else None,
+            "hits": [self.hit(pos, pontos[pos] if pontuar else None, ordenacao, corpo) for pos in posicoes.tolist()]
+        }}
+
+    # --------------------------------------------------------
+    # Hits
+    # --------------------------------------------------------
+    def hit(self, pos, ponto, ordenacao, corpo):
+        indice = self.indice
+        hit = {"_index": indice.nome, "_id": indice.ids[pos], "_score": None if ponto is None else float(ponto)}
+        if corpo.get('version'):
+            hit["_version"] = indice.versoes[pos]
+        fonte = filtrar_fonte(indice.fontes[pos], corpo.get('_source'))
+        if fonte is not None:
+            hit["_source"] = fonte
+        if ordenacao:
+            hit["sort"] = [float(ponto or 0.0) if campo == '_score' else pos if campo == '_doc'
+                           else indice.valor_de_ordenacao(campo, pos) for campo, _, _ in ordenacao]
+        if corpo.get('highlight'):
+            realces = self.realcar(indice.fontes[pos], corpo['highlight'])
+            if realces:
+                hit["highlight"] = realces
+        if pos in self.slots:
+            hit["fields"] = {"_percolator_document_slot": self.slots[pos]}
+        return hit
+
+    def realcar(self, fonte, especificacao):
+        """Destacar, no texto original, os termos que a query usou em cada campo"""
+        abre = _lista(especificacao.get('pre_tags', ['<em>']))[0]
+        fecha = _lista(especificacao.get('post_tags', ['</em>']))[0]
+        campos = especificacao.get('fields', {})
+        if isinstance(campos, list):
+            campos = {k: v for item in campos for k, v in item.items()}
+        resultado = {}
+        for campo in campos:
+            termos = self.realce.get(campo)
+            spec = self.indice.campos.get(campo)
+            if not termos or spec is None or spec.tipo != 'text':
+                continue
+            fragmentos = []
+            for valor in _valores(fonte, spec.origem):
+                texto = str(valor)
+                partes, ultimo = [], 0
+                for palavra in _PALAVRA.finditer(texto):
+                    if set(analisar(palavra.group(), spec.dobrar)) & termos:
+                        partes += [texto[ultimo:palavra.start()], abre, palavra.group(), fecha]
+                        ultimo = palavra.end()
+                if partes:
+                    fragmentos.append(''.join(partes) + texto[ultimo:])
+            if fragmentos:
+                resultado[campo] = fragmentos
+        return resultado
+
+
+def ler_ordenacao(sort):
+    """sort do ES -> [(campo, 'asc'|'desc', missing)]"""
+    ordenacao = []
+    for item in _lista(sort):
+        if isinstance(item, str):
+            campo, _, ordem = item.partition(':')
+            ordenacao.append((campo, ordem or ('desc' if campo == '_score' else 'asc'), None))
+            continue
+        for campo, opcoes in item.items():
+            if isinstance(opcoes, str):
+                opcoes = {'order': opcoes}
+            ordem = opcoes.get('order', 'desc' if campo == '_score' else 'asc')
+            ordenacao.append((campo, ordem, opcoes.get('missing')))
+    return ordenacao
+
+# ============================================================
+# CLIENTE
+# ============================================================
+
+def _duracao(texto):
+    """'5m', '30s', '1h' -> segundos"""
+    unidades = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    correspondencia = re.match(r"^(\d+)(ms|s|m|h|d)$", str(texto))
+    if not correspondencia:
+        return 300
+    return int(correspondencia.group(1)) * unidades[correspondencia.group(2)]
+
+
+def _perfil(indice, consulta, corpo, inicio, fim_consulta, fim_fetch, fim):
+    """Resposta de "profile": true com um shard, a árvore de cláusulas e os tempos de fetch e agregações"""
+    nanos = lambda segundos: int(segundos * 1e9)
+    aggs = corpo.get('aggs', corpo.get('aggregations'))
+    return {"shards": [{
+        "id": f"[local][{indice.nome}][0]",
+        "searches": [{
+            # Cada cláusula com o tempo de avaliação das suas máscaras (não há fases do Lucene aqui)
+            "query": consulta.perfil or [],
+            "rewrite_time": 0,
+            "collector": [{"name": "LocalCollector", "reason": "search_top_hits",
+                           "time_in_nanos": nanos(fim_consulta - inicio)}]
+        }],
+        # As agregações são avaliadas juntas: um único nó com o tempo de todas
+        "aggregations": [{"type": "local", "description": ",".join(aggs), "time_in_nanos": nanos(fim - fim_fetch),
+                          "breakdown": {}}] if aggs else [],
+        "fetch": {"type": "fetch", "description": "", "time_in_nanos": nanos(fim_fetch - fim_consulta),
+                  "breakdown": {}, "debug": {}, "children": []}
+    }]}
+
+
+def _linhas_bulk(corpo):
+    """Corpo do _bulk (NDJSON em bytes/str, ou lista de dicts/linhas) -> lista de dicts"""
+    if isinstance(corpo, (bytes, bytearray, memoryview)):
+        corpo = bytes(corpo).decode('utf-8')
+    if isinstance(corpo, str):
+        return [json.loads(linha) for linha in corpo.splitlines() if linha.strip()]
+    linhas = []
+    for item in corpo:
+        if isinstance(item, (bytes, str)):
+            linhas.extend(_linhas_bulk(item))
+        else:
+            linhas.append(item)
+    return linhas
+
+
+class _ApiIndices:
+    """es.indices: criação, aliases e settings"""
+
+    def __init__(self, motor):
+        self._motor = motor
+
+    def exists(self, index, **_):
+        with self._motor._lock:
+            try:
+                existe = bool(self._motor.concretos(index))
+            except NotFoundError:
+                existe = False
+        return HeadApiResponse(meta=_meta(200 if existe else 404))
+
+    def create(self, index, body=None, mappings=None, settings=None, aliases=None, **_):
+        corpo = dict(body or {})
+        if mappings is not None:
+            corpo['mappings'] = mappings
+        if settings is not None:
+            corpo['settings'] = settings
+        if aliases is not None:
+            corpo['aliases'] = aliases
+        with self._motor._lock:
+            self._motor.criar_indice(index, corpo)
+        return _resposta({"acknowledged": True, "shards_acknowledged": True, "index": index})
+
+    def delete(self, index, ignore_unavailable=False, **_):
+        with self._motor._lock:
+            for nome in self._motor.concretos(index, ignore_unavailable):
+                self._motor.remover_indice(nome)
+        return _resposta({"acknowledged": True})
+
+    def get(self, index, ignore_unavailable=False, allow_no_indices=True, **_):
+        with self._motor._lock:
+            nomes = self._motor.concretos(index, ignore_unavailable)
+            return _resposta({nome: self._motor._indices[nome].descricao(self._motor.aliases_do_indice(nome))
+                              for nome in nomes})
+
+    def get_mapping(self, index=None, **_):
+        with self._motor._lock:
+            return _resposta({nome: {"mappings": _copiar(self._motor._indices[nome].mappings)}
+                              for nome in self._motor.concretos(index)})
+
+    def get_settings(self, index=None, **_):
+        with self._motor._lock:
+            return _resposta({nome: {"settings": self._motor._indices[nome].descricao({})['settings']}
+                              for nome in self._motor.concretos(index)})
+
+    def put_settings(self, index=None, body=None, settings=None, **_):
+        novos = dict(body or settings or {})
+        if 'index' in novos:
+            novos = {**{k: v for k, v in novos.items() if k != 'index'}, **novos['index']}
+        novos = {(k[len('index.'):] if k.startswith('index.') else k): v for k, v in novos.items()}
+        with self._motor._lock:
+            for nome in self._motor.concretos(index):
+                atuais = self._motor._indices[nome].settings.setdefault('index', {})
+                for chave, valor in novos.items():
+                    if valor is None:
+                        atuais.pop(chave, None)
+                    else:
+                        atuais[chave] = valor
+        return _resposta({"acknowledged": True})
+
+    def refresh(self, index=None, **_):
+        # As escritas já são visíveis assim que gravadas
+        with self._motor._lock:
+            total = len(self._motor.concretos(index, True)) if index else len(self._motor._indices)
+        return _resposta({"_shards": {"total": total, "successful": total, "failed": 0}})
+
+    def validate_query(self, index=None, body=None, query=None, explain=False, rewrite=False, **_):
+        # Sem Lucene não há consulta reescrita: a explicação é o próprio DSL avaliado
+        consulta = (body or {}).get('query', query) or {"match_all": {}}
+        with self._motor._lock:
+            indice = self._motor.indice_de_leitura(index)
+            try:
+                Consulta(self._motor, indice).avaliar(consulta)
+                explicacao = {"index": indice.nome, "valid": True,
+                              "explanation": json.dumps(consulta, ensure_ascii=False, default=str)}
+            except BadRequestError as e:
+                explicacao = {"index": indice.nome, "valid": False, "error": str(e)}
+        resposta = {"_shards": {"total": 1, "successful": 1, "failed": 0}, "valid": explicacao['valid']}
+        if explain or rewrite:
+            resposta['explanations'] = [explicacao]
+        return _resposta(resposta)
+
+    def exists_alias(self, name, index=None, **_):
+        with self._motor._lock:
+            existe = bool(self._motor.aliases_filtrados(name, index))
+        return HeadApiResponse(meta=_meta(200 if existe else 404))
+
+    def get_alias(self, name=None, index=None, **_):
+        with self._motor._lock:
+            encontrados = self._motor.aliases_filtrados(name, index)
+            if name is not None and not encontrados:
+                raise _erro(NotFoundError, 404, 'aliases_not_found_exception', f"alias [{name}] missing")
+            if name is None:
+                for nome in self._motor.concretos(index or '_all', True):
+                    encontrados.setdefault(nome, {})
+            return _resposta({nome: {"aliases": aliases} for nome, aliases in encontrados.items()})
+
+    def update_aliases(self, body=None, actions=None, **_):
+        with self._motor._lock:
+            self._motor.atualizar_aliases((body or {}).get('actions', actions or []))
+        return _resposta({"acknowledged": True})
+
+
+class ElasticsearchLocal:
+    """Substituto em processo do cliente `Elasticsearch`, com a mesma interface para o que a API usa
+
+    Busca: query (match_all, match, multi_match com boosts/fuzziness,
+    match_phrase_prefix, term(s), range, exists, ids, wildcard, prefix,
+    bool, more_like_this, percolate), knn, post_filter, sort, from/size, _source,
+    highlight e aggs (terms, histogram, range, stats, avg/min/max/sum,
+    filter(s), top_hits). Documentos: get/mget/index/update/delete/
+    count/bulk e scroll (helpers.scan). Índices: create/delete/exists/
+    get, aliases e settings. As escritas ficam visíveis na hora (refresh
+    é no-op) e tudo roda sob um único lock.
+    """
+
+    def __init__(self):
+        self._indices = {}
+        self._aliases = {}
+        self._rolagens = {}
+        self._lock = threading.RLock()
+        self.indices = _ApiIndices(self)
+        self._client_meta = ()
+        # helpers.bulk serializa as ações com o serializer do transporte
+        self.transport = SimpleNamespace(serializers=SimpleNamespace(get_serializer=lambda mimetype: JSONSerializer()))
+
+    # --------------------------------------------------------
+    # Cliente
+    # --------------------------------------------------------
+    def options(self, **_):
+        return self
+
+    def ping(self, **_):
+        return True
+
+    def info(self, **_):
+        return _resposta({"name": "rpg-local", "cluster_name": "rpg-local", "version": {"number": "8.11.0-local"}})
+
+    def close(self):
+        pass
+
+    # --------------------------------------------------------
+    # Nomes, índices e aliases
+    # --------------------------------------------------------
+    def concretos(self, nome, ignorar_ausentes=False):
+        """Índices concretos para nomes, aliases, listas com vírgula e curingas"""
+        resultado = []
+        for parte in str(nome or '_all').split(','):
+            parte = parte.strip()
+            if parte in ('_all', '*'):
+                resultado += sorted(self._indices)
+            elif '*' in parte or '?' in parte:
+                resultado += sorted({i for i in self._indices if fnmatchcase(i, parte)} |
+                                    {i for a, membros in self._aliases.items() if fnmatchcase(a, parte)
+                                     for i in membros})
+            elif parte in self._indices:
+                resultado.append(parte)
+            elif parte in self._aliases:
+                resultado += sorted(self._aliases[parte])
+            elif not ignorar_ausentes:
+                raise _indice_inexistente(parte)
+        return list(dict.fromkeys(resultado))
+
+    def indice_de_leitura(self, nome):
+        nomes = self.concretos(nome)
+        if len(nomes) != 1:
+            raise _requisicao_invalida(f"backend local consulta um índice por vez ([{nome}] -> {nomes})",
+                                       'illegal_argument_exception')
+        return self._indices[nomes[0]]
+
+    def indice_de_escrita(self, nome):
+        """Índice concreto para gravar (alias -> índice de escrita; nome novo -> criação automática)"""
+        if nome in self._indices:
+            indice = self._indices[nome]
+        elif nome in self._aliases:
+            membros = self._aliases[nome]
+            escrita = [i for i, props in membros.items() if props.get('is_write_index')]
+            if len(membros) == 1:
+                escrita = list(membros)
+            if len(escrita) != 1:
+                raise _requisicao_invalida(f"no write index is defined for alias [{nome}]",
+                                           'illegal_argument_exception')
+            indice = self._indices[escrita[0]]
+        else:
+            indice = self.criar_indice(nome, {})
+        if indice.configuracao('blocks.write') in (True, 'true'):
+            raise _erro(AuthorizationException, 403, 'cluster_block_exception',
+                        f"index [{indice.nome}] blocked by: [FORBIDDEN/8/index write (api)];")
+        return indice
+
+    def criar_indice(self, nome, corpo):
+        if nome in self._indices or nome in self._aliases:
+            raise _requisicao_invalida(f"index [{nome}] already exists", 'resource_already_exists_exception')
+        aliases = (corpo or {}).get('aliases', {})
+        indice = Indice(nome, {k: v for k, v in (corpo or {}).items() if k != 'aliases'})
+        self._indices[nome] = indice
+        for alias, props in aliases.items():
+            self._aliases.setdefault(alias, {})[nome] = dict(props or {})
+        return indice
+
+    def remover_indice(self, nome):
+        del self._indices[nome]
+        for alias in list(self._aliases):
+            self._aliases[alias].pop(nome, None)
+            if not self._aliases[alias]:
+                del self._aliases[alias]
+
+    def aliases_do_indice(self, nome):
+        return {alias: _copiar(membros[nome]) for alias, membros in self._aliases.items() if nome in membros}
+
+    def aliases_filtrados(self, name=None, index=None):
+        """{índice: {alias: props}} para os aliases que casam com `name` (e índices com `index`)"""
+        indices = set(self.concretos(index, True)) if index else None
+        padroes = str(name).split(',') if name else ['*']
+        encontrados = {}
+        for alias, membros in self._aliases.items():
+            if not any(fnmatchcase(alias, p) for p in padroes):
+                continue
+            for nome, props in membros.items():
+                if indices is None or nome in indices:
+                    encontrados.setdefault(nome, {})[alias] = _copiar(props)
+        return encontrados
+
+    def atualizar_aliases(self, acoes):
+        """Ações add/remove/remove_index aplicadas de uma vez (tudo ou nada)"""
+        aliases = {alias: dict(membros) for alias, membros in self._aliases.items()}
+        remover = []
+        for acao in acoes:
+            (tipo, args), = acao.items()
+            nomes = self.concretos(args.get('index') or ','.join(args.get('indices', [])))
+            if tipo == 'remove_index':
+                remover += nomes
+                for membros in aliases.values():
+                    for nome in nomes:
+                        membros.pop(nome, None)
+                continue
+            for alias in _lista(args.get('alias')) + args.get('aliases', []):
+                if tipo == 'add':
+                    if alias in self._indices and alias not in remover:
+                        raise _requisicao_invalida(f"an index or data stream exists with the same name as the "
+                                                   f"alias [{alias}]", 'invalid_alias_name_exception')
+                    props = {k: args[k] for k in ('is_write_index', 'filter', 'routing') if k in args}
+                    for nome in nomes:
+                        aliases.setdefault(alias, {})[nome] = props
+                elif tipo == 'remove':
+                    for nome in nomes:
+                        if nome not in aliases.get(alias, {}):
+                            raise _erro(NotFoundError, 404, 'aliases_not_found_exception',
+                                        f"aliases [{alias}] missing")
+                        del aliases[alias][nome]
+                else:
+                    raise _requisicao_invalida(f"ação de alias [{tipo}] desconhecida")
+        for nome in remover:
+            self._indices.pop(nome, None)
+        self._aliases = {alias: membros for alias, membros in aliases.items() if membros}
+
+    # --------------------------------------------------------
+    # Documentos
+    # --------------------------------------------------------
+    def _resultado_escrita(self, indice, doc_id, resultado, versao, seq_no):
+        return {"_index": indice.nome, "_id": doc_id, "_version": versao, "result": resultado,
+                "_shards": {"total": 1, "successful": 1, "failed": 0}, "_seq_no": seq_no, "_primary_term": 1}
+
+    def _indexar(self, nome, doc_id, fonte, op='index', versao=None, tipo_versao=None):
+        indice = self.indice_de_escrita(nome)
+        doc_id = str(doc_id) if doc_id is not None else secrets.token_urlsafe(15)
+        resultado, versao, seq_no = indice.gravar(doc_id, fonte, op, versao, tipo_versao)
+        return self._resultado_escrita(indice, doc_id, resultado, versao, seq_no)
+
+    def _remover(self, nome, doc_id):
+        indice = self.indice_de_escrita(nome)
+        removido = indice.remover(str(doc_id))
+        if removido is None:
+            raise _erro(NotFoundError, 404, 'not_found', f"[{doc_id}]: document missing")
+        return self._resultado_escrita(indice, str(doc_id), 'deleted', *removido)
+
+    def _atualizar(self, nome, doc_id, corpo):
+        indice = self.indice_de_escrita(nome)
+        encontrado = indice.documento(str(doc_id))
+        if encontrado is None:
+            novo = corpo.get('doc') if corpo.get('doc_as_upsert') else corpo.get('upsert')
+            if novo is None:
+                raise _erro(NotFoundError, 404, 'document_missing_exception', f"[{doc_id}]: document missing")
+            return self._indexar(nome, doc_id, novo)
+        novo = _mesclar(encontrado[1], corpo.get('doc', {}))
+        if novo == encontrado[1]:
+            return self._resultado_escrita(indice, str(doc_id), 'noop', encontrado[2], indice.seq_no)
+        return self._indexar(nome, doc_id, novo)
+
+    def index(self, index, body=None, document=None, id=None, op_type=None, version=None, version_type=None,
+              refresh=None, **_):
+        with self._lock:
+            resposta = self._indexar(index, id, document if document is not None else body,
+                                     op_type or 'index', version, version_type)
+        return _resposta(resposta, 201 if resposta['result'] == 'created' else 200)
+
+    def create(self, index, id, body=None, document=None, refresh=None, **_):
+        return self.index(index, body=body, document=document, id=id, op_type='create')
+
+    def update(self, index, id, body=None, doc=None, doc_as_upsert=None, upsert=None, refresh=None, **_):
+        corpo = dict(body or {})
+        for chave, valor in (('doc', doc), ('doc_as_upsert', doc_as_upsert), ('upsert', upsert)):
+            if valor is not None:
+                corpo[chave] = valor
+        with self._lock:
+            return _resposta(self._atualizar(index, id, corpo))
+
+    def delete(self, index, id, refresh=None, **_):
+        with self._lock:
+            return _resposta(self._remover(index, id))
+
+    def _documento(self, indice, doc_id, fonte=None):
+        encontrado = indice.documento(str(doc_id))
+        if encontrado is None:
+            return {"_index": indice.nome, "_id": str(doc_id), "found": False}
+        pos, armazenada, versao = encontrado
+        documento = {"_index": indice.nome, "_id": str(doc_id), "_version": versao, "_seq_no": pos,
+                     "_primary_term": 1, "found": True}
+        filtrada = filtrar_fonte(armazenada, fonte)
+        if filtrada is not None:
+            documento["_source"] = filtrada
+        return documento
+
+    def get(self, index, id, _source=None, **_):
+        with self._lock:
+            documento = self._documento(self.indice_de_leitura(index), id, _source)
+        if not documento['found']:
+            raise _erro(NotFoundError, 404, 'not_found', f"[{id}]: document missing")
+        return _resposta(documento)
+
+    def exists(self, index, id, **_):
+        with self._lock:
+            try:
+                existe = self.indice_de_leitura(index).documento(str(id)) is not None
+            except NotFoundError:
+                existe = False
+        return HeadApiResponse(meta=_meta(200 if existe else 404))
+
+    def mget(self, index=None, body=None, ids=None, docs=None, _source=None, **_):
+        corpo = dict(body or {})
+        pedidos = [{"_id": i} for i in (ids or corpo.get('ids', []))] + list(docs or corpo.get('docs', []))
+        with self._lock:
+            return _resposta({"docs": [
+                self._documento(self.indice_de_leitura(pedido.get('_index', index)), pedido['_id'],
+                                pedido.get('_source', _source))
+                for pedido in pedidos
+            ]})
+
+    def bulk(self, body=None, operations=None, index=None, refresh=None, **_):
+        inicio = time.perf_counter()
+        linhas = _linhas_bulk(operations if operations is not None else body)
+        itens = []
+        with self._lock:
+            i = 0
+            while i < len(linhas):
+                (op, meta), = linhas[i].items()
+                fonte = None
+                if op != 'delete':
+                    fonte = linhas[i + 1]
+                    i += 1
+                i += 1
+                nome = meta.get('_index', index)
+                try:
+                    if op in ('index', 'create'):
+                        resultado = self._indexar(nome, meta.get('_id'), fonte, op, meta.get('version'),
+                                                  meta.get('version_type'))
+                        resultado['status'] = 201 if resultado['result'] == 'created' else 200
+                    elif op == 'delete':
+                        indice = self.indice_de_escrita(nome)
+                        if indice.documento(str(meta['_id'])) is None:
+                            # Como no ES: not_found no item, sem contar como erro do _bulk
+                            resultado = {"_index": indice.nome, "_id": str(meta['_id']), "result": "not_found",
+                                         "status": 404}
+                        else:
+                            resultado = {**self._remover(nome, meta['_id']), 'status': 200}
+                    elif op == 'update':
+                        resultado = {**self._atualizar(nome, meta['_id'], fonte), 'status': 200}
+                    else:
+                        raise _requisicao_invalida(f"operação de bulk [{op}] desconhecida")
+                except (BadRequestError, ConflictError, NotFoundError, AuthorizationException) as e:
+                    erro = {k: v for k, v in e.body['error'].items() if k != 'root_cause'}
+                    resultado = {"_index": nome, "_id": meta.get('_id'), "status": e.meta.status, "error": erro}
+                itens.append({op: resultado})
+        return _resposta({
+            "took": int((time.perf_counter() - inicio) * 1000),
+            "errors": any('error' in resultado for item in itens for resultado in item.values()),
+            "items": itens
+        })
+
+    # --------------------------------------------------------
+    # Busca
+    # --------------------------------------------------------
+    def _executar(self, indice, corpo, rolagem=False):
+        """Avaliar query/knn e devolver (consulta, máscara, máscara dos hits, pontuações, posições, ordenação)"""
+        desconhecidas = set(corpo) - CHAVES_BUSCA
+        if desconhecidas:
+            raise _requisicao_invalida(f"Unknown key for a START_OBJECT in [{sorted(desconhecidas)[0]}].")
+        consulta = Consulta(self, indice)
+        if corpo.get('profile'):
+            consulta.perfil = []
+        mascara, pontos = consulta.avaliar(corpo['query']) if 'query' in corpo else (None, None)
+        if 'knn' in corpo:
+            mk, pk = np.zeros(indice.n, dtype=bool), np.zeros(indice.n)
+            for knn in _lista(corpo['knn']):
+                m, p = consulta.knn(knn)
+                mk |= m
+                pk += p
+            mascara, pontos = (mk, pk) if mascara is None else (mascara | mk, pontos + pk)
+        if mascara is None:
+            mascara, pontos = consulta.avaliar({"match_all": {}})
+        mascara &= consulta.vivos
+        if corpo.get('min_score') is not None:
+            mascara &= pontos >= float(corpo['min_score'])
+        # post_filter restringe só os hits; as agregações ficam com `mascara`
+        mascara_hits = mascara & consulta.avaliar(corpo['post_filter'])[0] if 'post_filter' in corpo else mascara
+
+        ordenacao = ler_ordenacao(corpo.get('sort'))
+        limite = None if rolagem else int(corpo.get('from', 0)) + int(corpo.get('size', 10))
+        posicoes = indice.ordenar(np.flatnonzero(mascara_hits), pontos, ordenacao, limite)
+        return consulta, mascara, mascara_hits, pontos, posicoes, ordenacao
+
+    def _hits(self, consulta, pontos, posicoes, ordenacao, corpo):
+        pontuar = not ordenacao or corpo.get('track_scores') or any(c == '_score' for c, _, _ in ordenacao)
+        return [consulta.hit(pos, pontos[pos] if pontuar else None, ordenacao, corpo) for pos in posicoes.tolist()]
+
+    def search(self, index=None, body=None, scroll=None, **parametros):
+        inicio = time.perf_counter()
+        corpo = dict(body or {})
+        for chave, valor in parametros.items():
+            chave = 'from' if chave == 'from_' else chave
+            if chave in CHAVES_BUSCA:
+                corpo[chave] = valor
+        with self._lock:
+            indice = self.indice_de_leitura(index)
+            consulta, mascara, mascara_hits, pontos, posicoes, ordenacao = self._executar(
+                indice, corpo, rolagem=bool(scroll))
+            fim_consulta = time.perf_counter()
+            total = int(mascara_hits.sum())
+            resposta = {"took": 0, "timed_out": False,
+                        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}, "hits": {}}
+
+            rastrear = corpo.get('track_total_hits', TRACK_TOTAL_HITS_PADRAO)
+            if rastrear is True or scroll:
+                resposta['hits']['total'] = {"value": total, "relation": "eq"}
+            elif rastrear is not False:
+                resposta['hits']['total'] = {"value": min(total, int(rastrear)),
+                                             "relation": "eq" if total <= int(rastrear) else "gte"}
+
+            if scroll:
+                rolagem_id = secrets.token_urlsafe(16)
+                agora = time.time()
+                self._rolagens = {k: r for k, r in self._rolagens.items() if r['expira'] > agora}
+                self._rolagens[rolagem_id] = {
+                    'consulta': consulta, 'pontos': pontos, 'ordenacao': ordenacao, 'corpo': corpo,
+                    'tamanho': int(corpo.get('size', 10)), 'expira': agora + _duracao(scroll),
+                    # Retrato dos documentos: escritas depois daqui não aparecem na rolagem
+                    'restantes': [(pos, indice.ids[pos], indice.fontes[pos]) for pos in posicoes.tolist()]
+                }
+                resposta['_scroll_id'] = rolagem_id
+                resposta['hits']['hits'] = self._pagina(rolagem_id)
+            else:
+                posicoes = posicoes[int(corpo.get('from', 0)):]
+                resposta['hits']['hits'] = self._hits(consulta, pontos, posicoes, ordenacao, corpo)
+            fim_fetch = time.perf_counter()
+
+            notas = [h['_score'] for h in resposta['hits']['hits'] if h['_score'] is not None]
+            resposta['hits']['max_score'] = max(notas) if notas else None
+            aggs = corpo.get('aggs', corpo.get('aggregations'))
+            if aggs:
+                resposta['aggregations'] = consulta.agregar(aggs, mascara, pontos)
+            if corpo.get('profile'):
+                resposta['profile'] = _perfil(indice, consulta, corpo, inicio, fim_consulta, fim_fetch, time.perf_counter())
+        resposta['took'] = int((time.perf_counter() - inicio) * 1000)
+        return _resposta(resposta)
+
+    def _pagina(self, rolagem_id):
+        rolagem = self._rolagens[rolagem_id]
+        pagina = rolagem['restantes'][:rolagem['tamanho']]
+        del rolagem['restantes'][:rolagem['tamanho']]
+        consulta, corpo = rolagem['consulta'], rolagem['corpo']
+        hits = []
+        for pos, doc_id, fonte in pagina:
+            hit = consulta.hit(pos, rolagem['pontos'][pos], rolagem['ordenacao'], corpo)
+            hit['_id'] = doc_id
+            fonte = filtrar_fonte(fonte, corpo.get('_source'))
+            if fonte is not None:
+                hit['_source'] = fonte
+            hits.append(hit)
+        return hits
+
+    def scroll(self, scroll_id, scroll=None, **_):
+        with self._lock:
+            if scroll_id not in self._rolagens:
+                raise _erro(NotFoundError, 404, 'search_context_missing_exception',
+                            f"No search context found for id [{scroll_id}]")
+            if scroll:
+                self._rolagens[scroll_id]['expira'] = time.time() + _duracao(scroll)
+            hits = self._pagina(scroll_id)
+        return _resposta({"_scroll_id": scroll_id, "took": 0, "timed_out": False,
+                          "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+                          "hits": {"hits": hits}})
+
+    def clear_scroll(self, scroll_id=None, **_):
+        with self._lock:
+            liberados = sum(self._rolagens.pop(i, None) is not None for i in _lista(scroll_id))
+        return _resposta({"succeeded": True, "num_freed": liberados})
+
+    def count(self, index=None, body=None, query=None, **_):
+        corpo = dict(body or {})
+        if query is not None:
+            corpo['query'] = query
+        desconhecidas = set(corpo) - {'query'}
+        if desconhecidas:
+            raise _requisicao_invalida(f"request does not support [{sorted(desconhecidas)[0]}]")
+        with self._lock:
+            indice = self.indice_de_leitura(index)
+            consulta = Consulta(self, indice)
+            mascara = consulta.avaliar(corpo.get('query', {"match_all": {}}))[0] & consulta.vivos
+        return _resposta({"count": int(mascara.sum()),
+                          "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}})
+
+# ============================================================
+# CARGA INICIAL
+# ============================================================
+
+def popular(es, escala=1.0, seed=42, dataset=None, zipf=None, tamanho_lote=10000):
+    """Criar os índices versionados e carregar o gerador (ou um dataset de ingestao_rpg.py)"""
+    from gerador_rpg import ALIAS_ENTIDADES, BASE_ENTIDADES, lotes
+    from indices_rpg import garantir_indice
+
+    inicio = time.perf_counter()
+    if dataset:
+        with open(os.path.join(dataset, 'manifesto.json'), encoding='utf-8') as f:
+            manifesto = json.load(f)
+        for info in manifesto['entidades'].values():
+            garantir_indice(es, info['indice'])
+            for shard in info['shards']:
+                with open(os.path.join(dataset, shard), 'rb') as f:
+                    es.bulk(index=info['indice'], body=f.read())
+    else:
+        for entidade, base in BASE_ENTIDADES.items():
+            alias = ALIAS_ENTIDADES[entidade]
+            garantir_indice(es, alias)
+            for ids, docs in lotes(entidade, int(base * escala), seed, zipf, tamanho_lote):
+                operacoes = []
+                for doc_id, doc in zip(ids, docs):
+                    operacoes += [{"index": {"_id": doc_id}}, doc]
+                es.bulk(index=alias, operations=operacoes)
+
+    totais = {alias: es.count(index=alias)['count'] for alias in ALIAS_ENTIDADES.values()
+              if es.indices.exists(index=alias)}
+    print(f"✅ Backend local carregado em {time.perf_counter() - inicio:.1f}s: {totais}")
+    return totais
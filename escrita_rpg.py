@@ -0,0 +1,403 @@
+# escrita_rpg.py - Fila write-behind: escritas agrupadas em _bulk com journal local
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+# Operações pendentes antes de a fila recusar novas escritas
+CAPACIDADE_PADRAO = 10000
+
+# Um lote é enviado ao atingir este tamanho ou este tempo (o que vier antes)
+TAMANHO_LOTE_PADRAO = 500
+INTERVALO_FLUSH_PADRAO = 0.2
+
+# Resultados de escritas já gravadas guardados para consulta pelo ack
+MAX_RESULTADOS = 100000
+
+# Tentativas de um lote com o _bulk falhando antes de marcar as escritas como falhas;
+# a espera entre elas dobra a cada tentativa, até ESPERA_MAXIMA segundos
+MAX_TENTATIVAS_PADRAO = 5
+ESPERA_RETENTATIVA_PADRAO = 1.0
+ESPERA_MAXIMA = 30
+
+# Valores aceitos no parâmetro refresh, do mais barato ao mais caro
+POLITICAS_REFRESH = ('false', 'wait_for', 'true')
+
+# Intervalo de refresh periódico do ES (index.refresh_interval padrão), esperado
+# por um refresh explícito que ficou sem ficha no orçamento
+INTERVALO_REFRESH_PERIODICO = 1.0
+
+
+class FilaCheia(Exception):
+    """A fila write-behind está no limite; o cliente deve tentar de novo"""
+
+
+class OrcamentoRefresh:
+    """Limite de refresh=true por índice (token bucket)
+
+    Cada índice ganha `por_minuto` fichas por minuto, acumulando até
+    `rajada`. Um refresh forçado gasta uma ficha; sem fichas, a escrita
+    passa a wait_for, que espera o próximo refresh periódico em vez de
+    criar um segmento novo. As semeaduras das estruturas em memória
+    pedem o refresh delas por `refrescar`, do mesmo orçamento.
+    """
+
+    def __init__(self, por_minuto=60, rajada=None):
+        self.por_segundo = por_minuto / 60
+        self.rajada = rajada if rajada is not None else max(por_minuto, 1)
+        self._fichas = {}
+        self._lock = threading.Lock()
+        self.concedidos = {}
+        self.rebaixados = {}
+
+    def aplicar(self, indice, politica):
+        """Política efetiva para uma escrita que pediu `politica`"""
+        if politica != 'true':
+            return politica
+        agora = time.monotonic()
+        with self._lock:
+            fichas, ultimo = self._fichas.get(indice, (self.rajada, agora))
+            fichas = min(self.rajada, fichas + (agora - ultimo) * self.por_segundo)
+            if fichas >= 1:
+                self._fichas[indice] = (fichas - 1, agora)
+                self.concedidos[indice] = self.concedidos.get(indice, 0) + 1
+                return 'true'
+            self._fichas[indice] = (fichas, agora)
+            self.rebaixados[indice] = self.rebaixados.get(indice, 0) + 1
+            return 'wait_for'
+
+    def refrescar(self, es, indice):
+        """Refresh explícito (fora de uma escrita): gasta uma ficha ou, sem ficha, espera o periódico"""
+        if self.aplicar(indice, 'true') == 'true':
+            es.indices.refresh(index=indice)
+        else:
+            time.sleep(INTERVALO_REFRESH_PERIODICO)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'por_minuto': round(self.por_segundo * 60, 2),
+                'rajada': self.rajada,
+                'concedidos': dict(self.concedidos),
+                'rebaixados': dict(self.rebaixados)
+            }
+
+
+class FilaEscritas:
+    """Escritas de documentos enfileiradas e enviadas ao ES em lotes _bulk
+
+    Cada escrita recebe um ack, vai para o journal (JSONL) e entra numa
+    fila limitada. Uma thread junta as operações em lotes por
+    tamanho/tempo e faz um único _bulk; ao confirmar, chama `ao_gravar`
+    para cada operação e registra o ack como gravado no journal. No
+    início, operações do journal sem confirmação são enfileiradas de
+    novo (entrega pelo menos uma vez, idempotente porque toda operação
+    tem id). O lote usa o refresh mais forte pedido por suas operações.
+
+    O journal é gravado no arquivo a cada escrita, mas o fsync é em
+    grupo: um por lote (e um por intervalo de flush com a fila parada).
+    Uma queda do processo não perde nada; uma queda da máquina perde no
+    máximo as escritas aceitas desde o último fsync, cerca de um
+    intervalo de flush mais a duração do _bulk em andamento.
+
+    Um lote cujo _bulk falha fica com a thread e é tentado de novo antes
+    de qualquer escrita mais nova (a ordem por id se mantém e a fila
+    cheia não trava a thread); depois de `max_tentativas` as escritas
+    dele são marcadas como falhas e saem do journal.
+    """
+
+    def __init__(self, es, journal, ao_gravar=None, capacidade=CAPACIDADE_PADRAO,
+                 tamanho_lote=TAMANHO_LOTE_PADRAO, intervalo_flush=INTERVALO_FLUSH_PADRAO,
+                 max_tentativas=MAX_TENTATIVAS_PADRAO, espera_retentativa=ESPERA_RETENTATIVA_PADRAO):
+        self.es = es
+        self.journal = journal
+        self.ao_gravar = ao_gravar
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_flush = intervalo_flush
+        self.max_tentativas = max_tentativas
+        self.espera_retentativa = espera_retentativa
+        self.fila = queue.Queue(maxsize=capacidade)
+        self.capacidade = capacidade
+        self._resultados = {}
+        self._eventos = {}
+        # Última escrita ainda não gravada de cada (índice, id)
+        self._ultimas = {}
+        self._lock = threading.Lock()
+        self._lock_journal = threading.Lock()
+        self._sequencia = itertools.count(1)
+        self._thread = None
+        # Operações no journal ainda sem confirmação; há algo escrito sem fsync
+        self._no_journal = 0
+        self._journal_sujo = False
+        self.metricas = {
+            'enfileiradas': 0,
+            'gravadas': 0,
+            'falhas': 0,
+            'recusadas': 0,
+            'retentativas': 0,
+            'lotes': 0,
+            'ultimo_lote': 0,
+            'flush_ms_ultimo': 0.0,
+            'flush_ms_max': 0.0,
+            'flush_ms_total': 0.0
+        }
+        self._arquivo = None
+        self._recuperar_journal()
+
+    # --------------------------------------------------------
+    # Journal
+    # --------------------------------------------------------
+    def _recuperar_journal(self):
+        pendentes = {}
+        if os.path.exists(self.journal):
+            with open(self.journal, encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        # Última linha truncada por uma queda no meio da escrita
+                        continue
+                    if 'confirmados' in registro:
+                        for ack in registro['confirmados']:
+                            pendentes.pop(ack, None)
+                    else:
+                        pendentes[registro['ack']] = registro
+
+        # Reescreve o journal só com o que falta gravar
+        temporario = f"{self.journal}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            for registro in pendentes.values():
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        os.replace(temporario, self.journal)
+        self._arquivo = open(self.journal, 'a', encoding='utf-8')
+        self._no_journal = len(pendentes)
+
+        for registro in pendentes.values():
+            self._eventos[registro['ack']] = threading.Event()
+            self._ultimas[(registro['indice'], registro['id'])] = registro
+            self.fila.put(registro)
+        if pendentes:
+            print(f"♻️  {len(pendentes)} escritas pendentes recuperadas do journal")
+
+    def _anotar(self, registro):
+        """Escrever no journal (sem fsync: ver _sincronizar_journal)"""
+        with self._lock_journal:
+            if 'confirmados' in registro:
+                self._no_journal -= len(registro['confirmados'])
+            else:
+                self._no_journal += 1
+            if self._no_journal == 0:
+                # Tudo o que está no journal foi confirmado: recomeça do zero
+                self._arquivo.truncate(0)
+            else:
+                self._arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+            self._arquivo.flush()
+            self._journal_sujo = True
+
+    def _sincronizar_journal(self):
+        """fsync em grupo de tudo o que foi anotado desde o último"""
+        with self._lock_journal:
+            if self._journal_sujo:
+                os.fsync(self._arquivo.fileno())
+                self._journal_sujo = False
+
+    # --------------------------------------------------------
+    # Escrita
+    # --------------------------------------------------------
+    def enfileirar(self, indice, doc_id, novo, antigo=None, corpo=None, refresh='false', timeout=1.0):
+        """Enfileirar um index (novo) ou delete (novo=None); devolve (ack, doc_id)"""
+        doc_id = doc_id or uuid.uuid4().hex
+        ack = f"{int(time.time() * 1000):x}-{next(self._sequencia)}"
+        registro = {
+            'ack': ack,
+            'operacao': 'delete' if novo is None else 'index',
+            'indice': indice,
+            'id': doc_id,
+            'corpo': corpo if corpo is not None else novo,
+            'novo': novo,
+            'antigo': antigo,
+            'refresh': refresh
+        }
+        chave = (indice, doc_id)
+        with self._lock:
+            self._eventos[ack] = threading.Event()
+            anterior = self._ultimas.get(chave)
+            self._ultimas[chave] = registro
+        self._anotar(registro)
+        try:
+            self.fila.put(registro, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._eventos.pop(ack, None)
+                if self._ultimas.get(chave) is registro:
+                    if anterior is not None and anterior['ack'] in self._eventos:
+                        self._ultimas[chave] = anterior
+                    else:
+                        del self._ultimas[chave]
+            self._anotar({'confirmados': [ack]})
+            self.metricas['recusadas'] += 1
+            raise FilaCheia(f"Fila de escritas cheia ({self.capacidade} pendentes)")
+        self.metricas['enfileiradas'] += 1
+        return ack, doc_id
+
+    def pendente(self, indice, doc_id):
+        """(True, documento) se há escrita do id na fila (documento None = remoção), senão (False, None)"""
+        with self._lock:
+            registro = self._ultimas.get((indice, doc_id))
+        if registro is None:
+            return False, None
+        return True, registro['novo']
+
+    def esperar(self, ack, timeout=30):
+        """Bloquear até o lote do ack ser gravado (no timeout, o status continua pendente)"""
+        evento = self._eventos.get(ack)
+        if evento is not None:
+            evento.wait(timeout)
+        return self.resultado(ack)
+
+    def resultado(self, ack):
+        """Situação de um ack: pendente, gravado ou falhou"""
+        with self._lock:
+            if ack in self._resultados:
+                return self._resultados[ack]
+            if ack in self._eventos:
+                return {'ack': ack, 'status': 'pendente'}
+        return None
+
+    # --------------------------------------------------------
+    # Flush em lotes
+    # --------------------------------------------------------
+    def iniciar(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._laco, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def _laco(self):
+        lote, tentativas = None, 0
+        while True:
+            if lote is None:
+                lote = self._proximo_lote()
+                if lote is None:
+                    # Fila parada: fsync do que ficou anotado (confirmações do último lote)
+                    self._sincronizar_journal()
+                    continue
+            self._sincronizar_journal()
+            erro = self._gravar_lote(lote)
+            if erro is None:
+                lote, tentativas = None, 0
+                continue
+
+            tentativas += 1
+            if tentativas >= self.max_tentativas:
+                print(f"⚠️  Flush write-behind desistiu de {len(lote)} escritas após {tentativas} tentativas: {erro}")
+                self._descartar_lote(lote, erro)
+                lote, tentativas = None, 0
+                continue
+            # ES fora do ar: o lote fica com a thread (e no journal) e é tentado antes dos mais novos
+            espera = min(self.espera_retentativa * 2 ** (tentativas - 1), ESPERA_MAXIMA)
+            print(f"⚠️  Falha no flush write-behind ({len(lote)} escritas, tentativa {tentativas}): {erro}")
+            self.metricas['retentativas'] += 1
+            time.sleep(espera)
+
+    def _proximo_lote(self):
+        """Operações da fila até o tamanho do lote ou o intervalo de flush (None se a fila está vazia)"""
+        try:
+            lote = [self.fila.get(timeout=self.intervalo_flush)]
+        except queue.Empty:
+            return None
+        limite = time.monotonic() + self.intervalo_flush
+        while len(lote) < self.tamanho_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _gravar_lote(self, lote):
+        """Um _bulk com o lote; devolve a exceção se o _bulk falhou (None se foi gravado)"""
+        operacoes = []
+        for registro in lote:
+            operacoes.append({registro['operacao']: {'_index': registro['indice'], '_id': registro['id']}})
+            if registro['operacao'] == 'index':
+                operacoes.append(registro['corpo'])
+
+        refresh = max((registro.get('refresh', 'false') for registro in lote), key=POLITICAS_REFRESH.index)
+
+        inicio = time.perf_counter()
+        try:
+            itens = self.es.bulk(body=operacoes, refresh=refresh)['items']
+        except Exception as e:
+            return e
+        duracao = (time.perf_counter() - inicio) * 1000
+
+        confirmados, eventos = [], []
+        for registro, item in zip(lote, itens):
+            resposta = item[registro['operacao']]
+            erro = resposta.get('error')
+            # Remover algo que já não existe não é falha
+            if erro is None or (registro['operacao'] == 'delete' and resposta.get('status') == 404):
+                status = {'ack': registro['ack'], 'status': 'gravado', 'id': registro['id'],
+                          'resultado': resposta.get('result')}
+                self.metricas['gravadas'] += 1
+                if self.ao_gravar is not None:
+                    try:
+                        self.ao_gravar(registro['indice'], registro['id'], registro['antigo'], registro['novo'])
+                    except Exception as e:
+                        print(f"⚠️  Ouvinte do write-behind falhou: {e}")
+            else:
+                status = {'ack': registro['ack'], 'status': 'falhou', 'id': registro['id'], 'error': erro}
+                self.metricas['falhas'] += 1
+            self._concluir(registro, status, confirmados, eventos)
+
+        self.metricas['lotes'] += 1
+        self.metricas['ultimo_lote'] = len(lote)
+        self.metricas['flush_ms_ultimo'] = round(duracao, 2)
+        self.metricas['flush_ms_max'] = round(max(self.metricas['flush_ms_max'], duracao), 2)
+        self.metricas['flush_ms_total'] += duracao
+        self._finalizar(confirmados, eventos)
+        return None
+
+    def _descartar_lote(self, lote, erro):
+        """Marcar como falhas as escritas de um lote que esgotou as tentativas"""
+        confirmados, eventos = [], []
+        for registro in lote:
+            status = {'ack': registro['ack'], 'status': 'falhou', 'id': registro['id'], 'error': str(erro)}
+            self.metricas['falhas'] += 1
+            self._concluir(registro, status, confirmados, eventos)
+        self._finalizar(confirmados, eventos)
+
+    def _concluir(self, registro, status, confirmados, eventos):
+        confirmados.append(registro['ack'])
+        chave = (registro['indice'], registro['id'])
+        with self._lock:
+            self._resultados[registro['ack']] = status
+            evento = self._eventos.pop(registro['ack'], None)
+            if self._ultimas.get(chave) is registro:
+                del self._ultimas[chave]
+            while len(self._resultados) > MAX_RESULTADOS:
+                self._resultados.pop(next(iter(self._resultados)))
+        if evento is not None:
+            eventos.append(evento)
+
+    def _finalizar(self, confirmados, eventos):
+        self._anotar({'confirmados': confirmados})
+        # Só depois do journal: quem espera (wait_for) já vê o estado final
+        for evento in eventos:
+            evento.set()
+
+    def estatisticas(self):
+        lotes = self.metricas['lotes']
+        return {
+            **{k: v for k, v in self.metricas.items() if k != 'flush_ms_total'},
+            'profundidade': self.fila.qsize(),
+            'capacidade': self.capacidade,
+            'flush_ms_medio': round(self.metricas['flush_ms_total'] / lotes, 2) if lotes else 0.0,
+            'journal_bytes': os.path.getsize(self.journal) if os.path.exists(self.journal) else 0
+        }
@@ -0,0 +1,145 @@
+# eventos_rpg.py - Barramento de eventos em processo e formatação SSE
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+# Eventos guardados por assinante antes de começar a descartar os mais antigos
+CAPACIDADE_PADRAO = 1000
+
+# Intervalo dos comentários de keep-alive nas conexões SSE (segundos)
+INTERVALO_KEEPALIVE = 15
+
+# Últimos eventos guardados para quem reconecta com Last-Event-ID
+TAMANHO_HISTORICO = 1000
+
+# ============================================================
+# ASSINATURAS
+# ============================================================
+
+class Assinatura:
+    """Fila limitada de um cliente
+
+    Se o cliente lê mais devagar do que os eventos chegam, os mais
+    antigos são descartados (o publicador nunca bloqueia) e o total
+    descartado é informado ao cliente no próximo evento lido.
+    """
+
+    def __init__(self, barramento, filtro=None, capacidade=CAPACIDADE_PADRAO):
+        self.barramento = barramento
+        self.filtro = filtro
+        self.fila = deque(maxlen=capacidade)
+        self.descartados = 0
+        self.ativa = True
+        self._condicao = threading.Condition()
+
+    def entregar(self, evento):
+        if self.filtro is not None and not self.filtro(evento):
+            return
+        with self._condicao:
+            if len(self.fila) == self.fila.maxlen:
+                self.descartados += 1
+            self.fila.append(evento)
+            self._condicao.notify()
+
+    def proximos(self, timeout=INTERVALO_KEEPALIVE):
+        """Eventos pendentes (espera até `timeout`) e quantos foram descartados desde a última leitura"""
+        with self._condicao:
+            if not self.fila and self.ativa:
+                self._condicao.wait(timeout)
+            eventos = list(self.fila)
+            self.fila.clear()
+            descartados, self.descartados = self.descartados, 0
+        return eventos, descartados
+
+    def cancelar(self):
+        self.barramento.cancelar(self)
+        with self._condicao:
+            self.ativa = False
+            self._condicao.notify()
+
+# ============================================================
+# BARRAMENTO
+# ============================================================
+
+class BarramentoEventos:
+    """Publica eventos para todos os assinantes cujo filtro aceita o evento
+
+    Os últimos eventos ficam num histórico curto, para que um cliente
+    que reconecta (Last-Event-ID) receba o que perdeu sem lacunas.
+    """
+
+    def __init__(self, nome, tamanho_historico=TAMANHO_HISTORICO):
+        self.nome = nome
+        self.publicados = 0
+        self.historico = deque(maxlen=tamanho_historico)
+        self._assinaturas = set()
+        self._sequencia = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def publicar(self, tipo, dados):
+        """Entregar o evento a cada assinante; devolve o evento publicado"""
+        with self._lock:
+            evento = {'id': next(self._sequencia), 'tipo': tipo, 'momento': time.time(), **dados}
+            self.historico.append(evento)
+            assinaturas = list(self._assinaturas)
+            self.publicados += 1
+        for assinatura in assinaturas:
+            assinatura.entregar(evento)
+        return evento
+
+    def assinar(self, filtro=None, capacidade=CAPACIDADE_PADRAO, desde=None):
+        """Nova assinatura; com `desde`, reenvia os eventos do histórico posteriores a esse id"""
+        assinatura = Assinatura(self, filtro, capacidade)
+        with self._lock:
+            self._assinaturas.add(assinatura)
+            if desde is not None:
+                for evento in self.historico:
+                    if evento['id'] > desde:
+                        assinatura.entregar(evento)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def estatisticas(self):
+        with self._lock:
+            assinaturas = list(self._assinaturas)
+        return {
+            'barramento': self.nome,
+            'publicados': self.publicados,
+            'assinantes': len(assinaturas),
+            'pendentes': sum(len(a.fila) for a in assinaturas)
+        }
+
+# ============================================================
+# SERVER-SENT EVENTS
+# ============================================================
+
+def formatar_sse(evento, nome=None):
+    """Um evento no formato text/event-stream"""
+    linhas = []
+    if 'id' in evento:
+        linhas.append(f"id: {evento['id']}")
+    if nome:
+        linhas.append(f"event: {nome}")
+    linhas.append(f"data: {json.dumps(evento, ensure_ascii=False, default=str)}")
+    return "\n".join(linhas) + "\n\n"
+
+
+def fluxo_sse(assinatura, nome_evento=None):
+    """Gerador de uma resposta SSE: eventos, avisos de descarte e keep-alive"""
+    try:
+        yield "retry: 3000\n\n"
+        while assinatura.ativa:
+            eventos, descartados = assinatura.proximos()
+            if descartados:
+                yield formatar_sse({'descartados': descartados}, 'descartados')
+            for evento in eventos:
+                yield formatar_sse(evento, nome_evento or evento.get('tipo'))
+            if not eventos and not descartados:
+                yield ": keep-alive\n\n"
+    finally:
+        assinatura.cancelar()
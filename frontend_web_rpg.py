@@ -7,8 +7,11 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+import json
 import time
 
+from colunar_rpg import dataframe_de_registros
+
 # ============================================================
 # CONFIGURAÇÃO DA PÁGINA
 # ============================================================
@@ -24,6 +27,34 @@ st.set_page_config(
 # ============================================================
 API_URL = "http://localhost:5000"
 
+# Escritas dos formulários: responder só quando a listagem já mostra o resultado
+PARAMS_ESCRITA = {"refresh": "wait_for"}
+
+
+def erro_da_escrita(resp, status_esperado=200):
+    """None se a escrita deu certo, senão a mensagem de erro
+
+    Com write-behind a API responde 202 com um ack: espera o flush em
+    /escritas/<ack> e, se ele ainda não saiu, mostra o ack para acompanhar.
+    """
+    if resp.status_code == 202:
+        ack = resp.json()['ack']
+        try:
+            situacao = requests.get(f"{API_URL}/escritas/{ack}", params={"wait_for": 1}, timeout=10).json()
+        except requests.RequestException:
+            situacao = {}
+        if situacao.get('status') == 'falhou':
+            return f"escrita {ack} falhou: {situacao.get('error')}"
+        if situacao.get('status') != 'gravado':
+            st.info(f"⏳ Escrita enfileirada (ack {ack}): acompanhe em {API_URL}/escritas/{ack}")
+        return None
+    if resp.status_code == status_esperado:
+        return None
+    try:
+        return resp.json().get('error', 'Desconhecido')
+    except ValueError:
+        return 'Desconhecido'
+
 # Verificar conexão com API
 @st.cache_resource
 def verificar_api():
@@ -33,10 +64,134 @@ def verificar_api():
     except:
         return False
 
+# ============================================================
+# COLUNAS DAS TABELAS (campo da API -> título exibido)
+# ============================================================
+COLUNAS_BUSCA_ITENS = [
+    ('id', 'ID'), ('nome', 'Nome'), ('tipo', 'Tipo'), ('raridade', 'Raridade'),
+    ('valor', 'Valor (PO)'), ('score', 'Score')
+]
+COLUNAS_FILTRO_ITENS = [
+    ('id', 'ID'), ('nome', 'Nome'), ('tipo', 'Tipo'), ('raridade', 'Raridade'),
+    ('valor', 'Valor (PO)'), ('nivel_requerido', 'Nível'), ('peso', 'Peso')
+]
+COLUNAS_LISTA_ITENS = [
+    ('id', 'ID'), ('nome', 'Nome'), ('tipo', 'Tipo'), ('raridade', 'Raridade'), ('valor', 'Valor')
+]
+COLUNAS_BUSCA_PERSONAGENS = [
+    ('id', 'ID'), ('nome', 'Nome'), ('classe', 'Classe'), ('raca', 'Raça'),
+    ('nivel', 'Nível'), ('status', 'Status')
+]
+COLUNAS_FILTRO_PERSONAGENS = [
+    ('nome', 'Nome'), ('classe', 'Classe'), ('raca', 'Raça'), ('nivel', 'Nível'),
+    ('experiencia', 'Experiência'), ('status', 'Status')
+]
+COLUNAS_TOP_PERSONAGENS = [
+    ('nome', 'Nome'), ('classe', 'Classe'), ('nivel', 'Nível'),
+    ('experiencia', 'Experiência'), ('vida', 'Vida')
+]
+COLUNAS_LISTA_PERSONAGENS = [
+    ('id', 'ID'), ('nome', 'Nome'), ('classe', 'Classe'), ('raca', 'Raça'), ('nivel', 'Nível')
+]
+COLUNAS_BUSCA_MISSOES = [
+    ('id', 'ID'), ('titulo', 'Título'), ('dificuldade', 'Dificuldade'),
+    ('recompensa_ouro', 'Ouro'), ('recompensa_experiencia', 'XP')
+]
+COLUNAS_FILTRO_MISSOES = [
+    ('titulo', 'Título'), ('dificuldade', 'Dificuldade'), ('tipo', 'Tipo'),
+    ('recompensa_ouro', 'Ouro'), ('nivel_minimo', 'Nível Mín'), ('nivel_maximo', 'Nível Máx')
+]
+COLUNAS_LISTA_MISSOES = [
+    ('id', 'ID'), ('titulo', 'Título'), ('tipo', 'Tipo'), ('dificuldade', 'Dificuldade'),
+    ('recompensa_ouro', 'Recompensa')
+]
+
 # ============================================================
 # FUNÇÕES DE REQUISIÇÃO À API
 # ============================================================
 
+def texto_total(resultado):
+    """Total para exibição: '1000+' quando a API limitou a contagem"""
+    total = resultado.get('total', 0)
+    if resultado.get('total_exato', True):
+        return f"{total}"
+    return f"{total}+"
+
+# ============================================================
+# MÉTRICAS AO VIVO (FEED /stream/changes)
+# ============================================================
+# Tempo máximo que uma página fica escutando o feed antes de parar
+DURACAO_AO_VIVO = 300
+
+def estado_metricas(total, medias):
+    """Total e somas (a partir das médias do dashboard) para atualizar incrementalmente"""
+    return {
+        'total': total or 0,
+        'somas': {campo: (media or 0) * (total or 0) for campo, media in medias.items()},
+        'contagens': {}
+    }
+
+def numero_do_doc(doc, campo):
+    valor = (doc or {}).get(campo)
+    return valor if isinstance(valor, (int, float)) and not isinstance(valor, bool) else 0
+
+def aplicar_mudanca(estado, evento, contagens=None):
+    """Aplicar um evento criado/atualizado/removido às métricas da página"""
+    antigo, novo = evento.get('antigo'), evento.get('novo')
+    if antigo is None and novo is not None:
+        estado['total'] += 1
+    elif antigo is not None and novo is None:
+        estado['total'] -= 1
+    for campo in estado['somas']:
+        estado['somas'][campo] += numero_do_doc(novo, campo) - numero_do_doc(antigo, campo)
+    # Contagens por valor de campo (ex.: status == "Ativo")
+    for nome, (campo, valor) in (contagens or {}).items():
+        delta = int((novo or {}).get(campo) == valor) - int((antigo or {}).get(campo) == valor)
+        estado['contagens'][nome] = estado['contagens'].get(nome, 0) + delta
+
+def media_ao_vivo(estado, campo):
+    return estado['somas'][campo] / estado['total'] if estado['total'] else 0
+
+def eventos_sse(resp):
+    """Eventos de uma resposta SSE; None a cada keep-alive (para checar o tempo)"""
+    dados = []
+    for linha in resp.iter_lines(decode_unicode=True):
+        if linha is None:
+            continue
+        if linha.startswith(':'):
+            yield None
+        elif linha.startswith('data:'):
+            dados.append(linha[5:].strip())
+        elif linha == '' and dados:
+            yield json.loads('\n'.join(dados))
+            dados = []
+
+def acompanhar_ao_vivo(indice, estado, desenhar, contagens=None):
+    """Escutar /stream/changes e redesenhar as métricas a cada mudança no índice"""
+    if not st.toggle("🔴 Atualizar ao vivo", key=f"ao_vivo_{indice}",
+                     help="Métricas atualizadas pelo feed de mudanças da API, sem recarregar o dashboard"):
+        return
+    
+    situacao = st.empty()
+    situacao.caption("🔴 Ao vivo: aguardando mudanças...")
+    fim = time.time() + DURACAO_AO_VIVO
+    try:
+        with requests.get(f"{API_URL}/stream/changes", params={"indices": indice},
+                          stream=True, timeout=(5, 30)) as resp:
+            for evento in eventos_sse(resp):
+                if evento is not None and 'operacao' in evento:
+                    aplicar_mudanca(estado, evento, contagens)
+                    desenhar()
+                    situacao.caption(f"🔴 Ao vivo: {evento['operacao']} {evento['doc_id']} "
+                                     f"às {datetime.fromtimestamp(evento['momento']):%H:%M:%S}")
+                elif evento is not None and 'descartados' in evento:
+                    situacao.caption(f"⚠️ {evento['descartados']} eventos perdidos: recarregue o dashboard")
+                if time.time() > fim:
+                    break
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Feed de mudanças indisponível: {e}")
+    situacao.caption("⏸️ Ao vivo encerrado: recarregue a página para continuar")
+
 def buscar_itens(termo):
     """Realizar busca full-text"""
     try:
@@ -139,24 +294,13 @@ def pagina_busca_rapida():
         
         if resultado:
             total = resultado.get('total', 0)
-            st.success(f"✅ Encontrados {total} itens para '{termo}'")
+            st.success(f"✅ Encontrados {texto_total(resultado)} itens para '{termo}'")
             
             if total > 0:
                 itens = resultado.get('resultados', [])
                 
                 # Criar DataFrame para exibição
-                df_data = []
-                for item in itens:
-                    df_data.append({
-                        'ID': item['id'],
-                        'Nome': item['nome'],
-                        'Tipo': item['tipo'],
-                        'Raridade': item['raridade'],
-                        'Valor (PO)': item['valor'],
-                        'Score': f"{item['score']:.2f}"
-                    })
-                
-                df = pd.DataFrame(df_data)
+                df = dataframe_de_registros(itens, COLUNAS_BUSCA_ITENS).round({'Score': 2})
                 st.dataframe(df, use_container_width=True, hide_index=True)
                 
                 # Exibir detalhes dos itens
@@ -273,25 +417,13 @@ def pagina_filtros():
             
             if resultado:
                 total = resultado.get('total', 0)
-                st.success(f"✅ Encontrados {total} itens")
+                st.success(f"✅ Encontrados {texto_total(resultado)} itens")
                 
                 if total > 0:
                     itens = resultado.get('resultados', [])
                     
                     # Criar DataFrame
-                    df_data = []
-                    for item in itens:
-                        df_data.append({
-                            'ID': item['id'],
-                            'Nome': item['nome'],
-                            'Tipo': item['tipo'],
-                            'Raridade': item['raridade'],
-                            'Valor (PO)': item['valor'],
-                            'Nível': item.get('nivel_requerido', 0),
-                            'Peso': item.get('peso', 0)
-                        })
-                    
-                    df = pd.DataFrame(df_data)
+                    df = dataframe_de_registros(itens, COLUNAS_FILTRO_ITENS)
                     st.dataframe(df, use_container_width=True, hide_index=True)
                     
                     # Gráfico de distribuição
@@ -336,37 +468,19 @@ def pagina_dashboard():
         st.subheader("📈 Métricas Principais")
         
         col1, col2, col3, col4 = st.columns(4)
+        metricas = [col.empty() for col in (col1, col2, col3, col4)]
+        estado = estado_metricas(dados.get('total_itens', 0), {
+            'valor': dados['estatisticas_valor']['media'],
+            'nivel_requerido': dados['estatisticas_nivel']['media']
+        })
         
-        with col1:
-            st.metric(
-                "📦 Total de Itens",
-                f"{dados.get('total_itens', 0):,}",
-                delta=None
-            )
+        def desenhar():
+            metricas[0].metric("📦 Total de Itens", f"{estado['total']:,}")
+            metricas[1].metric("💰 Valor Total (PO)", f"{estado['somas']['valor']:,.0f}")
+            metricas[2].metric("💵 Valor Médio (PO)", f"{media_ao_vivo(estado, 'valor'):,.0f}")
+            metricas[3].metric("📊 Nível Médio", f"{media_ao_vivo(estado, 'nivel_requerido'):.1f}")
         
-        with col2:
-            valor_total = dados['estatisticas_valor']['soma_total']
-            st.metric(
-                "💰 Valor Total (PO)",
-                f"{valor_total:,.0f}",
-                delta=None
-            )
-        
-        with col3:
-            valor_medio = dados['estatisticas_valor']['media']
-            st.metric(
-                "💵 Valor Médio (PO)",
-                f"{valor_medio:,.0f}",
-                delta=None
-            )
-        
-        with col4:
-            nivel_medio = dados['estatisticas_nivel']['media']
-            st.metric(
-                "📊 Nível Médio",
-                f"{nivel_medio:.1f}",
-                delta=None
-            )
+        desenhar()
         
         # Gráficos de análise
         st.subheader("📊 Análises")
@@ -461,6 +575,9 @@ def pagina_dashboard():
         
         with col5:
             st.metric("Total de Itens", f"{dados['total_itens']}")
+        
+        # Por último: o laço do feed bloqueia até o fim da escuta
+        acompanhar_ao_vivo('rpg_itens', estado, desenhar)
 
 # ============================================================
 # PÁGINA: ITENS SIMILARES
@@ -504,18 +621,7 @@ def pagina_similares():
                 st.subheader(f"🎁 Itens Similares ({total})")
                 
                 if total > 0:
-                    df_data = []
-                    for item in similares:
-                        df_data.append({
-                            'ID': item['id'],
-                            'Nome': item['nome'],
-                            'Tipo': item['tipo'],
-                            'Raridade': item['raridade'],
-                            'Valor (PO)': item['valor'],
-                            'Score': f"{item['score']:.2f}"
-                        })
-                    
-                    df = pd.DataFrame(df_data)
+                    df = dataframe_de_registros(similares, COLUNAS_BUSCA_ITENS).round({'Score': 2})
                     st.dataframe(df, use_container_width=True, hide_index=True)
                     
                     # Gráfico de comparação
@@ -613,24 +719,13 @@ def pagina_busca_avancada():
         
         if resultado:
             total = resultado.get('total', 0)
-            st.success(f"✅ Encontrados {total} itens")
+            st.success(f"✅ Encontrados {texto_total(resultado)} itens")
             
             if total > 0:
                 itens = resultado.get('resultados', [])
                 
                 # Criar DataFrame
-                df_data = []
-                for item in itens:
-                    df_data.append({
-                        'ID': item.get('id', item.get('_id', '-')),
-                        'Nome': item.get('nome', '-'),
-                        'Tipo': item.get('tipo', '-'),
-                        'Raridade': item.get('raridade', '-'),
-                        'Valor (PO)': item.get('valor', 0),
-                        'Score': f"{item.get('score', 0):.2f}"
-                    })
-                
-                df = pd.DataFrame(df_data)
+                df = dataframe_de_registros(itens, COLUNAS_BUSCA_ITENS).round({'Score': 2})
                 st.dataframe(df, use_container_width=True, hide_index=True)
                 
                 # Gráficos
@@ -853,23 +948,12 @@ def pagina_busca_personagens():
                 return
         
         total = resultado.get('total', 0)
-        st.success(f"✅ Encontrados {total} personagens para '{termo}'")
+        st.success(f"✅ Encontrados {texto_total(resultado)} personagens para '{termo}'")
         
         if total > 0:
             personagens = resultado.get('resultados', [])
             
-            df_data = []
-            for p in personagens:
-                df_data.append({
-                    'ID': p['id'],
-                    'Nome': p['nome'],
-                    'Classe': p['classe'],
-                    'Raça': p['raca'],
-                    'Nível': p['nivel'],
-                    'Status': p['status']
-                })
-            
-            df = pd.DataFrame(df_data)
+            df = dataframe_de_registros(personagens, COLUNAS_BUSCA_PERSONAGENS)
             st.dataframe(df, use_container_width=True, hide_index=True)
             
             st.subheader("📋 Detalhes dos Personagens")
@@ -961,23 +1045,12 @@ def pagina_filtrar_personagens():
                     return
             
             total = resultado.get('total', 0)
-            st.success(f"✅ Encontrados {total} personagens")
+            st.success(f"✅ Encontrados {texto_total(resultado)} personagens")
             
             if total > 0:
                 personagens = resultado.get('resultados', [])
                 
-                df_data = []
-                for p in personagens:
-                    df_data.append({
-                        'Nome': p['nome'],
-                        'Classe': p['classe'],
-                        'Raça': p['raca'],
-                        'Nível': p['nivel'],
-                        'Experiência': p.get('experiencia', 0),
-                        'Status': p['status']
-                    })
-                
-                df = pd.DataFrame(df_data)
+                df = dataframe_de_registros(personagens, COLUNAS_FILTRO_PERSONAGENS)
                 st.dataframe(df, use_container_width=True, hide_index=True)
                 
                 col1, col2 = st.columns(2)
@@ -1022,18 +1095,20 @@ def pagina_dashboard_personagens():
     
     if dados:
         col1, col2, col3, col4 = st.columns(4)
+        metricas = [col.empty() for col in (col1, col2, col3, col4)]
+        estado = estado_metricas(dados.get('total_personagens', 0), {
+            'nivel': dados.get('nivel_medio'),
+            'experiencia': dados.get('exp_media')
+        })
+        estado['contagens']['ativos'] = dados.get('total_ativos', 0)
         
-        with col1:
-            st.metric("👥 Total de Personagens", f"{dados.get('total_personagens', 0)}")
+        def desenhar():
+            metricas[0].metric("👥 Total de Personagens", f"{estado['total']}")
+            metricas[1].metric("📊 Nível Médio", f"{media_ao_vivo(estado, 'nivel'):.1f}")
+            metricas[2].metric("⭐ Experiência Média", f"{media_ao_vivo(estado, 'experiencia'):,.0f}")
+            metricas[3].metric("✨ Ativos", f"{estado['contagens']['ativos']}")
         
-        with col2:
-            st.metric("📊 Nível Médio", f"{dados.get('nivel_medio', 0):.1f}")
-        
-        with col3:
-            st.metric("⭐ Experiência Média", f"{dados.get('exp_media', 0):,.0f}")
-        
-        with col4:
-            st.metric("✨ Ativos", f"{dados.get('total_ativos', 0)}")
+        desenhar()
         
         st.divider()
         
@@ -1060,6 +1135,9 @@ def pagina_dashboard_personagens():
                     title="Distribuição por Raça"
                 )
                 st.plotly_chart(fig, use_container_width=True)
+        
+        # Por último: o laço do feed bloqueia até o fim da escuta
+        acompanhar_ao_vivo('rpg_personagens', estado, desenhar, contagens={'ativos': ('status', 'Ativo')})
 
 # ============================================================
 # PÁGINA: TOP PERSONAGENS
@@ -1069,17 +1147,34 @@ def pagina_top_personagens():
     st.header("🏆 Top Personagens")
     st.write("Os personagens mais poderosos e experientes")
     
-    opcao = st.radio(
-        "Ordenar por:",
-        options=["Nível", "Experiência", "Vida", "Força"],
-        horizontal=True
-    )
+    atributos = {
+        "Nível": "nivel", "Experiência": "experiencia", "Vida": "vida", "Mana": "mana",
+        "Força": "forca", "Destreza": "destreza", "Constituição": "constituicao",
+        "Inteligência": "inteligencia", "Sabedoria": "sabedoria", "Carisma": "carisma"
+    }
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        opcao = st.radio(
+            "Ordenar por:",
+            options=list(atributos),
+            horizontal=True
+        )
+    with col2:
+        classe = st.selectbox(
+            "Classe:",
+            options=["Todas", "Guerreiro", "Mago", "Assassino", "Paladino", "Ranger", "Bardo", "Druida", "Clérigo"]
+        )
+    
+    params = {"ordenar_por": atributos[opcao]}
+    if classe != "Todas":
+        params["classe"] = classe
     
     with st.spinner("🔍 Buscando..."):
         try:
             resp = requests.get(
                 f"{API_URL}/top_personagens",
-                params={"ordenar_por": opcao.lower()},
+                params=params,
                 timeout=10
             )
             if resp.status_code == 200:
@@ -1094,18 +1189,7 @@ def pagina_top_personagens():
     personagens = resultado.get('personagens', [])
     
     if personagens:
-        df_data = []
-        for i, p in enumerate(personagens, 1):
-            df_data.append({
-                'Ranking': i,
-                'Nome': p['nome'],
-                'Classe': p['classe'],
-                'Nível': p['nivel'],
-                'Experiência': p.get('experiencia', 0),
-                'Vida': p.get('vida', 0)
-            })
-        
-        df = pd.DataFrame(df_data)
+        df = dataframe_de_registros(personagens, [('posicao', 'Ranking')] + COLUNAS_TOP_PERSONAGENS)
         st.dataframe(df, use_container_width=True, hide_index=True)
         
         fig = px.bar(
@@ -1155,22 +1239,13 @@ def pagina_busca_missoes():
                 return
         
         total = resultado.get('total', 0)
-        st.success(f"✅ Encontradas {total} missões")
+        st.success(f"✅ Encontradas {texto_total(resultado)} missões")
         
         if total > 0:
             missoes = resultado.get('resultados', [])
             
-            df_data = []
-            for m in missoes:
-                df_data.append({
-                    'ID': m['id'],
-                    'Título': m['titulo'][:50],
-                    'Dificuldade': m['dificuldade'],
-                    'Ouro': m['recompensa_ouro'],
-                    'XP': m['recompensa_experiencia']
-                })
-            
-            df = pd.DataFrame(df_data)
+            df = dataframe_de_registros(missoes, COLUNAS_BUSCA_MISSOES)
+            df['Título'] = df['Título'].str[:50]
             st.dataframe(df, use_container_width=True, hide_index=True)
             
             for m in missoes[:5]:
@@ -1260,22 +1335,14 @@ def pagina_filtrar_missoes():
                     return
             
             total = resultado.get('total', 0)
-            st.success(f"✅ Encontradas {total} missões")
+            st.success(f"✅ Encontradas {texto_total(resultado)} missões")
             
             if total > 0:
                 missoes = resultado.get('resultados', [])
                 
-                df_data = []
-                for m in missoes:
-                    df_data.append({
-                        'Título': m['titulo'][:40],
-                        'Dificuldade': m['dificuldade'],
-                        'Tipo': m['tipo'],
-                        'Ouro': m['recompensa_ouro'],
-                        'Nível': f"{m['nivel_minimo']}-{m['nivel_maximo']}"
-                    })
-                
-                df = pd.DataFrame(df_data)
+                df = dataframe_de_registros(missoes, COLUNAS_FILTRO_MISSOES)
+                df['Título'] = df['Título'].str[:40]
+                df['Nível'] = df.pop('Nível Mín').astype(str) + '-' + df.pop('Nível Máx').astype(str)
                 st.dataframe(df, use_container_width=True, hide_index=True)
                 
                 col1, col2 = st.columns(2)
@@ -1311,18 +1378,20 @@ def pagina_dashboard_missoes():
     
     if dados:
         col1, col2, col3, col4 = st.columns(4)
+        metricas = [col.empty() for col in (col1, col2, col3, col4)]
+        estado = estado_metricas(dados.get('total_missoes', 0), {
+            'recompensa_ouro': dados.get('ouro_medio'),
+            'recompensa_experiencia': dados.get('xp_medio'),
+            'taxa_conclusao_pct': dados.get('taxa_media')
+        })
         
-        with col1:
-            st.metric("🎯 Total de Missões", f"{dados.get('total_missoes', 0)}")
-        
-        with col2:
-            st.metric("💰 Ouro Médio", f"{dados.get('ouro_medio', 0):,.0f}")
+        def desenhar():
+            metricas[0].metric("🎯 Total de Missões", f"{estado['total']}")
+            metricas[1].metric("💰 Ouro Médio", f"{media_ao_vivo(estado, 'recompensa_ouro'):,.0f}")
+            metricas[2].metric("⭐ XP Médio", f"{media_ao_vivo(estado, 'recompensa_experiencia'):,.0f}")
+            metricas[3].metric("✨ Taxa Média", f"{media_ao_vivo(estado, 'taxa_conclusao_pct'):.1f}%")
         
-        with col3:
-            st.metric("⭐ XP Médio", f"{dados.get('xp_medio', 0):,.0f}")
-        
-        with col4:
-            st.metric("✨ Taxa Média", f"{dados.get('taxa_media', 0):.1f}%")
+        desenhar()
         
         st.divider()
         
@@ -1339,6 +1408,9 @@ def pagina_dashboard_missoes():
             if not df_tipo.empty:
                 fig = px.pie(df_tipo, names='tipo', values='quantidade', title="Distribuição por Tipo")
                 st.plotly_chart(fig, use_container_width=True)
+        
+        # Por último: o laço do feed bloqueia até o fim da escuta
+        acompanhar_ao_vivo('rpg_missoes', estado, desenhar)
 
 # ============================================================
 # PÁGINA: MISSÕES POR DIFICULDADE
@@ -1409,13 +1481,14 @@ def pagina_gerenciar_itens():
                     "valor": valor,
                     "descricao": descricao
                 }
-                resp = requests.post(f"{API_URL}/itens/criar", json=data, timeout=10)
-                if resp.status_code == 201:
+                resp = requests.post(f"{API_URL}/itens/criar", json=data, params=PARAMS_ESCRITA, timeout=10)
+                erro = erro_da_escrita(resp, 201)
+                if erro is None:
                     resultado = resp.json()
                     st.success(f"✅ {resultado['mensagem']}")
                     st.json(resultado['item'])
                 else:
-                    st.error(f"Erro: {resp.json().get('error', 'Desconhecido')}")
+                    st.error(f"Erro: {erro}")
             except Exception as e:
                 st.error(f"Erro ao conectar: {str(e)}")
     
@@ -1451,11 +1524,12 @@ def pagina_gerenciar_itens():
                             "valor": novo_valor,
                             "descricao": novo_desc
                         }
-                        resp = requests.put(f"{API_URL}/itens/{item_id}", json=data, timeout=10)
-                        if resp.status_code == 200:
+                        resp = requests.put(f"{API_URL}/itens/{item_id}", json=data, params=PARAMS_ESCRITA, timeout=10)
+                        erro = erro_da_escrita(resp)
+                        if erro is None:
                             st.success("✅ Item atualizado com sucesso!")
                         else:
-                            st.error(f"Erro: {resp.json().get('error', 'Desconhecido')}")
+                            st.error(f"Erro: {erro}")
                 else:
                     st.error("Item não encontrado")
             except Exception as e:
@@ -1467,11 +1541,12 @@ def pagina_gerenciar_itens():
         
         if st.button("⚠️ Deletar"):
             try:
-                resp = requests.delete(f"{API_URL}/itens/{item_id}", timeout=10)
-                if resp.status_code == 200:
+                resp = requests.delete(f"{API_URL}/itens/{item_id}", params=PARAMS_ESCRITA, timeout=10)
+                erro = erro_da_escrita(resp)
+                if erro is None:
                     st.success(f"✅ {resp.json()['mensagem']}")
                 else:
-                    st.error("Item não encontrado")
+                    st.error(f"Erro: {erro}")
             except Exception as e:
                 st.error(f"Erro: {str(e)}")
     
@@ -1484,19 +1559,9 @@ def pagina_gerenciar_itens():
             resp = requests.get(f"{API_URL}/itens", params={"pagina": pagina, "tamanho": tamanho}, timeout=10)
             if resp.status_code == 200:
                 resultado = resp.json()
-                st.metric("Total de Itens", resultado['total'])
-                
-                df_data = []
-                for item in resultado['itens']:
-                    df_data.append({
-                        'ID': item['id'],
-                        'Nome': item.get('nome', 'N/A'),
-                        'Tipo': item.get('tipo', 'N/A'),
-                        'Raridade': item.get('raridade', 'N/A'),
-                        'Valor': item.get('valor', 0)
-                    })
+                st.metric("Total de Itens", texto_total(resultado))
                 
-                df = pd.DataFrame(df_data)
+                df = dataframe_de_registros(resultado['itens'], COLUNAS_LISTA_ITENS, padrao_texto='N/A')
                 st.dataframe(df, use_container_width=True, hide_index=True)
         except Exception as e:
             st.error(f"Erro: {str(e)}")
@@ -1530,13 +1595,14 @@ def pagina_gerenciar_personagens():
                     "nivel": nivel,
                     "status": "Ativo"
                 }
-                resp = requests.post(f"{API_URL}/personagens/criar", json=data, timeout=10)
-                if resp.status_code == 201:
+                resp = requests.post(f"{API_URL}/personagens/criar", json=data, params=PARAMS_ESCRITA, timeout=10)
+                erro = erro_da_escrita(resp, 201)
+                if erro is None:
                     resultado = resp.json()
                     st.success(f"✅ {resultado['mensagem']}")
                     st.json(resultado['personagem'])
                 else:
-                    st.error(f"Erro: {resp.json().get('error', 'Desconhecido')}")
+                    st.error(f"Erro: {erro}")
             except Exception as e:
                 st.error(f"Erro: {str(e)}")
     
@@ -1570,11 +1636,12 @@ def pagina_gerenciar_personagens():
                             "nivel": novo_nivel,
                             "status": pessoa.get('status', 'Ativo')
                         }
-                        resp = requests.put(f"{API_URL}/personagens/{pessoa_id}", json=data, timeout=10)
-                        if resp.status_code == 200:
+                        resp = requests.put(f"{API_URL}/personagens/{pessoa_id}", json=data, params=PARAMS_ESCRITA, timeout=10)
+                        erro = erro_da_escrita(resp)
+                        if erro is None:
                             st.success("✅ Personagem atualizado com sucesso!")
                         else:
-                            st.error(f"Erro: {resp.json().get('error', 'Desconhecido')}")
+                            st.error(f"Erro: {erro}")
                 else:
                     st.error("Personagem não encontrado")
             except Exception as e:
@@ -1586,11 +1653,12 @@ def pagina_gerenciar_personagens():
         
         if st.button("⚠️ Deletar"):
             try:
-                resp = requests.delete(f"{API_URL}/personagens/{pessoa_id}", timeout=10)
-                if resp.status_code == 200:
+                resp = requests.delete(f"{API_URL}/personagens/{pessoa_id}", params=PARAMS_ESCRITA, timeout=10)
+                erro = erro_da_escrita(resp)
+                if erro is None:
                     st.success(f"✅ {resp.json()['mensagem']}")
                 else:
-                    st.error("Personagem não encontrado")
+                    st.error(f"Erro: {erro}")
             except Exception as e:
                 st.error(f"Erro: {str(e)}")
     
@@ -1603,19 +1671,9 @@ def pagina_gerenciar_personagens():
             resp = requests.get(f"{API_URL}/personagens", params={"pagina": pagina, "tamanho": tamanho}, timeout=10)
             if resp.status_code == 200:
                 resultado = resp.json()
-                st.metric("Total de Personagens", resultado['total'])
+                st.metric("Total de Personagens", texto_total(resultado))
                 
-                df_data = []
-                for pessoa in resultado['personagens']:
-                    df_data.append({
-                        'ID': pessoa['id'],
-                        'Nome': pessoa.get('nome', 'N/A'),
-                        'Classe': pessoa.get('classe', 'N/A'),
-                        'Raça': pessoa.get('raca', 'N/A'),
-                        'Nível': pessoa.get('nivel', 0)
-                    })
-                
-                df = pd.DataFrame(df_data)
+                df = dataframe_de_registros(resultado['personagens'], COLUNAS_LISTA_PERSONAGENS, padrao_texto='N/A')
                 st.dataframe(df, use_container_width=True, hide_index=True)
         except Exception as e:
             st.error(f"Erro: {str(e)}")
@@ -1651,13 +1709,14 @@ def pagina_gerenciar_missoes():
                     "recompensa_ouro": recompensa,
                     "descricao": descricao
                 }
-                resp = requests.post(f"{API_URL}/missoes/criar", json=data, timeout=10)
-                if resp.status_code == 201:
+                resp = requests.post(f"{API_URL}/missoes/criar", json=data, params=PARAMS_ESCRITA, timeout=10)
+                erro = erro_da_escrita(resp, 201)
+                if erro is None:
                     resultado = resp.json()
                     st.success(f"✅ {resultado['mensagem']}")
                     st.json(resultado['missao'])
                 else:
-                    st.error(f"Erro: {resp.json().get('error', 'Desconhecido')}")
+                    st.error(f"Erro: {erro}")
             except Exception as e:
                 st.error(f"Erro: {str(e)}")
     
@@ -1693,11 +1752,12 @@ def pagina_gerenciar_missoes():
                             "recompensa_ouro": novo_recompensa,
                             "descricao": novo_desc
                         }
-                        resp = requests.put(f"{API_URL}/missoes/{missao_id}", json=data, timeout=10)
-                        if resp.status_code == 200:
+                        resp = requests.put(f"{API_URL}/missoes/{missao_id}", json=data, params=PARAMS_ESCRITA, timeout=10)
+                        erro = erro_da_escrita(resp)
+                        if erro is None:
                             st.success("✅ Missão atualizada com sucesso!")
                         else:
-                            st.error(f"Erro: {resp.json().get('error', 'Desconhecido')}")
+                            st.error(f"Erro: {erro}")
                 else:
                     st.error("Missão não encontrada")
             except Exception as e:
@@ -1709,11 +1769,12 @@ def pagina_gerenciar_missoes():
         
         if st.button("⚠️ Deletar"):
             try:
-                resp = requests.delete(f"{API_URL}/missoes/{missao_id}", timeout=10)
-                if resp.status_code == 200:
+                resp = requests.delete(f"{API_URL}/missoes/{missao_id}", params=PARAMS_ESCRITA, timeout=10)
+                erro = erro_da_escrita(resp)
+                if erro is None:
                     st.success(f"✅ {resp.json()['mensagem']}")
                 else:
-                    st.error("Missão não encontrada")
+                    st.error(f"Erro: {erro}")
             except Exception as e:
                 st.error(f"Erro: {str(e)}")
     
@@ -1726,19 +1787,9 @@ def pagina_gerenciar_missoes():
             resp = requests.get(f"{API_URL}/missoes", params={"pagina": pagina, "tamanho": tamanho}, timeout=10)
             if resp.status_code == 200:
                 resultado = resp.json()
-                st.metric("Total de Missões", resultado['total'])
-                
-                df_data = []
-                for missao in resultado['missoes']:
-                    df_data.append({
-                        'ID': missao['id'],
-                        'Título': missao.get('titulo', 'N/A'),
-                        'Tipo': missao.get('tipo', 'N/A'),
-                        'Dificuldade': missao.get('dificuldade', 'N/A'),
-                        'Recompensa': missao.get('recompensa_ouro', 0)
-                    })
+                st.metric("Total de Missões", texto_total(resultado))
                 
-                df = pd.DataFrame(df_data)
+                df = dataframe_de_registros(resultado['missoes'], COLUNAS_LISTA_MISSOES, padrao_texto='N/A')
                 st.dataframe(df, use_container_width=True, hide_index=True)
         except Exception as e:
             st.error(f"Erro: {str(e)}")
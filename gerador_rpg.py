@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# gerador_rpg.py - Gerador sintético em escala (colunas NumPy, sementes determinísticas)
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from embeddings_rpg import CAMPO_EMBEDDING, embeddings_em_lote, parte_numerica, vetor_texto
+
+# ============================================================
+# REGRAS (as mesmas dos scripts populate_*)
+# ============================================================
+# Tamanho de cada entidade com --scale 1 (o que os populate_* geram)
+BASE_ENTIDADES = {'itens': 100, 'personagens': 50, 'missoes': 60}
+
+ALIAS_ENTIDADES = {'itens': 'rpg_itens', 'personagens': 'rpg_personagens', 'missoes': 'rpg_missoes'}
+
+# Itens
+NOMES_ARMAS = ["Espada", "Machado", "Lança", "Martelo", "Adaga", "Arco", "Cajado", "Alabarda"]
+ADJETIVOS = ["Flamejante", "Gélida", "Sombria", "Radiante", "Venenosa", "Trovejante", "Ancestral", "Mística"]
+TIPOS_ITEM = ["Arma", "Armadura", "Acessório", "Consumível", "Livro", "Componente Arcano"]
+RARIDADES = ["Comum", "Incomum", "Raro", "Muito Raro", "Lendário", "Artefato"]
+POCOES = ['Cura', 'Força', 'Invisibilidade', 'Voo', 'Sabedoria']
+TIPOS_COM_BONUS = ["Arma", "Armadura", "Acessório"]
+
+VALOR_POR_RARIDADE = {
+    "Comum": (10, 100),
+    "Incomum": (100, 500),
+    "Raro": (500, 2000),
+    "Muito Raro": (2000, 10000),
+    "Lendário": (10000, 50000),
+    "Artefato": (50000, 999999)
+}
+
+# Personagens
+CLASSES = ["Guerreiro", "Mago", "Assassino", "Paladino", "Ranger", "Bardo", "Druida", "Clérigo"]
+RACAS = ["Humano", "Elfo", "Anão", "Gnomo", "Meio-Orc", "Meio-Elfo", "Tiefling", "Dracônico"]
+STATUS_PERSONAGEM = ["Ativo", "Inativo", "Morto", "Congelado"]
+NOMES_BASE = ["Aragorn", "Legolas", "Gandalf", "Gimli", "Frodo", "Bilbo", "Thorin", "Boromir",
+              "Galadriel", "Elrond", "Saruman", "Sauron", "Glorfindel", "Tauriel", "Thranduil"]
+SOBRENOMES = ["o Bravo", "o Sábio", "o Rápido", "o Forte", "o Misterioso", "do Vale"]
+ATRIBUTOS_PERSONAGEM = ['forca', 'destreza', 'constituicao', 'inteligencia', 'sabedoria', 'carisma']
+
+# vida e mana: (base, por nível); atributos: (mínimo, máximo)
+REGRAS_CLASSE = {
+    "Guerreiro": {'vida': (12, 2), 'mana': (0, 0), 'forca': (16, 20), 'destreza': (10, 14),
+                  'constituicao': (14, 18), 'inteligencia': (8, 12), 'sabedoria': (10, 14), 'carisma': (8, 12)},
+    "Mago": {'vida': (6, 1), 'mana': (15, 3), 'forca': (8, 12), 'destreza': (12, 14),
+             'constituicao': (10, 12), 'inteligencia': (16, 20), 'sabedoria': (12, 14), 'carisma': (8, 12)},
+    "Assassino": {'vida': (8, 1), 'mana': (0, 0), 'forca': (12, 14), 'destreza': (16, 20),
+                  'constituicao': (10, 12), 'inteligencia': (12, 14), 'sabedoria': (12, 14), 'carisma': (12, 14)},
+    "Clérigo": {'vida': (10, 2), 'mana': (12, 2), 'forca': (12, 14), 'destreza': (10, 12),
+                'constituicao': (12, 14), 'inteligencia': (10, 12), 'sabedoria': (16, 20), 'carisma': (14, 16)}
+}
+REGRAS_OUTRAS_CLASSES = {'vida': (10, 1), 'mana': (8, 1), 'forca': (12, 16), 'destreza': (12, 16),
+                         'constituicao': (12, 14), 'inteligencia': (10, 14), 'sabedoria': (12, 14),
+                         'carisma': (10, 14)}
+
+# Missões
+TIPOS_MISSAO = ["Eliminar", "Coletar", "Explorar", "Proteger", "Investigar", "Resgate", "Entrega", "Assassinato"]
+DIFICULDADES = ["Fácil", "Normal", "Difícil", "Muito Difícil", "Lendário"]
+LOCALIZACOES = ["Floresta Escura", "Caverna Profunda", "Torre do Mago", "Ruínas Antigas",
+                "Castelo Abandonado", "Montanha Nevada", "Pântano Misterioso", "Cidade Perdida"]
+NPCS = ["Merlim", "Gandalf", "Bilbo", "Aragorn", "Galadriel", "Elrond", "Legolas", "Gimli"]
+INIMIGOS = ['Orcs', 'Goblins', 'Dragões', 'Espectros', 'Mortos-Vivos', 'Feiticeiros']
+STATUS_MISSAO = ["Ativa", "Inativa", "Concluída"]
+
+# nivel_minimo (faixa), nivel_maximo (None = mínimo + 3), ouro, experiência e taxa de conclusão
+REGRAS_DIFICULDADE = {
+    "Fácil": {'nivel': (1, 5), 'nivel_max': None, 'ouro': (50, 150), 'exp': (100, 300), 'taxa': (70, 95)},
+    "Normal": {'nivel': (5, 10), 'nivel_max': None, 'ouro': (200, 500), 'exp': (500, 1000), 'taxa': (50, 75)},
+    "Difícil": {'nivel': (10, 15), 'nivel_max': None, 'ouro': (800, 1500), 'exp': (1500, 3000),
+                'taxa': (30, 60)},
+    "Muito Difícil": {'nivel': (15, 18), 'nivel_max': None, 'ouro': (2000, 4000), 'exp': (4000, 6000),
+                      'taxa': (10, 40)},
+    "Lendário": {'nivel': (18, 20), 'nivel_max': 20, 'ouro': (5000, 10000), 'exp': (8000, 15000),
+                 'taxa': (1, 20)}
+}
+
+# ============================================================
+# SORTEIO VETORIZADO
+# ============================================================
+
+def probabilidades(n, zipf=None):
+    """Uniforme ou Zipf (p_k ∝ 1/k^s, na ordem das listas acima)"""
+    if not zipf:
+        return None
+    pesos = 1.0 / np.arange(1, n + 1) ** zipf
+    return pesos / pesos.sum()
+
+
+def sortear(rng, opcoes, n, zipf=None):
+    """Códigos (índices em `opcoes`) de n sorteios"""
+    return rng.choice(len(opcoes), size=n, p=probabilidades(len(opcoes), zipf))
+
+
+def inteiros_por_grupo(rng, codigos, faixas):
+    """Inteiro em [mínimo, máximo] com a faixa de cada linha escolhida pelo seu código"""
+    faixas = np.asarray(faixas)
+    return rng.integers(faixas[codigos, 0], faixas[codigos, 1] + 1)
+
+
+def tabela(valores):
+    """Array 1-D de objetos (strings ou listas) para indexar por código"""
+    resultado = np.empty(len(valores), dtype=object)
+    for i, valor in enumerate(valores):
+        resultado[i] = valor
+    return resultado
+
+# ============================================================
+# TABELAS DE TEXTO PRÉ-MONTADAS
+# ============================================================
+# Todo texto gerado vem de combinações finitas das listas: cada
+# combinação é montada uma vez e o lote só indexa a tabela.
+
+def _nomes_de_item(tipo):
+    if tipo == "Arma":
+        return [f"{base} {adjetivo}" for base in NOMES_ARMAS for adjetivo in ADJETIVOS]
+    if tipo == "Consumível":
+        return [f"Poção de {efeito}" for efeito in POCOES]
+    if tipo == "Livro":
+        return [f"Livro {adjetivo}" for adjetivo in ADJETIVOS]
+    return [f"{tipo} {adjetivo}" for adjetivo in ADJETIVOS]
+
+
+NOMES_ITEM = []
+INICIO_NOMES = []
+for _tipo in TIPOS_ITEM:
+    INICIO_NOMES.append(len(NOMES_ITEM))
+    NOMES_ITEM += _nomes_de_item(_tipo)
+QTD_NOMES = np.array([len(_nomes_de_item(t)) for t in TIPOS_ITEM])
+INICIO_NOMES = np.array(INICIO_NOMES)
+
+DESCRICOES_ITEM = tabela([f"Um {nome.lower()} de qualidade {raridade.lower()}"
+                          for nome in NOMES_ITEM for raridade in RARIDADES])
+TAGS_ITEM = tabela([[tipo.lower(), raridade.lower()] for tipo in TIPOS_ITEM for raridade in RARIDADES])
+
+_vetores_texto = None
+
+
+def vetores_texto_itens():
+    """Parte textual do embedding de cada (nome, raridade): o texto do item só depende disso"""
+    global _vetores_texto
+    if _vetores_texto is None:
+        tipo_do_nome = np.repeat(np.arange(len(TIPOS_ITEM)), QTD_NOMES)
+        _vetores_texto = np.stack([
+            vetor_texto({
+                'nome': nome,
+                'descricao': DESCRICOES_ITEM[g * len(RARIDADES) + r],
+                'tipo': TIPOS_ITEM[tipo_do_nome[g]],
+                'tags': TAGS_ITEM[tipo_do_nome[g] * len(RARIDADES) + r]
+            })
+            for g, nome in enumerate(NOMES_ITEM) for r in range(len(RARIDADES))
+        ])
+    return _vetores_texto
+
+
+NOMES_PERSONAGEM = tabela([f"{nome} {sobrenome}" for nome in NOMES_BASE for sobrenome in SOBRENOMES])
+DESCRICOES_PERSONAGEM = tabela([f"Um(a) {classe.lower()} {raca.lower()} de nível {nivel}"
+                                for classe in CLASSES for raca in RACAS for nivel in range(1, 21)])
+
+TITULOS_MISSAO = tabela([f"{tipo} os {inimigo} da {local}"
+                         for tipo in TIPOS_MISSAO for inimigo in INIMIGOS for local in LOCALIZACOES])
+DESCRICOES_MISSAO = tabela([
+    f"Uma perigosa missão de {tipo.lower()} na {local}. Oferecida por {npc}. Dificuldade: {dificuldade}"
+    for tipo in TIPOS_MISSAO for local in LOCALIZACOES for npc in NPCS for dificuldade in DIFICULDADES
+])
+OBJETIVOS_MISSAO = tabela([f"Completar a tarefa de {tipo.lower()} conforme solicitado" for tipo in TIPOS_MISSAO])
+
+# ============================================================
+# LOTES DE COLUNAS
+# ============================================================
+# Cada lote tem sua própria semente (seed, entidade, número do lote):
+# o lote k sai igual em qualquer ordem e em qualquer processo.
+
+def rng_do_lote(seed, entidade, lote):
+    return np.random.default_rng([seed, list(BASE_ENTIDADES).index(entidade), lote])
+
+
+def colunas_itens(rng, n, zipf=None, agora=None):
+    agora = agora or datetime.now()
+    tipo = sortear(rng, TIPOS_ITEM, n, zipf)
+    raridade = sortear(rng, RARIDADES, n, zipf)
+    nome = INICIO_NOMES[tipo] + (rng.random(n) * QTD_NOMES[tipo]).astype(np.int64)
+    texto = nome * len(RARIDADES) + raridade
+    colunas = {
+        'nome': tabela(NOMES_ITEM)[nome],
+        'descricao': DESCRICOES_ITEM[texto],
+        'tipo': tabela(TIPOS_ITEM)[tipo],
+        'raridade': tabela(RARIDADES)[raridade],
+        'valor': inteiros_por_grupo(rng, raridade, [VALOR_POR_RARIDADE[r] for r in RARIDADES]),
+        'peso': rng.integers(1, 51, n),
+        'nivel_requerido': rng.integers(1, 21, n),
+        'tags': TAGS_ITEM[tipo * len(RARIDADES) + raridade],
+        'data_criacao': agora.isoformat()
+    }
+    # Bônus só para armas, armaduras e acessórios (os demais não têm o campo)
+    com_bonus = np.isin(tipo, [TIPOS_ITEM.index(t) for t in TIPOS_COM_BONUS])
+    forca = np.where(com_bonus, rng.integers(0, 6, n), 0)
+    destreza = np.where(com_bonus, rng.integers(0, 6, n), 0)
+    colunas['atributos_bonus.forca'] = forca
+    colunas['atributos_bonus.destreza'] = destreza
+    colunas['_com_bonus'] = com_bonus
+
+    numericos = parte_numerica({campo: colunas[campo] for campo in
+                                ('valor', 'peso', 'nivel_requerido',
+                                 'atributos_bonus.forca', 'atributos_bonus.destreza')}, n)
+    embeddings = embeddings_em_lote(vetores_texto_itens()[texto], numericos)
+    colunas[CAMPO_EMBEDDING] = np.round(embeddings.astype(np.float64), 6)
+    return colunas
+
+
+def colunas_personagens(rng, n, zipf=None, agora=None):
+    agora = (agora or datetime.now()).isoformat()
+    classe = sortear(rng, CLASSES, n, zipf)
+    raca = sortear(rng, RACAS, n)
+    nivel = rng.integers(1, 21, n)
+    regras = [REGRAS_CLASSE.get(c, REGRAS_OUTRAS_CLASSES) for c in CLASSES]
+
+    colunas = {
+        'nome': NOMES_PERSONAGEM[rng.integers(0, len(NOMES_PERSONAGEM), n)],
+        'descricao': DESCRICOES_PERSONAGEM[(classe * len(RACAS) + raca) * 20 + nivel - 1],
+        'classe': tabela(CLASSES)[classe],
+        'raca': tabela(RACAS)[raca],
+        'nivel': nivel,
+        'experiencia': nivel * 1000 + rng.integers(0, 501, n)
+    }
+    for campo in ('vida', 'mana'):
+        base = np.array([r[campo][0] for r in regras])
+        por_nivel = np.array([r[campo][1] for r in regras])
+        colunas[campo] = base[classe] + nivel * por_nivel[classe]
+    for campo in ATRIBUTOS_PERSONAGEM:
+        colunas[campo] = inteiros_por_grupo(rng, classe, [r[campo] for r in regras])
+    colunas.update({
+        'status': tabela(STATUS_PERSONAGEM)[rng.integers(0, len(STATUS_PERSONAGEM), n)],
+        'data_criacao': agora,
+        'ultima_atualizacao': agora
+    })
+    return colunas
+
+
+def colunas_missoes(rng, n, zipf=None, agora=None):
+    agora = agora or datetime.now()
+    tipo = sortear(rng, TIPOS_MISSAO, n)
+    dificuldade = sortear(rng, DIFICULDADES, n)
+    local = sortear(rng, LOCALIZACOES, n)
+    npc = sortear(rng, NPCS, n)
+    regras = [REGRAS_DIFICULDADE[d] for d in DIFICULDADES]
+
+    nivel_min = inteiros_por_grupo(rng, dificuldade, [r['nivel'] for r in regras])
+    teto = np.array([r['nivel_max'] or 0 for r in regras])[dificuldade]
+    taxa = inteiros_por_grupo(rng, dificuldade, [r['taxa'] for r in regras])
+    aceitacoes = rng.integers(10, 501, n)
+    datas = tabela([(agora - timedelta(days=d)).isoformat() for d in range(1, 366)])
+
+    return {
+        'titulo': TITULOS_MISSAO[(tipo * len(INIMIGOS) + rng.integers(0, len(INIMIGOS), n))
+                                 * len(LOCALIZACOES) + local],
+        'descricao': DESCRICOES_MISSAO[((tipo * len(LOCALIZACOES) + local) * len(NPCS) + npc)
+                                       * len(DIFICULDADES) + dificuldade],
+        'objetivo': OBJETIVOS_MISSAO[tipo],
+        'recompensa_ouro': inteiros_por_grupo(rng, dificuldade, [r['ouro'] for r in regras]),
+        'recompensa_experiencia': inteiros_por_grupo(rng, dificuldade, [r['exp'] for r in regras]),
+        'nivel_minimo': nivel_min,
+        'nivel_maximo': np.where(teto > 0, teto, nivel_min + 3),
+        'dificuldade': tabela(DIFICULDADES)[dificuldade],
+        'tipo': tabela(TIPOS_MISSAO)[tipo],
+        'localizacao': tabela(LOCALIZACOES)[local],
+        'status': tabela(STATUS_MISSAO)[rng.integers(0, len(STATUS_MISSAO), n)],
+        'npc_ofertante': tabela(NPCS)[npc],
+        'tempo_limite_dias': rng.integers(3, 31, n),
+        'numero_aceitacoes': aceitacoes,
+        'numero_conclusoes': aceitacoes * taxa // 100,
+        'taxa_conclusao_pct': taxa,
+        'data_criacao': datas[rng.integers(0, 365, n)],
+        'repeticao_permitida': rng.random(n) < 0.5
+    }
+
+
+GERADORES = {
+    'itens': colunas_itens,
+    'personagens': colunas_personagens,
+    'missoes': colunas_missoes
+}
+
+# ============================================================
+# DOCUMENTOS
+# ============================================================
+
+def documentos(colunas, n):
+    """Documentos (dicts com tipos Python) a partir das colunas de um lote"""
+    listas = {}
+    for campo, valores in colunas.items():
+        if campo.startswith('_') or '.' in campo:
+            continue
+        listas[campo] = valores.tolist() if isinstance(valores, np.ndarray) else [valores] * n
+
+    campos = list(listas)
+    docs = [dict(zip(campos, linha)) for linha in zip(*listas.values())]
+
+    if '_com_bonus' in colunas:
+        forca = colunas['atributos_bonus.forca'].tolist()
+        destreza = colunas['atributos_bonus.destreza'].tolist()
+        for i in np.flatnonzero(colunas['_com_bonus']).tolist():
+            docs[i]['atributos_bonus'] = {'forca': forca[i], 'destreza': destreza[i]}
+    return docs
+
+
+def lotes(entidade, total, seed=42, zipf=None, tamanho_lote=10000, primeiro_id=1, lote_inicial=0, passo=1):
+    """Gerar (ids, documentos) em lotes; `lote_inicial`/`passo` repartem os lotes entre processos"""
+    gerador = GERADORES[entidade]
+    agora = datetime.now()
+    for lote in range(lote_inicial, (total + tamanho_lote - 1) // tamanho_lote, passo):
+        inicio = lote * tamanho_lote
+        n = min(tamanho_lote, total - inicio)
+        colunas = gerador(rng_do_lote(seed, entidade, lote), n, zipf, agora)
+        ids = [str(primeiro_id + inicio + i) for i in range(n)]
+        yield ids, documentos(colunas, n)
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+if __name__ == "__main__":
+    from elasticsearch import Elasticsearch, helpers
+
+    from indices_rpg import garantir_indice
+
+    parser = argparse.ArgumentParser(description="Gerar dados sintéticos de RPG em escala")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Fator de escala (1 = 100 itens, 50 personagens, 60 missões)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente (mesma semente, mesmos dados)")
+    parser.add_argument("--zipf", type=float, default=None,
+                        help="Expoente Zipf para tipo/raridade/classe (padrão: uniforme)")
+    parser.add_argument("--entidades", nargs="*", default=list(BASE_ENTIDADES), choices=list(BASE_ENTIDADES))
+    parser.add_argument("--lote", type=int, default=10000, help="Documentos por lote NumPy")
+    parser.add_argument("--threads", type=int, default=4, help="Requisições _bulk simultâneas")
+    parser.add_argument("--dry-run", action="store_true", help="Só gerar (mede a geração, sem ES)")
+    args = parser.parse_args()
+
+    es = None
+    if not args.dry_run:
+        es = Elasticsearch("http://localhost:9200", request_timeout=120)
+        if not es.ping():
+            print("❌ Elasticsearch não está rodando!")
+            print("Execute: docker-compose up -d")
+            sys.exit(1)
+
+    print(f"🎲 Gerando dados: scale={args.scale}, seed={args.seed}, zipf={args.zipf or 'uniforme'}")
+    print("=" * 60)
+
+    for entidade in args.entidades:
+        total = int(BASE_ENTIDADES[entidade] * args.scale)
+        alias = ALIAS_ENTIDADES[entidade]
+        inicio = time.perf_counter()
+        gerados = 0
+
+        if es is not None:
+            garantir_indice(es, alias)
+
+        for ids, docs in lotes(entidade, total, args.seed, args.zipf, args.lote):
+            gerados += len(docs)
+            if es is not None:
+                acoes = ({"_index": alias, "_id": doc_id, "_source": doc} for doc_id, doc in zip(ids, docs))
+                for ok, info in helpers.parallel_bulk(es, acoes, thread_count=args.threads,
+                                                      chunk_size=2000, raise_on_error=False):
+                    if not ok:
+                        print(f"⚠️  {info}")
+            decorrido = time.perf_counter() - inicio
+            print(f"\r   {entidade}: {gerados}/{total} ({gerados / max(decorrido, 1e-9):,.0f} docs/s)",
+                  end="", flush=True)
+
+        print(f"\n✅ {entidade}: {gerados} documentos em {time.perf_counter() - inicio:.1f}s")
+        if es is not None:
+            es.indices.refresh(index=alias)
+
+    print("\n" + "=" * 60)
@@ -0,0 +1,272 @@
+# indices_rpg.py - Definição dos índices RPG (settings, mappings e ordenação)
+import copy
+
+from embeddings_rpg import CAMPO_EMBEDDING, DIM_EMBEDDING
+
+# ============================================================
+# ORDENAÇÃO DO ÍNDICE (index.sort)
+# ============================================================
+# Cada entidade é gravada em disco já na ordem da sua ordenação padrão
+# na API. Consultas top-N com o mesmo sort podem encerrar cedo em cada
+# segmento quando o total de hits não precisa ser exato.
+ORDENACAO_INDICE = {
+    'rpg_itens': [('valor', 'desc')],
+    'rpg_personagens': [('nivel', 'desc')],
+    'rpg_missoes': [('recompensa_ouro', 'desc')]
+}
+
+# ============================================================
+# MAPPINGS
+# ============================================================
+MAPPING_ITENS = {
+    "settings": {
+        "number_of_shards": 1,
+        "number_of_replicas": 0,
+        "analysis": {
+            "analyzer": {
+                "item_analyzer": {
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "asciifolding"]
+                }
+            }
+        }
+    },
+    "mappings": {
+        # O vetor só serve para o kNN: fica fora do _source das respostas
+        "_source": {"excludes": [CAMPO_EMBEDDING]},
+        "properties": {
+            "nome": {
+                "type": "text",
+                "analyzer": "item_analyzer",
+                "fields": {
+                    "keyword": {"type": "keyword"},
+                    "suggest": {"type": "completion"}
+                }
+            },
+            "descricao": {"type": "text", "analyzer": "item_analyzer"},
+            "tipo": {"type": "keyword"},
+            "raridade": {"type": "keyword"},
+            "valor": {"type": "integer"},
+            "peso": {"type": "integer"},
+            "nivel_requerido": {"type": "short"},
+            "atributos_bonus": {
+                "properties": {
+                    "forca": {"type": "short"},
+                    "destreza": {"type": "short"}
+                }
+            },
+            "tags": {"type": "keyword"},
+            "data_criacao": {"type": "date"},
+            CAMPO_EMBEDDING: {
+                "type": "dense_vector",
+                "dims": DIM_EMBEDDING,
+                "index": True,
+                "similarity": "cosine"
+            }
+        }
+    }
+}
+
+MAPPING_PERSONAGENS = {
+    "settings": {
+        "number_of_shards": 1,
+        "number_of_replicas": 0,
+        "analysis": {
+            "analyzer": {
+                "character_analyzer": {
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "asciifolding"]
+                }
+            }
+        }
+    },
+    "mappings": {
+        "properties": {
+            "nome": {
+                "type": "text",
+                "analyzer": "character_analyzer",
+                "fields": {
+                    "keyword": {"type": "keyword"}
+                }
+            },
+            "descricao": {"type": "text", "analyzer": "character_analyzer"},
+            "classe": {"type": "keyword"},
+            "raca": {"type": "keyword"},
+            "nivel": {"type": "short"},
+            "experiencia": {"type": "integer"},
+            "vida": {"type": "short"},
+            "mana": {"type": "short"},
+            "forca": {"type": "short"},
+            "destreza": {"type": "short"},
+            "constituicao": {"type": "short"},
+            "inteligencia": {"type": "short"},
+            "sabedoria": {"type": "short"},
+            "carisma": {"type": "short"},
+            "status": {"type": "keyword"},
+            "data_criacao": {"type": "date"},
+            "ultima_atualizacao": {"type": "date"}
+        }
+    }
+}
+
+MAPPING_MISSOES = {
+    "settings": {
+        "number_of_shards": 1,
+        "number_of_replicas": 0,
+        "analysis": {
+            "analyzer": {
+                "mission_analyzer": {
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "asciifolding"]
+                }
+            }
+        }
+    },
+    "mappings": {
+        "properties": {
+            "titulo": {
+                "type": "text",
+                "analyzer": "mission_analyzer",
+                "fields": {
+                    "keyword": {"type": "keyword"}
+                }
+            },
+            "descricao": {"type": "text", "analyzer": "mission_analyzer"},
+            "objetivo": {"type": "text"},
+            "recompensa_ouro": {"type": "integer"},
+            "recompensa_experiencia": {"type": "integer"},
+            "nivel_minimo": {"type": "short"},
+            "nivel_maximo": {"type": "short"},
+            "dificuldade": {"type": "keyword"},
+            "tipo": {"type": "keyword"},
+            "localizacao": {"type": "keyword"},
+            "status": {"type": "keyword"},
+            "npc_ofertante": {"type": "keyword"},
+            "tempo_limite_dias": {"type": "short"},
+            "numero_aceitacoes": {"type": "integer"},
+            "numero_conclusoes": {"type": "integer"},
+            "taxa_conclusao_pct": {"type": "float"},
+            "data_criacao": {"type": "date"},
+            "repeticao_permitida": {"type": "boolean"}
+        }
+    }
+}
+
+# Buscas salvas: queries percolator sobre os campos dos itens (mesmo analyzer)
+MAPPING_BUSCAS_SALVAS = copy.deepcopy(MAPPING_ITENS)
+del MAPPING_BUSCAS_SALVAS["mappings"]["_source"]
+del MAPPING_BUSCAS_SALVAS["mappings"]["properties"][CAMPO_EMBEDDING]
+MAPPING_BUSCAS_SALVAS["mappings"]["properties"].update({
+    "query": {"type": "percolator"},
+    "nome_busca": {"type": "keyword"},
+    "usuario": {"type": "keyword"},
+    "criterios": {"type": "object", "enabled": False},
+    "data_busca": {"type": "date"}
+})
+
+MAPPINGS = {
+    'rpg_itens': MAPPING_ITENS,
+    'rpg_personagens': MAPPING_PERSONAGENS,
+    'rpg_missoes': MAPPING_MISSOES,
+    'rpg_buscas_salvas': MAPPING_BUSCAS_SALVAS
+}
+
+# ============================================================
+# CRIAÇÃO DOS ÍNDICES
+# ============================================================
+
+def corpo_do_indice(nome, ordenar=True):
+    """Settings + mappings do índice, com a ordenação declarada aplicada"""
+    corpo = copy.deepcopy(MAPPINGS[nome])
+
+    ordenacao = ORDENACAO_INDICE.get(nome)
+    if ordenar and ordenacao:
+        corpo['settings']['index'] = {
+            'sort.field': [campo for campo, _ in ordenacao],
+            'sort.order': [ordem for _, ordem in ordenacao]
+        }
+
+    return corpo
+
+
+def mesclar_settings(settings, extras):
+    """Mesclar `extras` em `settings` recursivamente (um dict aninhado como `index` não substitui o outro)"""
+    for chave, valor in extras.items():
+        if isinstance(valor, dict) and isinstance(settings.get(chave), dict):
+            mesclar_settings(settings[chave], valor)
+        else:
+            settings[chave] = valor
+    return settings
+
+# ============================================================
+# VERSÕES E ALIASES
+# ============================================================
+# Cada entidade vive num índice versionado (rpg_itens_v1, _v2...) e a
+# API lê e escreve pelo alias com o nome da entidade. Trocar de mapping
+# é criar a próxima versão, copiar os documentos e mover o alias numa
+# única chamada _aliases (ver migrar_indices.py).
+
+def nome_versao(alias, versao):
+    return f"{alias}_v{versao}"
+
+
+def versoes_existentes(es, alias):
+    """Números das versões já criadas do alias, em ordem"""
+    resp = es.indices.get(index=f"{alias}_v*", ignore_unavailable=True, allow_no_indices=True)
+    versoes = []
+    for nome in resp:
+        sufixo = nome[len(alias) + 2:]
+        if sufixo.isdigit():
+            versoes.append(int(sufixo))
+    return sorted(versoes)
+
+
+def indice_atual(es, alias):
+    """Índice concreto por trás do alias (o próprio nome se for um índice legado, None se não existe)"""
+    if es.indices.exists_alias(name=alias):
+        indices = es.indices.get_alias(name=alias)
+        for indice, info in indices.items():
+            if info['aliases'][alias].get('is_write_index'):
+                return indice
+        return sorted(indices)[-1]
+    if es.indices.exists(index=alias):
+        return alias
+    return None
+
+
+def criar_versao(es, alias, ordenar=True, settings_extras=None):
+    """Criar a próxima versão do índice (sem mexer no alias); devolve o nome"""
+    versoes = versoes_existentes(es, alias)
+    nome = nome_versao(alias, (versoes[-1] if versoes else 0) + 1)
+    corpo = corpo_do_indice(alias, ordenar)
+    mesclar_settings(corpo['settings'], settings_extras or {})
+    es.indices.create(index=nome, body=corpo)
+    return nome
+
+
+def trocar_alias(es, alias, novo_indice):
+    """Apontar o alias para `novo_indice` atomicamente
+
+    Um índice legado com o nome do alias (de antes das versões) é
+    removido na mesma operação (remove_index), já que um alias não pode
+    ter o nome de um índice existente.
+    """
+    acoes = []
+    atual = indice_atual(es, alias)
+    if atual == alias:
+        acoes.append({"remove_index": {"index": alias}})
+    elif atual is not None:
+        for indice in es.indices.get_alias(name=alias):
+            acoes.append({"remove": {"index": indice, "alias": alias}})
+    acoes.append({"add": {"index": novo_indice, "alias": alias, "is_write_index": True}})
+    es.indices.update_aliases(body={"actions": acoes})
+    return atual
+
+
+def garantir_indice(es, alias, ordenar=True):
+    """Criar a primeira versão e o alias se a entidade ainda não existe; devolve o índice concreto"""
+    atual = indice_atual(es, alias)
+    if atual is None:
+        atual = criar_versao(es, alias, ordenar)
+        trocar_alias(es, alias, atual)
+    return atual
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# ingestao_rpg.py - Ingestão em duas etapas: shards NDJSON pré-serializados e replay via mmap
+import argparse
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from gerador_rpg import ALIAS_ENTIDADES, BASE_ENTIDADES, lotes
+
+# Toda linha de ação começa assim (o _index vem da URL no replay): é o
+# que o replayer procura para cortar pedaços sem decodificar JSON
+INICIO_ACAO = b'{"index":'
+
+MANIFESTO = 'manifesto.json'
+
+# ============================================================
+# ETAPA 1: SHARDS NDJSON (um processo por shard)
+# ============================================================
+
+def escrever_shard(diretorio, entidade, total, seed, zipf, tamanho_lote, shard, shards):
+    """Gerar e serializar os lotes shard, shard + shards, ... num arquivo; devolve (arquivo, docs, bytes)"""
+    arquivo = os.path.join(diretorio, f"{entidade}-{shard:05d}.ndjson")
+    docs = 0
+    with open(arquivo + '.tmp', 'wb') as f:
+        for ids, documentos in lotes(entidade, total, seed, zipf, tamanho_lote, lote_inicial=shard, passo=shards):
+            linhas = []
+            for doc_id, doc in zip(ids, documentos):
+                linhas.append('{"index":{"_id":"%s"}}\n' % doc_id)
+                linhas.append(json.dumps(doc, ensure_ascii=False, separators=(',', ':')))
+                linhas.append('\n')
+            f.write(''.join(linhas).encode('utf-8'))
+            docs += len(ids)
+    os.replace(arquivo + '.tmp', arquivo)
+    return os.path.basename(arquivo), docs, os.path.getsize(arquivo)
+
+
+def construir(args):
+    os.makedirs(args.diretorio, exist_ok=True)
+    manifesto = {
+        'scale': args.scale,
+        'seed': args.seed,
+        'zipf': args.zipf,
+        'criado_em': datetime.now().isoformat(),
+        'entidades': {}
+    }
+    processos = args.processos or os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        for entidade in args.entidades:
+            total = int(BASE_ENTIDADES[entidade] * args.scale)
+            lotes_total = (total + args.lote - 1) // args.lote
+            shards = max(1, min(args.shards or processos * 2, lotes_total))
+            inicio = time.perf_counter()
+            futuros = [
+                executor.submit(escrever_shard, args.diretorio, entidade, total, args.seed, args.zipf,
+                                args.lote, shard, shards)
+                for shard in range(shards)
+            ]
+            arquivos = [futuro.result() for futuro in futuros]
+            decorrido = time.perf_counter() - inicio
+            tamanho = sum(b for _, _, b in arquivos)
+            manifesto['entidades'][entidade] = {
+                'indice': ALIAS_ENTIDADES[entidade],
+                'documentos': sum(d for _, d, _ in arquivos),
+                'bytes': tamanho,
+                'shards': [nome for nome, _, _ in arquivos]
+            }
+            print(f"✅ {entidade}: {total} documentos em {shards} shards, {tamanho / 2**20:,.0f} MB "
+                  f"em {decorrido:.1f}s ({total / max(decorrido, 1e-9):,.0f} docs/s, {processos} processos)")
+
+    with open(os.path.join(args.diretorio, MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    print(f"💾 Manifesto em {os.path.join(args.diretorio, MANIFESTO)}")
+
+# ============================================================
+# ETAPA 2: REPLAY (mmap + _bulk com tamanho adaptativo)
+# ============================================================
+
+class ControleLote:
+    """Tamanho dos pedaços do _bulk em bytes, ajustado por AIMD
+
+    Respostas rápidas aumentam o pedaço em `passo` bytes; respostas
+    acima do alvo reduzem 25%; rejeições (429) cortam pela metade e
+    pausam todos os workers com backoff exponencial.
+    """
+
+    def __init__(self, inicial=4 * 2**20, minimo=256 * 2**10, maximo=64 * 2**20, alvo_ms=1000,
+                 passo=2**20):
+        self.tamanho = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.alvo_ms = alvo_ms
+        self.passo = passo
+        self.pausa = 0.0
+        self.pausa_ate = 0.0
+        self.janela = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+    def registrar(self, duracao_ms, rejeitados):
+        with self._lock:
+            self.janela.append(bool(rejeitados))
+            if rejeitados:
+                self.tamanho = max(self.minimo, self.tamanho // 2)
+                self.pausa = min(max(self.pausa * 2, 0.25), 10.0)
+                self.pausa_ate = time.monotonic() + self.pausa
+            else:
+                self.pausa = 0.0
+                if duracao_ms > self.alvo_ms * 1.5:
+                    self.tamanho = max(self.minimo, int(self.tamanho * 0.75))
+                elif duracao_ms < self.alvo_ms:
+                    self.tamanho = min(self.maximo, self.tamanho + self.passo)
+
+    def esperar_backoff(self):
+        espera = self.pausa_ate - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+    def taxa_rejeicao(self):
+        with self._lock:
+            return sum(self.janela) / len(self.janela) if self.janela else 0.0
+
+
+class Replayer:
+    """Corta os shards (mapeados em memória) em pedaços e os envia em paralelo"""
+
+    def __init__(self, es, indice, arquivos, controle, refresh=False):
+        self.es = es
+        self.indice = indice
+        self.arquivos = deque(arquivos)
+        self.controle = controle
+        self.refresh = refresh
+        self.reenvios = deque()
+        self.atual = None
+        self.posicao = 0
+        self.enviados = 0
+        self.bytes_enviados = 0
+        self.rejeicoes = 0
+        self.falhas = 0
+        self.erros = []
+        self._em_voo = 0
+        self._lock = threading.Lock()
+        self._mapas = []
+
+    def _proximo_pedaco(self):
+        with self._lock:
+            if self.reenvios:
+                return self.reenvios.popleft()
+            while self.atual is None or self.posicao >= len(self.atual):
+                if not self.arquivos:
+                    return None
+                with open(self.arquivos.popleft(), 'rb') as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        continue
+                    self.atual = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mapas.append(self.atual)
+                self.posicao = 0
+
+            inicio = self.posicao
+            fim = self.atual.find(b'\n' + INICIO_ACAO, inicio + self.controle.tamanho - 1)
+            fim = len(self.atual) if fim < 0 else fim + 1
+            self.posicao = fim
+            # Fatia do mmap: os bytes vão ao _bulk como estão, sem decodificar
+            return self.atual[inicio:fim]
+
+    def _enviar(self, pedaco):
+        inicio = time.perf_counter()
+        try:
+            resp = self.es.bulk(body=pedaco, index=self.indice, refresh=self.refresh)
+        except Exception as e:
+            if getattr(getattr(e, 'meta', None), 'status', None) != 429:
+                raise
+            # O nó recusou o pedaço inteiro: volta para a fila
+            self.controle.registrar((time.perf_counter() - inicio) * 1000, True)
+            with self._lock:
+                self.rejeicoes += 1
+                self.reenvios.append(pedaco)
+            return
+        duracao = (time.perf_counter() - inicio) * 1000
+
+        rejeitados, falhas = [], 0
+        total = len(resp['items'])
+        if resp.get('errors'):
+            linhas = pedaco.split(b'\n')
+            for posicao, item in enumerate(resp['items']):
+                resultado = item['index']
+                if resultado.get('status') == 429:
+                    rejeitados.append(linhas[2 * posicao] + b'\n' + linhas[2 * posicao + 1] + b'\n')
+                elif resultado.get('error'):
+                    falhas += 1
+                    if len(self.erros) < 5:
+                        self.erros.append(resultado['error'])
+
+        self.controle.registrar(duracao, rejeitados)
+        with self._lock:
+            self.enviados += total - len(rejeitados) - falhas
+            self.falhas += falhas
+            self.bytes_enviados += len(pedaco)
+            if rejeitados:
+                self.rejeicoes += len(rejeitados)
+                self.reenvios.append(b''.join(rejeitados))
+
+    def _worker(self):
+        while True:
+            self.controle.esperar_backoff()
+            pedaco = self._proximo_pedaco()
+            if pedaco is None:
+                # Outro worker ainda pode devolver rejeitados para a fila
+                with self._lock:
+                    if not self.reenvios and not self._em_voo:
+                        return
+                time.sleep(0.05)
+                continue
+            with self._lock:
+                self._em_voo += 1
+            try:
+                self._enviar(pedaco)
+            finally:
+                with self._lock:
+                    self._em_voo -= 1
+
+    def executar(self, workers):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for futuro in [executor.submit(self._worker) for _ in range(workers)]:
+                futuro.result()
+        for mapa in self._mapas:
+            mapa.close()
+
+
+def enviar(args):
+    from elasticsearch import Elasticsearch
+
+    from indices_rpg import garantir_indice, indice_atual
+
+    with open(os.path.join(args.diretorio, MANIFESTO), encoding='utf-8') as f:
+        manifesto = json.load(f)
+
+    es = Elasticsearch("http://localhost:9200", request_timeout=300)
+    if not es.ping():
+        print("❌ Elasticsearch não está rodando!")
+        print("Execute: docker-compose up -d")
+        sys.exit(1)
+
+    for entidade, info in manifesto['entidades'].items():
+        if args.entidades and entidade not in args.entidades:
+            continue
+        indice = args.indice or info['indice']
+        concreto = indice_atual(es, indice) or garantir_indice(es, indice)
+        arquivos = [os.path.join(args.diretorio, nome) for nome in info['shards']]
+
+        # Sem refresh periódico durante a carga (restaurado no fim)
+        es.indices.put_settings(index=concreto, body={"index": {"refresh_interval": "-1"}})
+        controle = ControleLote(inicial=args.pedaco_mb * 2**20, alvo_ms=args.alvo_ms)
+        replayer = Replayer(es, indice, arquivos, controle)
+
+        print(f"\n📤 {entidade} -> {indice}: {info['documentos']} documentos, {info['bytes'] / 2**20:,.0f} MB")
+        inicio = time.perf_counter()
+        parar = threading.Event()
+
+        def progresso():
+            while not parar.wait(2):
+                decorrido = time.perf_counter() - inicio
+                print(f"\r   {replayer.enviados}/{info['documentos']} "
+                      f"({replayer.enviados / decorrido:,.0f} docs/s, "
+                      f"{replayer.bytes_enviados / 2**20 / decorrido:,.1f} MB/s, "
+                      f"pedaço {controle.tamanho / 2**20:.1f} MB, "
+                      f"429: {controle.taxa_rejeicao():.0%})", end="", flush=True)
+
+        monitor = threading.Thread(target=progresso, daemon=True)
+        monitor.start()
+        try:
+            replayer.executar(args.workers)
+        finally:
+            parar.set()
+            es.indices.put_settings(index=concreto, body={"index": {"refresh_interval": None}})
+            es.indices.refresh(index=indice)
+
+        decorrido = time.perf_counter() - inicio
+        print(f"\n✅ {replayer.enviados} documentos em {decorrido:.1f}s "
+              f"({replayer.enviados / max(decorrido, 1e-9):,.0f} docs/s), "
+              f"{replayer.rejeicoes} reenvios por 429")
+        if replayer.falhas:
+            print(f"⚠️  {replayer.falhas} documentos com erro; primeiros: {replayer.erros}")
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão em escala: shards NDJSON + replay via _bulk")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    p = comandos.add_parser("construir", help="Gerar os shards NDJSON (vários processos)")
+    p.add_argument("--diretorio", default="dataset_rpg")
+    p.add_argument("--scale", type=float, default=1.0,
+                   help="Fator de escala (1 = 100 itens, 50 personagens, 60 missões)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--zipf", type=float, default=None, help="Expoente Zipf para tipo/raridade/classe")
+    p.add_argument("--entidades", nargs="*", default=list(BASE_ENTIDADES), choices=list(BASE_ENTIDADES))
+    p.add_argument("--lote", type=int, default=10000, help="Documentos por lote NumPy")
+    p.add_argument("--processos", type=int, default=None, help="Processos (padrão: núcleos)")
+    p.add_argument("--shards", type=int, default=None, help="Shards por entidade (padrão: 2x processos)")
+    p.set_defaults(executar=construir)
+
+    p = comandos.add_parser("enviar", help="Enviar os shards ao Elasticsearch")
+    p.add_argument("--diretorio", default="dataset_rpg")
+    p.add_argument("--entidades", nargs="*", default=None, choices=list(BASE_ENTIDADES))
+    p.add_argument("--indice", default=None, help="Índice/alias de destino (padrão: o do manifesto)")
+    p.add_argument("--workers", type=int, default=4, help="Requisições _bulk simultâneas")
+    p.add_argument("--pedaco-mb", type=float, default=4, help="Tamanho inicial dos pedaços")
+    p.add_argument("--alvo-ms", type=float, default=1000, help="Latência alvo de cada _bulk")
+    p.set_defaults(executar=enviar)
+
+    args = parser.parse_args()
+    args.executar(args)
@@ -0,0 +1,287 @@
+# metricas_rpg.py - Métricas da API no formato texto do Prometheus, agregadas por thread
+import math
+import threading
+import time
+from bisect import bisect_left
+
+from flask import has_request_context, request
+
+# Limites (segundos) dos histogramas de latência: de 1ms a 10s
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Chamadas do cliente ES que o ClienteMedido conta (o resto passa direto)
+OPERACOES_ES = {'search', 'count', 'get', 'mget', 'index', 'create', 'update', 'delete', 'bulk', 'scroll',
+                'msearch', 'clear_scroll'}
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _rotulos(nomes, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+class Familia:
+    """Uma métrica (counter, gauge ou histogram) com seus rótulos
+
+    Os valores são gravados no fragmento da thread que mede, sem lock;
+    só a exportação soma os fragmentos.
+    """
+
+    def __init__(self, registro, nome, tipo, ajuda, rotulos=(), limites=None):
+        self.registro = registro
+        self.nome = nome
+        self.tipo = tipo
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites) if limites else None
+
+    def inc(self, *rotulos, n=1):
+        valores = self.registro._fragmento()
+        chave = (self.nome, rotulos)
+        valores[chave] = valores.get(chave, 0) + n
+
+    def dec(self, *rotulos, n=1):
+        self.inc(*rotulos, n=-n)
+
+    def observar(self, valor, *rotulos):
+        valores = self.registro._fragmento()
+        chave = (self.nome, rotulos)
+        baldes = valores.get(chave)
+        if baldes is None:
+            # Um balde por limite + o +Inf, depois soma e contagem
+            baldes = valores[chave] = [0] * (len(self.limites) + 3)
+        baldes[bisect_left(self.limites, valor)] += 1
+        baldes[-2] += valor
+        baldes[-1] += 1
+
+
+class RegistroMetricas:
+    """Métricas do processo: fragmentos por thread somados só na exportação
+
+    Cada thread que mede ganha um dicionário próprio (o único lock é no
+    primeiro uso). Fragmentos de threads encerradas são incorporados a
+    um acumulado na exportação seguinte, então servidores que criam uma
+    thread por requisição não acumulam fragmentos.
+    """
+
+    def __init__(self):
+        self._familias = {}
+        self._local = threading.local()
+        self._fragmentos = []
+        self._encerrados = {}
+        self._coletores = []
+        self._lock = threading.Lock()
+
+    def _fragmento(self):
+        valores = getattr(self._local, 'valores', None)
+        if valores is None:
+            valores = self._local.valores = {}
+            with self._lock:
+                self._fragmentos.append((threading.current_thread(), valores))
+        return valores
+
+    def _familia(self, nome, tipo, ajuda, rotulos, limites=None):
+        familia = Familia(self, nome, tipo, ajuda, rotulos, limites)
+        self._familias[nome] = familia
+        return familia
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._familia(nome, 'counter', ajuda, rotulos)
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        """Gauge somado entre threads (inc/dec); valores absolutos vão por coletor"""
+        return self._familia(nome, 'gauge', ajuda, rotulos)
+
+    def histograma(self, nome, ajuda, rotulos=(), limites=LIMITES_LATENCIA):
+        return self._familia(nome, 'histogram', ajuda, rotulos, limites)
+
+    def coletor(self, funcao):
+        """Registrar funcao() -> [(nome, tipo, ajuda, [(rotulos_dict, valor), ...])], chamada a cada exportação"""
+        self._coletores.append(funcao)
+        return funcao
+
+    # --------------------------------------------------------
+    # Exportação
+    # --------------------------------------------------------
+    @staticmethod
+    def _somar(destino, chave, valor):
+        if isinstance(valor, list):
+            atual = destino.get(chave)
+            if atual is None:
+                destino[chave] = list(valor)
+            else:
+                for i, v in enumerate(valor):
+                    atual[i] += v
+        else:
+            destino[chave] = destino.get(chave, 0) + valor
+
+    def _agregado(self):
+        with self._lock:
+            vivos = []
+            for thread, valores in self._fragmentos:
+                if thread.is_alive():
+                    vivos.append((thread, valores))
+                else:
+                    for chave, valor in valores.items():
+                        self._somar(self._encerrados, chave, valor)
+            self._fragmentos = vivos
+            total = {chave: list(v) if isinstance(v, list) else v for chave, v in self._encerrados.items()}
+            fragmentos = [valores for _, valores in vivos]
+        for valores in fragmentos:
+            # Cópia atômica sob o GIL: a thread dona pode continuar gravando
+            for chave, valor in list(valores.items()):
+                self._somar(total, chave, list(valor) if isinstance(valor, list) else valor)
+        return total
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)"""
+        total = self._agregado()
+        por_familia = {}
+        for (nome, rotulos), valor in total.items():
+            por_familia.setdefault(nome, []).append((rotulos, valor))
+
+        linhas = []
+        for nome, familia in self._familias.items():
+            linhas += [f"# HELP {nome} {familia.ajuda}", f"# TYPE {nome} {familia.tipo}"]
+            for rotulos, valor in sorted(por_familia.get(nome, []), key=lambda item: item[0]):
+                if familia.tipo != 'histogram':
+                    linhas.append(f"{nome}{_rotulos(familia.rotulos, rotulos)} {_numero(valor)}")
+                    continue
+                acumulado = 0
+                for limite, quantidade in zip(familia.limites + (math.inf,), valor[:-2]):
+                    acumulado += quantidade
+                    le = ('le', _numero(limite))
+                    linhas.append(f"{nome}_bucket{_rotulos(familia.rotulos, rotulos, le)} {acumulado}")
+                linhas.append(f"{nome}_sum{_rotulos(familia.rotulos, rotulos)} {_numero(valor[-2])}")
+                linhas.append(f"{nome}_count{_rotulos(familia.rotulos, rotulos)} {valor[-1]}")
+
+        for coletor in self._coletores:
+            try:
+                metricas = coletor()
+            except Exception as e:
+                print(f"⚠️  Coletor de métricas {coletor.__name__} falhou: {e}")
+                continue
+            for nome, tipo, ajuda, amostras in metricas:
+                linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+                for rotulos, valor in amostras:
+                    linhas.append(f"{nome}{_rotulos(list(rotulos), list(rotulos.values()))} {_numero(valor)}")
+        return "\n".join(linhas) + "\n"
+
+# ============================================================
+# CLIENTE ES MEDIDO
+# ============================================================
+
+def rota_atual():
+    """Rota Flask da requisição em andamento ('(segundo plano)' fora de requisições)"""
+    if not has_request_context():
+        return '(segundo plano)'
+    return request.url_rule.rule if request.url_rule else '(sem rota)'
+
+
+class ClienteMedido:
+    """Proxy do cliente Elasticsearch que conta chamadas, duração, `took` e erros por índice e rota
+
+    Atributos que não são chamadas de documento/busca (indices,
+    transport...) passam direto para o cliente original; options()
+    devolve o proxy sobre o cliente com as novas opções.
+    """
+
+    def __init__(self, es, registro):
+        self._es = es
+        self._chamadas = registro.contador(
+            'rpg_es_chamadas_total', 'Chamadas ao Elasticsearch por operação, índice e rota da API',
+            ('operacao', 'indice', 'rota'))
+        self._duracao = registro.histograma(
+            'rpg_es_duracao_segundos', 'Duração das chamadas ao Elasticsearch vista pelo cliente',
+            ('operacao', 'indice'))
+        self._took = registro.histograma(
+            'rpg_es_took_segundos', 'took informado pelo Elasticsearch por índice e rota da API', ('indice', 'rota'))
+        self._erros = registro.contador(
+            'rpg_es_erros_total', 'Chamadas ao Elasticsearch que falharam, por exceção', ('operacao', 'indice', 'excecao'))
+
+    def options(self, **kwargs):
+        """Mesmo proxy sobre o cliente com as opções (request_timeout...), para continuar medindo"""
+        copia = object.__new__(type(self))
+        copia.__dict__.update(self.__dict__)
+        copia._es = self._es.options(**kwargs)
+        return copia
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._es, nome)
+        if nome not in OPERACOES_ES:
+            return atributo
+
+        def medido(*args, **kwargs):
+            indice = str(kwargs.get('index') or '_all')
+            rota = rota_atual()
+            inicio = time.perf_counter()
+            try:
+                resp = atributo(*args, **kwargs)
+            except Exception as e:
+                self._erros.inc(nome, indice, type(e).__name__)
+                raise
+            finally:
+                self._duracao.observar(time.perf_counter() - inicio, nome, indice)
+                self._chamadas.inc(nome, indice, rota)
+            took = resp.get('took') if hasattr(resp, 'get') else None
+            if took is not None:
+                self._took.observar(took / 1000, indice, rota)
+            return resp
+
+        return medido
+
+
+def coletor_pool_es(es):
+    """Conexões do pool HTTP de cada nó do cliente ES (ausente no backend local)"""
+    def coletar():
+        pool = getattr(getattr(es, 'transport', None), 'node_pool', None)
+        if pool is None:
+            return []
+        criadas, requisicoes, livres, maximo = [], [], [], []
+        for no in pool.all():
+            conexoes = getattr(no, 'pool', None)
+            if conexoes is None:
+                continue
+            rotulos = {'no': str(no.base_url)}
+            criadas.append((rotulos, conexoes.num_connections))
+            requisicoes.append((rotulos, conexoes.num_requests))
+            livres.append((rotulos, conexoes.pool.qsize() if conexoes.pool is not None else 0))
+            maximo.append((rotulos, conexoes.pool.maxsize if conexoes.pool is not None else 0))
+        vivos = len(getattr(pool, '_alive_nodes', {}))
+        return [
+            ('rpg_es_pool_conexoes_criadas_total', 'counter', 'Conexões HTTP abertas com o nó', criadas),
+            ('rpg_es_pool_requisicoes_total', 'counter', 'Requisições HTTP feitas pelo pool do nó', requisicoes),
+            ('rpg_es_pool_vagas', 'gauge', 'Vagas livres no pool do nó (conexões ociosas ou por abrir)', livres),
+            ('rpg_es_pool_tamanho', 'gauge', 'Tamanho máximo do pool do nó', maximo),
+            ('rpg_es_nos_vivos', 'gauge', 'Nós do cliente considerados vivos', [({}, vivos)]),
+            ('rpg_es_nos_mortos', 'gauge', 'Nós do cliente marcados como mortos',
+             [({}, len(pool.all()) - vivos)]),
+        ]
+    return coletar
+
+
+def coletor_caches(caches):
+    """Acertos, erros, entradas e taxa de acerto de caches com estatisticas() (CacheTTL)"""
+    def coletar():
+        estatisticas = [cache.estatisticas() for cache in caches()]
+        serie = lambda campo: [({'cache': e['cache']}, e[campo]) for e in estatisticas]
+        return [
+            ('rpg_cache_acertos_total', 'counter', 'Consultas respondidas pelo cache', serie('acertos')),
+            ('rpg_cache_erros_total', 'counter', 'Consultas que não estavam no cache', serie('erros')),
+            ('rpg_cache_entradas', 'gauge', 'Entradas no cache', serie('entradas')),
+            ('rpg_cache_taxa_acerto', 'gauge', 'Acertos / consultas desde o início', serie('taxa_acerto')),
+        ]
+    return coletar
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# migrar_indices.py - Reindexação sem downtime: nova versão do índice e troca atômica do alias
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from elasticsearch import Elasticsearch, helpers
+
+from embeddings_rpg import com_embedding
+from indices_rpg import MAPPINGS, criar_versao, indice_atual, trocar_alias, versoes_existentes
+
+# Campos fora do _source não sobrevivem a uma cópia: são recalculados
+# no cliente a partir do documento (por isso esses índices usam o modo cliente)
+RECALCULAR = {
+    'rpg_itens': com_embedding
+}
+
+parser = argparse.ArgumentParser(description="Migrar índices RPG para uma nova versão sem downtime")
+parser.add_argument("entidades", nargs="*", default=['rpg_itens', 'rpg_personagens', 'rpg_missoes'],
+                    choices=list(MAPPINGS), help="Aliases a migrar")
+parser.add_argument("--modo", choices=["auto", "servidor", "cliente"], default="auto",
+                    help="servidor: _reindex com slices; cliente: scroll fatiado + _bulk (auto: cliente só se "
+                         "houver campos a recalcular)")
+parser.add_argument("--slices", default="auto", help="Fatias do _reindex (modo servidor)")
+parser.add_argument("--threads", type=int, default=4, help="Fatias paralelas do scroll (modo cliente)")
+parser.add_argument("--max-passadas", type=int, default=5, help="Passadas de catch-up antes da troca")
+parser.add_argument("--limiar", type=int, default=100,
+                    help="Encerrar o catch-up quando uma passada copiar até este número de documentos")
+parser.add_argument("--sem-bloqueio", action="store_true",
+                    help="Não bloquear escritas no índice antigo durante a última passada")
+parser.add_argument("--sem-troca", action="store_true", help="Copiar sem mover o alias")
+parser.add_argument("--limpar", action="store_true",
+                    help="Só remover as versões antigas (fora do alias) e sair")
+args = parser.parse_args()
+
+print("🔀 Migração de índices RPG")
+print("=" * 60)
+
+es = Elasticsearch("http://localhost:9200", request_timeout=3600)
+
+if not es.ping():
+    print("❌ Elasticsearch não está rodando!")
+    print("Execute: docker-compose up -d")
+    sys.exit(1)
+
+# ============================================================
+# CÓPIA (UMA PASSADA)
+# ============================================================
+# As duas formas gravam com version_type=external: o destino guarda a
+# versão da origem e só aceita um documento se ele for mais novo. Por
+# isso uma nova passada copia apenas o que mudou desde a anterior (o
+# resto vira conflito de versão, ignorado).
+
+def copiar_servidor(origem, destino):
+    """_reindex no cluster, paralelizado em slices; devolve (copiados, conflitos)"""
+    resp = es.reindex(
+        body={
+            "source": {"index": origem, "size": 1000},
+            "dest": {"index": destino, "version_type": "external"},
+            "conflicts": "proceed"
+        },
+        slices=int(args.slices) if args.slices.isdigit() else args.slices,
+        wait_for_completion=True,
+        refresh=False
+    )
+    if resp.get('failures'):
+        raise RuntimeError(f"_reindex com falhas: {resp['failures'][:3]}")
+    return resp['created'] + resp['updated'], resp['version_conflicts']
+
+
+def copiar_fatia(origem, destino, fatia, total, transformar):
+    query = {"version": True}
+    if total > 1:
+        query["slice"] = {"id": fatia, "max": total}
+    acoes = (
+        {
+            "_op_type": "index",
+            "_index": destino,
+            "_id": hit["_id"],
+            "version": hit["_version"],
+            "version_type": "external",
+            "_source": transformar(hit["_source"]) if transformar else hit["_source"]
+        }
+        for hit in helpers.scan(es, index=origem, query=query, size=1000)
+    )
+    copiados, erros = helpers.bulk(es, acoes, chunk_size=1000, raise_on_error=False,
+                                   raise_on_exception=True)
+    conflitos = sum(1 for erro in erros if erro.get('index', {}).get('status') == 409)
+    if len(erros) > conflitos:
+        raise RuntimeError(f"{len(erros) - conflitos} documentos falharam na fatia {fatia}")
+    return copiados, conflitos
+
+
+def copiar_cliente(origem, destino, transformar):
+    """Scroll fatiado em threads + _bulk; devolve (copiados, conflitos)"""
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        resultados = list(executor.map(
+            lambda fatia: copiar_fatia(origem, destino, fatia, args.threads, transformar),
+            range(args.threads)
+        ))
+    return sum(c for c, _ in resultados), sum(c for _, c in resultados)
+
+
+def ids_do_indice(indice):
+    return {hit["_id"] for hit in helpers.scan(es, index=indice, query={"_source": False}, size=5000)}
+
+
+def remover_orfaos(origem, destino):
+    """Remover do destino o que foi apagado da origem durante a cópia"""
+    orfaos = ids_do_indice(destino) - ids_do_indice(origem)
+    if orfaos:
+        helpers.bulk(es, ({"_op_type": "delete", "_index": destino, "_id": doc_id} for doc_id in orfaos),
+                     raise_on_error=False)
+    return len(orfaos)
+
+# ============================================================
+# MIGRAÇÃO DE UM ALIAS
+# ============================================================
+
+def limpar(alias):
+    atual = indice_atual(es, alias)
+    for versao in versoes_existentes(es, alias):
+        indice = f"{alias}_v{versao}"
+        if indice != atual:
+            es.indices.delete(index=indice)
+            print(f"🗑️  {indice} removido")
+
+
+def migrar(alias):
+    print(f"\n📦 {alias}")
+    origem = indice_atual(es, alias)
+    if origem is None:
+        print("   ⚠️  Não existe: rode o populate correspondente")
+        return
+
+    transformar = RECALCULAR.get(alias)
+    modo = args.modo
+    if modo == "auto":
+        modo = "cliente" if transformar else "servidor"
+    elif modo == "servidor" and transformar:
+        print("   ⚠️  Modo servidor perde campos fora do _source; usando modo cliente")
+        modo = "cliente"
+
+    def copiar():
+        if modo == "servidor":
+            return copiar_servidor(origem, destino)
+        return copiar_cliente(origem, destino, transformar)
+
+    # Sem refresh durante a carga; volta ao padrão antes da troca
+    destino = criar_versao(es, alias, settings_extras={"refresh_interval": "-1"})
+    print(f"   {origem} -> {destino} (modo {modo})")
+
+    inicio = time.perf_counter()
+    bloqueado = False
+    try:
+        copiados, _ = copiar()
+        print(f"   ✅ Cópia inicial: {copiados} documentos em {time.perf_counter() - inicio:.1f}s")
+
+        # Catch-up: escritas feitas pela API durante a cópia
+        for passada in range(1, args.max_passadas + 1):
+            copiados, conflitos = copiar()
+            print(f"   🔁 Passada {passada}: {copiados} novos/alterados ({conflitos} já em dia)")
+            if copiados <= args.limiar:
+                break
+
+        # Última passada com a origem só leitura: nada escapa entre ela e a troca
+        if not args.sem_troca and not args.sem_bloqueio:
+            es.indices.put_settings(index=origem, body={"index": {"blocks.write": True}})
+            bloqueado = True
+            copiados, _ = copiar()
+            print(f"   🔒 Passada final (escritas bloqueadas): {copiados} documentos")
+        print(f"   🧹 {remover_orfaos(origem, destino)} documentos removidos da origem durante a cópia")
+
+        es.indices.put_settings(index=destino, body={"index": {"refresh_interval": None}})
+        es.indices.refresh(index=destino)
+        total_origem = es.count(index=origem)['count']
+        total_destino = es.count(index=destino)['count']
+        print(f"   📊 Documentos: origem {total_origem}, destino {total_destino}")
+        if total_origem != total_destino:
+            raise RuntimeError("contagens diferentes após a cópia")
+
+        if args.sem_troca:
+            print(f"   ⏸️  Alias mantido em {origem}")
+            return
+
+        trocar_alias(es, alias, destino)
+        print(f"   🔀 Alias '{alias}' -> {destino} ({time.perf_counter() - inicio:.1f}s no total)")
+        if origem != alias:
+            print(f"   {origem} mantido (só leitura); remova com --limpar")
+    except Exception:
+        if bloqueado:
+            es.indices.put_settings(index=origem, body={"index": {"blocks.write": None}})
+        print(f"   ❌ Migração interrompida; alias continua em {origem} ({destino} pode ser removido)")
+        raise
+
+# ============================================================
+# EXECUTAR
+# ============================================================
+for alias in args.entidades:
+    if args.limpar:
+        limpar(alias)
+    else:
+        migrar(alias)
+
+print("\n" + "=" * 60)
@@ -0,0 +1,101 @@
+# perfil_rpg.py - Resumo do "profile": true do Elasticsearch em árvore de cláusulas com tempos
+
+# Descrições de cláusulas mais longas que isto são cortadas (wildcards expandidos ficam enormes)
+MAX_DESCRICAO = 200
+
+
+def _ms(nanos):
+    return round(nanos / 1e6, 3)
+
+
+def _resumir(texto):
+    texto = str(texto or '')
+    return texto if len(texto) <= MAX_DESCRICAO else texto[:MAX_DESCRICAO - 1] + '…'
+
+
+def _juntar(destino, nos):
+    """Somar os nós de um shard aos já acumulados, casando por tipo e descrição em cada nível"""
+    for no in nos or []:
+        chave = (no.get('type') or no.get('name'), no.get('description') or no.get('reason'))
+        atual = destino.get(chave)
+        if atual is None:
+            atual = destino[chave] = {'nanos': 0, 'max': 0, 'fases': {}, 'filhos': {}}
+        tempo = no.get('time_in_nanos', 0)
+        atual['nanos'] += tempo
+        atual['max'] = max(atual['max'], tempo)
+        for fase, valor in (no.get('breakdown') or {}).items():
+            # Os *_count são quantas vezes a fase rodou, não tempo
+            if not fase.endswith('_count'):
+                atual['fases'][fase] = atual['fases'].get(fase, 0) + valor
+        _juntar(atual['filhos'], no.get('children'))
+
+
+def _arvore(acumulado, shards):
+    nos = []
+    for (tipo, descricao), no in acumulado.items():
+        item = {'tipo': tipo, 'descricao': _resumir(descricao), 'tempo_ms': _ms(no['nanos'])}
+        if shards > 1:
+            item['max_shard_ms'] = _ms(no['max'])
+        fases = {fase: _ms(v) for fase, v in sorted(no['fases'].items(), key=lambda par: -par[1]) if v}
+        if fases:
+            item['fases_ms'] = fases
+        filhos = _arvore(no['filhos'], shards)
+        if filhos:
+            item['filhos'] = filhos
+        nos.append(item)
+    return sorted(nos, key=lambda item: -item['tempo_ms'])
+
+
+def _mais_caras(arvore, n):
+    """Cláusulas com mais tempo próprio (descontado o dos filhos)"""
+    planas = []
+    pendentes = list(arvore)
+    while pendentes:
+        no = pendentes.pop()
+        filhos = no.get('filhos', [])
+        planas.append({
+            'tipo': no['tipo'],
+            'descricao': no['descricao'],
+            'tempo_proprio_ms': round(no['tempo_ms'] - sum(f['tempo_ms'] for f in filhos), 3),
+            'tempo_ms': no['tempo_ms']
+        })
+        pendentes.extend(filhos)
+    return sorted(planas, key=lambda item: -item['tempo_proprio_ms'])[:n]
+
+
+def condensar_perfil(perfil, mais_caras=5):
+    """Árvore de cláusulas (create_weight, build_scorer, next_doc...), coletores e agregações somados entre shards"""
+    shards = (perfil or {}).get('shards', [])
+    consulta, coletores, agregacoes, knn = {}, {}, {}, {}
+    reescrita = fetch = 0
+    for shard in shards:
+        for busca in shard.get('searches', []):
+            _juntar(consulta, busca.get('query'))
+            _juntar(coletores, busca.get('collector'))
+            reescrita += busca.get('rewrite_time', 0)
+        for busca_knn in (shard.get('dfs') or {}).get('knn', []):
+            _juntar(knn, busca_knn.get('query'))
+            reescrita += busca_knn.get('rewrite_time', 0)
+        _juntar(agregacoes, shard.get('aggregations'))
+        fetch += (shard.get('fetch') or {}).get('time_in_nanos', 0)
+
+    arvore = _arvore(consulta, len(shards))
+    arvore_knn = _arvore(knn, len(shards))
+    resumo = {
+        'shards': len(shards),
+        'rewrite_ms': _ms(reescrita),
+        'consulta': arvore,
+        'coletores': _arvore(coletores, len(shards)),
+        'agregacoes': _arvore(agregacoes, len(shards)),
+        'fetch_ms': _ms(fetch),
+        'clausulas_mais_caras': _mais_caras(arvore + arvore_knn, mais_caras)
+    }
+    if arvore_knn:
+        resumo['knn'] = arvore_knn
+    return resumo
+
+
+def explicar_consulta(es, indice, consulta):
+    """Consulta reescrita (validate_query com rewrite) como o Elasticsearch a executa"""
+    resp = es.indices.validate_query(index=indice, body={"query": consulta}, rewrite=True)
+    return [e.get('explanation', e.get('error')) for e in resp.get('explanations', [])]
@@ -6,6 +6,8 @@ from datetime import datetime
 import random
 import sys
 
+from indices_rpg import criar_versao, garantir_indice, indice_atual, trocar_alias
+
 print("🎭 Iniciando população de Personagens...")
 print("=" * 60)
 
@@ -21,75 +23,26 @@ if not es.ping():
 print("✅ Conectado ao Elasticsearch")
 
 # ============================================================
-# DELETAR ÍNDICE EXISTENTE
+# ÍNDICE VERSIONADO (rpg_personagens -> rpg_personagens_vN)
 # ============================================================
+# A API usa o alias 'rpg_personagens'. Recriar gera uma nova versão, que só
+# passa a responder pelo alias depois de carregada (sem downtime).
+destino = "rpg_personagens"
 try:
-    if es.indices.exists(index="rpg_personagens"):
-        print("⚠️  Índice 'rpg_personagens' já existe")
-        resposta = input("Deseja deletar e recriar? (s/N): ").lower()
+    atual = indice_atual(es, "rpg_personagens")
+    if atual is not None:
+        print(f"⚠️  Índice 'rpg_personagens' já existe ({atual})")
+        resposta = input("Deseja recriar numa nova versão? (s/N): ").lower()
         if resposta == 's':
-            es.indices.delete(index="rpg_personagens")
-            print("🗑️  Índice deletado")
+            destino = criar_versao(es, "rpg_personagens")
+            print(f"📝 Índice '{destino}' criado com mapping e ordenação (index.sort)")
         else:
             print("Usando índice existente...")
-except Exception as e:
-    print(f"Aviso ao verificar índice: {e}")
-
-# ============================================================
-# CRIAR ÍNDICE COM MAPPING
-# ============================================================
-print("\n📝 Criando índice 'rpg_personagens'...")
-
-mapping = {
-    "settings": {
-        "number_of_shards": 1,
-        "number_of_replicas": 0,
-        "analysis": {
-            "analyzer": {
-                "character_analyzer": {
-                    "tokenizer": "standard",
-                    "filter": ["lowercase", "asciifolding"]
-                }
-            }
-        }
-    },
-    "mappings": {
-        "properties": {
-            "nome": {
-                "type": "text",
-                "analyzer": "character_analyzer",
-                "fields": {
-                    "keyword": {"type": "keyword"}
-                }
-            },
-            "descricao": {"type": "text", "analyzer": "character_analyzer"},
-            "classe": {"type": "keyword"},
-            "raca": {"type": "keyword"},
-            "nivel": {"type": "short"},
-            "experiencia": {"type": "integer"},
-            "vida": {"type": "short"},
-            "mana": {"type": "short"},
-            "forca": {"type": "short"},
-            "destreza": {"type": "short"},
-            "constituicao": {"type": "short"},
-            "inteligencia": {"type": "short"},
-            "sabedoria": {"type": "short"},
-            "carisma": {"type": "short"},
-            "status": {"type": "keyword"},
-            "data_criacao": {"type": "date"},
-            "ultima_atualizacao": {"type": "date"}
-        }
-    }
-}
-
-try:
-    if not es.indices.exists(index="rpg_personagens"):
-        es.indices.create(index="rpg_personagens", body=mapping)
-        print("✅ Índice criado com mapping")
     else:
-        print("✅ Usando índice existente")
+        destino = garantir_indice(es, "rpg_personagens")
+        print(f"✅ Índice '{destino}' criado com alias 'rpg_personagens'")
 except Exception as e:
-    print(f"⚠️  Aviso ao criar índice: {e}")
+    print(f"⚠️  Aviso ao preparar índice: {e}")
 
 # ============================================================
 # GERAR DADOS
@@ -187,7 +140,7 @@ for i in range(1, 51):
     }
     
     personagens_data.append({
-        "_index": "rpg_personagens",
+        "_index": destino,
         "_id": str(i),
         "_source": personagem
     })
@@ -215,11 +168,20 @@ except Exception as e:
 # ============================================================
 print("\n🔄 Atualizando índice...")
 try:
-    es.indices.refresh(index="rpg_personagens")
+    es.indices.refresh(index=destino)
     print("✅ Índice atualizado")
 except Exception as e:
     print(f"⚠️  Aviso ao atualizar: {e}")
 
+# ============================================================
+# TROCAR ALIAS
+# ============================================================
+if destino != "rpg_personagens" and indice_atual(es, "rpg_personagens") != destino:
+    anterior = trocar_alias(es, "rpg_personagens", destino)
+    print(f"🔀 Alias 'rpg_personagens': {anterior} -> {destino}")
+    if anterior and anterior != "rpg_personagens":
+        print(f"   Versão anterior mantida; remova com: python migrar_indices.py rpg_personagens --limpar")
+
 # ============================================================
 # VERIFICAR DADOS
 # ============================================================
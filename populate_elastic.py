@@ -5,6 +5,9 @@ from datetime import datetime
 import random
 import sys
 
+from embeddings_rpg import lista_embedding
+from indices_rpg import criar_versao, garantir_indice, indice_atual, trocar_alias
+
 print("🎲 Iniciando população do Elasticsearch...")
 print("=" * 60)
 
@@ -20,74 +23,26 @@ if not es.ping():
 print("✅ Conectado ao Elasticsearch")
 
 # ============================================================
-# DELETAR ÍNDICE EXISTENTE (OPCIONAL)
+# ÍNDICE VERSIONADO (rpg_itens -> rpg_itens_vN)
 # ============================================================
+# A API usa o alias 'rpg_itens'. Recriar gera uma nova versão, que só
+# passa a responder pelo alias depois de carregada (sem downtime).
+destino = "rpg_itens"
 try:
-    if es.indices.exists(index="rpg_itens"):
-        print("⚠️  Índice 'rpg_itens' já existe")
-        resposta = input("Deseja deletar e recriar? (s/N): ").lower()
+    atual = indice_atual(es, "rpg_itens")
+    if atual is not None:
+        print(f"⚠️  Índice 'rpg_itens' já existe ({atual})")
+        resposta = input("Deseja recriar numa nova versão? (s/N): ").lower()
         if resposta == 's':
-            es.indices.delete(index="rpg_itens")
-            print("🗑️  Índice deletado")
+            destino = criar_versao(es, "rpg_itens")
+            print(f"📝 Índice '{destino}' criado com mapping e ordenação (index.sort)")
         else:
             print("Usando índice existente...")
-except Exception as e:
-    print(f"Aviso ao verificar índice: {e}")
-
-# ============================================================
-# CRIAR ÍNDICE COM MAPPING
-# ============================================================
-print("\n📝 Criando índice 'rpg_itens'...")
-
-mapping = {
-    "settings": {
-        "number_of_shards": 1,
-        "number_of_replicas": 0,
-        "analysis": {
-            "analyzer": {
-                "item_analyzer": {
-                    "tokenizer": "standard",
-                    "filter": ["lowercase", "asciifolding"]
-                }
-            }
-        }
-    },
-    "mappings": {
-        "properties": {
-            "nome": {
-                "type": "text",
-                "analyzer": "item_analyzer",
-                "fields": {
-                    "keyword": {"type": "keyword"},
-                    "suggest": {"type": "completion"}
-                }
-            },
-            "descricao": {"type": "text", "analyzer": "item_analyzer"},
-            "tipo": {"type": "keyword"},
-            "raridade": {"type": "keyword"},
-            "valor": {"type": "integer"},
-            "peso": {"type": "integer"},
-            "nivel_requerido": {"type": "short"},
-            "atributos_bonus": {
-                "properties": {
-                    "forca": {"type": "short"},
-                    "destreza": {"type": "short"}
-                }
-            },
-            "tags": {"type": "keyword"},
-            "data_criacao": {"type": "date"}
-        }
-    }
-}
-
-try:
-    if not es.indices.exists(index="rpg_itens"):
-        es.indices.create(index="rpg_itens", body=mapping)
-        print("✅ Índice criado com mapping")
     else:
-        print("✅ Usando índice existente")
+        destino = garantir_indice(es, "rpg_itens")
+        print(f"✅ Índice '{destino}' criado com alias 'rpg_itens'")
 except Exception as e:
-    print(f"⚠️  Aviso ao criar índice: {e}")
+    print(f"⚠️  Aviso ao preparar índice: {e}")
 
 # ============================================================
 # GERAR DADOS
@@ -151,8 +106,11 @@ for i in range(1, 101):
             "destreza": random.randint(0, 5)
         }
     
+    # Vetor para a busca kNN (/similares/<id>?modo=knn)
+    item["embedding"] = lista_embedding(item)
+    
     itens_data.append({
-        "_index": "rpg_itens",
+        "_index": destino,
         "_id": str(i),
         "_source": item
     })
@@ -181,11 +139,20 @@ except Exception as e:
 # ============================================================
 print("\n🔄 Atualizando índice...")
 try:
-    es.indices.refresh(index="rpg_itens")
+    es.indices.refresh(index=destino)
     print("✅ Índice atualizado")
 except Exception as e:
     print(f"⚠️  Aviso ao atualizar: {e}")
 
+# ============================================================
+# TROCAR ALIAS
+# ============================================================
+if destino != "rpg_itens" and indice_atual(es, "rpg_itens") != destino:
+    anterior = trocar_alias(es, "rpg_itens", destino)
+    print(f"🔀 Alias 'rpg_itens': {anterior} -> {destino}")
+    if anterior and anterior != "rpg_itens":
+        print(f"   Versão anterior mantida; remova com: python migrar_indices.py rpg_itens --limpar")
+
 # ============================================================
 # VERIFICAR DADOS
 # ============================================================
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 import random
 import sys
 
+from indices_rpg import criar_versao, garantir_indice, indice_atual, trocar_alias
+
 print("🎯 Iniciando população de Missões...")
 print("=" * 60)
 
@@ -21,76 +23,26 @@ if not es.ping():
 print("✅ Conectado ao Elasticsearch")
 
 # ============================================================
-# DELETAR ÍNDICE EXISTENTE
+# ÍNDICE VERSIONADO (rpg_missoes -> rpg_missoes_vN)
 # ============================================================
+# A API usa o alias 'rpg_missoes'. Recriar gera uma nova versão, que só
+# passa a responder pelo alias depois de carregada (sem downtime).
+destino = "rpg_missoes"
 try:
-    if es.indices.exists(index="rpg_missoes"):
-        print("⚠️  Índice 'rpg_missoes' já existe")
-        resposta = input("Deseja deletar e recriar? (s/N): ").lower()
+    atual = indice_atual(es, "rpg_missoes")
+    if atual is not None:
+        print(f"⚠️  Índice 'rpg_missoes' já existe ({atual})")
+        resposta = input("Deseja recriar numa nova versão? (s/N): ").lower()
         if resposta == 's':
-            es.indices.delete(index="rpg_missoes")
-            print("🗑️  Índice deletado")
+            destino = criar_versao(es, "rpg_missoes")
+            print(f"📝 Índice '{destino}' criado com mapping e ordenação (index.sort)")
         else:
             print("Usando índice existente...")
-except Exception as e:
-    print(f"Aviso ao verificar índice: {e}")
-
-# ============================================================
-# CRIAR ÍNDICE COM MAPPING
-# ============================================================
-print("\n📝 Criando índice 'rpg_missoes'...")
-
-mapping = {
-    "settings": {
-        "number_of_shards": 1,
-        "number_of_replicas": 0,
-        "analysis": {
-            "analyzer": {
-                "mission_analyzer": {
-                    "tokenizer": "standard",
-                    "filter": ["lowercase", "asciifolding"]
-                }
-            }
-        }
-    },
-    "mappings": {
-        "properties": {
-            "titulo": {
-                "type": "text",
-                "analyzer": "mission_analyzer",
-                "fields": {
-                    "keyword": {"type": "keyword"}
-                }
-            },
-            "descricao": {"type": "text", "analyzer": "mission_analyzer"},
-            "objetivo": {"type": "text"},
-            "recompensa_ouro": {"type": "integer"},
-            "recompensa_experiencia": {"type": "integer"},
-            "nivel_minimo": {"type": "short"},
-            "nivel_maximo": {"type": "short"},
-            "dificuldade": {"type": "keyword"},
-            "tipo": {"type": "keyword"},
-            "localizacao": {"type": "keyword"},
-            "status": {"type": "keyword"},
-            "npc_ofertante": {"type": "keyword"},
-            "tempo_limite_dias": {"type": "short"},
-            "numero_aceitacoes": {"type": "integer"},
-            "numero_conclusoes": {"type": "integer"},
-            "taxa_conclusao_pct": {"type": "float"},
-            "data_criacao": {"type": "date"},
-            "repeticao_permitida": {"type": "boolean"}
-        }
-    }
-}
-
-try:
-    if not es.indices.exists(index="rpg_missoes"):
-        es.indices.create(index="rpg_missoes", body=mapping)
-        print("✅ Índice criado com mapping")
     else:
-        print("✅ Usando índice existente")
+        destino = garantir_indice(es, "rpg_missoes")
+        print(f"✅ Índice '{destino}' criado com alias 'rpg_missoes'")
 except Exception as e:
-    print(f"⚠️  Aviso ao criar índice: {e}")
+    print(f"⚠️  Aviso ao preparar índice: {e}")
 
 # ============================================================
 # GERAR DADOS
@@ -176,7 +128,7 @@ for i in range(1, 61):
     }
     
     missoes_data.append({
-        "_index": "rpg_missoes",
+        "_index": destino,
         "_id": str(i),
         "_source": missao
     })
@@ -204,11 +156,20 @@ except Exception as e:
 # ============================================================
 print("\n🔄 Atualizando índice...")
 try:
-    es.indices.refresh(index="rpg_missoes")
+    es.indices.refresh(index=destino)
     print("✅ Índice atualizado")
 except Exception as e:
     print(f"⚠️  Aviso ao atualizar: {e}")
 
+# ============================================================
+# TROCAR ALIAS
+# ============================================================
+if destino != "rpg_missoes" and indice_atual(es, "rpg_missoes") != destino:
+    anterior = trocar_alias(es, "rpg_missoes", destino)
+    print(f"🔀 Alias 'rpg_missoes': {anterior} -> {destino}")
+    if anterior and anterior != "rpg_missoes":
+        print(f"   Versão anterior mantida; remova com: python migrar_indices.py rpg_missoes --limpar")
+
 # ============================================================
 # VERIFICAR DADOS
 # ============================================================
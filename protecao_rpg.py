@@ -0,0 +1,300 @@
+# protecao_rpg.py - Compartimentos de concorrência por classe de rota, disjuntor e timeouts adaptativos do ES
+import math
+import threading
+import time
+from collections import deque
+
+from elasticsearch import ApiError, ConnectionError as ErroConexao, ConnectionTimeout
+from flask import has_request_context
+
+from metricas_rpg import rota_atual
+
+# Status do ES que indicam sobrecarga (fila de busca cheia, nó indisponível)
+STATUS_SOBRECARGA = {429, 503, 504}
+
+# Chamadas do cliente ES que passam pelo disjuntor
+OPERACOES_PROTEGIDAS = {'search', 'count', 'get', 'mget', 'index', 'create', 'update', 'delete', 'bulk', 'scroll',
+                        'msearch'}
+
+# Só leituras recebem timeout adaptativo: uma escrita que estoura o timeout
+# no cliente pode ter sido aplicada pelo ES sem os ouvintes serem avisados
+OPERACOES_LEITURA = {'search', 'count', 'get', 'mget', 'msearch'}
+
+
+def sobrecarga(e):
+    """True para erros que indicam ES sobrecarregado ou fora: 429/503/504, timeout e conexão"""
+    if isinstance(e, (ConnectionTimeout, ErroConexao)):
+        return True
+    return isinstance(e, ApiError) and e.meta.status in STATUS_SOBRECARGA
+
+
+class LatenciasRecentes:
+    """Janela das últimas latências, com os percentis recalculados a cada `passo` amostras"""
+
+    def __init__(self, tamanho=512, passo=32):
+        self.passo = passo
+        self._amostras = deque(maxlen=tamanho)
+        self._novas = 0
+        self._ordenadas = []
+
+    def __len__(self):
+        return len(self._ordenadas)
+
+    def registrar(self, segundos):
+        self._amostras.append(segundos)
+        self._novas += 1
+        if self._novas >= self.passo:
+            self._novas = 0
+            self._ordenadas = sorted(list(self._amostras))
+
+    def percentil(self, p):
+        ordenadas = self._ordenadas
+        if not ordenadas:
+            return None
+        return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+# ============================================================
+# COMPARTIMENTOS (BULKHEADS)
+# ============================================================
+
+class Compartimento:
+    """Limite de requisições simultâneas de uma classe de rotas, com fila de espera limitada
+
+    Uma classe cara (dashboards, similares) lotada não ocupa os workers
+    das outras. Passando do limite, a requisição espera até `espera`
+    segundos numa fila de até `fila` lugares; com a fila cheia ela é
+    recusada na hora, para o cliente tentar de novo (Retry-After).
+    """
+
+    def __init__(self, nome, limite, fila=None, espera=1.0):
+        self.nome = nome
+        self.limite = limite
+        self.fila = limite if fila is None else fila
+        self.espera = espera
+        self.em_uso = 0
+        self.esperando = 0
+        self.latencias = LatenciasRecentes()
+        self.metricas = {'admitidas': 0, 'recusadas': 0, 'expiradas': 0}
+        self._vagas = threading.BoundedSemaphore(limite)
+        self._lock = threading.Lock()
+
+    def entrar(self):
+        """Ocupar uma vaga; False se a requisição deve ser descartada"""
+        if not self._vagas.acquire(blocking=False):
+            with self._lock:
+                if self.esperando >= self.fila:
+                    self.metricas['recusadas'] += 1
+                    return False
+                self.esperando += 1
+            try:
+                admitida = self._vagas.acquire(timeout=self.espera)
+            finally:
+                with self._lock:
+                    self.esperando -= 1
+            if not admitida:
+                with self._lock:
+                    self.metricas['expiradas'] += 1
+                return False
+        with self._lock:
+            self.em_uso += 1
+            self.metricas['admitidas'] += 1
+        return True
+
+    def sair(self, duracao):
+        self.latencias.registrar(duracao)
+        with self._lock:
+            self.em_uso -= 1
+        self._vagas.release()
+
+    def retry_after(self):
+        """Segundos até uma vaga provável: mediana recente x requisições à frente / vagas"""
+        mediana = self.latencias.percentil(0.5) or 1.0
+        return max(1, math.ceil(mediana * (self.esperando + 1) / self.limite))
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'limite': self.limite,
+                'fila': self.fila,
+                'espera_s': self.espera,
+                'em_uso': self.em_uso,
+                'esperando': self.esperando,
+                **self.metricas
+            }
+
+# ============================================================
+# DISJUNTOR E TIMEOUTS DO ELASTICSEARCH
+# ============================================================
+
+class CircuitoAberto(Exception):
+    """Chamada ao ES recusada sem tentar: o disjuntor está aberto"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Elasticsearch sobrecarregado (circuito aberto); tente novamente em {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Disjuntor:
+    """Disjuntor das chamadas ao ES: fechado -> aberto -> meio-aberto
+
+    Abre depois de `limite` falhas de sobrecarga seguidas (429, 503,
+    504, timeout, conexão) e recusa tudo por `espera` segundos. Depois
+    deixa passar uma chamada de teste: se ela funciona o circuito fecha,
+    se falha abre de novo. Respostas de erro comuns (404, 400) contam
+    como sucesso, já que o ES respondeu.
+    """
+
+    def __init__(self, limite=5, espera=10.0):
+        self.limite = limite
+        self.espera = espera
+        self.estado = 'fechado'
+        self.falhas = 0
+        self.metricas = {'aberturas': 0, 'recusadas': 0}
+        self._aberto_ate = 0.0
+        self._testando = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Levantar CircuitoAberto se a chamada não deve ir ao ES"""
+        if self.estado == 'fechado':
+            return
+        with self._lock:
+            agora = time.monotonic()
+            if self.estado == 'aberto' and agora >= self._aberto_ate:
+                self.estado = 'meio_aberto'
+                self._testando = False
+            if self.estado == 'fechado' or (self.estado == 'meio_aberto' and not self._testando):
+                self._testando = self.estado == 'meio_aberto'
+                return
+            self.metricas['recusadas'] += 1
+            raise CircuitoAberto(max(1, math.ceil(self._aberto_ate - agora)))
+
+    def sucesso(self):
+        if self.estado == 'fechado' and not self.falhas:
+            return
+        with self._lock:
+            self.falhas = 0
+            self.estado = 'fechado'
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            if self.estado == 'meio_aberto' or (self.estado == 'fechado' and self.falhas >= self.limite):
+                self.estado = 'aberto'
+                self._aberto_ate = time.monotonic() + self.espera
+                self._testando = False
+                self.metricas['aberturas'] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            restante = max(0.0, self._aberto_ate - time.monotonic()) if self.estado == 'aberto' else 0.0
+            return {
+                'estado': self.estado,
+                'falhas_seguidas': self.falhas,
+                'limite': self.limite,
+                'espera_s': self.espera,
+                'reabre_em_s': round(restante, 2),
+                **self.metricas
+            }
+
+
+class TimeoutsAdaptativos:
+    """Timeout de cada (rota, operação, índice) = p99 recente x fator, entre piso e teto
+
+    A rota entra na chave para que a agregação de um dashboard não herde
+    o p99 das buscas baratas no mesmo índice. Até juntar `minimo`
+    amostras vale o timeout padrão.
+    """
+
+    def __init__(self, padrao=10.0, fator=3.0, piso=0.5, teto=30.0, percentil=0.99, minimo=50):
+        self.padrao = padrao
+        self.fator = fator
+        self.piso = piso
+        self.teto = teto
+        self.percentil = percentil
+        self.minimo = minimo
+        self._janelas = {}
+
+    def registrar(self, chave, segundos):
+        janela = self._janelas.get(chave)
+        if janela is None:
+            janela = self._janelas.setdefault(chave, LatenciasRecentes())
+        janela.registrar(segundos)
+
+    def timeout(self, chave):
+        janela = self._janelas.get(chave)
+        if janela is None or len(janela) < self.minimo:
+            return self.padrao
+        return min(max(janela.percentil(self.percentil) * self.fator, self.piso), self.teto)
+
+    def estatisticas(self):
+        return {
+            f"{rota} {operacao}:{indice}": {
+                'amostras': len(janela),
+                'p50_ms': round((janela.percentil(0.5) or 0) * 1000, 2),
+                'p99_ms': round((janela.percentil(self.percentil) or 0) * 1000, 2),
+                'timeout_s': round(self.timeout((rota, operacao, indice)), 3)
+            }
+            for (rota, operacao, indice), janela in list(self._janelas.items())
+        }
+
+
+class ClienteProtegido:
+    """Proxy do cliente ES que passa as chamadas das rotas pelo disjuntor, com timeout adaptativo
+
+    Threads em segundo plano (write-behind, percolador) têm seus próprios
+    retries e passam direto. Só as leituras (OPERACOES_LEITURA) recebem
+    timeout adaptativo; escritas e rolagens ficam com o padrão. Estourar
+    um timeout adaptativo (mais curto que o padrão) não conta como falha
+    no disjuntor: a duração entra na janela e o p99 sobe. Com o
+    disjuntor fora de 'fechado' as chamadas usam o timeout padrão, para
+    a chamada de teste ser justa.
+    """
+
+    def __init__(self, es, disjuntor, timeouts):
+        self._es = es
+        self.disjuntor = disjuntor
+        self.timeouts = timeouts
+
+    def options(self, **kwargs):
+        copia = object.__new__(type(self))
+        copia.__dict__.update(self.__dict__)
+        copia._es = self._es.options(**kwargs)
+        return copia
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._es, nome)
+        if nome not in OPERACOES_PROTEGIDAS:
+            return atributo
+
+        def protegido(*args, **kwargs):
+            if not has_request_context():
+                return atributo(*args, **kwargs)
+            self.disjuntor.permitir()
+            chave = (rota_atual(), nome, str(kwargs.get('index') or '_all'))
+            # Rolagens (helpers.scan) são longas por natureza: ficam com o timeout padrão
+            rolagem = nome == 'scroll' or 'scroll' in kwargs
+            adaptativo = nome in OPERACOES_LEITURA and not rolagem
+            if adaptativo and self.disjuntor.estado == 'fechado':
+                timeout = self.timeouts.timeout(chave)
+            else:
+                timeout = self.timeouts.padrao
+            cliente = self._es.options(request_timeout=timeout)
+            inicio = time.perf_counter()
+            try:
+                resp = getattr(cliente, nome)(*args, **kwargs)
+            except Exception as e:
+                if isinstance(e, ConnectionTimeout) and timeout < self.timeouts.padrao:
+                    self.timeouts.registrar(chave, time.perf_counter() - inicio)
+                elif sobrecarga(e):
+                    self.disjuntor.falha()
+                else:
+                    self.disjuntor.sucesso()
+                raise
+            if adaptativo:
+                self.timeouts.registrar(chave, time.perf_counter() - inicio)
+            self.disjuntor.sucesso()
+            return resp
+
+        return protegido
@@ -0,0 +1,397 @@
+# ranking_rpg.py - Rankings de personagens em memória (top-N, posição e vizinhos)
+import random
+import threading
+import time
+from collections import Counter
+
+from elasticsearch import helpers
+
+# ============================================================
+# ATRIBUTOS RANQUEÁVEIS
+# ============================================================
+ATRIBUTOS_RANKING = [
+    'nivel', 'experiencia', 'vida', 'mana', 'forca', 'destreza',
+    'constituicao', 'inteligencia', 'sabedoria', 'carisma'
+]
+
+# Campos guardados de cada personagem para montar as respostas
+CAMPOS_RESUMO = ['nome', 'classe', 'raca', 'status'] + ATRIBUTOS_RANKING
+
+NIVEIS_MAXIMOS = 32
+
+# Maior que qualquer id real: fecha faixas de valor na skiplist
+ID_MAXIMO = '\U0010ffff'
+
+# ============================================================
+# SKIPLIST INDEXÁVEL
+# ============================================================
+
+class _No:
+    __slots__ = ('chave', 'proximos', 'larguras')
+
+    def __init__(self, chave, altura):
+        self.chave = chave
+        self.proximos = [None] * altura
+        self.larguras = [1] * altura
+
+
+class SkiplistIndexavel:
+    """Lista ordenada com inserção, remoção, posição e acesso por índice em O(log n)
+
+    Cada ponteiro guarda quantos elementos pula (largura), o que permite
+    descobrir a posição de uma chave e o i-ésimo elemento descendo pelos
+    níveis, como numa busca comum.
+    """
+
+    def __init__(self, semente=None):
+        self._rng = random.Random(semente)
+        self._cabeca = _No(None, NIVEIS_MAXIMOS)
+        self._altura = 1
+        self.tamanho = 0
+
+    def __len__(self):
+        return self.tamanho
+
+    def _altura_aleatoria(self):
+        altura = 1
+        while altura < NIVEIS_MAXIMOS and self._rng.random() < 0.5:
+            altura += 1
+        return altura
+
+    def _caminho(self, chave):
+        """Último nó antes da chave em cada nível e a posição de cada um"""
+        anteriores = [None] * NIVEIS_MAXIMOS
+        posicoes = [0] * NIVEIS_MAXIMOS
+        no, posicao = self._cabeca, 0
+        for nivel in range(self._altura - 1, -1, -1):
+            while no.proximos[nivel] is not None and no.proximos[nivel].chave < chave:
+                posicao += no.larguras[nivel]
+                no = no.proximos[nivel]
+            anteriores[nivel] = no
+            posicoes[nivel] = posicao
+        return anteriores, posicoes
+
+    def inserir(self, chave):
+        anteriores, posicoes = self._caminho(chave)
+        altura = self._altura_aleatoria()
+        if altura > self._altura:
+            for nivel in range(self._altura, altura):
+                anteriores[nivel] = self._cabeca
+                posicoes[nivel] = 0
+                self._cabeca.larguras[nivel] = self.tamanho + 1
+            self._altura = altura
+
+        novo = _No(chave, altura)
+        posicao = posicoes[0] + 1
+        for nivel in range(self._altura):
+            anterior = anteriores[nivel]
+            if nivel < altura:
+                novo.proximos[nivel] = anterior.proximos[nivel]
+                anterior.proximos[nivel] = novo
+                pulados = posicao - posicoes[nivel]
+                novo.larguras[nivel] = anterior.larguras[nivel] - pulados + 1
+                anterior.larguras[nivel] = pulados
+            else:
+                anterior.larguras[nivel] += 1
+        self.tamanho += 1
+
+    def remover(self, chave):
+        """Remover a chave; devolve False se ela não existe"""
+        anteriores, _ = self._caminho(chave)
+        alvo = anteriores[0].proximos[0]
+        if alvo is None or alvo.chave != chave:
+            return False
+        for nivel in range(self._altura):
+            anterior = anteriores[nivel]
+            if anterior.proximos[nivel] is alvo:
+                anterior.proximos[nivel] = alvo.proximos[nivel]
+                anterior.larguras[nivel] += alvo.larguras[nivel] - 1
+            else:
+                anterior.larguras[nivel] -= 1
+        while self._altura > 1 and self._cabeca.proximos[self._altura - 1] is None:
+            self._altura -= 1
+        self.tamanho -= 1
+        return True
+
+    def posicao(self, chave):
+        """Quantidade de elementos estritamente menores que a chave"""
+        _, posicoes = self._caminho(chave)
+        return posicoes[0]
+
+    def _no_em(self, indice):
+        no, posicao = self._cabeca, -1
+        for nivel in range(self._altura - 1, -1, -1):
+            while no.proximos[nivel] is not None and posicao + no.larguras[nivel] <= indice:
+                posicao += no.larguras[nivel]
+                no = no.proximos[nivel]
+        return no
+
+    def fatia(self, inicio, fim):
+        """Elementos nas posições [inicio, fim)"""
+        inicio = max(inicio, 0)
+        fim = min(fim, self.tamanho)
+        if inicio >= fim:
+            return []
+        no = self._no_em(inicio)
+        chaves = []
+        while no is not None and len(chaves) < fim - inicio:
+            chaves.append(no.chave)
+            no = no.proximos[0]
+        return chaves
+
+# ============================================================
+# RANKINGS DE PERSONAGENS
+# ============================================================
+
+def chave_ranking(valor, doc_id):
+    """Ordem do ranking: maior valor primeiro, empate pelo id"""
+    return (-valor, doc_id)
+
+
+def valor_atributo(doc, atributo):
+    valor = doc.get(atributo)
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return 0
+    return valor
+
+
+def particoes(doc):
+    """Rankings em que o personagem entra: geral, por classe, por raça e por classe+raça"""
+    classe, raca = doc.get('classe'), doc.get('raca')
+    # Sem classe ou raça algumas partições coincidem: cada uma conta uma vez
+    return list(dict.fromkeys([(None, None), (classe, None), (None, raca), (classe, raca)]))
+
+
+class RankingPersonagens:
+    """Um ranking ordenado por atributo e por filtro (classe/raça)
+
+    Semeado com um scan do índice de personagens, mantido pelas rotas
+    CRUD através de `registrar_escrita` e reconciliado com um novo scan
+    a cada `intervalo_reconciliacao` segundos. A skiplist de cada
+    (atributo, classe, raça) só é montada na primeira consulta a ela.
+    Top-N, posição de um id e vizinhos de um id custam O(log n) mais o
+    tamanho da resposta.
+    """
+
+    def __init__(self, es, indice='rpg_personagens', intervalo_reconciliacao=300, orcamento=None):
+        self.es = es
+        self.indice = indice
+        self.intervalo_reconciliacao = intervalo_reconciliacao
+        self.orcamento = orcamento
+        self.resumos = {}
+        self.membros = Counter()
+        self.rankings = {}
+        self.semeado = False
+        self.semeado_em = None
+        self._lock = threading.RLock()
+        self._lock_semeadura = threading.Lock()
+        self._durante_semeadura = None
+        self._thread = None
+
+    # --------------------------------------------------------
+    # Manutenção
+    # --------------------------------------------------------
+    @staticmethod
+    def _montar(chave, resumos):
+        """Skiplist de um (atributo, classe, raça) a partir dos resumos"""
+        atributo, classe, raca = chave
+        ranking = SkiplistIndexavel()
+        for doc_id, resumo in resumos.items():
+            if (classe, raca) in particoes(resumo):
+                ranking.inserir(chave_ranking(valor_atributo(resumo, atributo), doc_id))
+        return ranking
+
+    def _ranking(self, atributo, classe, raca):
+        """Skiplist do ranking, montada na primeira consulta (None se a partição está vazia)"""
+        chave = (atributo, classe, raca)
+        ranking = self.rankings.get(chave)
+        if ranking is None and atributo in ATRIBUTOS_RANKING and self.membros[(classe, raca)] > 0:
+            ranking = self.rankings[chave] = self._montar(chave, self.resumos)
+        return ranking
+
+    def _adicionar(self, doc_id, doc):
+        resumo = {campo: doc.get(campo) for campo in CAMPOS_RESUMO}
+        self.resumos[doc_id] = resumo
+        for classe, raca in particoes(resumo):
+            self.membros[(classe, raca)] += 1
+            for atributo in ATRIBUTOS_RANKING:
+                ranking = self.rankings.get((atributo, classe, raca))
+                if ranking is not None:
+                    ranking.inserir(chave_ranking(valor_atributo(resumo, atributo), doc_id))
+
+    def _retirar(self, doc_id):
+        resumo = self.resumos.pop(doc_id, None)
+        if resumo is None:
+            return
+        for classe, raca in particoes(resumo):
+            self.membros[(classe, raca)] -= 1
+            vazia = self.membros[(classe, raca)] <= 0
+            if vazia:
+                del self.membros[(classe, raca)]
+            for atributo in ATRIBUTOS_RANKING:
+                ranking = self.rankings.get((atributo, classe, raca))
+                if ranking is None:
+                    continue
+                if vazia:
+                    del self.rankings[(atributo, classe, raca)]
+                else:
+                    ranking.remover(chave_ranking(valor_atributo(resumo, atributo), doc_id))
+
+    def _aplicar(self, doc_id, novo):
+        """Aplicar uma escrita; aplicar a mesma duas vezes dá o mesmo resultado"""
+        self._retirar(doc_id)
+        if novo is not None:
+            self._adicionar(doc_id, novo)
+
+    def semear(self, forcar=True):
+        """Reconstruir os rankings a partir de um scan do índice, sem bloquear as consultas
+
+        Uma semeadura por vez (forcar=False desiste se outra já semeou).
+        O refresh antes do scan torna visíveis as escritas já avisadas; as
+        avisadas durante o scan são guardadas e reaplicadas no fim.
+        """
+        with self._lock_semeadura:
+            if not forcar and self.semeado:
+                return
+            with self._lock:
+                self._durante_semeadura = []
+                montados = list(self.rankings)
+            try:
+                self._refresh()
+                resumos = {}
+                for hit in helpers.scan(self.es, index=self.indice, query={"_source": CAMPOS_RESUMO}, size=5000):
+                    resumos[hit['_id']] = {campo: hit['_source'].get(campo) for campo in CAMPOS_RESUMO}
+                membros = Counter(particao for resumo in resumos.values() for particao in particoes(resumo))
+                # Os rankings já consultados são remontados aqui, fora do lock
+                rankings = {chave: self._montar(chave, resumos) for chave in montados
+                            if membros[chave[1:]] > 0}
+            except Exception:
+                with self._lock:
+                    self._durante_semeadura = None
+                raise
+
+            with self._lock:
+                self.resumos, self.membros, self.rankings = resumos, membros, rankings
+                escritas, self._durante_semeadura = self._durante_semeadura, None
+                for doc_id, novo in escritas:
+                    self._aplicar(doc_id, novo)
+                self.semeado = True
+                self.semeado_em = time.time()
+
+    def _refresh(self):
+        if self.orcamento is None:
+            self.es.indices.refresh(index=self.indice)
+        else:
+            self.orcamento.refrescar(self.es, self.indice)
+
+    def garantir_semeado(self):
+        if not self.semeado:
+            self.semear(forcar=False)
+
+    def registrar_escrita(self, indice, doc_id, antigo, novo):
+        """Ouvinte das escritas da API: mantém os rankings de personagens"""
+        if indice != self.indice:
+            return
+        with self._lock:
+            if self._durante_semeadura is not None:
+                self._durante_semeadura.append((doc_id, novo))
+            if self.semeado:
+                self._aplicar(doc_id, novo)
+
+    def reconciliar(self):
+        """Novo scan (corrige escritas que não passaram pela API); só depois da primeira consulta"""
+        if not self.semeado:
+            return
+        try:
+            self.semear()
+        except Exception as e:
+            print(f"⚠️  Falha ao reconciliar rankings de '{self.indice}': {e}")
+
+    def iniciar_reconciliacao_periodica(self):
+        """Thread daemon que reconcilia a cada `intervalo_reconciliacao` segundos"""
+        if self._thread is not None or not self.intervalo_reconciliacao:
+            return
+
+        def laco():
+            while True:
+                time.sleep(self.intervalo_reconciliacao)
+                self.reconciliar()
+
+        self._thread = threading.Thread(target=laco, name="reconciliacao-rankings", daemon=True)
+        self._thread.start()
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+    def _entrada(self, chave, posicao):
+        valor, doc_id = chave
+        return {'id': doc_id, 'posicao': posicao, 'valor': -valor, **self.resumos[doc_id]}
+
+    def top(self, atributo, limite=10, classe=None, raca=None):
+        """Os `limite` primeiros e o total do ranking"""
+        self.garantir_semeado()
+        with self._lock:
+            ranking = self._ranking(atributo, classe, raca)
+            if ranking is None:
+                return [], 0
+            chaves = ranking.fatia(0, limite)
+            return [self._entrada(chave, i + 1) for i, chave in enumerate(chaves)], len(ranking)
+
+    def posicao(self, doc_id, atributo, classe=None, raca=None):
+        """Posição do personagem no ranking (None se ele não faz parte)
+
+        `posicao` desempata pelo id, como no top; `posicao_empate` é a
+        posição compartilhada por todos com o mesmo valor.
+        """
+        self.garantir_semeado()
+        with self._lock:
+            resumo = self.resumos.get(doc_id)
+            if resumo is None or (classe, raca) not in particoes(resumo):
+                return None
+            ranking = self._ranking(atributo, classe, raca)
+            if ranking is None:
+                return None
+            chave = chave_ranking(valor_atributo(resumo, atributo), doc_id)
+            # Menor chave possível com esse valor: conta só os estritamente melhores
+            melhores = ranking.posicao((chave[0], ''))
+            return {
+                **self._entrada(chave, ranking.posicao(chave) + 1),
+                'posicao_empate': melhores + 1,
+                'total': len(ranking)
+            }
+
+    def vizinhos(self, doc_id, atributo, raio=5, classe=None, raca=None):
+        """Até `raio` personagens acima e abaixo do id no ranking"""
+        self.garantir_semeado()
+        with self._lock:
+            resumo = self.resumos.get(doc_id)
+            if resumo is None or (classe, raca) not in particoes(resumo):
+                return None
+            ranking = self._ranking(atributo, classe, raca)
+            if ranking is None:
+                return None
+            indice = ranking.posicao(chave_ranking(valor_atributo(resumo, atributo), doc_id))
+            inicio = max(indice - raio, 0)
+            chaves = ranking.fatia(inicio, indice + raio + 1)
+            return {
+                'vizinhos': [self._entrada(chave, inicio + i + 1) for i, chave in enumerate(chaves)],
+                'total': len(ranking)
+            }
+
+    def faixa(self, atributo, minimo, maximo, limite=50, classe=None, raca=None):
+        """Personagens com o atributo entre `minimo` e `maximo`, na ordem do ranking"""
+        self.garantir_semeado()
+        with self._lock:
+            ranking = self._ranking(atributo, classe, raca)
+            if ranking is None:
+                return [], 0
+            inicio = ranking.posicao((-maximo, ''))
+            fim = ranking.posicao((-minimo, ID_MAXIMO))
+            chaves = ranking.fatia(inicio, min(fim, inicio + limite))
+            return [self._entrada(chave, inicio + i + 1) for i, chave in enumerate(chaves)], fim - inicio
+
+    def obter(self, doc_id):
+        """Resumo de um personagem (ou None)"""
+        self.garantir_semeado()
+        with self._lock:
+            return self.resumos.get(doc_id)
@@ -0,0 +1,264 @@
+# recomendacao_rpg.py - Recomendação de equipamentos (matriz de itens em NumPy)
+import threading
+import time
+
+import numpy as np
+from elasticsearch import helpers
+
+# ============================================================
+# PERFIL DE CADA CLASSE
+# ============================================================
+# Peso de cada bônus (força, destreza) para a classe
+PERFIS_CLASSE = {
+    'Guerreiro': (1.0, 0.3),
+    'Paladino': (0.9, 0.3),
+    'Clérigo': (0.6, 0.3),
+    'Druida': (0.4, 0.4),
+    'Mago': (0.1, 0.3),
+    'Bardo': (0.3, 0.7),
+    'Ranger': (0.4, 1.0),
+    'Assassino': (0.3, 1.0)
+}
+PERFIL_PADRAO = (0.5, 0.5)
+
+# Quanto o perfil da classe pesa frente aos atributos do próprio personagem
+PESO_CLASSE = 0.5
+
+# Desempate: itens mais próximos do nível do personagem valem um pouco mais
+PESO_NIVEL = 0.1
+
+CAMPOS_ITEM = ['nome', 'tipo', 'raridade', 'valor', 'nivel_requerido', 'atributos_bonus']
+
+
+def perfil_personagem(personagem):
+    """Pesos (força, destreza): metade classe, metade atributos do personagem"""
+    classe = np.array(PERFIS_CLASSE.get(personagem.get('classe'), PERFIL_PADRAO), dtype=np.float32)
+    atributos = np.array([personagem.get('forca') or 0, personagem.get('destreza') or 0], dtype=np.float32)
+    if atributos.sum() > 0:
+        atributos = atributos / atributos.max()
+    else:
+        atributos = classe
+    return PESO_CLASSE * classe + (1 - PESO_CLASSE) * atributos
+
+# ============================================================
+# MATRIZ DE ITENS
+# ============================================================
+
+class MatrizItens:
+    """Itens em colunas NumPy compactas para pontuar muitos personagens de uma vez
+
+    A matriz é montada a partir de um scan do índice de itens, mantida
+    pelas escritas da API (cada escrita troca, acrescenta ou remove só a
+    linha do item; a remoção move a última linha para o buraco) e
+    reconciliada com um novo scan a cada `intervalo_reconciliacao`
+    segundos. As consultas pontuam sobre as colunas sem copiá-las: depois
+    de uma consulta, a próxima escrita copia as colunas antes de alterá-las
+    (cópia na escrita), e a consulta em andamento continua com as antigas.
+    """
+
+    def __init__(self, es, indice='rpg_itens', intervalo_reconciliacao=300, orcamento=None):
+        self.es = es
+        self.indice = indice
+        self.intervalo_reconciliacao = intervalo_reconciliacao
+        self.orcamento = orcamento
+        self.itens = {}
+        self.semeado = False
+        self.semeado_em = None
+        self._lock = threading.RLock()
+        self._lock_semeadura = threading.Lock()
+        self._durante_semeadura = None
+        self._thread = None
+        # Alguma consulta guardou as colunas atuais: a próxima escrita copia antes
+        self._em_uso = False
+        self.n = 0
+        self.posicoes = {}
+        self.ids = np.empty(0, dtype=object)
+        self.nivel_requerido = np.empty(0, dtype=np.int16)
+        self.bonus = np.empty((0, 2), dtype=np.float32)
+
+    # --------------------------------------------------------
+    # Manutenção
+    # --------------------------------------------------------
+    def semear(self, forcar=True):
+        """Remontar a matriz a partir de um scan do índice, sem bloquear as consultas
+
+        Uma semeadura por vez (forcar=False desiste se outra já semeou).
+        O refresh antes do scan torna visíveis as escritas já avisadas; as
+        avisadas durante o scan são guardadas e reaplicadas no fim.
+        """
+        with self._lock_semeadura:
+            if not forcar and self.semeado:
+                return
+            with self._lock:
+                self._durante_semeadura = []
+            try:
+                self._refresh()
+                itens = {}
+                for hit in helpers.scan(self.es, index=self.indice, query={"_source": CAMPOS_ITEM}, size=5000):
+                    itens[hit['_id']] = {campo: hit['_source'].get(campo) for campo in CAMPOS_ITEM}
+                colunas = self._montar(itens)
+            except Exception:
+                with self._lock:
+                    self._durante_semeadura = None
+                raise
+
+            with self._lock:
+                self.itens = itens
+                self.n, self.posicoes, self.ids, self.nivel_requerido, self.bonus = colunas
+                self._em_uso = False
+                escritas, self._durante_semeadura = self._durante_semeadura, None
+                for doc_id, novo in escritas:
+                    self._aplicar(doc_id, novo)
+                self.semeado = True
+                self.semeado_em = time.time()
+
+    def _refresh(self):
+        if self.orcamento is None:
+            self.es.indices.refresh(index=self.indice)
+        else:
+            self.orcamento.refrescar(self.es, self.indice)
+
+    def garantir_semeado(self):
+        if not self.semeado:
+            self.semear(forcar=False)
+
+    def registrar_escrita(self, indice, doc_id, antigo, novo):
+        """Ouvinte das escritas da API: atualiza o item e a linha dele na matriz"""
+        if indice != self.indice:
+            return
+        with self._lock:
+            if self._durante_semeadura is not None:
+                self._durante_semeadura.append((doc_id, novo))
+            if self.semeado:
+                self._aplicar(doc_id, novo)
+
+    def reconciliar(self):
+        """Novo scan (corrige escritas que não passaram pela API); só depois da primeira consulta"""
+        if not self.semeado:
+            return
+        try:
+            self.semear()
+        except Exception as e:
+            print(f"⚠️  Falha ao reconciliar a matriz de '{self.indice}': {e}")
+
+    def iniciar_reconciliacao_periodica(self):
+        """Thread daemon que reconcilia a cada `intervalo_reconciliacao` segundos"""
+        if self._thread is not None or not self.intervalo_reconciliacao:
+            return
+
+        def laco():
+            while True:
+                time.sleep(self.intervalo_reconciliacao)
+                self.reconciliar()
+
+        self._thread = threading.Thread(target=laco, name="reconciliacao-matriz-itens", daemon=True)
+        self._thread.start()
+
+    def _aplicar(self, doc_id, novo):
+        """Estado final de um item (idempotente: reaplicar a mesma escrita não muda nada)"""
+        self._antes_de_alterar()
+        self.itens.pop(doc_id, None)
+        if novo is not None:
+            self.itens[doc_id] = {campo: novo.get(campo) for campo in CAMPOS_ITEM}
+        self._atualizar_linha(doc_id, self.itens.get(doc_id))
+
+    def _antes_de_alterar(self):
+        """Cópia na escrita: não mexer nas colunas que uma consulta ainda está lendo"""
+        if not self._em_uso:
+            return
+        self.itens = dict(self.itens)
+        self.ids = self.ids.copy()
+        self.nivel_requerido = self.nivel_requerido.copy()
+        self.bonus = self.bonus.copy()
+        self._em_uso = False
+
+    @staticmethod
+    def _preencher(colunas, i, doc_id, item):
+        ids, nivel_requerido, bonus_colunas = colunas
+        bonus = item.get('atributos_bonus') or {}
+        ids[i] = doc_id
+        nivel_requerido[i] = item.get('nivel_requerido') or 0
+        bonus_colunas[i] = (bonus.get('forca') or 0, bonus.get('destreza') or 0)
+
+    @classmethod
+    def _montar(cls, itens):
+        """Colunas inteiras a partir do dicionário de itens (só na semeadura)"""
+        n = len(itens)
+        colunas = (np.empty(n, dtype=object), np.zeros(n, dtype=np.int16), np.zeros((n, 2), dtype=np.float32))
+        posicoes = {}
+        for i, (doc_id, item) in enumerate(itens.items()):
+            posicoes[doc_id] = i
+            cls._preencher(colunas, i, doc_id, item)
+        return (n, posicoes) + colunas
+
+    def _crescer(self):
+        """Dobrar a capacidade das colunas (acréscimos custam O(1) amortizado)"""
+        capacidade = max(16, 2 * len(self.ids))
+        for nome in ('ids', 'nivel_requerido', 'bonus'):
+            atual = getattr(self, nome)
+            nova = np.zeros((capacidade,) + atual.shape[1:], dtype=atual.dtype)
+            nova[:self.n] = atual[:self.n]
+            setattr(self, nome, nova)
+
+    def _atualizar_linha(self, doc_id, item):
+        """Trocar (item existente), acrescentar (novo) ou remover (item=None) a linha de um item"""
+        i = self.posicoes.get(doc_id)
+        if item is None:
+            if i is None:
+                return
+            ultimo = self.n - 1
+            if i != ultimo:
+                self.ids[i] = self.ids[ultimo]
+                self.nivel_requerido[i] = self.nivel_requerido[ultimo]
+                self.bonus[i] = self.bonus[ultimo]
+                self.posicoes[self.ids[i]] = i
+            del self.posicoes[doc_id]
+            self.ids[ultimo] = None
+            self.n = ultimo
+            return
+        if i is None:
+            if self.n == len(self.ids):
+                self._crescer()
+            i = self.posicoes[doc_id] = self.n
+            self.n += 1
+        self._preencher((self.ids, self.nivel_requerido, self.bonus), i, doc_id, item)
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+    def recomendar(self, personagens, limite=10):
+        """Melhores itens usáveis para cada personagem, numa única conta matricial
+
+        `personagens` é uma lista de dicts com nivel, classe, forca e
+        destreza. Devolve, na mesma ordem, listas de (id, pontuação, item).
+        """
+        self.garantir_semeado()
+        with self._lock:
+            # Sem cópia: as escritas copiam as colunas antes de alterá-las
+            self._em_uso = True
+            n, itens = self.n, self.itens
+            ids = self.ids[:n]
+            nivel_requerido = self.nivel_requerido[:n]
+            bonus = self.bonus[:n]
+
+        if not personagens or not len(ids):
+            return [[] for _ in personagens]
+
+        perfis = np.stack([perfil_personagem(p) for p in personagens])
+        niveis = np.array([p.get('nivel') or 0 for p in personagens], dtype=np.float32)
+
+        # (personagens x itens): encaixe dos bônus + proximidade do nível
+        pontuacoes = perfis @ bonus.T
+        pontuacoes += PESO_NIVEL * nivel_requerido[None, :] / np.maximum(niveis[:, None], 1)
+        pontuacoes[nivel_requerido[None, :] > niveis[:, None]] = -np.inf
+
+        k = max(1, min(limite, len(ids)))
+        melhores = np.argpartition(-pontuacoes, k - 1, axis=1)[:, :k]
+        resultados = []
+        for linha, colunas in enumerate(melhores):
+            colunas = colunas[np.argsort(-pontuacoes[linha, colunas], kind='stable')]
+            resultados.append([
+                (ids[c], round(float(pontuacoes[linha, c]), 4), itens.get(ids[c]))
+                for c in colunas if np.isfinite(pontuacoes[linha, c])
+            ])
+        return resultados
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+# similares_rpg.py - Tabela pré-calculada de itens similares (TF-IDF local)
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+import numpy as np
+from elasticsearch import Elasticsearch, helpers
+
+# ============================================================
+# TOKENIZAÇÃO (mesmos campos do more_like_this)
+# ============================================================
+CAMPOS_ITEM = ['nome', 'descricao', 'tags', 'tipo', 'raridade', 'valor']
+CAMPOS_RESUMO = ['nome', 'tipo', 'raridade', 'valor']
+
+# Termos presentes em mais que esta fração dos itens não contam (como max_doc_freq)
+MAX_FRACAO_DF = 0.5
+# ...nem os com mais que MAX_POSTING itens: comuns demais para separar vizinhos e caros de percorrer
+MAX_POSTING = 1000
+
+# Construção em blocos: células da matriz densa bloco x N e pares (item, candidato) por bloco
+CELULAS_POR_BLOCO = 1 << 22
+PARES_POR_BLOCO = 1 << 22
+
+# Segundos entre verificações de um arquivo novo gerado offline
+VERIFICAR_ARQUIVO = 30
+
+PALAVRA = re.compile(r"\w+")
+
+
+def normalizar(texto):
+    """lowercase + asciifolding, como o item_analyzer"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def termos_do_item(item):
+    """Termos do item: texto de nome/descricao, tags e tipo (keywords com prefixo)"""
+    termos = []
+    for campo in ('nome', 'descricao'):
+        termos += ['t:' + p for p in PALAVRA.findall(normalizar(item.get(campo) or ''))]
+    tags = item.get('tags') or []
+    termos += ['tag:' + tag for tag in (tags if isinstance(tags, list) else [tags])]
+    if item.get('tipo'):
+        termos.append('tipo:' + item['tipo'])
+    return Counter(termos)
+
+# ============================================================
+# CONSTRUÇÃO VETORIZADA (OFFLINE)
+# ============================================================
+
+def limite_postings(total_docs):
+    """Tamanho máximo de uma lista de postings que ainda entra na pontuação"""
+    return max(min(MAX_FRACAO_DF * total_docs, MAX_POSTING), 2)
+
+
+def modelo_tfidf(docs):
+    """Vetores TF-IDF normalizados dos itens em CSR: (ids, termos, idf, indptr, indices, pesos)"""
+    ids = list(docs)
+    contagens = [termos_do_item(docs[doc_id]) for doc_id in ids]
+    vocabulario = {}
+    for contagem in contagens:
+        for termo in contagem:
+            vocabulario.setdefault(termo, len(vocabulario))
+
+    indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(contagem) for contagem in contagens])
+    total = int(indptr[-1])
+    indices = np.fromiter((vocabulario[t] for c in contagens for t in c), dtype=np.int64, count=total)
+    tf = np.fromiter((n for c in contagens for n in c.values()), dtype=np.float64, count=total)
+
+    df = np.bincount(indices, minlength=len(vocabulario))
+    idf = np.log((1 + len(ids)) / (1 + df)) + 1
+    pesos = (1 + np.log(tf)) * idf[indices]
+    linhas = np.repeat(np.arange(len(ids)), np.diff(indptr))
+    normas = np.sqrt(np.bincount(linhas, weights=pesos * pesos, minlength=len(ids)))
+    normas[normas == 0] = 1.0
+    pesos /= normas[linhas]
+    return ids, list(vocabulario), idf, indptr, indices, pesos
+
+
+def vizinhos_em_blocos(indptr, indices, pesos, total_termos, k, limite_df):
+    """Top-k de cosseno de todos os itens pelo produto esparso X·Xᵀ, um bloco de linhas por vez
+
+    Cada termo de um item do bloco é expandido na sua lista de postings
+    (pares item x candidato) e os pares são somados com bincount numa
+    matriz densa bloco x N. Termos com mais de limite_df itens ficam de
+    fora, então o custo é linear em itens x termos x limite_df.
+    Devolve (vizinhos int32 com -1 nas vagas, scores float32).
+    """
+    n = len(indptr) - 1
+    vizinhos = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if n < 2 or k < 1:
+        return vizinhos, scores
+
+    # Postings (CSC) só dos termos que contam
+    df = np.bincount(indices, minlength=total_termos)
+    comprimento = np.where(df <= limite_df, df, 0)
+    linhas = np.repeat(np.arange(n), np.diff(indptr))
+    ordem = np.argsort(indices, kind='stable')
+    ordem = ordem[comprimento[indices[ordem]] > 0]
+    docs_postings, pesos_postings = linhas[ordem], pesos[ordem]
+    inicio_postings = np.concatenate(([0], np.cumsum(comprimento)[:-1]))
+
+    # Pares gerados por entrada e acumulados até cada linha, para dividir os blocos
+    pares_entrada = comprimento[indices]
+    pares = np.concatenate(([0], np.cumsum(pares_entrada)))[indptr]
+    kk = min(k, n - 1)
+
+    inicio = 0
+    while inicio < n:
+        fim = min(n, inicio + max(1, CELULAS_POR_BLOCO // n))
+        cabe = int(np.searchsorted(pares, pares[inicio] + PARES_POR_BLOCO, side='right')) - 1
+        fim = max(inicio + 1, min(fim, cabe))
+        a, b = indptr[inicio], indptr[fim]
+        tamanhos = pares_entrada[a:b]
+        total = int(tamanhos.sum())
+        if total:
+            bloco = fim - inicio
+            linha_par = np.repeat(linhas[a:b] - inicio, tamanhos)
+            deslocamento = np.arange(total) - np.repeat(np.cumsum(tamanhos) - tamanhos, tamanhos)
+            posicao = np.repeat(inicio_postings[indices[a:b]], tamanhos) + deslocamento
+            pontos = np.bincount(
+                linha_par * n + docs_postings[posicao],
+                weights=np.repeat(pesos[a:b], tamanhos) * pesos_postings[posicao],
+                minlength=bloco * n
+            ).reshape(bloco, n)
+            pontos[np.arange(bloco), np.arange(inicio, fim)] = 0
+
+            melhores = np.argpartition(-pontos, kk - 1, axis=1)[:, :kk]
+            valores = np.take_along_axis(pontos, melhores, axis=1)
+            ordem_bloco = np.argsort(-valores, axis=1, kind='stable')
+            melhores = np.take_along_axis(melhores, ordem_bloco, axis=1)
+            valores = np.take_along_axis(valores, ordem_bloco, axis=1)
+            positivos = valores > 0
+            vizinhos[inicio:fim, :kk] = np.where(positivos, melhores, -1)
+            scores[inicio:fim, :kk] = np.where(positivos, valores, 0)
+        inicio = fim
+    return vizinhos, scores
+
+# ============================================================
+# TABELA DE VIZINHOS
+# ============================================================
+
+class TabelaSimilares:
+    """Top-K vizinhos de cada item por similaridade de cosseno TF-IDF
+
+    A tabela completa é montada offline (`python similares_rpg.py`) e
+    salva em disco (.npz) junto com o modelo TF-IDF; a API carrega o
+    arquivo e o recarrega quando ele muda. Com construir_no_processo a
+    própria thread da tabela faz a construção a cada `intervalo`.
+
+    Escritas da API só enfileiram o item. A thread da tabela recalcula o
+    item tocado e os itens cuja lista ele entra ou deixa (achados pelo
+    índice reverso `citado_por`); os pesos IDF ficam congelados até a
+    próxima reconstrução. Escritas mais novas que o scan que gerou a
+    tabela são reaplicadas sobre ela ao carregar.
+    """
+
+    def __init__(self, es, arquivo=None, k=10, intervalo=3600, indice='rpg_itens', construir_no_processo=False):
+        self.es = es
+        self.arquivo = arquivo
+        self.k = k
+        self.intervalo = intervalo
+        self.indice = indice
+        self.construir_no_processo = construir_no_processo
+        self.itens = {}
+        self.vizinhos = {}
+        self.citado_por = {}
+        self.vetores = {}
+        self.postings = {}
+        self.idf = {}
+        self.total_docs = 0
+        self.pronto = False
+        self.modelo_carregado = False
+        self.construido_em = None
+        self._lock = threading.RLock()
+        self._lock_fila = threading.Lock()
+        self._pendentes = {}
+        self._recentes = {}
+        self._evento = threading.Event()
+        self._mtime_arquivo = None
+        self._thread = None
+
+    # --------------------------------------------------------
+    # Modelo TF-IDF
+    # --------------------------------------------------------
+    def _peso_idf(self, termo):
+        df = len(self.postings.get(termo, ()))
+        return math.log((1 + self.total_docs) / (1 + df)) + 1
+
+    def _vetor(self, item):
+        pesos = {}
+        for termo, tf in termos_do_item(item).items():
+            idf = self.idf.get(termo)
+            if idf is None:
+                idf = self._peso_idf(termo)
+            pesos[termo] = (1 + math.log(tf)) * idf
+        norma = math.sqrt(sum(p * p for p in pesos.values())) or 1.0
+        return {termo: p / norma for termo, p in pesos.items()}
+
+    def _pontuar(self, doc_id, vetor):
+        """Cosseno do vetor contra todos os itens que compartilham algum termo"""
+        limite_df = limite_postings(self.total_docs)
+        pontos = Counter()
+        for termo, peso in vetor.items():
+            posting = self.postings.get(termo)
+            if not posting or len(posting) > limite_df:
+                continue
+            for outro, peso_outro in posting.items():
+                pontos[outro] += peso * peso_outro
+        pontos.pop(doc_id, None)
+        return pontos
+
+    def _top(self, pontos):
+        return [(outro, round(p, 4)) for outro, p in pontos.most_common(self.k) if p > 0]
+
+    def _indexar(self, doc_id, vetor):
+        self.vetores[doc_id] = vetor
+        for termo, peso in vetor.items():
+            self.postings.setdefault(termo, {})[doc_id] = peso
+
+    def _desindexar(self, doc_id):
+        for termo in self.vetores.pop(doc_id, {}):
+            posting = self.postings.get(termo)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[termo]
+
+    def _definir(self, doc_id, lista):
+        """Trocar a lista de vizinhos de doc_id (None remove) mantendo o índice reverso"""
+        for outro, _ in self.vizinhos.get(doc_id, ()):
+            citantes = self.citado_por.get(outro)
+            if citantes is not None:
+                citantes.discard(doc_id)
+                if not citantes:
+                    del self.citado_por[outro]
+        if lista is None:
+            self.vizinhos.pop(doc_id, None)
+            return
+        self.vizinhos[doc_id] = lista
+        for outro, _ in lista:
+            self.citado_por.setdefault(outro, set()).add(doc_id)
+
+    # --------------------------------------------------------
+    # Construção completa
+    # --------------------------------------------------------
+    def construir(self):
+        """Scan do índice e cálculo do top-K de todos os itens em blocos (NumPy)"""
+        inicio = time.perf_counter()
+        construido_em = time.time()
+        docs = {}
+        for hit in helpers.scan(self.es, index=self.indice, query={"_source": CAMPOS_ITEM}, size=5000):
+            docs[hit['_id']] = hit['_source']
+
+        ids, termos, idf, indptr, indices, pesos = modelo_tfidf(docs)
+        vizinhos, scores = vizinhos_em_blocos(indptr, indices, pesos, len(termos), self.k,
+                                              limite_postings(len(ids)))
+        resumos = [{campo: docs[doc_id].get(campo) for campo in CAMPOS_RESUMO} for doc_id in ids]
+        self._instalar(ids, resumos, vizinhos, scores, (termos, idf, indptr, indices, pesos), construido_em)
+
+        print(f"✅ Similares: {len(docs)} itens em {time.perf_counter() - inicio:.1f}s")
+
+    def _instalar(self, ids, resumos, vizinhos, scores, modelo, construido_em):
+        """Trocar a tabela inteira e reenfileirar as escritas mais novas que ela"""
+        itens = dict(zip(ids, resumos))
+        tabela, citado_por = {}, {}
+        for doc_id, linha, pontos in zip(ids, vizinhos.tolist(), scores.tolist()):
+            tabela[doc_id] = [(ids[j], round(p, 4)) for j, p in zip(linha, pontos) if j >= 0]
+            for outro, _ in tabela[doc_id]:
+                citado_por.setdefault(outro, set()).add(doc_id)
+
+        vetores, postings, idf = {}, {}, {}
+        if modelo is not None:
+            termos, pesos_idf, indptr, indices, pesos = modelo
+            termos_entrada = [termos[t] for t in indices.tolist()]
+            pesos_entrada = pesos.tolist()
+            limites = indptr.tolist()
+            for i, doc_id in enumerate(ids):
+                vetor = dict(zip(termos_entrada[limites[i]:limites[i + 1]], pesos_entrada[limites[i]:limites[i + 1]]))
+                vetores[doc_id] = vetor
+                for termo, peso in vetor.items():
+                    postings.setdefault(termo, {})[doc_id] = peso
+            idf = dict(zip(termos, pesos_idf.tolist()))
+
+        with self._lock:
+            self.itens, self.vizinhos, self.citado_por = itens, tabela, citado_por
+            self.vetores, self.postings, self.idf = vetores, postings, idf
+            self.total_docs = len(ids)
+            self.pronto = True
+            self.modelo_carregado = modelo is not None
+            self.construido_em = construido_em
+        with self._lock_fila:
+            self._recentes = {doc_id: escrita for doc_id, escrita in self._recentes.items()
+                              if escrita[0] >= construido_em}
+            self._pendentes = {doc_id: novo for doc_id, (_, novo) in self._recentes.items()}
+        if self._pendentes:
+            self._evento.set()
+
+    # --------------------------------------------------------
+    # Atualização incremental
+    # --------------------------------------------------------
+    def registrar_escrita(self, indice, doc_id, antigo, novo):
+        """Ouvinte das escritas da API: só enfileira o item para a thread da tabela"""
+        if indice != self.indice:
+            return
+        with self._lock_fila:
+            self._recentes[doc_id] = (time.time(), novo)
+            self._pendentes[doc_id] = novo
+        self._evento.set()
+
+    def processar_pendentes(self):
+        """Aplicar as escritas enfileiradas, uma por vez; devolve quantas foram aplicadas"""
+        aplicadas = 0
+        while self.modelo_carregado:
+            with self._lock_fila:
+                if not self._pendentes:
+                    break
+                doc_id = next(iter(self._pendentes))
+                novo = self._pendentes.pop(doc_id)
+            with self._lock:
+                self._aplicar(doc_id, novo)
+            aplicadas += 1
+        return aplicadas
+
+    def _aplicar(self, doc_id, novo):
+        """Tirar o item da tabela e, se ele ainda existe, recolocar com vetor e vizinhos novos"""
+        afetados = set(self.citado_por.get(doc_id, ()))
+        for outro in afetados:
+            self._definir(outro, [(v, p) for v, p in self.vizinhos[outro] if v != doc_id])
+        existia = doc_id in self.vetores
+        self._desindexar(doc_id)
+        self._definir(doc_id, None)
+        self.itens.pop(doc_id, None)
+
+        if novo is not None:
+            if not existia:
+                self.total_docs += 1
+            vetor = self._vetor(novo)
+            self._indexar(doc_id, vetor)
+            self.itens[doc_id] = {campo: novo.get(campo) for campo in CAMPOS_RESUMO}
+            pontos = self._pontuar(doc_id, vetor)
+            self._definir(doc_id, self._top(pontos))
+            # O item novo entra na lista de quem ele supera (cosseno é simétrico)
+            for outro, p in pontos.items():
+                lista = self.vizinhos.get(outro)
+                if lista is None or outro in afetados or p <= 0:
+                    continue
+                if len(lista) < self.k or p > lista[-1][1]:
+                    lista = sorted(lista + [(doc_id, round(p, 4))], key=lambda par: par[1], reverse=True)
+                    self._definir(outro, lista[:self.k])
+        elif existia:
+            self.total_docs -= 1
+
+        # Quem perdeu o item pode ter um novo vizinho fora da lista antiga
+        for outro in afetados:
+            if outro in self.vetores:
+                self._definir(outro, self._top(self._pontuar(outro, self.vetores[outro])))
+
+    # --------------------------------------------------------
+    # Consulta
+    # --------------------------------------------------------
+    def obter(self, doc_id):
+        """(resumo do item, lista de vizinhos com resumo) ou None se fora da tabela"""
+        with self._lock:
+            if not self.pronto or doc_id not in self.vizinhos:
+                return None
+            similares = [
+                {'id': outro, 'score': p, **self.itens.get(outro, {})}
+                for outro, p in self.vizinhos[doc_id]
+            ]
+            return self.itens[doc_id], similares
+
+    # --------------------------------------------------------
+    # Job em segundo plano e persistência
+    # --------------------------------------------------------
+    def iniciar_job(self):
+        """Thread daemon: carrega o arquivo, aplica as escritas e troca a tabela quando há uma nova
+
+        A troca é recarregar o arquivo quando o job offline o regrava
+        (verificado a cada VERIFICAR_ARQUIVO s) ou, com
+        construir_no_processo, reconstruir a cada `intervalo`.
+        """
+        if self._thread is not None:
+            return
+
+        def laco():
+            if self.arquivo and os.path.exists(self.arquivo):
+                self.carregar_arquivo()
+            proxima = time.monotonic()
+            if self.construir_no_processo and self.modelo_carregado:
+                proxima += self.intervalo or math.inf
+            while True:
+                if time.monotonic() >= proxima:
+                    self._trocar_tabela()
+                    if self.construir_no_processo:
+                        proxima = time.monotonic() + (self.intervalo or math.inf)
+                    else:
+                        proxima = time.monotonic() + VERIFICAR_ARQUIVO
+                try:
+                    self.processar_pendentes()
+                except Exception as e:
+                    print(f"⚠️  Falha ao atualizar tabela de similares: {e}")
+                self._evento.wait(min(max(0.0, proxima - time.monotonic()), VERIFICAR_ARQUIVO))
+                self._evento.clear()
+
+        self._thread = threading.Thread(target=laco, name="tabela-similares", daemon=True)
+        self._thread.start()
+
+    def _trocar_tabela(self):
+        try:
+            if self.construir_no_processo:
+                self.construir()
+                if self.arquivo:
+                    self.salvar_arquivo()
+            elif self.arquivo_mudou():
+                self.carregar_arquivo()
+        except Exception as e:
+            print(f"⚠️  Falha ao construir tabela de similares: {e}")
+
+    def arquivo_mudou(self):
+        return bool(self.arquivo) and os.path.exists(self.arquivo) \
+            and os.path.getmtime(self.arquivo) != self._mtime_arquivo
+
+    def _modelo_em_arrays(self, ids):
+        """Vetores dos itens em CSR, no formato de modelo_tfidf"""
+        vocabulario, indices, pesos, indptr = {}, [], [], [0]
+        for doc_id in ids:
+            for termo, peso in self.vetores.get(doc_id, {}).items():
+                indices.append(vocabulario.setdefault(termo, len(vocabulario)))
+                pesos.append(peso)
+            indptr.append(len(indices))
+        termos = list(vocabulario)
+        idf = [self.idf[t] if t in self.idf else self._peso_idf(t) for t in termos]
+        return {
+            'termos': np.array(termos, dtype=str),
+            'idf': np.array(idf, dtype=np.float64),
+            'indptr': np.array(indptr, dtype=np.int64),
+            'indices': np.array(indices, dtype=np.int64),
+            'pesos': np.array(pesos, dtype=np.float64)
+        }
+
+    def salvar_arquivo(self):
+        """Gravar a tabela compacta (ids, vizinhos int32, scores float32) e o modelo TF-IDF em CSR"""
+        if not self.pronto:
+            return
+        with self._lock:
+            ids = list(self.vizinhos)
+            posicao = {doc_id: i for i, doc_id in enumerate(ids)}
+            vizinhos = np.full((len(ids), self.k), -1, dtype=np.int32)
+            scores = np.zeros((len(ids), self.k), dtype=np.float32)
+            for i, doc_id in enumerate(ids):
+                for j, (outro, p) in enumerate(self.vizinhos[doc_id]):
+                    vizinhos[i, j] = posicao.get(outro, -1)
+                    scores[i, j] = p
+            resumos = json.dumps([self.itens.get(doc_id) for doc_id in ids], ensure_ascii=False)
+            modelo = self._modelo_em_arrays(ids) if self.modelo_carregado else {}
+            construido_em = self.construido_em or time.time()
+
+        temporario = f"{self.arquivo}.tmp.npz"
+        np.savez_compressed(temporario, ids=np.array(ids, dtype=str), vizinhos=vizinhos, scores=scores,
+                            resumos=np.array(resumos), construido_em=np.array(construido_em), **modelo)
+        os.replace(temporario, self.arquivo)
+        self._mtime_arquivo = os.path.getmtime(self.arquivo)
+
+    def carregar_arquivo(self):
+        """Carregar a tabela salva; com o modelo junto, as escritas passam a ser aplicadas nela"""
+        try:
+            mtime = os.path.getmtime(self.arquivo)
+            with np.load(self.arquivo) as dados:
+                ids = [str(i) for i in dados['ids']]
+                resumos = json.loads(str(dados['resumos']))
+                vizinhos, scores = dados['vizinhos'], dados['scores']
+                construido_em = float(dados['construido_em']) if 'construido_em' in dados.files else mtime
+                modelo = None
+                if 'indptr' in dados.files:
+                    modelo = ([str(t) for t in dados['termos']], dados['idf'], dados['indptr'],
+                              dados['indices'], dados['pesos'])
+            self._instalar(ids, resumos, vizinhos, scores, modelo, construido_em)
+            self._mtime_arquivo = mtime
+        except Exception as e:
+            print(f"⚠️  Tabela de similares ignorada ({self.arquivo}): {e}")
+
+# ============================================================
+# EXECUÇÃO OFFLINE
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-calcular a tabela de itens similares")
+    parser.add_argument("--arquivo", default=os.environ.get('RPG_ARQUIVO_SIMILARES', 'similares_itens.npz'))
+    parser.add_argument("-k", type=int, default=10, help="Vizinhos por item")
+    parser.add_argument("--intervalo", type=int, default=0,
+                        help="Reconstruir a cada N segundos (0 = uma vez); a API recarrega o arquivo novo")
+    args = parser.parse_args()
+
+    es = Elasticsearch("http://localhost:9200", request_timeout=120)
+    if not es.ping():
+        print("❌ Elasticsearch não está rodando!")
+        raise SystemExit(1)
+
+    tabela = TabelaSimilares(es, arquivo=args.arquivo, k=args.k)
+    while True:
+        tabela.construir()
+        tabela.salvar_arquivo()
+        print(f"💾 Tabela salva em {args.arquivo}")
+        if not args.intervalo:
+            break
+        time.sleep(args.intervalo)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# snapshots_rpg.py - Fixtures de benchmark: snapshot/restore dos índices num repositório fs local
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from elasticsearch import Elasticsearch
+
+from gerador_rpg import ALIAS_ENTIDADES, BASE_ENTIDADES
+from indices_rpg import corpo_do_indice, indice_atual
+
+# Repositório registrado no ES; `location` é relativo ao path.repo do
+# container (volume essnapshots no docker-compose.yaml)
+REPOSITORIO = 'rpg_fixtures'
+LOCAL_REPOSITORIO = 'rpg_fixtures'
+
+ENTIDADE_DO_ALIAS = {alias: entidade for entidade, alias in ALIAS_ENTIDADES.items()}
+
+# ============================================================
+# VERIFICAÇÃO
+# ============================================================
+
+def diferencas_mapping(esperado, atual, caminho=''):
+    """Chaves do mapping esperado ausentes ou diferentes no atual (o ES acrescenta padrões)"""
+    if isinstance(esperado, dict):
+        if not isinstance(atual, dict):
+            return [f"{caminho or '/'}: esperado objeto, encontrado {atual!r}"]
+        diferencas = []
+        for chave, valor in esperado.items():
+            if chave not in atual:
+                diferencas.append(f"{caminho}/{chave}: ausente")
+            else:
+                diferencas += diferencas_mapping(valor, atual[chave], f"{caminho}/{chave}")
+        return diferencas
+    if esperado != atual and str(esperado).lower() != str(atual).lower():
+        return [f"{caminho}: esperado {esperado!r}, encontrado {atual!r}"]
+    return []
+
+
+def verificar(es, contagens_esperadas):
+    """Comparar contagem e mapping de cada alias com o esperado; devolve a lista de problemas"""
+    problemas = []
+    for alias, esperado in contagens_esperadas.items():
+        es.indices.refresh(index=alias)
+        total = es.count(index=alias)['count']
+        situacao = "✅" if total == esperado else "❌"
+        print(f"   {situacao} {alias}: {total} documentos (esperado {esperado})")
+        if total != esperado:
+            problemas.append(f"{alias}: {total} documentos, esperado {esperado}")
+
+        mapping = next(iter(es.indices.get_mapping(index=alias).values()))['mappings']
+        diferencas = diferencas_mapping(corpo_do_indice(alias)['mappings'], mapping)
+        if diferencas:
+            print(f"   ❌ {alias}: mapping diverge de indices_rpg.py ({len(diferencas)} diferenças)")
+            problemas += [f"{alias}{d}" for d in diferencas]
+        else:
+            print(f"   ✅ {alias}: mapping confere com indices_rpg.py")
+    return problemas
+
+
+def contagens_da_escala(aliases, scale):
+    """Tamanho que populate_* (scale 1) ou gerador_rpg --scale gera para cada alias"""
+    return {alias: int(BASE_ENTIDADES[ENTIDADE_DO_ALIAS[alias]] * scale) for alias in aliases}
+
+# ============================================================
+# COMANDOS
+# ============================================================
+
+def nome_snapshot(nome):
+    return f"fixture-{nome}".lower()
+
+
+def registrar(es, args):
+    es.snapshot.create_repository(name=REPOSITORIO, body={
+        "type": "fs",
+        "settings": {"location": LOCAL_REPOSITORIO, "compress": True}
+    })
+    es.snapshot.verify_repository(name=REPOSITORIO)
+    print(f"✅ Repositório '{REPOSITORIO}' registrado e verificado")
+
+
+def criar(es, args):
+    aliases = [ALIAS_ENTIDADES[e] for e in args.entidades]
+    indices = {}
+    for alias in aliases:
+        concreto = indice_atual(es, alias)
+        if concreto is None:
+            print(f"❌ '{alias}' não existe: popule antes de criar o snapshot")
+            sys.exit(1)
+        indices[alias] = concreto
+
+    es.indices.refresh(index=','.join(aliases))
+    contagens = {alias: es.count(index=alias)['count'] for alias in aliases}
+    if args.scale is not None:
+        esperado = contagens_da_escala(aliases, args.scale)
+        if esperado != contagens:
+            print(f"⚠️  Contagens {contagens} não batem com scale={args.scale} ({esperado})")
+
+    nome = nome_snapshot(args.nome)
+    print(f"📸 Criando snapshot '{nome}' de {list(indices.values())}...")
+    inicio = time.perf_counter()
+    resp = es.snapshot.create(
+        repository=REPOSITORIO,
+        snapshot=nome,
+        body={
+            "indices": ','.join(indices.values()),
+            "include_global_state": False,
+            "metadata": {
+                "scale": args.scale,
+                "contagens": contagens,
+                "indices": indices,
+                "criado_em": datetime.now().isoformat()
+            }
+        },
+        wait_for_completion=True
+    )
+    estado = resp['snapshot']['state']
+    print(f"{'✅' if estado == 'SUCCESS' else '❌'} {estado} em {time.perf_counter() - inicio:.1f}s")
+
+
+def listar(es, args):
+    resp = es.snapshot.get(repository=REPOSITORIO, snapshot='fixture-*', ignore_unavailable=True)
+    if not resp['snapshots']:
+        print("Nenhuma fixture salva")
+    for snap in resp['snapshots']:
+        metadata = snap.get('metadata') or {}
+        print(f"📦 {snap['snapshot'][len('fixture-'):]:<20} {snap['state']:<8} "
+              f"scale={metadata.get('scale')} {metadata.get('contagens')}")
+
+
+def restaurar(es, args):
+    nome = nome_snapshot(args.nome)
+    snap = es.snapshot.get(repository=REPOSITORIO, snapshot=nome)['snapshots'][0]
+    metadata = snap.get('metadata') or {}
+    indices = metadata.get('indices') or {}
+
+    # O restore não sobrescreve índices abertos: remove os atuais da entidade
+    existentes = set()
+    for alias, concreto in indices.items():
+        atual = indice_atual(es, alias)
+        if atual is not None:
+            existentes.update(es.indices.get_alias(name=alias) if atual != alias else [alias])
+        if es.indices.exists(index=concreto):
+            existentes.add(concreto)
+    if existentes and not args.substituir:
+        print(f"❌ Já existem {sorted(existentes)}; use --substituir para trocá-los pela fixture")
+        sys.exit(1)
+    for indice in sorted(existentes):
+        es.indices.delete(index=indice)
+        print(f"🗑️  {indice} removido")
+
+    print(f"♻️  Restaurando '{nome}'...")
+    inicio = time.perf_counter()
+    es.snapshot.restore(
+        repository=REPOSITORIO,
+        snapshot=nome,
+        body={"indices": ','.join(indices.values()), "include_aliases": True, "include_global_state": False},
+        wait_for_completion=True
+    )
+    print(f"✅ Restaurado em {time.perf_counter() - inicio:.1f}s")
+
+    if not args.sem_verificar:
+        verificar_fixture(es, metadata)
+
+
+def verificar_fixture(es, metadata):
+    print("🔎 Verificando integridade...")
+    esperado = dict(metadata.get('contagens') or {})
+    if metadata.get('scale') is not None:
+        # O snapshot tem que bater também com o que os geradores definem
+        for alias, total in contagens_da_escala(esperado, metadata['scale']).items():
+            if total != esperado[alias]:
+                print(f"   ⚠️  {alias}: snapshot com {esperado[alias]}, scale {metadata['scale']} gera {total}")
+    problemas = verificar(es, esperado)
+    if problemas:
+        print(f"❌ Fixture inconsistente ({len(problemas)} problemas)")
+        sys.exit(1)
+    print("✅ Fixture íntegra")
+
+
+def verificar_comando(es, args):
+    if args.nome:
+        snap = es.snapshot.get(repository=REPOSITORIO, snapshot=nome_snapshot(args.nome))['snapshots'][0]
+        verificar_fixture(es, snap.get('metadata') or {})
+    else:
+        aliases = [ALIAS_ENTIDADES[e] for e in args.entidades]
+        verificar_fixture(es, {'scale': args.scale, 'contagens': contagens_da_escala(aliases, args.scale)})
+
+
+def remover(es, args):
+    es.snapshot.delete(repository=REPOSITORIO, snapshot=nome_snapshot(args.nome))
+    print(f"🗑️  Fixture '{args.nome}' removida")
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixtures de benchmark via snapshot/restore")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    p = comandos.add_parser("registrar", help="Registrar o repositório fs (uma vez por cluster)")
+    p.set_defaults(executar=registrar)
+
+    p = comandos.add_parser("criar", help="Snapshot dos índices atuais como fixture")
+    p.add_argument("nome", help="Nome da fixture (ex.: escala_1000)")
+    p.add_argument("--scale", type=float, default=None, help="Escala usada ao popular (1 = populate_*)")
+    p.add_argument("--entidades", nargs="*", default=list(BASE_ENTIDADES), choices=list(BASE_ENTIDADES))
+    p.set_defaults(executar=criar)
+
+    p = comandos.add_parser("listar", help="Fixtures salvas")
+    p.set_defaults(executar=listar)
+
+    p = comandos.add_parser("restaurar", help="Restaurar uma fixture e verificar")
+    p.add_argument("nome")
+    p.add_argument("--substituir", action="store_true", help="Remover os índices atuais das entidades")
+    p.add_argument("--sem-verificar", action="store_true")
+    p.set_defaults(executar=restaurar)
+
+    p = comandos.add_parser("verificar", help="Checar contagens e mappings (de uma fixture ou de uma escala)")
+    p.add_argument("nome", nargs="?", default=None)
+    p.add_argument("--scale", type=float, default=1.0)
+    p.add_argument("--entidades", nargs="*", default=list(BASE_ENTIDADES), choices=list(BASE_ENTIDADES))
+    p.set_defaults(executar=verificar_comando)
+
+    p = comandos.add_parser("remover", help="Apagar uma fixture do repositório")
+    p.add_argument("nome")
+    p.set_defaults(executar=remover)
+
+    args = parser.parse_args()
+
+    es = Elasticsearch("http://localhost:9200", request_timeout=3600)
+    if not es.ping():
+        print("❌ Elasticsearch não está rodando!")
+        print("Execute: docker-compose up -d")
+        sys.exit(1)
+
+    args.executar(es, args)
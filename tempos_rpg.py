@@ -0,0 +1,203 @@
+# tempos_rpg.py - Tempo por fase de cada requisição (Server-Timing) e log de consultas lentas
+import time
+
+from flask import g, has_request_context
+from flask.json.provider import DefaultJSONProvider
+
+from captura_rpg import CapturaTrafego
+
+# Fases na ordem em que aparecem no cabeçalho Server-Timing
+FASES = ('parse', 'build', 'es', 'format', 'serialize')
+
+# Operações do cliente ES cronometradas; o corpo só é guardado nas de busca
+OPERACOES_CRONOMETRADAS = {'search', 'count', 'msearch', 'scroll', 'get', 'mget', 'index', 'create', 'update',
+                           'delete', 'bulk'}
+OPERACOES_COM_CORPO = {'search', 'count', 'msearch'}
+
+# Parâmetros do cliente que não fazem parte do DSL da consulta
+PARAMETROS_TRANSPORTE = {'index', 'params', 'headers', 'request_timeout', 'ignore', 'scroll', 'filter_path'}
+
+
+class Cronometro:
+    """Tempo gasto em cada fase de uma requisição
+
+    Uma fase dura até a próxima marcação: a requisição começa em
+    'parse', as rotas marcam 'build' ao montar a consulta, cada chamada
+    ao ES conta em 'es' e devolve para 'format', e o JSON da resposta
+    conta em 'serialize'.
+    """
+
+    __slots__ = ('fase', 'fases', 'chamadas', 'inicio', '_marca')
+
+    def __init__(self):
+        self.inicio = self._marca = time.perf_counter()
+        self.fase = 'parse'
+        self.fases = {}
+        self.chamadas = []
+
+    def marcar(self, fase):
+        """Encerrar a fase atual e começar outra; devolve a anterior"""
+        anterior = self.fase
+        if fase != anterior:
+            agora = time.perf_counter()
+            if anterior is not None:
+                self.fases[anterior] = self.fases.get(anterior, 0.0) + agora - self._marca
+            self._marca = agora
+            self.fase = fase
+        return anterior
+
+    def encerrar(self):
+        """Fechar a última fase e devolver a duração total (segundos)"""
+        self.marcar(None)
+        return self._marca - self.inicio
+
+    def took_ms(self):
+        return sum(c['took'] for c in self.chamadas if c.get('took') is not None)
+
+    def server_timing(self, total):
+        """Valor do cabeçalho Server-Timing (durações em ms)"""
+        partes = [f"{fase};dur={self.fases[fase] * 1000:.3f}" for fase in FASES if fase in self.fases]
+        if self.chamadas:
+            chamadas = len(self.chamadas)
+            partes.append(f'es_took;dur={self.took_ms()};desc="{chamadas} chamada{"s" if chamadas > 1 else ""}"')
+        partes.append(f"total;dur={total * 1000:.3f}")
+        return ', '.join(partes)
+
+
+def cronometro_atual():
+    """Cronômetro da requisição em andamento (None fora de requisições ou desligado)"""
+    return g.get('cronometro') if has_request_context() else None
+
+
+def marcar_fase(fase):
+    cronometro = cronometro_atual()
+    if cronometro is not None:
+        cronometro.marcar(fase)
+
+
+class em_fase:
+    """Contexto que conta o bloco numa fase e volta para a anterior"""
+
+    __slots__ = ('fase', '_anterior', '_cronometro')
+
+    def __init__(self, fase):
+        self.fase = fase
+
+    def __enter__(self):
+        self._cronometro = cronometro_atual()
+        if self._cronometro is not None:
+            self._anterior = self._cronometro.marcar(self.fase)
+        return self
+
+    def __exit__(self, *exc):
+        if self._cronometro is not None:
+            self._cronometro.marcar(self._anterior)
+
+
+class JSONCronometrado(DefaultJSONProvider):
+    """Provedor JSON do Flask que conta o dumps do jsonify na fase 'serialize'"""
+
+    def dumps(self, obj, **kwargs):
+        with em_fase('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def corpo_da_chamada(kwargs):
+    """DSL de uma chamada de busca, aceitando body= ou os campos como parâmetros"""
+    corpo = {k: v for k, v in kwargs.items() if k not in PARAMETROS_TRANSPORTE and k != 'body'}
+    if kwargs.get('body') is not None:
+        corpo = {**kwargs['body'], **corpo} if isinstance(kwargs['body'], dict) else kwargs['body']
+    return corpo
+
+
+class ClienteCronometrado:
+    """Proxy do cliente ES que conta as chamadas na fase 'es' e guarda índice, took e DSL de cada uma
+
+    Fora de uma requisição cronometrada as chamadas passam direto.
+    """
+
+    def __init__(self, es):
+        self._es = es
+
+    def options(self, **kwargs):
+        copia = object.__new__(type(self))
+        copia.__dict__.update(self.__dict__)
+        copia._es = self._es.options(**kwargs)
+        return copia
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._es, nome)
+        if nome not in OPERACOES_CRONOMETRADAS:
+            return atributo
+
+        def cronometrado(*args, **kwargs):
+            cronometro = cronometro_atual()
+            if cronometro is None:
+                return atributo(*args, **kwargs)
+            cronometro.marcar('es')
+            inicio = time.perf_counter()
+            chamada = {'operacao': nome, 'indice': kwargs.get('index')}
+            try:
+                resp = atributo(*args, **kwargs)
+                chamada['took'] = resp.get('took') if hasattr(resp, 'get') else None
+                return resp
+            except Exception as e:
+                chamada['erro'] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                chamada['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 3)
+                if nome in OPERACOES_COM_CORPO:
+                    chamada['corpo'] = corpo_da_chamada(kwargs)
+                elif 'id' in kwargs:
+                    chamada['id'] = kwargs['id']
+                cronometro.chamadas.append(chamada)
+                cronometro.marcar('format')
+
+        return cronometrado
+
+# ============================================================
+# LOG DE CONSULTAS LENTAS
+# ============================================================
+
+class LogConsultasLentas(CapturaTrafego):
+    """Requisições acima de limite_ms gravadas em JSONL com fases, DSL e took de cada chamada ao ES
+
+    Usa a mesma fila limitada, thread de escrita e rotação da captura de
+    tráfego. Com perfil=True, cada busca de uma requisição lenta é
+    executada de novo com "profile": true na thread de escrita (nunca na
+    requisição) e o perfil por shard vai junto no registro.
+    """
+
+    NOME_THREAD = 'consultas-lentas'
+
+    def __init__(self, arquivo, limite_ms, es=None, perfil=False, **kwargs):
+        super().__init__(arquivo, amostragem=1.0 if limite_ms > 0 else 0.0, **kwargs)
+        self.limite_ms = limite_ms
+        self.es = es
+        self.perfil = perfil and es is not None
+        self.metricas['perfis'] = 0
+        self.metricas['perfis_falhos'] = 0
+
+    def lenta(self, duracao_ms):
+        return self.ativa and duracao_ms >= self.limite_ms
+
+    def _preparar(self, registro):
+        if not self.perfil:
+            return registro
+        for chamada in registro.get('chamadas_es', []):
+            if chamada['operacao'] != 'search' or not isinstance(chamada.get('corpo'), dict):
+                continue
+            try:
+                resp = self.es.search(index=chamada['indice'], body={**chamada['corpo'], 'profile': True})
+                chamada['perfil'] = resp.get('profile')
+                chamada['took_perfil'] = resp.get('took')
+                self.metricas['perfis'] += 1
+            except Exception as e:
+                chamada['perfil_erro'] = f"{type(e).__name__}: {e}"
+                self.metricas['perfis_falhos'] += 1
+        return registro
+
+    def estatisticas(self):
+        estatisticas = super().estatisticas()
+        del estatisticas['amostragem']
+        return {'limite_ms': self.limite_ms, 'perfil': self.perfil, **estatisticas}
@@ -0,0 +1,75 @@
+# conftest.py - API sobre o backend local (ES em processo) para os testes das estruturas em memória
+import os
+import sys
+import tempfile
+
+import pytest
+from elasticsearch import NotFoundError
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Antes de importar a API: backend local pequeno, sem threads de
+# reconciliação nem construção de similares, arquivos num diretório temporário
+TEMPORARIO = tempfile.mkdtemp(prefix='rpg_testes_')
+os.environ['RPG_ES_BACKEND'] = 'local'
+os.environ.setdefault('RPG_ES_LOCAL_ESCALA', '4')
+os.environ['RPG_INTERVALO_RECONCILIACAO'] = '0'
+os.environ['RPG_SIMILARES_NO_PROCESSO'] = '0'
+os.environ['RPG_ARQUIVO_SIMILARES'] = os.path.join(TEMPORARIO, 'similares.npz')
+os.environ['RPG_WRITE_BEHIND_JOURNAL'] = os.path.join(TEMPORARIO, 'write_behind.jsonl')
+os.environ.pop('RPG_CONTADORES_ARQUIVO', None)
+
+
+@pytest.fixture(scope='session')
+def api():
+    import app_rpg_search
+    return app_rpg_search
+
+
+@pytest.fixture
+def escrever(api):
+    """escrever(indice, doc_id, novo): grava no ES (novo=None remove) e avisa os ouvintes, como as rotas CRUD"""
+    def escrita(indice, doc_id, novo):
+        try:
+            antigo = api.es.get(index=indice, id=doc_id)['_source']
+        except NotFoundError:
+            antigo = None
+        if novo is None:
+            api.es.delete(index=indice, id=doc_id)
+        else:
+            api.es.index(index=indice, id=doc_id, body=novo)
+        api.notificar_escrita(indice, doc_id, antigo, novo)
+    return escrita
+
+
+class EscritaDuranteConsulta:
+    """Cliente que faz as escritas pendentes logo depois da próxima search
+
+    Simula escritas avisadas enquanto uma semeadura consulta o ES: a
+    resposta da search não as contém, mas o aviso chega antes do fim.
+    """
+
+    def __init__(self, es, pendentes):
+        self._es = es
+        self._pendentes = pendentes
+
+    def options(self, **kwargs):
+        return EscritaDuranteConsulta(self._es.options(**kwargs), self._pendentes)
+
+    def search(self, *args, **kwargs):
+        resp = self._es.search(*args, **kwargs)
+        while self._pendentes:
+            self._pendentes.pop(0)()
+        return resp
+
+    def __getattr__(self, nome):
+        return getattr(self._es, nome)
+
+
+@pytest.fixture
+def durante_consulta(api):
+    """durante_consulta(escrita, ...): cliente que roda as escritas (funções sem argumento) na próxima search"""
+    def cliente(*escritas):
+        return EscritaDuranteConsulta(api.es, list(escritas))
+    return cliente
@@ -0,0 +1,72 @@
+# test_buscas_salvas.py - Buscas salvas: cada escrita de item que bate gera exatamente uma notificação
+import time
+
+import pytest
+
+TIPO = 'Percolado Teste'
+
+
+def item(nome, valor, tipo=TIPO):
+    return {'nome': nome, 'tipo': tipo, 'raridade': 'Raro', 'valor': valor}
+
+
+def esperar_notificacoes(api, assinatura, percolados):
+    """Eventos publicados até o percolador processar `percolados` itens (com folga para os atrasados)"""
+    limite = time.monotonic() + 10
+    eventos = []
+    while api.percolador.percolados < percolados and time.monotonic() < limite:
+        eventos += assinatura.proximos(timeout=0.05)[0]
+    assert api.percolador.percolados >= percolados
+    time.sleep(0.2)
+    eventos += assinatura.proximos(timeout=0)[0]
+    return eventos
+
+
+@pytest.fixture
+def busca(api):
+    cliente = api.app.test_client()
+    resp = cliente.post('/buscas_salvas', json={
+        'nome': 'Percolados baratos', 'usuario': 'testes', 'criterios': {'tipo': TIPO, 'valor_max': 1000}
+    })
+    assert resp.status_code == 201
+    busca_id = resp.get_json()['id']
+    assinatura = api.barramento_buscas.assinar(lambda evento: evento.get('busca_id') == busca_id)
+    yield cliente, assinatura
+    assinatura.cancelar()
+    assert cliente.delete(f'/buscas_salvas/{busca_id}').status_code == 200
+
+
+def test_criar_atualizar_e_bulk_notificam_uma_vez(api, busca):
+    cliente, assinatura = busca
+    criados = []
+
+    # Criação: um item que bate e um que não bate (caro demais)
+    inicio = api.percolador.percolados
+    bate = cliente.post('/itens/criar', json=item('Barato', 500)).get_json()['id']
+    caro = cliente.post('/itens/criar', json=item('Caro', 50000)).get_json()['id']
+    criados += [bate, caro]
+    eventos = esperar_notificacoes(api, assinatura, inicio + 2)
+    assert [(e['item_id'], e['operacao']) for e in eventos] == [(bate, 'criado')]
+
+    # Atualização: o caro passa a bater, o barato sai da busca
+    inicio = api.percolador.percolados
+    assert cliente.put(f'/itens/{caro}', json=item('Caro', 900)).status_code == 200
+    assert cliente.put(f'/itens/{bate}', json=item('Barato', 500, tipo='Arma')).status_code == 200
+    eventos = esperar_notificacoes(api, assinatura, inicio + 2)
+    assert [(e['item_id'], e['operacao']) for e in eventos] == [(caro, 'atualizado')]
+    assert eventos[0]['item']['valor'] == 900
+
+    # Bulk: um que bate e um de outro tipo
+    inicio = api.percolador.percolados
+    resp = cliente.post('/itens/bulk', json=[item('Lote barato', 10), item('Lote outro', 10, tipo='Arma')])
+    assert resp.status_code == 201
+    ids = resp.get_json()['ids']
+    criados += ids
+    eventos = esperar_notificacoes(api, assinatura, inicio + 2)
+    assert [(e['item_id'], e['operacao']) for e in eventos] == [(ids[0], 'criado')]
+
+    # Remoção não percola
+    inicio = api.percolador.percolados
+    for doc_id in criados:
+        assert cliente.delete(f'/itens/{doc_id}').status_code == 200
+    assert esperar_notificacoes(api, assinatura, inicio) == []
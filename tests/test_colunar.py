@@ -0,0 +1,67 @@
+# test_colunar.py - Respostas Arrow e JSON colunar de /filtrar contra a resposta JSON, linha a linha
+import json
+
+import pandas as pd
+import pytest
+
+from colunar_rpg import dataframe_de_arrow
+
+TIPO = 'Relíquia Colunar'
+
+ITENS = {
+    'col-completo': {'nome': 'Completo', 'tipo': TIPO, 'raridade': 'Raro', 'valor': 5000,
+                     'nivel_requerido': 12, 'peso': 2.5},
+    # Sem nivel_requerido nem peso: a rota usa 0 nos dois
+    'col-ausentes': {'nome': 'Ausentes', 'tipo': TIPO, 'raridade': 'Comum', 'valor': 300},
+    # Nulos explícitos continuam nulos (o inteiro anulável não vira 0 nem float)
+    'col-nulos': {'nome': 'Nulos', 'tipo': TIPO, 'raridade': 'Épico', 'valor': 100,
+                  'nivel_requerido': None, 'peso': None},
+}
+
+
+def python(valor):
+    """Valor de uma célula do DataFrame como no JSON (NA -> None, escalares NumPy -> Python)"""
+    if valor is None or valor is pd.NA or (isinstance(valor, float) and pd.isna(valor)):
+        return None
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+@pytest.fixture
+def itens(api, escrever):
+    for doc_id, item in ITENS.items():
+        escrever('rpg_itens', doc_id, item)
+    yield
+    for doc_id in ITENS:
+        escrever('rpg_itens', doc_id, None)
+
+
+def test_arrow_e_colunar_batem_com_json(api, itens):
+    cliente = api.app.test_client()
+    json_resp = cliente.get('/filtrar', query_string={'tipo': TIPO})
+    arrow_resp = cliente.get('/filtrar', query_string={'tipo': TIPO, 'formato': 'arrow'})
+    colunar_resp = cliente.get('/filtrar', query_string={'tipo': TIPO},
+                               headers={'Accept': 'application/vnd.rpg.colunar+json'})
+    assert (json_resp.status_code, arrow_resp.status_code, colunar_resp.status_code) == (200, 200, 200)
+    assert arrow_resp.mimetype == 'application/vnd.apache.arrow.stream'
+    assert colunar_resp.mimetype == 'application/vnd.rpg.colunar+json'
+
+    corpo = json_resp.get_json()
+    linhas_json = corpo.pop('resultados')
+    assert [linha['id'] for linha in linhas_json] == ['col-completo', 'col-ausentes', 'col-nulos']
+    campos = list(linhas_json[0])
+
+    df, metadados = dataframe_de_arrow(arrow_resp.data)
+    assert metadados == json.loads(json.dumps(corpo))
+    assert str(df['valor'].dtype) == 'Int32' and str(df['nivel_requerido'].dtype) == 'Int32'
+    assert str(df['tipo'].dtype) == 'category'
+    linhas_arrow = [{campo: python(linha[campo]) for campo in campos} for _, linha in df.iterrows()]
+
+    colunar = colunar_resp.get_json()
+    colunas = colunar.pop('colunas')
+    assert colunar.pop('n_linhas') == len(linhas_json)
+    assert colunar == corpo
+    linhas_colunar = [{campo: colunas[campo][i] for campo in campos} for i in range(len(linhas_json))]
+
+    assert linhas_arrow == linhas_json
+    assert linhas_colunar == linhas_json
+    assert linhas_json[1]['nivel_requerido'] == 0 and linhas_json[2]['nivel_requerido'] is None
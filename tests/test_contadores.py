@@ -0,0 +1,123 @@
+# test_contadores.py - Contadores incrementais contra uma agregação nova do ES
+import pytest
+
+import escrita_rpg
+from contadores_rpg import RepositorioContadores
+from escrita_rpg import OrcamentoRefresh
+
+
+def comparavel(snapshot):
+    """Snapshot sem o horário da semeadura e sem depender da ordem dos empates"""
+    return {
+        'total': snapshot['total'],
+        'termos': {campo: dict(contagem) for campo, contagem in snapshot['termos'].items()},
+        'estatisticas': {
+            campo: {chave: pytest.approx(valor) if valor is not None else None for chave, valor in stats.items()}
+            for campo, stats in snapshot['estatisticas'].items()
+        },
+        'faixas': snapshot['faixas'],
+        'histogramas': dict(snapshot['histogramas']),
+        'top': [src.get('valor') for src in snapshot['top']]
+    }
+
+
+def novo_item(nome, valor, tipo='Arma', raridade='Comum', nivel=1):
+    return {'nome': nome, 'descricao': f'{nome} de teste', 'tipo': tipo, 'raridade': raridade,
+            'valor': valor, 'peso': 1, 'nivel_requerido': nivel, 'tags': ['teste']}
+
+
+def agregacao_nova(api, indice):
+    return RepositorioContadores(api.es).snapshot(indice)
+
+
+def test_escritas_batem_com_agregacao_nova(api, escrever):
+    api.contadores.snapshot('rpg_itens')
+
+    escrever('rpg_itens', 'cont-1', novo_item('Lâmina', 250))
+    escrever('rpg_itens', 'cont-2', novo_item('Escudo', 12000, tipo='Armadura', raridade='Raro', nivel=30))
+    escrever('rpg_itens', 'cont-3', novo_item('Poção', 40, tipo='Consumível'))
+    escrever('rpg_itens', 'cont-1', novo_item('Lâmina', 90000, raridade='Épico', nivel=45))
+    escrever('rpg_itens', 'cont-3', None)
+
+    assert comparavel(api.contadores.snapshot('rpg_itens')) == comparavel(agregacao_nova(api, 'rpg_itens'))
+
+
+def test_remover_o_maximo_ressemeia(api, escrever):
+    escrever('rpg_itens', 'cont-max', novo_item('Relíquia', 10 ** 8, raridade='Lendário', nivel=99))
+    assert api.contadores.snapshot('rpg_itens')['estatisticas']['valor']['max'] == 10 ** 8
+
+    escrever('rpg_itens', 'cont-max', None)
+
+    atual = api.contadores.snapshot('rpg_itens')
+    assert atual['estatisticas']['valor']['max'] < 10 ** 8
+    assert comparavel(atual) == comparavel(agregacao_nova(api, 'rpg_itens'))
+
+
+def test_escrita_durante_semeadura_e_reaplicada(api, escrever, durante_consulta, monkeypatch):
+    personagem = {'nome': 'Durante', 'classe': 'Mago', 'raca': 'Elfo', 'status': 'Ativo',
+                  'nivel': 77, 'experiencia': 123456}
+    monkeypatch.setattr(api.contadores, 'es', durante_consulta(
+        lambda: escrever('rpg_personagens', 'cont-durante', personagem)
+    ))
+
+    api.contadores.semear('rpg_personagens')
+    monkeypatch.undo()
+
+    assert comparavel(api.contadores.snapshot('rpg_personagens')) == \
+        comparavel(agregacao_nova(api, 'rpg_personagens'))
+    escrever('rpg_personagens', 'cont-durante', None)
+    assert comparavel(api.contadores.snapshot('rpg_personagens')) == \
+        comparavel(agregacao_nova(api, 'rpg_personagens'))
+
+
+class AvisoNoRefresh:
+    """Cliente cujo próximo refresh entrega avisos atrasados: escrita já no índice, aviso no meio da semeadura"""
+
+    def __init__(self, es, avisos):
+        self._es = es
+        self._avisos = avisos
+        self.refreshes = 0
+        self.indices = self
+
+    def refresh(self, **kwargs):
+        self.refreshes += 1
+        self._es.indices.refresh(**kwargs)
+        while self._avisos:
+            self._avisos.pop(0)()
+
+    def __getattr__(self, nome):
+        return getattr(self._es, nome)
+
+
+def test_escrita_ja_indexada_e_avisada_na_semeadura_conta_uma_vez(api, monkeypatch):
+    api.contadores.snapshot('rpg_itens')
+    novo = novo_item('Atrasado', 777, tipo='Anel', raridade='Raro')
+    api.es.index(index='rpg_itens', id='cont-atrasado', body=novo)
+    monkeypatch.setattr(api.contadores, 'es', AvisoNoRefresh(api.es, [
+        lambda: api.notificar_escrita('rpg_itens', 'cont-atrasado', None, novo)
+    ]))
+
+    api.contadores.semear('rpg_itens')
+    monkeypatch.undo()
+
+    assert comparavel(api.contadores.snapshot('rpg_itens')) == comparavel(agregacao_nova(api, 'rpg_itens'))
+    api.es.delete(index='rpg_itens', id='cont-atrasado')
+    api.notificar_escrita('rpg_itens', 'cont-atrasado', novo, None)
+    assert comparavel(api.contadores.snapshot('rpg_itens')) == comparavel(agregacao_nova(api, 'rpg_itens'))
+
+
+def test_semeadura_usa_orcamento_de_refresh(api, monkeypatch):
+    assert api.contadores.orcamento is api.orcamento_refresh
+    monkeypatch.setattr(escrita_rpg, 'INTERVALO_REFRESH_PERIODICO', 0)
+    cliente = AvisoNoRefresh(api.es, [])
+    orcamento = OrcamentoRefresh(por_minuto=1, rajada=1)
+    repositorio = RepositorioContadores(cliente, orcamento=orcamento)
+
+    repositorio.semear('rpg_missoes')
+    repositorio.reconciliar()
+
+    # A segunda semeadura (e as dos outros índices) não força refresh sem ficha
+    assert cliente.refreshes == 3
+    assert orcamento.concedidos == {'rpg_itens': 1, 'rpg_personagens': 1, 'rpg_missoes': 1}
+    assert orcamento.rebaixados == {'rpg_missoes': 1}
+    assert comparavel(repositorio.snapshot('rpg_missoes')) == comparavel(agregacao_nova(api, 'rpg_missoes'))
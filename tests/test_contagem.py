@@ -0,0 +1,55 @@
+# test_contagem.py - Cache do /count invalidado pelas escritas e total limitado por LIMITE_TOTAL_HITS
+TIPO = 'Contagem Teste'
+
+
+def item(nome, tipo=TIPO, valor=10):
+    return {'nome': nome, 'tipo': tipo, 'raridade': 'Comum', 'valor': valor, 'nivel_requerido': 1, 'peso': 1}
+
+
+def contar(cliente, **filtros):
+    resp = cliente.get('/count', query_string={'entidade': 'itens', **filtros})
+    assert resp.status_code == 200
+    corpo = resp.get_json()
+    return corpo['total'], corpo['cache']
+
+
+def test_escritas_invalidam_o_cache_do_count(api, escrever):
+    cliente = api.app.test_client()
+    assert contar(cliente, tipo=TIPO) == (0, False)
+    assert contar(cliente, tipo=TIPO) == (0, True)
+
+    escrever('rpg_itens', 'cont-cache-1', item('Um'))
+    assert contar(cliente, tipo=TIPO) == (1, False)
+    assert contar(cliente, tipo=TIPO) == (1, True)
+
+    # Escrita em outro índice não mexe no cache dos itens
+    escrever('rpg_missoes', 'cont-cache-missao', {'titulo': 'Outra', 'status': 'Ativa'})
+    assert contar(cliente, tipo=TIPO) == (1, True)
+
+    # Atualização que tira o item do filtro e remoção
+    escrever('rpg_itens', 'cont-cache-2', item('Dois'))
+    assert contar(cliente, tipo=TIPO) == (2, False)
+    escrever('rpg_itens', 'cont-cache-2', item('Dois', tipo='Arma'))
+    assert contar(cliente, tipo=TIPO) == (1, False)
+    escrever('rpg_itens', 'cont-cache-1', None)
+    assert contar(cliente, tipo=TIPO) == (0, False)
+
+    escrever('rpg_itens', 'cont-cache-2', None)
+    escrever('rpg_missoes', 'cont-cache-missao', None)
+
+
+def test_exact_total_ignora_o_limite_de_total_hits(api, monkeypatch):
+    cliente = api.app.test_client()
+    exato, _ = contar(cliente, tipo='Arma')
+    limite = 5
+    assert exato > limite
+    monkeypatch.setattr(api, 'LIMITE_TOTAL_HITS', limite)
+
+    corpo = cliente.get('/filtrar', query_string={'tipo': 'Arma'}).get_json()
+    assert (corpo['total'], corpo['total_exato']) == (limite, False)
+
+    corpo = cliente.get('/filtrar', query_string={'tipo': 'Arma', 'exact_total': '1'}).get_json()
+    assert (corpo['total'], corpo['total_exato']) == (exato, True)
+
+    corpo = cliente.post('/filtrar', json={'tipo': 'Arma', 'exact_total': True}).get_json()
+    assert (corpo['total'], corpo['total_exato']) == (exato, True)
@@ -0,0 +1,118 @@
+# test_elegibilidade.py - Índice de faixas de nível das missões contra um scan novo
+import random
+
+from elegibilidade_rpg import METRICAS, IndiceMissoesPorNivel
+
+NIVEIS = range(0, 102)
+
+
+def missao(titulo, nivel_minimo, nivel_maximo, ouro, status='Ativa', dias=5):
+    return {'titulo': titulo, 'dificuldade': 'Média', 'tipo': 'Caça', 'localizacao': 'Floresta',
+            'status': status, 'nivel_minimo': nivel_minimo, 'nivel_maximo': nivel_maximo,
+            'recompensa_ouro': ouro, 'recompensa_experiencia': ouro * 2, 'tempo_limite_dias': dias}
+
+
+def mesmo_indice(atual, api):
+    novo = IndiceMissoesPorNivel(api.es, intervalo_reconciliacao=0)
+    novo.semear()
+    # As escritas dividem e juntam segmentos: a estrutura tem de ser a mesma de uma semeadura
+    assert (atual.limites, atual.segmentos, atual.pontos) == (novo.limites, novo.segmentos, novo.pontos)
+    for metrica in METRICAS:
+        for nivel in NIVEIS:
+            assert atual.missoes_do_nivel(nivel, metrica, 1000) == novo.missoes_do_nivel(nivel, metrica, 1000), \
+                (metrica, nivel)
+    assert atual.inativas == novo.inativas
+
+
+def test_escritas_batem_com_scan_novo(api, escrever):
+    indice = api.missoes_por_nivel
+    indice.missoes_do_nivel(10)
+
+    escrever('rpg_missoes', 'eleg-1', missao('Nova faixa', 3, 97, 5000))
+    escrever('rpg_missoes', 'eleg-2', missao('Faixa única', 42, 42, 100000, dias=1))
+    escrever('rpg_missoes', 'eleg-3', missao('Invertida', 50, 20, 800))
+    escrever('rpg_missoes', 'eleg-4', missao('Encerrada', 1, 100, 700, status='Concluída'))
+    mesmo_indice(indice, api)
+
+    # Faixa que muda, missão desativada, reativada e removida
+    escrever('rpg_missoes', 'eleg-1', missao('Nova faixa', 60, 61, 5000))
+    escrever('rpg_missoes', 'eleg-2', missao('Faixa única', 42, 42, 100000, status='Inativa', dias=1))
+    escrever('rpg_missoes', 'eleg-4', missao('Encerrada', 1, 100, 700))
+    escrever('rpg_missoes', 'eleg-3', None)
+    mesmo_indice(indice, api)
+    assert indice.status_inativa('eleg-2') == 'Inativa'
+    assert indice.status_inativa('eleg-3') is None and indice.obter('eleg-3') is None
+
+    for doc_id in ('eleg-1', 'eleg-2', 'eleg-4'):
+        escrever('rpg_missoes', doc_id, None)
+    mesmo_indice(indice, api)
+
+
+def test_faixas_aleatorias_batem_com_scan_novo(api, escrever):
+    indice = api.missoes_por_nivel
+    indice.missoes_do_nivel(10)
+    sorteio = random.Random(7)
+    ids = [f'eleg-rand-{i}' for i in range(12)]
+    existentes = set()
+    for _ in range(150):
+        doc_id = sorteio.choice(ids)
+        if doc_id in existentes and sorteio.random() < 0.2:
+            escrever('rpg_missoes', doc_id, None)
+            existentes.discard(doc_id)
+            continue
+        existentes.add(doc_id)
+        minimo = sorteio.choice([None, 0, 1, 50, 100, 150, sorteio.randint(0, 120)])
+        maximo = sorteio.choice([None, 1, 49, 100, 200, sorteio.randint(0, 120)])
+        status = sorteio.choice(['Ativa', 'Ativa', 'Ativa', 'Inativa'])
+        escrever('rpg_missoes', doc_id, missao(doc_id, minimo, maximo, sorteio.randint(0, 3) * 100, status=status))
+    mesmo_indice(indice, api)
+
+    for doc_id in existentes:
+        escrever('rpg_missoes', doc_id, None)
+    mesmo_indice(indice, api)
+
+
+def test_escritas_durante_primeira_semeadura_sao_reaplicadas(api, escrever, durante_consulta, monkeypatch):
+    escrever('rpg_missoes', 'eleg-sai', missao('Sai', 1, 10, 100))
+    escrever('rpg_missoes', 'eleg-fica', missao('Fica', 1, 10, 100))
+    indice = IndiceMissoesPorNivel(api.es, intervalo_reconciliacao=0)
+    monkeypatch.setattr(indice, 'es', durante_consulta(
+        lambda: escrever('rpg_missoes', 'eleg-nova', missao('Nova', 200, 300, 5)),
+        lambda: escrever('rpg_missoes', 'eleg-fica', missao('Fica', 150, 160, 100)),
+        lambda: escrever('rpg_missoes', 'eleg-sai', None)
+    ))
+    api.ao_escrever(indice.registrar_escrita)
+    try:
+        indice.garantir_semeado()
+    finally:
+        api.OUVINTES_ESCRITA.remove(indice.registrar_escrita)
+    monkeypatch.undo()
+
+    assert indice.obter('eleg-sai') is None
+    assert [m['id'] for m in indice.missoes_do_nivel(250)[0]] == ['eleg-nova']
+    assert [m['id'] for m in indice.missoes_do_nivel(155)[0]] == ['eleg-fica']
+    mesmo_indice(indice, api)
+    for doc_id in ('eleg-nova', 'eleg-fica'):
+        escrever('rpg_missoes', doc_id, None)
+
+
+def test_rota_separa_inativas_de_inexistentes(api, escrever):
+    escrever('rpg_missoes', 'eleg-ativa', missao('Ativa', 1, 100, 10))
+    escrever('rpg_missoes', 'eleg-inativa', missao('Parada', 1, 100, 10, status='Inativa'))
+    cliente = api.app.test_client()
+
+    resp = cliente.post('/personagens/elegiveis', json={
+        'missoes': ['eleg-ativa', 'eleg-inativa', 'eleg-nao-existe'], 'limite': -1
+    })
+    corpo = resp.get_json()
+    assert resp.status_code == 200
+    assert list(corpo['resultados']) == ['eleg-ativa']
+    assert len(corpo['resultados']['eleg-ativa']['personagens']) == 1
+    assert corpo['inativas'] == {'eleg-inativa': 'Inativa'}
+    assert corpo['nao_encontradas'] == ['eleg-nao-existe']
+
+    resp = cliente.post('/personagens/elegiveis', json={'missoes': ['eleg-ativa'], 'limite': 'dez'})
+    assert resp.status_code == 400
+
+    for doc_id in ('eleg-ativa', 'eleg-inativa'):
+        escrever('rpg_missoes', doc_id, None)
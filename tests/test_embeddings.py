@@ -0,0 +1,82 @@
+# test_embeddings.py - Matriz de embeddings mantida pelas escritas contra um scan novo do índice
+import numpy as np
+
+from embeddings_rpg import MatrizEmbeddings, embedding_do_item
+
+
+def item(nome, valor, descricao='Lâmina antiga'):
+    return {'nome': nome, 'descricao': descricao, 'tags': ['teste'], 'tipo': 'Arma', 'raridade': 'Raro',
+            'valor': valor, 'peso': 3, 'nivel_requerido': 5, 'atributos_bonus': {'forca': 2, 'destreza': 1}}
+
+
+def matriz_nova(api):
+    matriz = MatrizEmbeddings(api.es, intervalo_reconciliacao=0)
+    matriz.semear()
+    return matriz
+
+
+def linhas(matriz):
+    """Conteúdo da matriz por id (a ordem das linhas muda com as remoções)"""
+    assert len(matriz.posicoes) == matriz.n
+    resultado = {}
+    for i in range(matriz.n):
+        doc_id = matriz.ids[i]
+        assert matriz.posicoes[doc_id] == i
+        resultado[doc_id] = (tuple(matriz.matriz[i].tolist()), matriz.itens[doc_id])
+    assert set(resultado) == set(matriz.itens)
+    return resultado
+
+
+def test_escritas_batem_com_scan_novo(api, escrever):
+    matriz = api.matriz_embeddings
+    matriz.garantir_semeado()
+    escrever('rpg_itens', 'emb-1', item('Espada Um', 100))
+    escrever('rpg_itens', 'emb-2', item('Arco Dois', 300, descricao='Arco élfico'))
+    escrever('rpg_itens', 'emb-1', item('Espada Um', 900, descricao='Reforjada'))
+    escrever('rpg_itens', 'emb-2', None)
+
+    assert linhas(matriz) == linhas(matriz_nova(api))
+    vizinhos = matriz.vizinhos(embedding_do_item(item('Espada Um', 900, descricao='Reforjada')), k=1)
+    assert vizinhos[0][0] == 'emb-1'
+    escrever('rpg_itens', 'emb-1', None)
+    assert linhas(matriz) == linhas(matriz_nova(api))
+
+
+def test_escritas_durante_primeira_semeadura_sao_reaplicadas(api, escrever, durante_consulta, monkeypatch):
+    escrever('rpg_itens', 'emb-sai', item('Sai', 10))
+    escrever('rpg_itens', 'emb-fica', item('Fica', 10))
+    matriz = MatrizEmbeddings(api.es, intervalo_reconciliacao=0)
+    monkeypatch.setattr(matriz, 'es', durante_consulta(
+        lambda: escrever('rpg_itens', 'emb-novo', item('Novo', 20)),
+        lambda: escrever('rpg_itens', 'emb-fica', item('Fica', 5000, descricao='Mudou')),
+        lambda: escrever('rpg_itens', 'emb-sai', None)
+    ))
+    api.ao_escrever(matriz.registrar_escrita)
+    try:
+        matriz.garantir_semeado()
+    finally:
+        api.OUVINTES_ESCRITA.remove(matriz.registrar_escrita)
+    monkeypatch.undo()
+
+    conteudo = linhas(matriz)
+    assert 'emb-sai' not in conteudo and 'emb-novo' in conteudo
+    assert conteudo['emb-fica'][1]['valor'] == 5000
+    assert conteudo == linhas(matriz_nova(api))
+    escrever('rpg_itens', 'emb-novo', None)
+    escrever('rpg_itens', 'emb-fica', None)
+
+
+def test_consulta_nao_ve_escritas_posteriores(api, escrever):
+    matriz = api.matriz_embeddings
+    escrever('rpg_itens', 'emb-some', item('Some', 10))
+    matriz.vizinhos(np.ones(matriz.matriz.shape[1], dtype=np.float32))
+    ids, linhas_antes = matriz.ids, matriz.matriz
+    copias = ids.copy(), linhas_antes.copy()
+
+    escrever('rpg_itens', 'emb-cow', item('Cópia', 10))
+    escrever('rpg_itens', 'emb-some', None)
+
+    # As linhas que a consulta guardou continuam intactas
+    assert (ids == copias[0]).all() and (linhas_antes == copias[1]).all()
+    assert linhas(matriz) == linhas(matriz_nova(api))
+    escrever('rpg_itens', 'emb-cow', None)
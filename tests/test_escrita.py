@@ -0,0 +1,171 @@
+# test_escrita.py - Fila write-behind: retentativas, journal, ordem por id e ciclo do ack
+import os
+import time
+
+import pytest
+
+from escrita_rpg import FilaCheia, FilaEscritas
+
+
+class ESFalso:
+    """_bulk em memória que falha nas primeiras `falhas` chamadas"""
+
+    def __init__(self, falhas=0):
+        self.falhas = falhas
+        self.docs = {}
+
+    def bulk(self, body, refresh=None):
+        if self.falhas:
+            self.falhas -= 1
+            raise ConnectionError('ES fora do ar')
+        itens, operacoes = [], iter(body)
+        for acao in operacoes:
+            operacao, meta = next(iter(acao.items()))
+            chave = (meta['_index'], meta['_id'])
+            if operacao == 'index':
+                self.docs[chave] = next(operacoes)
+                itens.append({'index': {'result': 'created', 'status': 201}})
+            elif self.docs.pop(chave, None) is None:
+                itens.append({'delete': {'result': 'not_found', 'status': 404}})
+            else:
+                itens.append({'delete': {'result': 'deleted', 'status': 200}})
+        return {'items': itens}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / 'write_behind.jsonl')
+
+
+def nova_fila(es, journal, **opcoes):
+    opcoes = {'intervalo_flush': 0.01, 'espera_retentativa': 0.01, **opcoes}
+    return FilaEscritas(es, journal, **opcoes)
+
+
+def test_falha_do_bulk_com_fila_cheia_retenta_em_ordem(journal):
+    es = ESFalso(falhas=5)
+    fila = nova_fila(es, journal, capacidade=3, tamanho_lote=2, max_tentativas=100)
+    fila.iniciar()
+
+    aceitas, recusadas = [], 0
+    for valor in range(10):
+        try:
+            aceitas.append((fila.enfileirar('rpg_itens', 'x', {'valor': valor}, timeout=0.01)[0], valor))
+        except FilaCheia:
+            recusadas += 1
+    assert recusadas > 0
+
+    for ack, _ in aceitas:
+        assert fila.esperar(ack, timeout=5)['status'] == 'gravado'
+    assert es.docs[('rpg_itens', 'x')] == {'valor': aceitas[-1][1]}
+    assert fila.estatisticas()['retentativas'] == 5
+    assert fila.pendente('rpg_itens', 'x') == (False, None)
+
+    # A thread continua gravando depois da falha
+    ack, _ = fila.enfileirar('rpg_itens', 'y', {'valor': 1})
+    assert fila.esperar(ack, timeout=5)['status'] == 'gravado'
+
+
+def test_lote_que_esgota_as_tentativas_falha_e_sai_do_journal(journal):
+    fila = nova_fila(ESFalso(falhas=10 ** 9), journal, max_tentativas=3)
+    fila.iniciar()
+    acks = [fila.enfileirar('rpg_itens', str(i), {'valor': i})[0] for i in range(3)]
+
+    for ack in acks:
+        resultado = fila.esperar(ack, timeout=5)
+        assert resultado['status'] == 'falhou'
+        assert 'fora do ar' in resultado['error']
+    assert fila.pendente('rpg_itens', '0') == (False, None)
+    assert nova_fila(ESFalso(), journal).fila.qsize() == 0
+
+
+def test_journal_reaplicado_no_reinicio(journal):
+    antes = nova_fila(ESFalso(), journal)
+    antes.enfileirar('rpg_itens', 'a', {'valor': 1})
+    antes.enfileirar('rpg_itens', 'b', {'valor': 2}, antigo=None)
+    antes.enfileirar('rpg_itens', 'a', None, antigo={'valor': 1})
+
+    es, avisos = ESFalso(), []
+    depois = nova_fila(es, journal, ao_gravar=lambda *escrita: avisos.append(escrita))
+    assert depois.fila.qsize() == 3
+    assert depois.pendente('rpg_itens', 'a') == (True, None)
+    depois.iniciar()
+
+    prazo = time.monotonic() + 5
+    while len(avisos) < 3 and time.monotonic() < prazo:
+        time.sleep(0.01)
+    assert avisos == [
+        ('rpg_itens', 'a', None, {'valor': 1}),
+        ('rpg_itens', 'b', None, {'valor': 2}),
+        ('rpg_itens', 'a', {'valor': 1}, None)
+    ]
+    assert es.docs == {('rpg_itens', 'b'): {'valor': 2}}
+    time.sleep(0.1)
+    assert os.path.getsize(journal) == 0
+
+
+def test_ciclo_do_ack(journal):
+    fila = nova_fila(ESFalso(), journal)
+    ack, _ = fila.enfileirar('rpg_itens', 'z', {'valor': 1})
+    assert fila.resultado(ack) == {'ack': ack, 'status': 'pendente'}
+    assert fila.resultado('desconhecido') is None
+
+    fila.iniciar()
+    assert fila.esperar(ack, timeout=5)['status'] == 'gravado'
+    assert fila.resultado(ack)['status'] == 'gravado'
+
+# ============================================================
+# Pela API (?write_behind=1)
+# ============================================================
+
+def item(valor):
+    return {'nome': f'Fila {valor}', 'tipo': 'Arma', 'raridade': 'Comum', 'valor': valor}
+
+
+def test_escritas_do_mesmo_id_na_fila_encadeiam_o_antigo(api):
+    cliente = api.app.test_client()
+    avisos = []
+
+    def ouvinte(indice, doc_id, antigo, novo):
+        if doc_id == item_id:
+            avisos.append(((antigo or {}).get('valor'), (novo or {}).get('valor')))
+    item_id = None
+    api.ao_escrever(ouvinte)
+    try:
+        resp = cliente.post('/itens/criar?write_behind=1', json=item(1))
+        assert resp.status_code == 202
+        item_id = resp.get_json()['id']
+        acks = [resp.get_json()['ack']]
+        # Ainda na fila: PUT/DELETE partem da última escrita enfileirada, não do ES
+        for valor in (2, 3):
+            resp = cliente.put(f'/itens/{item_id}?write_behind=1', json=item(valor))
+            assert resp.status_code == 202
+            acks.append(resp.get_json()['ack'])
+        resp = cliente.delete(f'/itens/{item_id}?write_behind=1')
+        assert resp.status_code == 202
+        acks.append(resp.get_json()['ack'])
+        assert cliente.put(f'/itens/{item_id}?write_behind=1', json=item(4)).status_code == 404
+
+        for ack in acks:
+            assert cliente.get(f'/escritas/{ack}?wait_for=1').get_json()['status'] == 'gravado'
+    finally:
+        api.OUVINTES_ESCRITA.remove(ouvinte)
+
+    assert avisos == [(None, 1), (1, 2), (2, 3), (3, None)]
+    assert cliente.get(f'/itens/{item_id}').status_code == 404
+
+
+def test_ack_pela_api(api):
+    cliente = api.app.test_client()
+    resp = cliente.post('/itens/criar?write_behind=1', json=item(7))
+    assert resp.status_code == 202
+    corpo = resp.get_json()
+    assert corpo['status_url'] == f"/escritas/{corpo['ack']}"
+
+    assert cliente.get(corpo['status_url']).get_json()['status'] in ('pendente', 'gravado')
+    final = cliente.get(f"{corpo['status_url']}?wait_for=1").get_json()
+    assert final == {'ack': corpo['ack'], 'status': 'gravado', 'id': corpo['id'], 'resultado': 'created'}
+    assert cliente.get(f"/itens/{corpo['id']}").get_json()['item']['valor'] == 7
+    assert cliente.get('/escritas/nao-existe').status_code == 404
+
+    cliente.delete(f"/itens/{corpo['id']}")
@@ -0,0 +1,145 @@
+# test_protecao.py - Disjuntor, compartimentos por classe de rota e timeouts adaptativos
+import time
+
+import pytest
+from elasticsearch import ConnectionError as ErroConexao, ConnectionTimeout
+
+from protecao_rpg import CircuitoAberto, ClienteProtegido, Compartimento, Disjuntor, TimeoutsAdaptativos
+
+
+class ESFalso:
+    """Cliente que anota (operação, request_timeout) de cada chamada e levanta `erro` se houver"""
+
+    def __init__(self, erro=None, chamadas=None, request_timeout=None):
+        self.erro = erro
+        self.chamadas = [] if chamadas is None else chamadas
+        self.request_timeout = request_timeout
+
+    def options(self, request_timeout=None, **_):
+        return ESFalso(self.erro, self.chamadas, request_timeout)
+
+    def _chamar(self, operacao):
+        self.chamadas.append((operacao, self.request_timeout))
+        if self.erro is not None:
+            raise self.erro
+        return {}
+
+    def search(self, **_):
+        return self._chamar('search')
+
+    def get(self, **_):
+        return self._chamar('get')
+
+    def index(self, **_):
+        return self._chamar('index')
+
+
+def test_disjuntor_fechado_aberto_meio_aberto():
+    disjuntor = Disjuntor(limite=2, espera=0.05)
+    disjuntor.falha()
+    assert disjuntor.estado == 'fechado'
+    disjuntor.falha()
+    assert disjuntor.estado == 'aberto'
+    with pytest.raises(CircuitoAberto) as erro:
+        disjuntor.permitir()
+    assert erro.value.retry_after >= 1
+
+    time.sleep(0.06)
+    disjuntor.permitir()
+    assert disjuntor.estado == 'meio_aberto'
+    # Só uma chamada de teste por vez
+    with pytest.raises(CircuitoAberto):
+        disjuntor.permitir()
+    # Teste que falha reabre; o próximo que funciona fecha
+    disjuntor.falha()
+    assert disjuntor.estado == 'aberto'
+    time.sleep(0.06)
+    disjuntor.permitir()
+    disjuntor.sucesso()
+    assert disjuntor.estado == 'fechado'
+    assert disjuntor.estatisticas()['aberturas'] == 2
+
+
+def test_disjuntor_aberto_responde_503_na_rota(api, monkeypatch):
+    monkeypatch.setattr(api.es, '_es', ESFalso(erro=ErroConexao('ES fora do ar')))
+    monkeypatch.setattr(api.disjuntor_es, 'espera', 60)
+    cliente = api.app.test_client()
+    try:
+        for _ in range(api.disjuntor_es.limite):
+            assert cliente.get('/buscar?q=espada').status_code == 503
+        assert api.disjuntor_es.estado == 'aberto'
+        chamadas = len(api.es._es.chamadas)
+
+        resp = cliente.get('/buscar?q=espada')
+        assert resp.status_code == 503
+        assert int(resp.headers['Retry-After']) >= 1
+        assert len(api.es._es.chamadas) == chamadas
+        # Rotas de documento: circuito aberto não vira "não encontrado"
+        for rota in ('/itens/1', '/personagens/1', '/missoes/1'):
+            assert cliente.get(rota).status_code == 503
+            assert cliente.delete(rota).status_code == 503
+    finally:
+        api.disjuntor_es.sucesso()
+
+
+def test_compartimento_cheio_responde_503_com_retry_after(api, monkeypatch):
+    lotado = Compartimento('pesadas', limite=1, fila=0, espera=0)
+    monkeypatch.setitem(api.compartimentos, 'pesadas', lotado)
+    assert lotado.entrar()
+    try:
+        resp = api.app.test_client().get('/count?indice=rpg_itens')
+        assert resp.status_code == 503
+        assert int(resp.headers['Retry-After']) >= 1
+        assert lotado.estatisticas()['recusadas'] == 1
+    finally:
+        lotado.sair(0.0)
+    assert api.app.test_client().get('/count?indice=rpg_itens').status_code == 200
+
+
+def test_compartimento_com_fila_expira_a_espera():
+    compartimento = Compartimento('buscas', limite=1, fila=1, espera=0.05)
+    assert compartimento.entrar()
+    inicio = time.perf_counter()
+    assert not compartimento.entrar()
+    assert time.perf_counter() - inicio >= 0.05
+    assert compartimento.estatisticas()['expiradas'] == 1
+    compartimento.sair(0.01)
+    assert compartimento.entrar()
+
+
+def cliente_protegido(erro, amostras):
+    """ClienteProtegido com timeouts já adaptados (p99 de 10ms em /buscar search:rpg_itens)"""
+    timeouts = TimeoutsAdaptativos(padrao=10.0, piso=0.05, minimo=1)
+    for _ in range(amostras):
+        timeouts.registrar(('/buscar', 'search', 'rpg_itens'), 0.01)
+        timeouts.registrar(('/buscar', 'index', 'rpg_itens'), 0.01)
+    es = ESFalso(erro=erro)
+    return ClienteProtegido(es, Disjuntor(limite=3, espera=60), timeouts), es
+
+
+def test_timeout_adaptativo_nao_conta_para_o_disjuntor(api):
+    protegido, es = cliente_protegido(ConnectionTimeout('estourou'), amostras=64)
+    with api.app.test_request_context('/buscar'):
+        for _ in range(10):
+            with pytest.raises(ConnectionTimeout):
+                protegido.search(index='rpg_itens', body={})
+    assert protegido.disjuntor.estado == 'fechado'
+    assert protegido.disjuntor.falhas == 0
+    assert all(timeout < 10.0 for _, timeout in es.chamadas)
+
+    # Com o timeout padrão o mesmo erro é sobrecarga e abre o circuito
+    protegido, es = cliente_protegido(ConnectionTimeout('estourou'), amostras=0)
+    with api.app.test_request_context('/buscar'):
+        for _ in range(3):
+            with pytest.raises(ConnectionTimeout):
+                protegido.search(index='rpg_itens', body={})
+    assert protegido.disjuntor.estado == 'aberto'
+
+
+def test_escritas_ficam_com_o_timeout_padrao(api):
+    protegido, es = cliente_protegido(None, amostras=64)
+    with api.app.test_request_context('/buscar'):
+        protegido.search(index='rpg_itens', body={})
+        protegido.index(index='rpg_itens', id='1', body={})
+    assert es.chamadas[0][1] < 10.0
+    assert es.chamadas[1] == ('index', 10.0)
@@ -0,0 +1,99 @@
+# test_ranking.py - Rankings mantidos pelas escritas contra um scan novo do índice
+import pytest
+
+from ranking_rpg import RankingPersonagens
+
+# Rankings consultados antes das escritas (mantidos escrita a escrita) e depois (montados na consulta)
+CONSULTAS = [
+    ('nivel', None, None),
+    ('experiencia', 'Mago', None),
+    ('forca', None, 'Anão'),
+    ('inteligencia', 'Mago', 'Elfo'),
+    ('nivel', 'Testador', None),
+]
+
+
+def personagem(nome, classe, raca, nivel, **atributos):
+    return {'nome': nome, 'classe': classe, 'raca': raca, 'status': 'Ativo', 'nivel': nivel,
+            'experiencia': nivel * 1000, **atributos}
+
+
+def ranking_novo(api):
+    ranking = RankingPersonagens(api.es, intervalo_reconciliacao=0)
+    ranking.semear()
+    return ranking
+
+
+def mesmo_ranking(atual, novo, atributo, classe, raca):
+    top_atual, total_atual = atual.top(atributo, 10 ** 6, classe, raca)
+    top_novo, total_novo = novo.top(atributo, 10 ** 6, classe, raca)
+    assert total_atual == total_novo
+    assert [(e['id'], e['valor']) for e in top_atual] == [(e['id'], e['valor']) for e in top_novo]
+
+
+@pytest.fixture
+def ranking(api):
+    for atributo, classe, raca in CONSULTAS[:3]:
+        api.ranking.top(atributo, classe=classe, raca=raca)
+    return api.ranking
+
+
+def test_escritas_batem_com_scan_novo(api, ranking, escrever):
+    escrever('rpg_personagens', 'rank-1', personagem('Um', 'Mago', 'Elfo', 60, inteligencia=30))
+    escrever('rpg_personagens', 'rank-2', personagem('Dois', 'Guerreiro', 'Anão', 12, forca=29))
+    escrever('rpg_personagens', 'rank-3', personagem('Três', 'Testador', 'Elfo', 5))
+    # Troca de partição e de valor, e uma partição que some com a remoção
+    escrever('rpg_personagens', 'rank-2', personagem('Dois', 'Mago', 'Anão', 70, forca=1))
+    escrever('rpg_personagens', 'rank-3', None)
+
+    novo = ranking_novo(api)
+    for consulta in CONSULTAS:
+        mesmo_ranking(ranking, novo, *consulta)
+    assert ranking.top('nivel', classe='Testador') == ([], 0)
+
+    posicao = ranking.posicao('rank-2', 'nivel', classe='Mago')
+    assert posicao == novo.posicao('rank-2', 'nivel', classe='Mago')
+
+    escrever('rpg_personagens', 'rank-1', None)
+    escrever('rpg_personagens', 'rank-2', None)
+    novo = ranking_novo(api)
+    for consulta in CONSULTAS:
+        mesmo_ranking(ranking, novo, *consulta)
+
+
+def test_escritas_durante_semeadura_sao_reaplicadas(api, ranking, escrever, durante_consulta, monkeypatch):
+    escrever('rpg_personagens', 'rank-fica', personagem('Fica', 'Mago', 'Elfo', 40))
+    escrever('rpg_personagens', 'rank-sai', personagem('Sai', 'Mago', 'Anão', 41))
+    monkeypatch.setattr(ranking, 'es', durante_consulta(
+        lambda: escrever('rpg_personagens', 'rank-novo', personagem('Novo', 'Mago', 'Humano', 99)),
+        lambda: escrever('rpg_personagens', 'rank-fica', personagem('Fica', 'Druida', 'Elfo', 2)),
+        lambda: escrever('rpg_personagens', 'rank-sai', None)
+    ))
+
+    ranking.semear()
+    monkeypatch.undo()
+
+    assert ranking.obter('rank-sai') is None
+    assert ranking.obter('rank-fica')['classe'] == 'Druida'
+    novo = ranking_novo(api)
+    for consulta in CONSULTAS:
+        mesmo_ranking(ranking, novo, *consulta)
+
+    for doc_id in ('rank-fica', 'rank-novo'):
+        escrever('rpg_personagens', doc_id, None)
+
+
+def test_limite_e_raio_invalidos(api, ranking):
+    cliente = api.app.test_client()
+    top, _ = ranking.top('nivel', 1)
+    primeiro = top[0]['id']
+
+    assert len(cliente.get('/top_personagens?limite=0').get_json()['personagens']) == 1
+    assert len(cliente.get('/top_personagens?limite=-5').get_json()['personagens']) == 1
+    assert len(cliente.get('/top_personagens?limite=99999').get_json()['personagens']) == \
+        min(1000, ranking.top('nivel', 1)[1])
+    assert cliente.get('/top_personagens?limite=dez').status_code == 400
+
+    vizinhos = cliente.get(f'/top_personagens/{primeiro}/vizinhos?raio=-3').get_json()
+    assert vizinhos == cliente.get(f'/top_personagens/{primeiro}/vizinhos?raio=1').get_json()
+    assert cliente.get(f'/top_personagens/{primeiro}/vizinhos?raio=1.5').status_code == 400
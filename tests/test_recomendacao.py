@@ -0,0 +1,81 @@
+# test_recomendacao.py - Matriz de itens mantida pelas escritas contra um scan novo do índice
+from recomendacao_rpg import MatrizItens
+
+
+def item(nome, nivel, forca=0, destreza=0):
+    return {'nome': nome, 'tipo': 'Arma', 'raridade': 'Comum', 'valor': 10, 'nivel_requerido': nivel,
+            'atributos_bonus': {'forca': forca, 'destreza': destreza}}
+
+
+def matriz_nova(api):
+    matriz = MatrizItens(api.es, intervalo_reconciliacao=0)
+    matriz.semear()
+    return matriz
+
+
+def linhas(matriz):
+    """Conteúdo da matriz por id (a ordem das linhas muda com as remoções)"""
+    assert len(matriz.posicoes) == matriz.n
+    resultado = {}
+    for i in range(matriz.n):
+        doc_id = matriz.ids[i]
+        assert matriz.posicoes[doc_id] == i
+        resultado[doc_id] = (int(matriz.nivel_requerido[i]), tuple(matriz.bonus[i].tolist()), matriz.itens[doc_id])
+    assert set(resultado) == set(matriz.itens)
+    return resultado
+
+
+def test_escritas_batem_com_scan_novo(api, escrever):
+    matriz = api.matriz_itens
+    matriz.garantir_semeado()
+    escrever('rpg_itens', 'mat-1', item('Um', 3, forca=5))
+    escrever('rpg_itens', 'mat-2', item('Dois', 8, destreza=7))
+    escrever('rpg_itens', 'mat-1', item('Um', 4, forca=1, destreza=9))
+    escrever('rpg_itens', 'mat-2', None)
+
+    assert linhas(matriz) == linhas(matriz_nova(api))
+    escrever('rpg_itens', 'mat-1', None)
+    assert linhas(matriz) == linhas(matriz_nova(api))
+
+
+def test_escritas_durante_primeira_semeadura_sao_reaplicadas(api, escrever, durante_consulta, monkeypatch):
+    escrever('rpg_itens', 'mat-sai', item('Sai', 2))
+    escrever('rpg_itens', 'mat-fica', item('Fica', 2))
+    matriz = MatrizItens(api.es, intervalo_reconciliacao=0)
+    monkeypatch.setattr(matriz, 'es', durante_consulta(
+        lambda: escrever('rpg_itens', 'mat-novo', item('Novo', 1, forca=3)),
+        lambda: escrever('rpg_itens', 'mat-fica', item('Fica', 9, destreza=2)),
+        lambda: escrever('rpg_itens', 'mat-sai', None)
+    ))
+    api.ao_escrever(matriz.registrar_escrita)
+    try:
+        matriz.garantir_semeado()
+    finally:
+        api.OUVINTES_ESCRITA.remove(matriz.registrar_escrita)
+    monkeypatch.undo()
+
+    conteudo = linhas(matriz)
+    assert 'mat-sai' not in conteudo and 'mat-novo' in conteudo
+    assert conteudo['mat-fica'][0] == 9
+    assert conteudo == linhas(matriz_nova(api))
+    escrever('rpg_itens', 'mat-novo', None)
+    escrever('rpg_itens', 'mat-fica', None)
+
+
+def test_consulta_nao_ve_escritas_posteriores(api, escrever):
+    matriz = api.matriz_itens
+    personagem = {'nivel': 50, 'classe': 'Guerreiro', 'forca': 20, 'destreza': 5}
+    escrever('rpg_itens', 'mat-some', item('Some', 1))
+    matriz.recomendar([personagem])
+    colunas = (matriz.ids, matriz.nivel_requerido, matriz.bonus)
+    copias = [coluna.copy() for coluna in colunas]
+
+    escrever('rpg_itens', 'mat-cow', item('Cópia', 1, forca=99))
+    escrever('rpg_itens', 'mat-some', None)
+
+    # As colunas que a consulta guardou continuam intactas
+    for coluna, copia in zip(colunas, copias):
+        assert (coluna == copia).all()
+    assert matriz.recomendar([personagem], limite=1)[0][0][0] == 'mat-cow'
+    assert linhas(matriz) == linhas(matriz_nova(api))
+    escrever('rpg_itens', 'mat-cow', None)
@@ -0,0 +1,98 @@
+# test_similares.py - Tabela de similares mantida pelas escritas contra o índice e a força bruta
+import pytest
+
+from similares_rpg import CAMPOS_RESUMO, TabelaSimilares
+
+
+def item(nome, descricao, tags, tipo='Arma', raridade='Raro', valor=500):
+    return {'nome': nome, 'descricao': descricao, 'tags': tags, 'tipo': tipo,
+            'raridade': raridade, 'valor': valor, 'peso': 1, 'nivel_requerido': 1}
+
+
+def itens_do_indice(api):
+    resp = api.es.search(index='rpg_itens', body={'size': 10000, '_source': CAMPOS_RESUMO})
+    return {hit['_id']: {campo: hit['_source'].get(campo) for campo in CAMPOS_RESUMO}
+            for hit in resp['hits']['hits']}
+
+
+def consistente(tabela, api):
+    """Mesmos itens do índice, listas iguais às recalculadas do zero e índice reverso em dia
+
+    Os pesos IDF ficam congelados entre reconstruções: as listas são
+    comparadas com a força bruta sobre o próprio modelo da tabela.
+    """
+    assert tabela.itens == itens_do_indice(api)
+    assert set(tabela.vizinhos) == set(tabela.itens) == set(tabela.vetores)
+
+    for doc_id, lista in tabela.vizinhos.items():
+        esperada = tabela._top(tabela._pontuar(doc_id, tabela.vetores[doc_id]))
+        assert [p for _, p in lista] == pytest.approx([p for _, p in esperada], abs=1e-4), doc_id
+        # Empates no último score podem trocar de id; acima dele os ids são os mesmos
+        corte = esperada[-1][1] if len(esperada) == tabela.k else 0
+        assert {o for o, p in lista if p > corte + 1e-4} == {o for o, p in esperada if p > corte + 1e-4}, doc_id
+
+    citado_por = {}
+    for doc_id, lista in tabela.vizinhos.items():
+        for outro, _ in lista:
+            citado_por.setdefault(outro, set()).add(doc_id)
+    assert tabela.citado_por == citado_por
+
+
+@pytest.fixture
+def tabela(api):
+    """Tabela própria (sem thread), construída agora e registrada como ouvinte das escritas"""
+    tabela = TabelaSimilares(api.es)
+    api.ao_escrever(tabela.registrar_escrita)
+    tabela.construir()
+    yield tabela
+    api.OUVINTES_ESCRITA.remove(tabela.registrar_escrita)
+
+
+def test_construcao_bate_com_forca_bruta(api, tabela):
+    consistente(tabela, api)
+
+
+def test_escritas_batem_com_recalculo(api, tabela, escrever):
+    existente = next(iter(tabela.vizinhos))
+    citado = next(iter(tabela.citado_por))
+
+    escrever('rpg_itens', 'sim-1', item('Espada flamejante', 'Lâmina de fogo forjada no vulcão', ['fogo', 'espada']))
+    escrever('rpg_itens', 'sim-2', item('Espada gélida', 'Lâmina de gelo das montanhas', ['gelo', 'espada']))
+    escrever('rpg_itens', 'sim-3', item('Escudo flamejante', 'Escudo de fogo', ['fogo'], tipo='Armadura'))
+    tabela.processar_pendentes()
+    consistente(tabela, api)
+    assert 'sim-2' in dict(tabela.vizinhos['sim-1'])
+
+    # Texto trocado, item citado por outros removido e item antigo reescrito
+    escrever('rpg_itens', 'sim-1', item('Arco longo', 'Arco de teixo élfico', ['arco']))
+    escrever('rpg_itens', citado, None)
+    escrever('rpg_itens', existente, item('Espada gélida antiga', 'Lâmina de gelo', ['gelo', 'espada']))
+    tabela.processar_pendentes()
+    consistente(tabela, api)
+    assert citado not in tabela.citado_por
+
+    for doc_id in ('sim-1', 'sim-2', 'sim-3'):
+        escrever('rpg_itens', doc_id, None)
+    tabela.processar_pendentes()
+    consistente(tabela, api)
+
+
+def test_escritas_durante_construcao_sao_reaplicadas(api, tabela, escrever, durante_consulta, monkeypatch):
+    escrever('rpg_itens', 'sim-sai', item('Machado rúnico', 'Machado com runas', ['runa']))
+    tabela.processar_pendentes()
+    monkeypatch.setattr(tabela, 'es', durante_consulta(
+        lambda: escrever('rpg_itens', 'sim-entra', item('Machado rúnico duplo', 'Machado com runas', ['runa'])),
+        lambda: escrever('rpg_itens', 'sim-sai', None)
+    ))
+
+    tabela.construir()
+    monkeypatch.undo()
+    tabela.processar_pendentes()
+
+    assert 'sim-sai' not in tabela.vizinhos
+    assert 'sim-entra' in tabela.vizinhos
+    consistente(tabela, api)
+
+    escrever('rpg_itens', 'sim-entra', None)
+    tabela.processar_pendentes()
+    consistente(tabela, api)